@@ -1,11 +1,19 @@
-from fastapi import APIRouter, Depends, UploadFile, File, Form
+from fastapi import APIRouter, Depends, UploadFile, File, Form, Query, Request
 from fastapi.responses import FileResponse
 from sqlalchemy.orm import Session
 from typing import List, Optional
 
 from app.core.dependencies import get_database
 from app.services.document_service import DocumentService
-from app.schemas.document import DocumentResponse, DocumentUpdate
+from app.services.upload_session_service import UploadSessionService
+from app.schemas.document import (
+    BatchUploadResponse,
+    ConversionStatusResponse,
+    DocumentResponse,
+    DocumentUpdate,
+    UploadSessionCreate,
+    UploadSessionResponse,
+)
 
 router = APIRouter(prefix="/documents", tags=["文档管理"])
 
@@ -33,6 +41,96 @@ async def upload_document(
     )
 
 
+@router.post("/upload/batch", response_model=BatchUploadResponse, status_code=201)
+async def upload_documents(
+    files: List[UploadFile] = File(...),
+    description: Optional[str] = Form(None),
+    category_id: Optional[int] = Form(None),
+    db: Session = Depends(get_database),
+):
+    """
+    批量上传文档
+    
+    - **files**: 上传的文件列表（同一字段名重复多次）
+    - **description**: 文档描述（可选，应用到所有文件）
+    - **category_id**: 分类ID（可选，应用到所有文件）
+    
+    单个文件失败不影响其他文件，逐个文件的结果见 results。
+    """
+    service = DocumentService(db)
+    
+    return await service.upload_documents(
+        files=files,
+        description=description,
+        category_id=category_id,
+    )
+
+
+@router.post("/uploads", response_model=UploadSessionResponse, status_code=201)
+async def create_upload_session(
+    data: UploadSessionCreate,
+    db: Session = Depends(get_database),
+):
+    """
+    创建断点续传上传会话
+    
+    - **filename**: 原始文件名
+    - **total_size**: 文件总大小（字节）
+    - **content_type**: 文件类型（可选）
+    - **description**: 文档描述（可选）
+    - **category_id**: 分类ID（可选）
+    """
+    service = UploadSessionService(db)
+    return await service.create_session(data)
+
+
+@router.get("/uploads/{upload_id}", response_model=UploadSessionResponse)
+async def get_upload_session(
+    upload_id: str,
+    db: Session = Depends(get_database),
+):
+    """查询上传会话，offset 为服务端已接收的字节数"""
+    service = UploadSessionService(db)
+    return await service.get_session(upload_id)
+
+
+@router.put("/uploads/{upload_id}", response_model=UploadSessionResponse)
+async def upload_chunk(
+    upload_id: str,
+    request: Request,
+    offset: int = Query(..., ge=0, description="分块起始偏移量"),
+    db: Session = Depends(get_database),
+):
+    """
+    上传分块（请求体为原始二进制数据）
+    
+    - **offset**: 分块起始偏移量，必须等于服务端已接收的字节数，否则返回 409
+    """
+    service = UploadSessionService(db)
+    return await service.append_chunk(upload_id, offset, request.stream())
+
+
+@router.post("/uploads/{upload_id}/complete", response_model=DocumentResponse, status_code=201)
+async def complete_upload(
+    upload_id: str,
+    db: Session = Depends(get_database),
+):
+    """完成上传，创建文档并启动 PDF 转换"""
+    service = UploadSessionService(db)
+    return await service.complete(upload_id)
+
+
+@router.delete("/uploads/{upload_id}", status_code=204)
+async def abort_upload(
+    upload_id: str,
+    db: Session = Depends(get_database),
+):
+    """取消上传会话"""
+    service = UploadSessionService(db)
+    await service.abort(upload_id)
+    return None
+
+
 @router.get("/", response_model=List[DocumentResponse])
 def get_documents(
     skip: int = 0,
@@ -81,6 +179,26 @@ def download_document(
     )
 
 
+@router.get("/{document_id}/conversion", response_model=ConversionStatusResponse)
+def get_conversion_status(
+    document_id: int,
+    db: Session = Depends(get_database),
+):
+    """获取文档的 PDF 转换状态"""
+    service = DocumentService(db)
+    return service.get_conversion_status(document_id)
+
+
+@router.post("/{document_id}/conversion", response_model=ConversionStatusResponse, status_code=202)
+def request_conversion(
+    document_id: int,
+    db: Session = Depends(get_database),
+):
+    """重新提交文档的 PDF 转换任务（用于转换失败或未提交转换的文档）"""
+    service = DocumentService(db)
+    return service.request_conversion(document_id)
+
+
 @router.put("/{document_id}", response_model=DocumentResponse)
 def update_document(
     document_id: int,
@@ -3,8 +3,17 @@ from fastapi.responses import FileResponse
 from sqlalchemy.orm import Session
 
 from app.core.dependencies import get_database
+from app.core.exceptions import CompilationVolumesRequireJobError
+from app.services.compilation_service import CompilationService
+from app.services.conversion_cache import ConversionCache
 from app.services.pdf_service import PDFService
-from app.schemas.pdf import PDFGenerateRequest
+from app.schemas.pdf import (
+    CompilationAppendRequest,
+    CompilationEstimate,
+    CompilationJobResponse,
+    ConversionCacheStats,
+    PDFGenerateRequest,
+)
 
 router = APIRouter(prefix="/pdf", tags=["PDF生成"])
 
@@ -18,17 +27,145 @@ def generate_pdf(
     生成文档汇编 PDF
     
     - **document_ids**: 文档ID列表
+    - **selector**: 文档筛选条件（关键词、标签、分类、文件类型、排序），与 document_ids 二选一
     - **title**: PDF 标题（可选）
+    - **add_header** / **header_text**: 页眉（可选）
+    - **watermark_text**: 水印（可选）
+    - **page_ranges**: 各文档的页码范围（可选），如 {"3": {"start": 1, "end": 2}}
+    - **profile**: 输出配置（archive / screen / email，默认 archive）
+    
+    预估页数或大小超出上限时返回 413（见 /estimate）。
     """
+    if request.split_volumes:
+        raise CompilationVolumesRequireJobError()
+    
     service = PDFService(db)
+    document_ids = service.resolve_document_ids(request.document_ids, request.selector)
+    service.check_compilation_size(document_ids, request.page_range_tuples())
     output_path = service.generate_pdf(
-        document_ids=request.document_ids,
+        document_ids=document_ids,
         title=request.title,
+        add_header=request.add_header,
+        header_text=request.header_text,
+        page_ranges=request.page_range_tuples(),
+        profile=request.profile,
+        watermark_text=request.watermark_text,
+    )
+    
+    return FileResponse(
+        path=str(output_path),
+        filename=f"{request.title}.pdf",
+        media_type="application/pdf",
+    )
+
+
+@router.post("/estimate", response_model=CompilationEstimate)
+def estimate_compilation(
+    request: PDFGenerateRequest,
+    db: Session = Depends(get_database),
+):
+    """
+    预估汇编规模（请求体同「生成文档汇编 PDF」），不转换、不合并
+    
+    根据入库时记录的页数、PDF 大小和转换状态计算总页数、预估大小、待转换文档数和分卷数，
+    并返回是否超出单次汇编的上限（超出时生成接口和任务接口返回 413）。
+    """
+    service = PDFService(db)
+    return service.estimate_compilation(
+        document_ids=service.resolve_document_ids(request.document_ids, request.selector),
+        page_ranges=request.page_range_tuples(),
+        max_pages_per_volume=request.max_pages_per_volume,
+        max_bytes_per_volume=request.max_bytes_per_volume,
+    )
+
+
+@router.post("/compilations", response_model=CompilationJobResponse, status_code=202)
+def submit_compilation(
+    request: PDFGenerateRequest,
+    db: Session = Depends(get_database),
+):
+    """
+    提交文档汇编 PDF 任务（立即返回任务ID，由后台工作进程合并）
+    
+    - **document_ids**: 文档ID列表
+    - **selector**: 文档筛选条件，与 document_ids 二选一（提交时解析为文档ID列表）
+    - **title**: PDF 标题（可选）
+    - **add_header** / **header_text**: 页眉（可选）
+    - **watermark_text**: 水印（可选）
+    - **page_ranges**: 各文档的页码范围（可选）
+    - **profile**: 输出配置（archive / screen / email，默认 archive）
+    - **max_pages_per_volume** / **max_bytes_per_volume**: 分卷汇编（可选），每完成一卷即可下载
+    """
+    service = CompilationService(db)
+    return service.submit(request)
+
+
+@router.post("/compilations/{job_id}/append", response_model=CompilationJobResponse, status_code=202)
+def append_compilation(
+    job_id: int,
+    request: CompilationAppendRequest,
+    db: Session = Depends(get_database),
+):
+    """
+    在已完成的汇编末尾追加文档（返回新的汇编任务，原汇编保持不变）
+    
+    新任务复制原汇编后只写入追加的页面和书签（增量保存），耗时与追加的页数成正比。
+    页眉、水印和输出配置沿用原汇编；分卷汇编不支持追加。
+    
+    - **document_ids**: 追加的文档ID列表
+    - **title**: 新汇编标题（可选，默认沿用原标题）
+    - **page_ranges**: 追加文档的页码范围（可选）
+    """
+    service = CompilationService(db)
+    return service.append(job_id, request)
+
+
+@router.get("/compilations/{job_id}", response_model=CompilationJobResponse)
+def get_compilation(
+    job_id: int,
+    db: Session = Depends(get_database),
+):
+    """获取汇编任务状态和进度（已处理文档数 / 页数）"""
+    service = CompilationService(db)
+    return service.get_job(job_id)
+
+
+@router.get("/compilations/{job_id}/download")
+def download_compilation(
+    job_id: int,
+    db: Session = Depends(get_database),
+):
+    """下载汇编结果（任务完成后可用；分卷汇编时返回分卷清单）"""
+    service = CompilationService(db)
+    output_path, filename, media_type = service.get_output(job_id)
+    
+    return FileResponse(
+        path=str(output_path),
+        filename=filename,
+        media_type=media_type,
     )
+
+
+@router.get("/compilations/{job_id}/volumes/{index}")
+def download_compilation_volume(
+    job_id: int,
+    index: int,
+    db: Session = Depends(get_database),
+):
+    """下载汇编分卷（分卷完成后即可下载，不必等待整个任务完成）"""
+    service = CompilationService(db)
+    output_path, filename = service.get_volume(job_id, index)
     
     return FileResponse(
         path=str(output_path),
-        filename=output_path.name,
+        filename=filename,
         media_type="application/pdf",
     )
 
+
+@router.get("/conversion-cache", response_model=ConversionCacheStats)
+def get_conversion_cache_stats(
+    db: Session = Depends(get_database),
+):
+    """获取 PDF 转换结果缓存统计（命中/未命中次数、文件数、总大小）"""
+    return ConversionCache(db).stats()
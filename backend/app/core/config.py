@@ -26,9 +26,63 @@ class Settings(BaseSettings):
     PDF_OUTPUT_DIR: str = "files/generated_pdfs"
     PDF_COMPILATION_DIR: str = "files/compilations"
     MAX_UPLOAD_SIZE: int = 104857600  # 100MB
+    UPLOAD_CHUNK_SIZE: int = 1048576  # 上传流式写入的分块大小（1MB）
+    MAX_RESUMABLE_UPLOAD_SIZE: int = 10737418240  # 断点续传上传的最大文件大小（10GB）
+    BATCH_UPLOAD_CONCURRENCY: int = 8  # 批量上传时并发写入的文件数
+    UPLOAD_SESSION_TTL: int = 86400  # 断点续传会话过期时间（秒），超时未完成的会话会被清理
+    UPLOAD_REJECT_UNCONVERTIBLE: bool = False  # 是否拒绝按文件头识别为无法转换 PDF 的文件（压缩包、可执行文件、音视频等，返回 415），关闭时照常保存但不转换
     
     # LibreOffice 配置
     LIBREOFFICE_PATH: Optional[str] = None  # LibreOffice 可执行文件路径（可选，如果为空则自动检测）
+    LIBREOFFICE_POOL_SIZE: int = os.cpu_count() or 2  # 常驻 LibreOffice 工作进程数（即最大并发转换数）
+    LIBREOFFICE_MAX_JOBS_PER_WORKER: int = 50  # 单个工作进程处理多少个任务后重启（防止内存泄漏累积）
+    LIBREOFFICE_TIMEOUT: int = 300  # 单个文档转换超时时间（秒）
+    LIBREOFFICE_START_TIMEOUT: int = 60  # 工作进程启动超时时间（秒）
+    LIBREOFFICE_PROFILE_DIR: str = "files/libreoffice_profiles"  # 工作进程独立用户配置目录的根目录
+    LIBREOFFICE_UNO_PYTHON: Optional[str] = None  # 可以导入 uno 的 Python 解释器（当前 Python 无法导入 uno 时用于运行 UNO 客户端，为空则自动检测）
+    LIBREOFFICE_ONESHOT_FALLBACK: bool = False  # 没有可以导入 uno 的 Python 时是否降级为每个任务启动一次性 soffice 进程（否则 Office 转换不可用）
+    
+    # PDF 转换任务队列配置
+    CONVERSION_WORKER_EMBEDDED: bool = True  # 是否在 API 进程内运行转换工作进程（关闭后需单独运行 python -m app.worker）
+    CONVERSION_WORKER_POLL_INTERVAL: float = 1.0  # 没有任务时的轮询间隔（秒）
+    CONVERSION_MAX_ATTEMPTS: int = 3  # 单个任务最大尝试次数
+    CONVERSION_RETRY_BASE_DELAY: int = 30  # 重试退避基数（秒），第 n 次重试等待 base * 2^(n-1) 秒
+    CONVERSION_JOB_LOCK_TIMEOUT: int = 900  # 任务心跳超时时间（秒），超过该时间未刷新心跳视为工作进程已退出并重新排队
+    CONVERSION_JOB_HEARTBEAT_INTERVAL: int = 60  # 处理中任务的心跳间隔（秒），需小于 CONVERSION_JOB_LOCK_TIMEOUT
+    CONVERSION_TEXT_CONCURRENCY: int = 4  # 文本类（纯文本、Markdown、HTML、CSV）进程内转换的最大并发数（每个工作进程）
+    CONVERSION_IMAGE_CONCURRENCY: int = 4  # 图片转换的最大并发数（每个工作进程）
+    CONVERSION_OFFICE_CONCURRENCY: int = os.cpu_count() or 2  # Office 文档转换的最大并发数（每个工作进程，不超过 LIBREOFFICE_POOL_SIZE 才有意义）
+    CONVERSION_TEXT_TIME_BUDGET: int = 60  # 单个文本类文件转换的时间预算（秒）
+    CONVERSION_IMAGE_TIME_BUDGET: int = 120  # 单个图片转换的时间预算（秒），Office 文档使用 LIBREOFFICE_TIMEOUT
+    CONVERSION_TEXT_MAX_QUEUE: int = 2000  # 排队中的文本类转换任务上限，超出时拒绝上传（503）
+    CONVERSION_IMAGE_MAX_QUEUE: int = 2000  # 排队中的图片转换任务上限，超出时拒绝上传（503）
+    CONVERSION_OFFICE_MAX_QUEUE: int = 200  # 排队中的 Office 转换任务上限，超出时拒绝上传（503）
+    CONVERSION_BUSY_RETRY_AFTER: int = 60  # 转换队列已满时返回给客户端的 Retry-After（秒）
+    CONVERSION_CACHE_MAX_SIZE: int = 10737418240  # PDF 输出目录（转换结果缓存）的容量上限（10GB），超出时按 LRU 淘汰，0 表示不限制
+    
+    # PDF 汇编任务配置
+    COMPILATION_WORKER_CONCURRENCY: int = 1  # 单个工作进程同时处理的汇编任务数
+    COMPILATION_JOB_LOCK_TIMEOUT: int = 600  # 汇编任务超过该时间（秒）未刷新心跳视为工作进程已退出，重新排队
+    COMPILATION_JOB_HEARTBEAT_INTERVAL: int = 60  # 处理中汇编任务的心跳间隔（秒），需小于 COMPILATION_JOB_LOCK_TIMEOUT
+    COMPILATION_MAX_ATTEMPTS: int = 3  # 单个汇编任务最大尝试次数，超时重新排队达到该次数后标记为失败
+    COMPILATION_CONVERT_CONCURRENCY: int = 8  # 汇编时并发转换缺少 PDF 的文档数
+    COMPILATION_CACHE_MAX_SIZE: int = 5368709120  # 汇编目录（汇编结果缓存）的容量上限（5GB），超出时按 LRU 淘汰，0 表示不限制
+    COMPILATION_JOB_RESULT_RETENTION: int = 604800  # 汇编任务结果的保留时间（秒），期间不被汇编缓存淘汰，0 表示一直保留
+    COMPILATION_MAX_PAGES: int = 20000  # 单次汇编的预估总页数上限，超出时拒绝提交，0 表示不限制
+    COMPILATION_ESTIMATE_PAGE_BYTES: int = 102400  # 预估页数未知的文档时的平均每页大小（字节），汇编中有已知页数的文档时按其平均值估算
+    COMPILATION_MAX_BYTES: int = 2147483648  # 单次汇编的预估总大小上限（2GB），超出时拒绝提交，0 表示不限制
+    
+    # PDF 处理进程池配置（图片 / 文本转换、合并、页眉水印等 CPU 密集操作）
+    PDF_PROCESS_POOL_SIZE: int = os.cpu_count() or 2  # PDF 处理进程数（每个 API / 工作进程），0 表示在线程中直接执行
+    PDF_PROCESS_MEMORY_LIMIT: int = 4294967296  # 单个 PDF 处理进程的内存（地址空间）上限（4GB），超出时该任务失败，0 表示不限制（仅 Linux / macOS 生效）
+    PDF_PROCESS_MAX_TASKS_PER_CHILD: int = 200  # 单个 PDF 处理进程处理多少个任务后重启（释放内存碎片），0 表示不重启（需要 Python 3.11+）
+    
+    # 图片转 PDF 配置
+    IMAGE_PDF_RECOMPRESS_LOSSLESS: bool = True  # BMP、TIFF、GIF 等无损图片是否重新编码为 PNG 预测器压缩（体积更小，转换稍慢），关闭时按原始像素 Deflate 压缩
+    IMAGE_PDF_MAX_PIXELS: int = 1000000000  # 单帧图片的像素数上限（10 亿），超出时视为解压炸弹，解码前拒绝，0 表示只使用 Pillow 的默认上限（约 1.79 亿）
+    IMAGE_PDF_LARGE_PIXELS: int = 50000000  # 超过该像素数（5000 万）的图片按大图片转换：条带分块解码，限制解码内存，0 表示不区分
+    IMAGE_PDF_MAX_DECODE_BYTES: int = 536870912  # 大图片无法分块解码时允许整帧解码的最大内存（512MB），超出时拒绝转换，0 表示不限制
+    IMAGE_PDF_MAX_DPI: int = 0  # 大图片降采样的目标分辨率（按图片记录的 DPI 计算），0 表示不降采样
     
     # CORS 配置
     CORS_ORIGINS: List[str] = [
@@ -61,6 +115,13 @@ class Settings(BaseSettings):
         path.mkdir(parents=True, exist_ok=True)
         return path
     
+    @property
+    def libreoffice_profile_dir_path(self) -> Path:
+        """获取 LibreOffice 工作进程用户配置根目录路径"""
+        path = self.BASE_DIR / self.LIBREOFFICE_PROFILE_DIR
+        path.mkdir(parents=True, exist_ok=True)
+        return path
+    
     class Config:
         env_file = ".env"
         case_sensitive = True
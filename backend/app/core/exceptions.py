@@ -1,5 +1,5 @@
 from fastapi import HTTPException, status
-from typing import Any, Dict, Optional
+from typing import Any, Dict, List, Optional
 
 
 class BaseAPIException(HTTPException):
@@ -24,6 +24,46 @@ class DocumentNotFoundError(BaseAPIException):
         )
 
 
+class DocumentsNotFoundError(BaseAPIException):
+    """多个文档不存在异常（批量校验时一次报告所有不存在的ID）"""
+    
+    def __init__(self, document_ids: List[int]) -> None:
+        super().__init__(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail=f"文档 ID {', '.join(str(doc_id) for doc_id in document_ids)} 不存在",
+        )
+
+
+class EmptyDocumentSelectionError(BaseAPIException):
+    """筛选条件没有匹配任何文档异常"""
+    
+    def __init__(self) -> None:
+        super().__init__(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="没有符合筛选条件的文档",
+        )
+
+
+class InvalidPageRangeError(BaseAPIException):
+    """页码范围超出文档页数异常"""
+    
+    def __init__(self, title: str, start: int, end: Optional[int], page_count: int) -> None:
+        super().__init__(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"页码范围 {start}-{end or ''} 超出文档《{title}》的页数 {page_count}",
+        )
+
+
+class CompilationVolumesRequireJobError(BaseAPIException):
+    """同步生成接口不支持分卷异常"""
+    
+    def __init__(self) -> None:
+        super().__init__(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="分卷汇编请使用异步汇编接口 /api/v1/pdf/compilations",
+        )
+
+
 class TagNotFoundError(BaseAPIException):
     """标签不存在异常"""
     
@@ -54,6 +94,128 @@ class FileNotFoundError(BaseAPIException):
         )
 
 
+class FileTooLargeError(BaseAPIException):
+    """文件过大异常"""
+    
+    def __init__(self, max_size: int) -> None:
+        super().__init__(
+            status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+            detail=f"文件大小超过限制: 最大 {max_size} 字节",
+        )
+
+
+class UnsupportedFileTypeError(BaseAPIException):
+    """文件内容无法转换为 PDF 异常"""
+    
+    def __init__(self, file_type: str) -> None:
+        super().__init__(
+            status_code=status.HTTP_415_UNSUPPORTED_MEDIA_TYPE,
+            detail=f"文件内容识别为 {file_type}，无法转换为 PDF",
+        )
+
+
+class UploadSessionNotFoundError(BaseAPIException):
+    """上传会话不存在异常"""
+    
+    def __init__(self, upload_id: str) -> None:
+        super().__init__(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail=f"上传会话 {upload_id} 不存在或已过期",
+        )
+
+
+class UploadOffsetMismatchError(BaseAPIException):
+    """上传偏移量不匹配异常"""
+    
+    def __init__(self, expected_offset: int) -> None:
+        super().__init__(
+            status_code=status.HTTP_409_CONFLICT,
+            detail=f"上传偏移量不匹配，服务端已接收 {expected_offset} 字节",
+            headers={"Upload-Offset": str(expected_offset)},
+        )
+
+
+class UploadIncompleteError(BaseAPIException):
+    """上传未完成异常"""
+    
+    def __init__(self, received: int, total: int) -> None:
+        super().__init__(
+            status_code=status.HTTP_409_CONFLICT,
+            detail=f"上传未完成: 已接收 {received}/{total} 字节",
+        )
+
+
+class ServiceBusyError(BaseAPIException):
+    """服务繁忙异常（转换队列已满）"""
+    
+    def __init__(self, retry_after: int) -> None:
+        super().__init__(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail=f"PDF 转换队列已满，请 {retry_after} 秒后重试",
+            headers={"Retry-After": str(retry_after)},
+        )
+
+
+class CompilationJobNotFoundError(BaseAPIException):
+    """汇编任务不存在异常"""
+    
+    def __init__(self, job_id: int) -> None:
+        super().__init__(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail=f"汇编任务 ID {job_id} 不存在",
+        )
+
+
+class CompilationNotReadyError(BaseAPIException):
+    """汇编结果尚未生成异常"""
+    
+    def __init__(self, job_id: int) -> None:
+        super().__init__(
+            status_code=status.HTTP_409_CONFLICT,
+            detail=f"汇编任务 {job_id} 尚未完成",
+        )
+
+
+class CompilationVolumeNotFoundError(BaseAPIException):
+    """汇编分卷不存在异常"""
+    
+    def __init__(self, job_id: int, index: int) -> None:
+        super().__init__(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail=f"汇编任务 ID {job_id} 的第 {index} 卷不存在",
+        )
+
+
+class CompilationAppendNotSupportedError(BaseAPIException):
+    """分卷汇编不支持追加异常"""
+    
+    def __init__(self, job_id: int) -> None:
+        super().__init__(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"汇编任务 {job_id} 为分卷汇编，不支持追加文档",
+        )
+
+
+class CompilationPageRangeConflictError(BaseAPIException):
+    """追加文档的页码范围与原汇编冲突异常"""
+    
+    def __init__(self, document_ids: List[int]) -> None:
+        super().__init__(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"文档 {document_ids} 已在原汇编中，追加时的页码范围必须与原汇编一致",
+        )
+
+
+class CompilationTooLargeError(BaseAPIException):
+    """汇编规模超出限制异常"""
+    
+    def __init__(self, message: str) -> None:
+        super().__init__(
+            status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+            detail=f"汇编规模超出限制: {message}",
+        )
+
+
 class PDFGenerationError(BaseAPIException):
     """PDF 生成异常"""
     
@@ -1,8 +1,15 @@
+import asyncio
+
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 
 from app.core.config import settings
 from app.api import api_router
+from app.services.conversion_scheduler import shutdown_conversion_scheduler
+from app.services.conversion_worker import ConversionWorker
+from app.services.converters import get_converter_registry
+from app.services.libreoffice_pool import shutdown_libreoffice_pool
+from app.services.process_pool import shutdown_pdf_process_pool
 
 # 创建 FastAPI 应用
 app = FastAPI(
@@ -26,6 +33,29 @@ app.add_middleware(
 app.include_router(api_router)
 
 
+@app.on_event("startup")
+async def startup():
+    """探测 PDF 转换器，启动内置的 PDF 转换工作进程"""
+    # 探测 LibreOffice 需要启动进程，不阻塞事件循环
+    await asyncio.get_running_loop().run_in_executor(None, get_converter_registry().probe)
+    if settings.CONVERSION_WORKER_EMBEDDED:
+        worker = ConversionWorker()
+        app.state.conversion_worker = worker
+        app.state.conversion_worker_task = asyncio.create_task(worker.run())
+
+
+@app.on_event("shutdown")
+async def shutdown():
+    """关闭时停止转换工作进程、转换线程池、PDF 处理进程池和常驻的 LibreOffice 工作进程"""
+    worker = getattr(app.state, "conversion_worker", None)
+    if worker is not None:
+        worker.stop()
+        await app.state.conversion_worker_task
+    shutdown_conversion_scheduler()
+    shutdown_pdf_process_pool()
+    shutdown_libreoffice_pool()
+
+
 @app.get("/")
 async def root():
     """根路径"""
@@ -2,6 +2,8 @@ from app.models.document_model import Document, document_tags
 from app.models.tag_model import Tag
 from app.models.user_model import User
 from app.models.category_model import Category
+from app.models.conversion_job_model import ConversionJob
+from app.models.compilation_job_model import CompilationJob
 
-__all__ = ["Document", "Tag", "User", "Category", "document_tags"]
+__all__ = ["Document", "Tag", "User", "Category", "ConversionJob", "CompilationJob", "document_tags"]
 
@@ -0,0 +1,34 @@
+from sqlalchemy import Column, String, Integer, Text, DateTime, Index
+
+from app.models.base_model import BaseModel
+
+
+class CompilationJob(BaseModel):
+    """PDF 汇编任务模型"""
+    
+    __tablename__ = "compilation_jobs"
+    
+    # 状态常量
+    STATUS_PENDING = 0
+    STATUS_RUNNING = 1
+    STATUS_SUCCEEDED = 2
+    STATUS_FAILED = 3
+    
+    title = Column(String(255), nullable=False, comment="汇编标题")
+    document_ids = Column(Text, nullable=False, comment="文档ID列表（JSON，按汇编顺序）")
+    options = Column(Text, nullable=True, comment="汇编选项（JSON）")
+    status = Column(Integer, nullable=False, default=0, comment="状态：0-待处理，1-处理中，2-成功，3-失败")
+    total_documents = Column(Integer, nullable=False, default=0, comment="文档总数")
+    processed_documents = Column(Integer, nullable=False, default=0, comment="已处理文档数")
+    processed_pages = Column(Integer, nullable=False, default=0, comment="已处理页数")
+    output_path = Column(String(500), nullable=True, comment="汇编结果文件路径")
+    output_size = Column(Integer, nullable=False, default=0, comment="汇编结果文件大小")
+    volumes = Column(Text, nullable=True, comment="已完成的分卷列表（JSON，分卷汇编时逐卷追加）")
+    attempts = Column(Integer, nullable=False, default=0, comment="已尝试次数（每次领取加一）")
+    locked_by = Column(String(100), nullable=True, comment="正在处理的工作进程标识")
+    locked_time = Column(DateTime(timezone=True), nullable=True, comment="开始处理时间")
+    last_error = Column(Text, nullable=True, comment="失败原因")
+    
+    __table_args__ = (
+        Index("idx_compilation_jobs_status", "status"),
+    )
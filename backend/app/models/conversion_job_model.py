@@ -0,0 +1,34 @@
+from sqlalchemy import Column, String, Integer, Text, DateTime, Index
+
+from app.models.base_model import BaseModel
+
+
+class ConversionJob(BaseModel):
+    """PDF 转换任务模型"""
+    
+    __tablename__ = "conversion_jobs"
+    
+    # 状态常量
+    STATUS_PENDING = 0
+    STATUS_RUNNING = 1
+    STATUS_SUCCEEDED = 2
+    STATUS_FAILED = 3
+    
+    document_id = Column(Integer, nullable=False, comment="发起转换的文档ID")
+    source_path = Column(String(500), nullable=False, comment="源文件路径（同一文件的多个文档共享转换结果）")
+    converter_class = Column(String(20), nullable=False, comment="转换器类型：text-文本类，image-图片，office-Office 文档")
+    status = Column(Integer, nullable=False, default=0, comment="状态：0-待处理，1-处理中，2-成功，3-失败")
+    priority = Column(Integer, nullable=False, default=0, comment="优先级：数值越小越先处理（按估算转换开销）")
+    attempts = Column(Integer, nullable=False, default=0, comment="已尝试次数")
+    max_attempts = Column(Integer, nullable=False, default=3, comment="最大尝试次数")
+    next_run_time = Column(DateTime(timezone=True), nullable=False, comment="下次可执行时间（重试退避）")
+    locked_by = Column(String(100), nullable=True, comment="正在处理的工作进程标识")
+    locked_time = Column(DateTime(timezone=True), nullable=True, comment="开始处理时间")
+    last_error = Column(Text, nullable=True, comment="最近一次失败原因")
+    
+    __table_args__ = (
+        Index("idx_conversion_jobs_status_next_run_time", "status", "next_run_time"),
+        Index("idx_conversion_jobs_converter_class_status", "converter_class", "status"),
+        Index("idx_conversion_jobs_source_path", "source_path"),
+        Index("idx_conversion_jobs_document_id", "document_id"),
+    )
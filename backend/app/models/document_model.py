@@ -29,6 +29,7 @@ class Document(BaseModel):
     file_type = Column(String(100), nullable=False, comment="文件类型")
     pdf_file_size = Column(Integer, nullable=False, comment="PDF文件大小")
     pdf_save_path = Column(String(500), nullable=True, comment="PDF文件保存路径")
+    page_count = Column(Integer, nullable=True, comment="PDF页数（原始 PDF 或转换结果的页数，为空表示未知）")
     introduction = Column(Text, nullable=True, comment="文章简介")
     write_time = Column(DateTime(timezone=True), nullable=True, comment="写作时间")
     status = Column(Integer, nullable=False, default=1, comment="状态：0-草稿，1-已发布，2-隐藏")
@@ -46,5 +47,6 @@ class Document(BaseModel):
         Index("idx_documents_delete_flag", "delete_flag"),
         Index("idx_documents_create_time", "create_time"),
         Index("idx_documents_update_time", "update_time"),
+        Index("idx_documents_save_path", "save_path"),
     )
 
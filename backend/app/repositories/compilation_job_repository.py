@@ -0,0 +1,244 @@
+from sqlalchemy.orm import Session
+from datetime import datetime, timedelta
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Set
+import json
+
+from app.core.config import settings
+from app.models.compilation_job_model import CompilationJob
+
+
+class CompilationJobRepository:
+    """PDF 汇编任务仓库类"""
+    
+    def __init__(self, db: Session):
+        self.db = db
+    
+    def create(
+        self,
+        title: str,
+        document_ids: List[int],
+        options: Optional[Dict[str, Any]] = None,
+    ) -> CompilationJob:
+        """
+        创建汇编任务
+        
+        Args:
+            title: 汇编标题
+            document_ids: 文档ID列表（按汇编顺序）
+            options: 汇编选项
+        
+        Returns:
+            CompilationJob: 汇编任务
+        """
+        job = CompilationJob(
+            title=title,
+            document_ids=json.dumps(document_ids),
+            options=json.dumps(options or {}, ensure_ascii=False),
+            status=CompilationJob.STATUS_PENDING,
+            total_documents=len(document_ids),
+            attempts=0,
+        )
+        self.db.add(job)
+        self.db.commit()
+        self.db.refresh(job)
+        return job
+    
+    def get_by_id(self, job_id: int) -> Optional[CompilationJob]:
+        """通过ID获取任务"""
+        return self.db.query(CompilationJob).filter(CompilationJob.id == job_id).first()
+    
+    def claim_next(self, worker_id: str) -> Optional[CompilationJob]:
+        """
+        领取下一个待处理的任务（带状态条件的 UPDATE，多个工作进程同时领取时只有一个能成功）
+        
+        Args:
+            worker_id: 工作进程标识
+        
+        Returns:
+            CompilationJob: 领取到的任务，没有待处理任务时返回 None
+        """
+        while True:
+            candidate = (
+                self.db.query(CompilationJob.id)
+                .filter(CompilationJob.status == CompilationJob.STATUS_PENDING)
+                .order_by(CompilationJob.id)
+                .first()
+            )
+            if candidate is None:
+                return None
+            
+            claimed = (
+                self.db.query(CompilationJob)
+                .filter(
+                    CompilationJob.id == candidate.id,
+                    CompilationJob.status == CompilationJob.STATUS_PENDING,
+                )
+                .update(
+                    {
+                        CompilationJob.status: CompilationJob.STATUS_RUNNING,
+                        CompilationJob.attempts: CompilationJob.attempts + 1,
+                        CompilationJob.locked_by: worker_id,
+                        CompilationJob.locked_time: datetime.utcnow(),
+                        CompilationJob.processed_documents: 0,
+                        CompilationJob.processed_pages: 0,
+                        CompilationJob.volumes: None,
+                    },
+                    synchronize_session=False,
+                )
+            )
+            self.db.commit()
+            
+            # 被其他工作进程抢先领取，继续尝试下一个
+            if claimed == 1:
+                return self.get_by_id(candidate.id)
+    
+    def _update_owned(self, job_id: int, worker_id: str, values: Dict[Any, Any]) -> bool:
+        """
+        更新处理中的任务（带 locked_by 条件，任务已被重新排队或被其他工作进程领取时不更新）
+        
+        Returns:
+            bool: 任务仍由该工作进程处理、已更新时返回 True
+        """
+        updated = (
+            self.db.query(CompilationJob)
+            .filter(
+                CompilationJob.id == job_id,
+                CompilationJob.status == CompilationJob.STATUS_RUNNING,
+                CompilationJob.locked_by == worker_id,
+            )
+            .update(values, synchronize_session=False)
+        )
+        self.db.commit()
+        return updated == 1
+    
+    def heartbeat(self, job_id: int, worker_id: str) -> bool:
+        """
+        刷新处理中任务的 locked_time（心跳），避免合并前转换、大文件合并、保存和分卷等耗时步骤被 requeue_stale 当作超时
+        
+        Returns:
+            bool: 任务仍由该工作进程处理时返回 True
+        """
+        return self._update_owned(job_id, worker_id, {CompilationJob.locked_time: datetime.utcnow()})
+    
+    def update_progress(
+        self,
+        job: CompilationJob,
+        worker_id: str,
+        processed_documents: int,
+        processed_pages: int,
+    ) -> bool:
+        """更新处理进度（同时刷新 locked_time），任务已不由该工作进程处理时返回 False"""
+        return self._update_owned(
+            job.id,
+            worker_id,
+            {
+                CompilationJob.processed_documents: processed_documents,
+                CompilationJob.processed_pages: processed_pages,
+                CompilationJob.locked_time: datetime.utcnow(),
+            },
+        )
+    
+    def add_volume(self, job: CompilationJob, worker_id: str, volume: Dict[str, Any]) -> bool:
+        """追加一个已完成的分卷（同时刷新 locked_time），任务已不由该工作进程处理时返回 False"""
+        volumes = json.loads(job.volumes or "[]")
+        volumes.append(volume)
+        return self._update_owned(
+            job.id,
+            worker_id,
+            {
+                CompilationJob.volumes: json.dumps(volumes, ensure_ascii=False),
+                CompilationJob.locked_time: datetime.utcnow(),
+            },
+        )
+    
+    def get_output_file_names(self, retention: int = 0) -> Set[str]:
+        """
+        获取任务引用的汇编结果文件名（汇编缓存淘汰时跳过）
+        
+        包括处理中任务已完成的分卷，以及成功任务的结果文件或分卷清单（清单所在的整组分卷一起保留）。
+        
+        Args:
+            retention: 成功任务的结果保留时间（秒），更早完成的任务不再保留，0 表示一直保留
+        """
+        names: Set[str] = set()
+        for (volumes,) in self.db.query(CompilationJob.volumes).filter(
+            CompilationJob.status == CompilationJob.STATUS_RUNNING,
+            CompilationJob.volumes.isnot(None),
+        ):
+            names.update(volume["file"] for volume in json.loads(volumes))
+        
+        succeeded = self.db.query(CompilationJob.output_path).filter(
+            CompilationJob.status == CompilationJob.STATUS_SUCCEEDED,
+            CompilationJob.output_path.isnot(None),
+        )
+        if retention:
+            succeeded = succeeded.filter(
+                CompilationJob.update_time >= datetime.utcnow() - timedelta(seconds=retention)
+            )
+        names.update(Path(output_path).name for (output_path,) in succeeded)
+        return names
+    
+    def mark_succeeded(self, job: CompilationJob, worker_id: str, output_path: str, output_size: int) -> bool:
+        """标记任务成功，任务已不由该工作进程处理时不更新并返回 False"""
+        return self._update_owned(
+            job.id,
+            worker_id,
+            {
+                CompilationJob.status: CompilationJob.STATUS_SUCCEEDED,
+                CompilationJob.output_path: output_path,
+                CompilationJob.output_size: output_size,
+                CompilationJob.processed_documents: CompilationJob.total_documents,
+                CompilationJob.last_error: None,
+                CompilationJob.locked_by: None,
+            },
+        )
+    
+    def mark_failed(self, job: CompilationJob, worker_id: str, error: str) -> bool:
+        """标记任务失败，任务已不由该工作进程处理时不更新并返回 False"""
+        return self._update_owned(
+            job.id,
+            worker_id,
+            {
+                CompilationJob.status: CompilationJob.STATUS_FAILED,
+                CompilationJob.last_error: error,
+                CompilationJob.locked_by: None,
+            },
+        )
+    
+    def requeue_stale(self) -> int:
+        """
+        回收超时未更新进度的任务（处理它的工作进程可能已退出）
+        
+        已尝试 COMPILATION_MAX_ATTEMPTS 次的任务标记为失败，不再重新排队
+        （如每次都导致工作进程崩溃的汇编）。
+        
+        Returns:
+            int: 重新排队的任务数
+        """
+        deadline = datetime.utcnow() - timedelta(seconds=settings.COMPILATION_JOB_LOCK_TIMEOUT)
+        stale = self.db.query(CompilationJob).filter(
+            CompilationJob.status == CompilationJob.STATUS_RUNNING,
+            CompilationJob.locked_time < deadline,
+        )
+        
+        stale.filter(CompilationJob.attempts >= settings.COMPILATION_MAX_ATTEMPTS).update(
+            {
+                CompilationJob.status: CompilationJob.STATUS_FAILED,
+                CompilationJob.locked_by: None,
+                CompilationJob.last_error: "工作进程超时未完成",
+            },
+            synchronize_session=False,
+        )
+        count = (
+            stale.filter(CompilationJob.attempts < settings.COMPILATION_MAX_ATTEMPTS)
+            .update(
+                {
+                    CompilationJob.status: CompilationJob.STATUS_PENDING,
+                    CompilationJob.locked_by: None,
+                },
+                synchronize_session=False,
+            )
+        )
+        self.db.commit()
+        return count
@@ -0,0 +1,261 @@
+from sqlalchemy.orm import Session
+from datetime import datetime, timedelta
+from typing import List, Optional, Tuple
+
+from app.core.config import settings
+from app.models.conversion_job_model import ConversionJob
+
+
+class ConversionJobRepository:
+    """PDF 转换任务仓库类"""
+    
+    ACTIVE_STATUSES = (ConversionJob.STATUS_PENDING, ConversionJob.STATUS_RUNNING)
+    
+    def __init__(self, db: Session):
+        self.db = db
+    
+    def _new_job(
+        self,
+        document_id: int,
+        source_path: str,
+        converter_class: str,
+        priority: int = 0,
+    ) -> ConversionJob:
+        return ConversionJob(
+            document_id=document_id,
+            source_path=source_path,
+            converter_class=converter_class,
+            status=ConversionJob.STATUS_PENDING,
+            priority=priority,
+            attempts=0,
+            max_attempts=settings.CONVERSION_MAX_ATTEMPTS,
+            next_run_time=datetime.utcnow(),
+        )
+    
+    def get_active_by_source_path(self, source_path: str) -> Optional[ConversionJob]:
+        """获取同一源文件的未完成任务"""
+        return (
+            self.db.query(ConversionJob)
+            .filter(
+                ConversionJob.source_path == source_path,
+                ConversionJob.status.in_(self.ACTIVE_STATUSES),
+            )
+            .first()
+        )
+    
+    def enqueue(
+        self,
+        document_id: int,
+        source_path: str,
+        converter_class: str,
+        priority: int = 0,
+        commit: bool = True,
+    ) -> ConversionJob:
+        """
+        创建转换任务
+        
+        同一源文件已有未完成任务时直接返回该任务，不重复转换。
+        
+        Args:
+            document_id: 文档ID
+            source_path: 源文件路径
+            converter_class: 转换器类型（image / office）
+            priority: 优先级（数值越小越先处理）
+            commit: 是否提交事务（False 时由调用方与文档记录一起提交）
+        
+        Returns:
+            ConversionJob: 转换任务
+        """
+        existing = self.get_active_by_source_path(source_path)
+        if existing:
+            return existing
+        
+        job = self._new_job(document_id, source_path, converter_class, priority)
+        self.db.add(job)
+        if commit:
+            self.db.commit()
+            self.db.refresh(job)
+        else:
+            self.db.flush()
+        return job
+    
+    def enqueue_many(self, items: List[Tuple[int, str, str, int]], commit: bool = True) -> None:
+        """
+        批量创建转换任务（单个事务）
+        
+        Args:
+            items: (文档ID, 源文件路径, 转换器类型, 优先级) 列表，同一源文件只创建一个任务
+            commit: 是否提交事务（False 时由调用方与文档记录一起提交）
+        """
+        source_paths = {item[1] for item in items}
+        if not source_paths:
+            return
+        
+        active = {
+            source_path
+            for (source_path,) in self.db.query(ConversionJob.source_path).filter(
+                ConversionJob.source_path.in_(source_paths),
+                ConversionJob.status.in_(self.ACTIVE_STATUSES),
+            )
+        }
+        for document_id, source_path, converter_class, priority in items:
+            if source_path in active:
+                continue
+            active.add(source_path)
+            self.db.add(self._new_job(document_id, source_path, converter_class, priority))
+        
+        if commit:
+            self.db.commit()
+    
+    def get_by_id(self, job_id: int) -> Optional[ConversionJob]:
+        """通过ID获取任务"""
+        return self.db.query(ConversionJob).filter(ConversionJob.id == job_id).first()
+    
+    def get_latest_by_source_path(self, source_path: str) -> Optional[ConversionJob]:
+        """获取源文件最近的转换任务"""
+        return (
+            self.db.query(ConversionJob)
+            .filter(ConversionJob.source_path == source_path)
+            .order_by(ConversionJob.id.desc())
+            .first()
+        )
+    
+    def count_pending(self, converter_class: str) -> int:
+        """统计某类转换器排队中的任务数（队列深度）"""
+        return (
+            self.db.query(ConversionJob)
+            .filter(
+                ConversionJob.converter_class == converter_class,
+                ConversionJob.status == ConversionJob.STATUS_PENDING,
+            )
+            .count()
+        )
+    
+    def claim_next(self, worker_id: str, converter_class: str) -> Optional[ConversionJob]:
+        """
+        领取下一个可执行的任务
+        
+        通过带状态条件的 UPDATE 原子地抢占任务，多个工作进程（包括其他机器上的进程）
+        同时领取时只有一个能成功。
+        
+        Args:
+            worker_id: 工作进程标识
+            converter_class: 转换器类型，只领取该类型的任务
+        
+        Returns:
+            ConversionJob: 领取到的任务，没有可执行任务时返回 None
+        """
+        while True:
+            now = datetime.utcnow()
+            candidate = (
+                self.db.query(ConversionJob.id)
+                .filter(
+                    ConversionJob.converter_class == converter_class,
+                    ConversionJob.status == ConversionJob.STATUS_PENDING,
+                    ConversionJob.next_run_time <= now,
+                )
+                .order_by(ConversionJob.priority, ConversionJob.id)
+                .first()
+            )
+            if candidate is None:
+                return None
+            
+            claimed = (
+                self.db.query(ConversionJob)
+                .filter(
+                    ConversionJob.id == candidate.id,
+                    ConversionJob.status == ConversionJob.STATUS_PENDING,
+                )
+                .update(
+                    {
+                        ConversionJob.status: ConversionJob.STATUS_RUNNING,
+                        ConversionJob.attempts: ConversionJob.attempts + 1,
+                        ConversionJob.locked_by: worker_id,
+                        ConversionJob.locked_time: now,
+                    },
+                    synchronize_session=False,
+                )
+            )
+            self.db.commit()
+            
+            # 被其他工作进程抢先领取，继续尝试下一个
+            if claimed == 1:
+                return self.get_by_id(candidate.id)
+    
+    def heartbeat(self, job_id: int, worker_id: str) -> bool:
+        """
+        刷新处理中任务的 locked_time（心跳），避免耗时较长的任务被 requeue_stale 当作超时任务重新排队
+        
+        Returns:
+            bool: 任务仍由该工作进程处理时返回 True
+        """
+        updated = (
+            self.db.query(ConversionJob)
+            .filter(
+                ConversionJob.id == job_id,
+                ConversionJob.status == ConversionJob.STATUS_RUNNING,
+                ConversionJob.locked_by == worker_id,
+            )
+            .update({ConversionJob.locked_time: datetime.utcnow()}, synchronize_session=False)
+        )
+        self.db.commit()
+        return updated == 1
+    
+    def mark_succeeded(self, job: ConversionJob) -> None:
+        """标记任务成功"""
+        job.status = ConversionJob.STATUS_SUCCEEDED
+        job.last_error = None
+        job.locked_by = None
+        self.db.commit()
+    
+    def mark_failed(self, job: ConversionJob, error: str) -> None:
+        """
+        标记任务失败
+        
+        未达到最大尝试次数时按指数退避重新排队，否则标记为最终失败。
+        """
+        job.last_error = error
+        job.locked_by = None
+        if job.attempts < job.max_attempts:
+            delay = settings.CONVERSION_RETRY_BASE_DELAY * (2 ** (job.attempts - 1))
+            job.status = ConversionJob.STATUS_PENDING
+            job.next_run_time = datetime.utcnow() + timedelta(seconds=delay)
+        else:
+            job.status = ConversionJob.STATUS_FAILED
+        self.db.commit()
+    
+    def requeue_stale(self) -> int:
+        """
+        回收超时未完成的任务（超过 CONVERSION_JOB_LOCK_TIMEOUT 没有心跳，处理它的工作进程可能已退出）
+        
+        Returns:
+            int: 重新排队的任务数
+        """
+        deadline = datetime.utcnow() - timedelta(seconds=settings.CONVERSION_JOB_LOCK_TIMEOUT)
+        stale = self.db.query(ConversionJob).filter(
+            ConversionJob.status == ConversionJob.STATUS_RUNNING,
+            ConversionJob.locked_time < deadline,
+        )
+        
+        # 已用完重试次数的任务直接标记失败，避免反复拖垮工作进程
+        stale.filter(ConversionJob.attempts >= ConversionJob.max_attempts).update(
+            {
+                ConversionJob.status: ConversionJob.STATUS_FAILED,
+                ConversionJob.locked_by: None,
+                ConversionJob.last_error: "工作进程超时未完成",
+            },
+            synchronize_session=False,
+        )
+        count = (
+            stale.filter(ConversionJob.attempts < ConversionJob.max_attempts)
+            .update(
+                {
+                    ConversionJob.status: ConversionJob.STATUS_PENDING,
+                    ConversionJob.locked_by: None,
+                    ConversionJob.next_run_time: datetime.utcnow(),
+                },
+                synchronize_session=False,
+            )
+        )
+        self.db.commit()
+        return count
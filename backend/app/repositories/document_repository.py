@@ -1,15 +1,17 @@
-from sqlalchemy.orm import Session
-from sqlalchemy import or_
-from typing import List, Optional
-from pathlib import Path
+from sqlalchemy.orm import Query, Session
+from sqlalchemy import or_, select
+from typing import Any, Dict, Iterator, List, Optional, Set, Tuple
 
-from app.models.document_model import Document
+from app.models.document_model import Document, document_tags
 from app.schemas.document import DocumentCreate, DocumentUpdate
 
 
 class DocumentRepository:
     """文档仓库类"""
     
+    # 单条 IN 查询的最大参数个数（低于 SQLite 的参数数量上限）
+    IN_QUERY_BATCH_SIZE = 500
+    
     def __init__(self, db: Session):
         self.db = db
     
@@ -22,6 +24,8 @@ class DocumentRepository:
         introduction: Optional[str] = None,
         category_id: Optional[int] = None,
         category_name: Optional[str] = None,
+        page_count: Optional[int] = None,
+        commit: bool = True,
     ) -> Document:
         """
         创建文档
@@ -34,7 +38,9 @@ class DocumentRepository:
             introduction: 文章简介
             category_id: 分类ID
             category_name: 分类名称
-            
+            page_count: PDF 页数（上传的文件本身是 PDF 时）
+            commit: 是否提交事务（False 时只 flush 以获取ID，由调用方与其他记录一起提交）
+        
         Returns:
             Document: 创建的文档对象
         """
@@ -45,6 +51,7 @@ class DocumentRepository:
             file_type=file_type,
             pdf_file_size=0,
             pdf_save_path=None,
+            page_count=page_count,
             introduction=introduction,
             upload_user_name="默认用户",
             upload_user_id="001",
@@ -53,20 +60,126 @@ class DocumentRepository:
         )
         
         self.db.add(document)
-        self.db.commit()
-        self.db.refresh(document)
+        if commit:
+            self.db.commit()
+            self.db.refresh(document)
+        else:
+            self.db.flush()
         
         return document
     
+    def create_many(self, items: List[Dict[str, Any]], commit: bool = True) -> List[Document]:
+        """
+        批量创建文档（单个事务）
+        
+        Args:
+            items: 文档字段字典列表，字段同 create；可额外包含 pdf_file_size、pdf_save_path、page_count
+            commit: 是否提交事务（False 时只 flush 以获取ID，由调用方与其他记录一起提交）
+        
+        Returns:
+            List[Document]: 创建的文档对象列表（与 items 顺序一致）
+        """
+        documents = []
+        for item in items:
+            fields = dict(
+                pdf_file_size=0,
+                pdf_save_path=None,
+                upload_user_name="默认用户",
+                upload_user_id="001",
+            )
+            fields.update(item)
+            documents.append(Document(**fields))
+        
+        if not documents:
+            return documents
+        
+        self.db.add_all(documents)
+        self.db.flush()
+        if not commit:
+            return documents
+        ids = [document.id for document in documents]
+        self.db.commit()
+        
+        # 一次查询刷新所有对象（代替逐个 refresh）
+        self.db.query(Document).filter(Document.id.in_(ids)).all()
+        
+        return documents
+    
     def get_by_id(self, document_id: int) -> Optional[Document]:
         """通过ID获取文档"""
         return self.db.query(Document).filter(Document.id == document_id).first()
     
+    def get_by_ids(self, document_ids: List[int]) -> Tuple[List[Document], List[int]]:
+        """
+        批量获取文档（按请求顺序返回，允许重复ID）
+        
+        Args:
+            document_ids: 文档ID列表
+        
+        Returns:
+            Tuple[List[Document], List[int]]: (按请求顺序排列的文档, 不存在的文档ID)
+        """
+        unique_ids = list(dict.fromkeys(document_ids))
+        found: Dict[int, Document] = {}
+        for start in range(0, len(unique_ids), self.IN_QUERY_BATCH_SIZE):
+            batch = unique_ids[start:start + self.IN_QUERY_BATCH_SIZE]
+            for document in self.db.query(Document).filter(Document.id.in_(batch)):
+                found[document.id] = document
+        
+        documents = [found[doc_id] for doc_id in document_ids if doc_id in found]
+        missing = [doc_id for doc_id in unique_ids if doc_id not in found]
+        return documents, missing
+    
+    def count_by_save_path(self, save_path: str) -> int:
+        """统计引用同一文件的文档数量"""
+        return self.db.query(Document).filter(Document.save_path == save_path).count()
+    
+    def get_converted_by_save_paths(self, save_paths: List[str]) -> Dict[str, Document]:
+        """
+        批量获取已完成 PDF 转换的文档
+        
+        Returns:
+            Dict[str, Document]: 文件路径 -> 引用该文件且已转换的文档
+        """
+        if not save_paths:
+            return {}
+        
+        documents = (
+            self.db.query(Document)
+            .filter(
+                Document.save_path.in_(set(save_paths)),
+                Document.pdf_save_path.isnot(None),
+            )
+            .all()
+        )
+        return {document.save_path: document for document in documents}
+    
+    def get_converted_by_save_path(self, save_path: str) -> Optional[Document]:
+        """获取引用同一文件且已完成 PDF 转换的文档"""
+        return (
+            self.db.query(Document)
+            .filter(
+                Document.save_path == save_path,
+                Document.pdf_save_path.isnot(None),
+            )
+            .first()
+        )
+    
+    def get_pdf_save_paths(self) -> Set[str]:
+        """获取所有文档引用的 PDF 文件路径"""
+        return {
+            pdf_save_path
+            for (pdf_save_path,) in self.db.query(Document.pdf_save_path)
+            .filter(Document.pdf_save_path.isnot(None))
+            .distinct()
+        }
+    
     def update_pdf_info(
         self,
         document_id: int,
         pdf_file_size: int,
         pdf_save_path: str,
+        page_count: Optional[int] = None,
     ) -> Optional[Document]:
         """
         更新文档的 PDF 信息
@@ -75,7 +188,8 @@ class DocumentRepository:
             document_id: 文档ID
             pdf_file_size: PDF 文件大小
             pdf_save_path: PDF 文件保存路径
-            
+            page_count: PDF 页数
+        
         Returns:
             Document: 更新后的文档对象，如果文档不存在返回 None
         """
@@ -85,10 +199,48 @@ class DocumentRepository:
         
         document.pdf_file_size = pdf_file_size
         document.pdf_save_path = pdf_save_path
+        document.page_count = page_count
         self.db.commit()
         self.db.refresh(document)
         return document
     
+    def update_pdf_info_by_save_path(
+        self,
+        save_path: str,
+        pdf_file_size: int,
+        pdf_save_path: str,
+        page_count: Optional[int] = None,
+    ) -> int:
+        """
+        更新引用同一文件的所有未转换文档的 PDF 信息
+        
+        Args:
+            save_path: 原始文件保存路径
+            pdf_file_size: PDF 文件大小
+            pdf_save_path: PDF 文件保存路径
+            page_count: PDF 页数
+        
+        Returns:
+            int: 更新的文档数量
+        """
+        count = (
+            self.db.query(Document)
+            .filter(
+                Document.save_path == save_path,
+                Document.pdf_save_path.is_(None),
+            )
+            .update(
+                {
+                    Document.pdf_file_size: pdf_file_size,
+                    Document.pdf_save_path: pdf_save_path,
+                    Document.page_count: page_count,
+                },
+                synchronize_session=False,
+            )
+        )
+        self.db.commit()
+        return count
+    
     def get_document_tags(self, document_id: int) -> List:
         """获取文档的标签列表"""
         from app.models.document_model import document_tags
@@ -135,24 +287,32 @@ class DocumentRepository:
         return document
     
     def delete(self, document: Document) -> None:
-        """删除文档"""
-        # 删除文件
-        file_path = Path(document.save_path)
-        if file_path.exists():
-            file_path.unlink()
+        """
+        删除文档记录
         
+        原始文件按内容去重存储，多个文档可能引用同一文件，
+        无引用的文件由 StorageService.delete_blob_if_unreferenced 删除。
+        """
         self.db.delete(document)
         self.db.commit()
     
-    def search(
+    # 搜索结果可用的排序字段
+    SEARCH_ORDER_FIELDS = {
+        "id": Document.id,
+        "title": Document.title,
+        "create_time": Document.create_time,
+        "update_time": Document.update_time,
+    }
+    
+    def _search_query(
         self,
+        query: Query,
         keyword: Optional[str] = None,
         tag_ids: Optional[List[int]] = None,
         file_type: Optional[str] = None,
-    ) -> List[Document]:
-        """搜索文档"""
-        query = self.db.query(Document)
-        
+        category_id: Optional[int] = None,
+    ) -> Query:
+        """为查询添加搜索条件（标签条件使用子查询，结果无需去重）"""
         if keyword:
             keyword_filter = or_(
                 Document.title.contains(keyword),
@@ -161,13 +321,68 @@ class DocumentRepository:
             query = query.filter(keyword_filter)
         
         if tag_ids:
-            from app.models.document_model import document_tags
-            query = query.join(document_tags, Document.id == document_tags.c.document_id).filter(
-                document_tags.c.tag_id.in_(tag_ids)
+            query = query.filter(
+                Document.id.in_(
+                    select(document_tags.c.document_id).where(document_tags.c.tag_id.in_(tag_ids))
+                )
             )
         
         if file_type:
             query = query.filter(Document.file_type.contains(file_type))
         
-        return query.distinct().all()
+        if category_id is not None:
+            query = query.filter(Document.category_id == category_id)
+        
+        return query
+    
+    def search(
+        self,
+        keyword: Optional[str] = None,
+        tag_ids: Optional[List[int]] = None,
+        file_type: Optional[str] = None,
+        category_id: Optional[int] = None,
+    ) -> List[Document]:
+        """搜索文档"""
+        query = self._search_query(
+            self.db.query(Document),
+            keyword=keyword,
+            tag_ids=tag_ids,
+            file_type=file_type,
+            category_id=category_id,
+        )
+        return query.all()
+    
+    def iter_search_ids(
+        self,
+        keyword: Optional[str] = None,
+        tag_ids: Optional[List[int]] = None,
+        file_type: Optional[str] = None,
+        category_id: Optional[int] = None,
+        order_by: str = "create_time",
+        descending: bool = False,
+    ) -> Iterator[int]:
+        """
+        按搜索条件逐批读取文档ID（只查询ID列，不加载文档对象）
+        
+        Args:
+            order_by: 排序字段（SEARCH_ORDER_FIELDS 中的键），相同值按ID排序
+            descending: 是否倒序
+        
+        Yields:
+            int: 文档ID
+        """
+        column = self.SEARCH_ORDER_FIELDS[order_by]
+        id_column = Document.id
+        if descending:
+            column, id_column = column.desc(), id_column.desc()
+        
+        query = self._search_query(
+            self.db.query(Document.id),
+            keyword=keyword,
+            tag_ids=tag_ids,
+            file_type=file_type,
+            category_id=category_id,
+        )
+        for (document_id,) in query.order_by(column, id_column).yield_per(self.IN_QUERY_BATCH_SIZE):
+            yield document_id
 
@@ -3,22 +3,48 @@ from app.schemas.document import (
     DocumentCreate,
     DocumentUpdate,
     DocumentResponse,
+    UploadSessionCreate,
+    UploadSessionResponse,
+    BatchUploadResult,
+    BatchUploadResponse,
+    ConversionStatusResponse,
 )
 from app.schemas.tag import TagBase, TagCreate, TagUpdate, TagResponse
 from app.schemas.search import SearchQuery, SearchResponse
-from app.schemas.pdf import PDFGenerateRequest
+from app.schemas.pdf import (
+    DocumentSelector,
+    PageRange,
+    PDFGenerateRequest,
+    CompilationAppendRequest,
+    ConversionCacheStats,
+    CompilationEstimate,
+    CompilationVolume,
+    CompilationJobResponse,
+)
 
 __all__ = [
     "DocumentBase",
     "DocumentCreate",
     "DocumentUpdate",
     "DocumentResponse",
+    "UploadSessionCreate",
+    "UploadSessionResponse",
+    "BatchUploadResult",
+    "BatchUploadResponse",
+    "ConversionStatusResponse",
     "TagBase",
     "TagCreate",
     "TagUpdate",
     "TagResponse",
     "SearchQuery",
     "SearchResponse",
+    "DocumentSelector",
+    "PageRange",
     "PDFGenerateRequest",
+    "CompilationAppendRequest",
+    "ConversionCacheStats",
+    "CompilationEstimate",
+    "CompilationVolume",
+    "CompilationJobResponse",
 ]
 
@@ -1,6 +1,6 @@
 from pydantic import BaseModel, Field, model_validator
 from datetime import datetime
-from typing import List, Optional
+from typing import ClassVar, Dict, List, Optional
 
 from app.schemas.tag import TagResponse
 
@@ -32,6 +32,7 @@ class DocumentResponse(DocumentBase):
     file_size: int = Field(..., description="文件大小")
     file_type: str = Field(..., description="文件类型")
     pdf_file_size: int = Field(..., description="PDF文件大小")
+    page_count: Optional[int] = Field(None, description="PDF页数（未知时为空）")
     introduction: Optional[str] = Field(None, description="文章简介")
     write_time: Optional[datetime] = Field(None, description="写作时间")
     status: int = Field(..., description="状态：0-草稿，1-已发布，2-隐藏")
@@ -56,3 +57,65 @@ class DocumentResponse(DocumentBase):
     class Config:
         from_attributes = True
 
+
+
+class UploadSessionCreate(BaseModel):
+    """创建断点续传上传会话模式"""
+    
+    filename: str = Field(..., description="原始文件名", min_length=1, max_length=255)
+    total_size: int = Field(..., description="文件总大小（字节）", ge=0)
+    content_type: Optional[str] = Field(None, description="文件类型")
+    description: Optional[str] = Field(None, description="文档描述")
+    category_id: Optional[int] = Field(None, description="分类ID")
+
+
+class UploadSessionResponse(BaseModel):
+    """断点续传上传会话响应模式"""
+    
+    upload_id: str = Field(..., description="上传会话ID")
+    filename: str = Field(..., description="原始文件名")
+    total_size: int = Field(..., description="文件总大小（字节）")
+    offset: int = Field(..., description="服务端已接收的字节数，下一个分块从此处开始")
+
+
+class BatchUploadResult(BaseModel):
+    """批量上传单个文件结果模式"""
+    
+    filename: Optional[str] = Field(None, description="原始文件名")
+    success: bool = Field(..., description="是否上传成功")
+    document: Optional[DocumentResponse] = Field(None, description="创建的文档（成功时）")
+    error: Optional[str] = Field(None, description="失败原因（失败时）")
+
+
+class BatchUploadResponse(BaseModel):
+    """批量上传响应模式"""
+    
+    total: int = Field(..., description="文件总数")
+    succeeded: int = Field(..., description="成功数量")
+    failed: int = Field(..., description="失败数量")
+    results: List[BatchUploadResult] = Field(default_factory=list, description="逐个文件的结果（与上传顺序一致）")
+
+
+class ConversionStatusResponse(BaseModel):
+    """PDF 转换状态响应模式"""
+    
+    # conversion_jobs.status -> 状态名称
+    JOB_STATUS_NAMES: ClassVar[Dict[int, str]] = {
+        0: "pending",
+        1: "running",
+        2: "succeeded",
+        3: "failed",
+    }
+    
+    document_id: int = Field(..., description="文档ID")
+    status: str = Field(
+        ...,
+        description="转换状态：pending-排队中，running-转换中，succeeded-已完成，failed-失败，"
+                    "not_required-已是 PDF，unsupported-格式不支持，not_queued-未提交转换",
+    )
+    pdf_file_size: int = Field(0, description="PDF文件大小")
+    attempts: int = Field(0, description="已尝试次数")
+    max_attempts: Optional[int] = Field(None, description="最大尝试次数")
+    last_error: Optional[str] = Field(None, description="最近一次失败原因")
+    next_run_time: Optional[datetime] = Field(None, description="下次重试时间")
+    update_time: Optional[datetime] = Field(None, description="任务最后更新时间")
@@ -1,10 +1,158 @@
-from pydantic import BaseModel, Field
-from typing import List, Optional
+from pydantic import BaseModel, Field, model_validator
+from datetime import datetime
+from typing import ClassVar, Dict, List, Literal, Optional, Tuple
+
+
+class DocumentSelector(BaseModel):
+    """汇编文档筛选条件（与搜索接口使用相同的查询逻辑，由服务端解析为文档列表）"""
+    
+    keyword: Optional[str] = Field(None, description="搜索关键词（标题、简介）")
+    tag_ids: Optional[List[int]] = Field(None, description="标签ID列表（包含任一标签）")
+    category_id: Optional[int] = Field(None, description="分类ID")
+    file_type: Optional[str] = Field(None, description="文件类型")
+    order_by: Literal["id", "title", "create_time", "update_time"] = Field(
+        default="create_time", description="排序字段"
+    )
+    descending: bool = Field(default=False, description="是否倒序")
+
+
+class PageRange(BaseModel):
+    """文档页码范围（从1开始，包含首尾页）"""
+    
+    start: int = Field(default=1, ge=1, description="起始页")
+    end: Optional[int] = Field(default=None, ge=1, description="结束页（为空表示到最后一页）")
+    
+    @model_validator(mode="after")
+    def check_order(self) -> "PageRange":
+        if self.end is not None and self.end < self.start:
+            raise ValueError("结束页不能小于起始页")
+        return self
 
 
 class PDFGenerateRequest(BaseModel):
-    """PDF 生成请求模式"""
+    """PDF 生成请求模式（document_ids 与 selector 二选一）"""
     
-    document_ids: List[int] = Field(..., description="文档ID列表", min_items=1)
+    document_ids: Optional[List[int]] = Field(None, description="文档ID列表", min_items=1)
+    selector: Optional[DocumentSelector] = Field(None, description="文档筛选条件")
     title: Optional[str] = Field(default="文档汇编", description="PDF 标题")
+    add_header: bool = Field(default=False, description="是否添加页眉")
+    header_text: Optional[str] = Field(default=None, description="页眉文本（为空时每个文档使用自己的标题）")
+    watermark_text: Optional[str] = Field(default=None, max_length=50, description="水印文本（为空时不加水印）")
+    page_ranges: Optional[Dict[int, PageRange]] = Field(
+        default=None, description="各文档的页码范围（文档ID -> 页码范围），未指定的文档包含全部页面"
+    )
+    profile: Literal["archive", "screen", "email"] = Field(
+        default="archive",
+        description="输出配置：archive-存档（无损），screen-屏幕阅读（图片降至150 DPI），email-邮件发送（图片降至96 DPI）",
+    )
+    max_pages_per_volume: Optional[int] = Field(default=None, ge=1, description="每卷最大页数（分卷汇编）")
+    max_bytes_per_volume: Optional[int] = Field(
+        default=None, ge=1024 * 1024, description="每卷最大字节数（按源文件估算，分卷汇编）"
+    )
+    
+    @model_validator(mode="after")
+    def check_document_source(self) -> "PDFGenerateRequest":
+        if (self.document_ids is None) == (self.selector is None):
+            raise ValueError("document_ids 和 selector 必须且只能提供一个")
+        if self.page_ranges and self.document_ids is not None:
+            unknown = set(self.page_ranges) - set(self.document_ids)
+            if unknown:
+                raise ValueError(f"page_ranges 包含不在 document_ids 中的文档: {sorted(unknown)}")
+        return self
+    
+    @property
+    def split_volumes(self) -> bool:
+        """是否分卷汇编"""
+        return self.max_pages_per_volume is not None or self.max_bytes_per_volume is not None
+    
+    def page_range_tuples(self) -> Optional[Dict[int, Tuple[int, Optional[int]]]]:
+        """页码范围转换为 文档ID -> (起始页, 结束页)"""
+        if not self.page_ranges:
+            return None
+        return {doc_id: (page_range.start, page_range.end) for doc_id, page_range in self.page_ranges.items()}
+
+
+class CompilationAppendRequest(BaseModel):
+    """汇编追加请求模式（在已完成的汇编末尾追加文档，页眉、水印和输出配置沿用原汇编）"""
+    
+    document_ids: List[int] = Field(..., description="追加的文档ID列表", min_items=1)
+    title: Optional[str] = Field(default=None, description="新汇编标题（为空时沿用原汇编标题）")
+    page_ranges: Optional[Dict[int, PageRange]] = Field(
+        default=None, description="追加文档的页码范围（文档ID -> 页码范围），未指定的文档包含全部页面"
+    )
+    
+    @model_validator(mode="after")
+    def check_page_ranges(self) -> "CompilationAppendRequest":
+        if self.page_ranges:
+            unknown = set(self.page_ranges) - set(self.document_ids)
+            if unknown:
+                raise ValueError(f"page_ranges 包含不在 document_ids 中的文档: {sorted(unknown)}")
+        return self
+    
+    def page_range_tuples(self) -> Optional[Dict[int, Tuple[int, Optional[int]]]]:
+        """页码范围转换为 文档ID -> (起始页, 结束页)"""
+        if not self.page_ranges:
+            return None
+        return {doc_id: (page_range.start, page_range.end) for doc_id, page_range in self.page_ranges.items()}
+
+
+
+class ConversionCacheStats(BaseModel):
+    """PDF 转换结果缓存统计模式"""
+    
+    hits: int = Field(..., description="命中次数（所有进程累计）")
+    misses: int = Field(..., description="未命中次数（所有进程累计）")
+    entries: int = Field(..., description="缓存文件数")
+    size: int = Field(..., description="缓存总大小（字节）")
+    max_size: int = Field(..., description="缓存容量上限（字节），0 表示不限制")
+
+
+class CompilationEstimate(BaseModel):
+    """汇编预估结果模式（根据入库时记录的文档元数据计算，不打开 PDF 文件）"""
+    
+    total_documents: int = Field(..., description="文档数")
+    total_pages: int = Field(..., description="预估总页数（含页数未知文档的估算页数）")
+    estimated_size: int = Field(..., description="预估输出大小（字节，按源文件大小和页码范围比例估算）")
+    converted_documents: int = Field(..., description="已有 PDF 的文档数（原始 PDF 或已转换）")
+    pending_conversions: int = Field(..., description="汇编前需要转换的文档数")
+    unknown_page_documents: int = Field(..., description="页数未知的文档数（未转换或入库时未记录页数）")
+    estimated_pages: int = Field(..., description="页数未知的文档按平均每页大小估算的页数（已计入总页数）")
+    skipped_documents: int = Field(..., description="格式不支持转换、将被跳过的文档数")
+    estimated_volumes: Optional[int] = Field(None, description="预估分卷数（分卷汇编时）")
+    max_pages: int = Field(..., description="单次汇编的页数上限，0 表示不限制")
+    max_bytes: int = Field(..., description="单次汇编的大小上限（字节），0 表示不限制")
+    exceeds_limits: bool = Field(..., description="是否超出上限（超出时提交会被拒绝）")
+
+
+class CompilationVolume(BaseModel):
+    """汇编分卷信息"""
+    
+    index: int = Field(..., description="卷号（从1开始）")
+    pages: int = Field(..., description="页数")
+    size: int = Field(..., description="文件大小")
+    download_url: str = Field(..., description="下载地址")
 
+
+class CompilationJobResponse(BaseModel):
+    """PDF 汇编任务响应模式"""
+    
+    # compilation_jobs.status -> 状态名称
+    STATUS_NAMES: ClassVar[Dict[int, str]] = {
+        0: "pending",
+        1: "running",
+        2: "succeeded",
+        3: "failed",
+    }
+    
+    job_id: int = Field(..., description="汇编任务ID")
+    title: str = Field(..., description="PDF 标题")
+    status: str = Field(..., description="任务状态：pending-排队中，running-汇编中，succeeded-已完成，failed-失败")
+    total_documents: int = Field(..., description="文档总数")
+    processed_documents: int = Field(..., description="已处理文档数")
+    processed_pages: int = Field(..., description="已处理页数")
+    output_size: int = Field(0, description="汇编结果文件大小")
+    error: Optional[str] = Field(None, description="失败原因")
+    download_url: Optional[str] = Field(None, description="下载地址（任务完成后提供；分卷汇编时为分卷清单）")
+    volumes: List[CompilationVolume] = Field(default_factory=list, description="已完成的分卷（分卷汇编时逐卷可下载）")
+    create_time: Optional[datetime] = Field(None, description="创建时间")
+    update_time: Optional[datetime] = Field(None, description="最后更新时间")
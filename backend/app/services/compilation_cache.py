@@ -0,0 +1,230 @@
+from sqlalchemy.orm import Session
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, Optional, Set
+from uuid import uuid4
+import hashlib
+import json
+import logging
+import os
+import threading
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+
+from app.core.config import settings
+from app.repositories.compilation_job_repository import CompilationJobRepository
+from app.services.file_lru import evict_lru
+
+logger = logging.getLogger(__name__)
+
+
+class CompilationCache:
+    """
+    PDF 汇编结果缓存
+    
+    缓存键由有序的文档列表（文档ID、更新时间、参与合并的 PDF 文件）和汇编选项计算得出，
+    结果保存为 <compilation_dir>/<key>.pdf。相同请求直接复用已有文件；
+    相同键的并发请求只合并一次，其余请求等待并复用结果（single-flight）：进程内按键排队，
+    API 进程和转换工作进程之间对 <compilation_dir>/.locks/<key>.lock 加 flock，
+    淘汰时跳过其他进程正在生成的键（不支持 flock 的系统上只在进程内有效）。
+    
+    分卷汇编的结果为 <key>-<卷号>.pdf 和分卷清单 <key>.json，每卷完成后立即放入缓存，
+    清单在全部分卷完成后写入；任一分卷被淘汰时整个结果视为未命中。
+    
+    汇编目录总大小超过 COMPILATION_CACHE_MAX_SIZE 时按最近使用时间淘汰，
+    同一缓存键的分卷和清单一起淘汰；汇编任务引用的结果（COMPILATION_JOB_RESULT_RETENTION 内）不淘汰。
+    """
+    
+    LOCK_DIR_NAME = ".locks"
+    
+    # 本进程正在生成的缓存键 -> [锁, 等待/持有的请求数]
+    _inflight: Dict[str, list] = {}
+    _inflight_lock = threading.Lock()
+    
+    def __init__(self, db: Optional[Session] = None, cache_dir: Optional[Path] = None):
+        self.db = db
+        self.cache_dir = cache_dir or settings.pdf_compilation_dir_path
+        self.lock_dir = self.cache_dir / self.LOCK_DIR_NAME
+        self.lock_dir.mkdir(parents=True, exist_ok=True)
+    
+    @staticmethod
+    def make_key(sections: List[Dict[str, Any]], options: Dict[str, Any]) -> str:
+        """
+        计算缓存键
+        
+        Args:
+            sections: 按汇编顺序排列的文档信息（文档ID、更新时间、PDF 路径等）
+            options: 汇编选项（标题、页眉等）
+        """
+        payload = json.dumps(
+            {"sections": sections, "options": options},
+            sort_keys=True,
+            ensure_ascii=False,
+            default=str,
+        )
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+    
+    def entry_path(self, key: str) -> Path:
+        """缓存文件路径"""
+        return self.cache_dir / f"{key}.pdf"
+    
+    def volume_path(self, key: str, index: int) -> Path:
+        """分卷文件路径"""
+        return self.cache_dir / f"{key}-{index:03d}.pdf"
+    
+    def manifest_path(self, key: str) -> Path:
+        """分卷清单路径"""
+        return self.cache_dir / f"{key}.json"
+    
+    def temp_path(self, key: str) -> Path:
+        """生成中的临时文件路径（不参与缓存统计和淘汰）"""
+        return self.cache_dir / f".{key}.{uuid4().hex}.part"
+    
+    def get(self, key: str) -> Optional[Path]:
+        """查找缓存结果，命中时刷新最近使用时间"""
+        path = self.entry_path(key)
+        try:
+            os.utime(path)
+        except FileNotFoundError:
+            return None
+        
+        logger.info(f"PDF 汇编缓存命中: {path}")
+        return path
+    
+    def put(self, key: str, temp_path: Path) -> Path:
+        """将生成的文件放入缓存，然后按容量淘汰旧文件"""
+        path = self.entry_path(key)
+        os.replace(temp_path, path)
+        self._evict(key)
+        return path
+    
+    def put_volume(self, key: str, index: int, temp_path: Path) -> Path:
+        """将生成的分卷放入缓存，然后按容量淘汰旧文件（不淘汰本次汇编已完成的分卷）"""
+        path = self.volume_path(key, index)
+        os.replace(temp_path, path)
+        self._evict(key)
+        return path
+    
+    @staticmethod
+    def _entry_key(name: str) -> str:
+        """缓存文件名 -> 缓存键（<key>.pdf、<key>-<卷号>.pdf 和 <key>.json 属于同一个键）"""
+        return name.split(".", 1)[0].split("-", 1)[0]
+    
+    def _evict(self, key: str) -> None:
+        """
+        按容量淘汰旧的汇编结果
+        
+        同一缓存键的文件（单文件结果或全部分卷和清单）作为一组淘汰，
+        不会只留下部分分卷或没有分卷的清单；正在生成的键（包括本次汇编）和汇编任务引用的结果不淘汰。
+        """
+        with self._inflight_lock:
+            keep = set(self._inflight) | {key}
+        keep |= self._locked_keys()
+        evict_lru(
+            self.cache_dir,
+            settings.COMPILATION_CACHE_MAX_SIZE,
+            pinned=self._pinned if self.db is not None else None,
+            keep=keep,
+            pattern="[0-9a-f]*",
+            group=self._entry_key,
+        )
+    
+    def _pinned(self) -> Set[str]:
+        """汇编任务引用的结果文件名（下载地址已返回给客户端，不淘汰）"""
+        return CompilationJobRepository(self.db).get_output_file_names(settings.COMPILATION_JOB_RESULT_RETENTION)
+    
+    def get_manifest(self, key: str) -> Optional[Dict[str, Any]]:
+        """
+        查找分卷汇编结果，所有分卷都存在时命中并刷新最近使用时间
+        
+        Returns:
+            Dict: 分卷清单，未命中时返回 None
+        """
+        path = self.manifest_path(key)
+        try:
+            manifest = json.loads(path.read_text(encoding="utf-8"))
+            for volume in manifest["volumes"]:
+                os.utime(self.cache_dir / volume["file"])
+            os.utime(path)
+        except (FileNotFoundError, ValueError, KeyError):
+            return None
+        
+        logger.info(f"PDF 分卷汇编缓存命中: {path}")
+        return manifest
+    
+    def put_manifest(self, key: str, manifest: Dict[str, Any]) -> Path:
+        """写入分卷清单（先写临时文件再替换，读取方不会读到不完整的清单）"""
+        path = self.manifest_path(key)
+        temp_path = self.temp_path(key)
+        temp_path.write_text(json.dumps(manifest, ensure_ascii=False, indent=2), encoding="utf-8")
+        os.replace(temp_path, path)
+        return path
+    
+    def _lock_path(self, key: str) -> Path:
+        return self.lock_dir / f"{key}.lock"
+    
+    def _flock(self, key: str, blocking: bool = True) -> Optional[int]:
+        """
+        对缓存键的锁文件加排他锁
+        
+        Returns:
+            int: 持有锁的文件描述符（关闭即释放）；blocking 为 False 且锁被占用时返回 None
+        """
+        path = self._lock_path(key)
+        while True:
+            fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o644)
+            try:
+                fcntl.flock(fd, fcntl.LOCK_EX | (0 if blocking else fcntl.LOCK_NB))
+            except BlockingIOError:
+                os.close(fd)
+                return None
+            except BaseException:
+                os.close(fd)
+                raise
+            # 等待期间锁文件被清理（见 _locked_keys）时重新打开
+            if os.fstat(fd).st_nlink > 0:
+                return fd
+            os.close(fd)
+    
+    def _locked_keys(self) -> Set[str]:
+        """其他进程（或本进程）正在生成的缓存键，顺带清理空闲的锁文件"""
+        if fcntl is None:
+            return set()
+        
+        locked = set()
+        for path in self.lock_dir.glob("*.lock"):
+            fd = self._flock(path.stem, blocking=False)
+            if fd is None:
+                locked.add(path.stem)
+                continue
+            try:
+                path.unlink()
+            except FileNotFoundError:
+                pass
+            finally:
+                os.close(fd)
+        return locked
+    
+    @contextmanager
+    def single_flight(self, key: str) -> Iterator[None]:
+        """同一缓存键同时只允许一个请求生成（跨进程），其余请求等待"""
+        with self._inflight_lock:
+            entry = self._inflight.setdefault(key, [threading.Lock(), 0])
+            entry[1] += 1
+        
+        try:
+            with entry[0]:
+                fd = self._flock(key) if fcntl is not None else None
+                try:
+                    yield
+                finally:
+                    if fd is not None:
+                        os.close(fd)
+        finally:
+            with self._inflight_lock:
+                entry[1] -= 1
+                if entry[1] == 0:
+                    self._inflight.pop(key, None)
@@ -0,0 +1,290 @@
+from sqlalchemy.orm import Session
+from pathlib import Path
+from typing import Tuple
+import json
+import logging
+
+from app.core.config import settings
+from app.core.exceptions import (
+    BaseAPIException,
+    CompilationAppendNotSupportedError,
+    CompilationJobNotFoundError,
+    CompilationNotReadyError,
+    CompilationPageRangeConflictError,
+    CompilationVolumeNotFoundError,
+)
+from app.models.compilation_job_model import CompilationJob
+from app.repositories.compilation_job_repository import CompilationJobRepository
+from app.schemas.pdf import (
+    CompilationAppendRequest,
+    CompilationJobResponse,
+    CompilationVolume,
+    PDFGenerateRequest,
+)
+from app.services.pdf_service import DEFAULT_OUTPUT_PROFILE, PDFService
+
+logger = logging.getLogger(__name__)
+
+
+class CompilationService:
+    """
+    PDF 汇编任务服务类
+    
+    提交汇编请求后立即返回任务ID，由工作进程在后台合并（与 PDF 转换共用工作进程），
+    客户端通过状态接口查询进度，完成后通过下载接口获取结果。
+    分卷汇编时每完成一卷即记录到任务中，客户端可以在任务完成前下载已完成的分卷。
+    """
+    
+    def __init__(self, db: Session):
+        self.db = db
+        self.repository = CompilationJobRepository(db)
+    
+    def _to_response(self, job: CompilationJob) -> CompilationJobResponse:
+        download_url = None
+        if job.status == CompilationJob.STATUS_SUCCEEDED:
+            download_url = f"/api/v1/pdf/compilations/{job.id}/download"
+        
+        volumes = [
+            CompilationVolume(
+                index=volume["index"],
+                pages=volume["pages"],
+                size=volume["size"],
+                download_url=f"/api/v1/pdf/compilations/{job.id}/volumes/{volume['index']}",
+            )
+            for volume in json.loads(job.volumes or "[]")
+        ]
+        
+        return CompilationJobResponse(
+            job_id=job.id,
+            title=job.title,
+            status=CompilationJobResponse.STATUS_NAMES[job.status],
+            total_documents=job.total_documents,
+            processed_documents=job.processed_documents,
+            processed_pages=job.processed_pages,
+            output_size=job.output_size,
+            error=job.last_error,
+            download_url=download_url,
+            volumes=volumes,
+            create_time=job.create_time,
+            update_time=job.update_time,
+        )
+    
+    def _get_job(self, job_id: int) -> CompilationJob:
+        job = self.repository.get_by_id(job_id)
+        if not job:
+            raise CompilationJobNotFoundError(job_id)
+        return job
+    
+    def submit(self, request: PDFGenerateRequest) -> CompilationJobResponse:
+        """
+        提交汇编任务
+        
+        按筛选条件提交时，文档列表在提交时确定，之后新增的文档不会加入本次汇编。
+        
+        Raises:
+            DocumentsNotFoundError: 文档不存在时抛出（提交时即校验，不必等到后台处理）
+            CompilationTooLargeError: 预估页数或大小超出上限时抛出
+        """
+        pdf_service = PDFService(self.db)
+        document_ids = pdf_service.resolve_document_ids(request.document_ids, request.selector)
+        pdf_service.check_compilation_size(document_ids, request.page_range_tuples())
+        
+        job = self.repository.create(
+            title=request.title,
+            document_ids=document_ids,
+            options={
+                "add_header": request.add_header,
+                "header_text": request.header_text,
+                "watermark_text": request.watermark_text,
+                "page_ranges": request.page_range_tuples(),
+                "max_pages_per_volume": request.max_pages_per_volume,
+                "max_bytes_per_volume": request.max_bytes_per_volume,
+                "profile": request.profile,
+            },
+        )
+        logger.info(f"提交 PDF 汇编任务: {job.id} ({job.total_documents} 个文档)")
+        return self._to_response(job)
+    
+    def append(self, job_id: int, request: CompilationAppendRequest) -> CompilationJobResponse:
+        """
+        提交追加任务：在已完成的汇编末尾追加文档，生成新的汇编任务
+        
+        新任务复制原汇编文件后增量写入追加的页面和书签，原任务的结果保持不变。
+        页眉、水印和输出配置沿用原汇编。
+        
+        Raises:
+            CompilationNotReadyError: 原任务未完成时抛出
+            CompilationAppendNotSupportedError: 原任务为分卷汇编时抛出
+            CompilationPageRangeConflictError: 追加原汇编中已有的文档但页码范围不同时抛出
+            DocumentsNotFoundError: 追加的文档不存在时抛出
+            CompilationTooLargeError: 追加后预估页数或大小超出上限时抛出
+        """
+        base_job = self._get_job(job_id)
+        if base_job.status != CompilationJob.STATUS_SUCCEEDED:
+            raise CompilationNotReadyError(job_id)
+        if Path(base_job.output_path).suffix == ".json":
+            raise CompilationAppendNotSupportedError(job_id)
+        
+        base_options = json.loads(base_job.options or "{}")
+        base_document_ids = json.loads(base_job.document_ids)
+        # 与原汇编选项合并时统一使用字符串键（与 JSON 中的键一致）
+        page_ranges = dict(base_options.get("page_ranges") or {})
+        append_ranges = {str(doc_id): list(page_range) for doc_id, page_range in (request.page_range_tuples() or {}).items()}
+        
+        # 页码范围按文档ID记录，原汇编中已有的文档在两处必须使用相同范围，
+        # 否则增量追加和原汇编被淘汰后的完整合并会得到不同结果
+        conflicts = []
+        for doc_id in sorted(set(request.document_ids) & set(base_document_ids)):
+            base_range = page_ranges.get(str(doc_id))
+            if append_ranges.get(str(doc_id)) != (list(base_range) if base_range else None):
+                conflicts.append(doc_id)
+        if conflicts:
+            raise CompilationPageRangeConflictError(conflicts)
+        page_ranges.update(append_ranges)
+        
+        # 追加后的完整汇编同样受规模上限约束
+        document_ids = base_document_ids + request.document_ids
+        PDFService(self.db).check_compilation_size(
+            document_ids,
+            {int(doc_id): tuple(page_range) for doc_id, page_range in page_ranges.items()},
+        )
+        
+        job = self.repository.create(
+            title=request.title or base_job.title,
+            document_ids=document_ids,
+            options={
+                **base_options,
+                "page_ranges": page_ranges or None,
+                "base_job_id": base_job.id,
+                "append_document_ids": request.document_ids,
+            },
+        )
+        logger.info(f"提交 PDF 汇编追加任务: {job.id} (基于任务 {base_job.id}，追加 {len(request.document_ids)} 个文档)")
+        return self._to_response(job)
+    
+    def get_job(self, job_id: int) -> CompilationJobResponse:
+        """获取汇编任务状态和进度"""
+        return self._to_response(self._get_job(job_id))
+    
+    def get_output(self, job_id: int) -> Tuple[Path, str, str]:
+        """
+        获取汇编结果文件（分卷汇编时为分卷清单）
+        
+        Returns:
+            Tuple[Path, str, str]: (文件路径, 下载文件名, 媒体类型)
+        
+        Raises:
+            CompilationNotReadyError: 任务未完成时抛出
+        """
+        job = self._get_job(job_id)
+        if job.status != CompilationJob.STATUS_SUCCEEDED:
+            raise CompilationNotReadyError(job_id)
+        
+        output_path = Path(job.output_path)
+        if not output_path.exists():
+            raise CompilationJobNotFoundError(job_id)
+        
+        if output_path.suffix == ".json":
+            return output_path, f"{job.title}.json", "application/json"
+        return output_path, f"{job.title}.pdf", "application/pdf"
+    
+    def get_volume(self, job_id: int, index: int) -> Tuple[Path, str]:
+        """
+        获取已完成的分卷文件（任务完成前即可下载）
+        
+        Returns:
+            Tuple[Path, str]: (文件路径, 下载文件名)
+        
+        Raises:
+            CompilationNotReadyError: 分卷尚未完成时抛出
+            CompilationVolumeNotFoundError: 分卷不存在或已被淘汰时抛出
+        """
+        job = self._get_job(job_id)
+        for volume in json.loads(job.volumes or "[]"):
+            if volume["index"] == index:
+                volume_path = settings.pdf_compilation_dir_path / volume["file"]
+                if not volume_path.exists():
+                    raise CompilationVolumeNotFoundError(job_id, index)
+                return volume_path, f"{job.title}_{index:03d}.pdf"
+        
+        if job.status in (CompilationJob.STATUS_PENDING, CompilationJob.STATUS_RUNNING):
+            raise CompilationNotReadyError(job_id)
+        raise CompilationVolumeNotFoundError(job_id, index)
+    
+    def run_job(self, job: CompilationJob) -> None:
+        """
+        执行已领取的汇编任务（在工作进程的线程中同步执行）
+        
+        每合并一个文件更新一次进度。任务已被重新排队或被其他工作进程领取时（locked_by 不再是本工作进程），
+        在下一次更新进度时中止，也不标记结果。
+        """
+        job_id, worker_id = job.id, job.locked_by
+        
+        def ensure_owned(owned: bool) -> None:
+            if not owned:
+                raise RuntimeError("汇编任务已不由本工作进程处理")
+        
+        def progress(processed_documents: int, processed_pages: int) -> None:
+            ensure_owned(self.repository.update_progress(job, worker_id, processed_documents, processed_pages))
+        
+        def on_volume(volume: dict) -> None:
+            ensure_owned(self.repository.add_volume(job, worker_id, volume))
+        
+        try:
+            options = json.loads(job.options or "{}")
+            # JSON 对象的键为字符串，还原为文档ID
+            page_ranges = {
+                int(doc_id): tuple(page_range)
+                for doc_id, page_range in (options.get("page_ranges") or {}).items()
+            }
+            base_job = self.repository.get_by_id(options["base_job_id"]) if options.get("base_job_id") else None
+            if base_job and base_job.output_path and Path(base_job.output_path).exists():
+                # 已处理的文档数和页数从原汇编继续计算
+                def append_progress(processed_documents: int, processed_pages: int) -> None:
+                    progress(
+                        base_job.total_documents + processed_documents,
+                        base_job.processed_pages + processed_pages,
+                    )
+                
+                output_path = PDFService(self.db).append_pdf(
+                    base_path=Path(base_job.output_path),
+                    document_ids=options["append_document_ids"],
+                    add_header=options.get("add_header", False),
+                    header_text=options.get("header_text"),
+                    progress=append_progress,
+                    page_ranges=page_ranges,
+                    profile=options.get("profile", DEFAULT_OUTPUT_PROFILE),
+                    watermark_text=options.get("watermark_text"),
+                )
+            else:
+                if options.get("base_job_id"):
+                    logger.warning(f"原汇编结果已被淘汰，重新完整合并 (job_id={job.id}, base_job_id={options['base_job_id']})")
+                output_path = PDFService(self.db).generate_pdf(
+                    document_ids=json.loads(job.document_ids),
+                    title=job.title,
+                    add_header=options.get("add_header", False),
+                    header_text=options.get("header_text"),
+                    progress=progress,
+                    page_ranges=page_ranges,
+                    max_pages_per_volume=options.get("max_pages_per_volume"),
+                    max_bytes_per_volume=options.get("max_bytes_per_volume"),
+                    on_volume=on_volume,
+                    profile=options.get("profile", DEFAULT_OUTPUT_PROFILE),
+                    watermark_text=options.get("watermark_text"),
+                )
+        except Exception as e:
+            error = str(e.detail) if isinstance(e, BaseAPIException) else str(e)
+            logger.error(f"PDF 汇编失败 (job_id={job_id}): {error}", exc_info=True)
+            self.db.rollback()
+            if not self.repository.mark_failed(job, worker_id, error):
+                logger.warning(f"汇编任务已不由本工作进程处理，不标记失败 (job_id={job_id})")
+            return
+        
+        if output_path.suffix == ".json":
+            output_size = sum(volume["size"] for volume in json.loads(job.volumes or "[]"))
+        else:
+            output_size = output_path.stat().st_size
+        if not self.repository.mark_succeeded(job, worker_id, str(output_path), output_size):
+            logger.warning(f"汇编任务已不由本工作进程处理，不标记完成 (job_id={job_id})")
+            return
+        logger.info(f"PDF 汇编完成 (job_id={job_id}, pages={job.processed_pages}, output={output_path})")
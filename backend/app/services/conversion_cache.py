@@ -0,0 +1,207 @@
+from sqlalchemy.orm import Session
+from pathlib import Path
+from typing import Any, Dict, Optional
+from uuid import uuid4
+import hashlib
+import json
+import logging
+import os
+import re
+import shutil
+import threading
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+
+from app.core.config import settings
+from app.repositories.document_repository import DocumentRepository
+from app.services.file_lru import directory_usage, evict_lru
+from app.services.storage_service import StorageService
+
+logger = logging.getLogger(__name__)
+
+_SHA256_PATTERN = re.compile(r"^[0-9a-f]{64}$")
+
+
+class ConversionCache:
+    """
+    PDF 转换结果缓存
+    
+    缓存键由 (源文件内容哈希, 目标格式, 转换器名称, 转换器版本, 转换选项) 计算得出，
+    缓存文件为 <cache_dir>/<key>.pdf。相同内容的文件再次转换时直接返回已有结果；
+    转换器升级或选项变化时键随之改变，旧结果不会被误用。
+    
+    缓存目录总大小超过 CONVERSION_CACHE_MAX_SIZE 时按最近使用时间（文件 mtime，命中时刷新）
+    淘汰最久未使用的文件，仍被文档引用（documents.pdf_save_path）的文件不会被淘汰。
+    
+    命中/未命中次数记录在缓存目录的统计文件中（文件锁保护），
+    API 进程、各 uvicorn worker 和独立的转换工作进程读写同一份计数。
+    """
+    
+    STAGING_DIR_NAME = ".staging"
+    STATS_FILE_NAME = ".stats.json"
+    
+    # 同一进程内的线程互斥（没有 fcntl 的平台上只能保证进程内计数准确）
+    _stats_lock = threading.Lock()
+    
+    def __init__(self, db: Session, cache_dir: Optional[Path] = None):
+        self.db = db
+        self.cache_dir = cache_dir or settings.pdf_output_dir_path
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+    
+    @staticmethod
+    def make_key(
+        source_hash: str,
+        target: str,
+        converter: str,
+        version: str,
+        options: Optional[Dict[str, Any]] = None,
+    ) -> str:
+        """计算缓存键"""
+        payload = json.dumps(
+            {
+                "source": source_hash,
+                "target": target,
+                "converter": converter,
+                "version": version,
+                "options": options or {},
+            },
+            sort_keys=True,
+            ensure_ascii=False,
+        )
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+    
+    @staticmethod
+    def source_hash(file_path: Path) -> str:
+        """
+        获取源文件内容的 SHA-256
+        
+        内容寻址存储中的文件名即为内容哈希，无需重新读取文件。
+        """
+        blob_dir = StorageService().blob_dir.resolve()
+        if _SHA256_PATTERN.match(file_path.stem) and blob_dir in file_path.resolve().parents:
+            return file_path.stem
+        
+        hasher = hashlib.sha256()
+        with open(file_path, "rb") as f:
+            while True:
+                chunk = f.read(settings.UPLOAD_CHUNK_SIZE)
+                if not chunk:
+                    break
+                hasher.update(chunk)
+        return hasher.hexdigest()
+    
+    def entry_path(self, key: str) -> Path:
+        """缓存文件路径"""
+        return self.cache_dir / f"{key}.pdf"
+    
+    @staticmethod
+    def _read_stats(f) -> Dict[str, int]:
+        f.seek(0)
+        try:
+            data = json.load(f)
+        except ValueError:
+            data = {}
+        return {name: int(data.get(name, 0)) for name in ("hits", "misses")}
+    
+    def _count(self, name: str) -> None:
+        """在统计文件中累加计数（读-改-写在排他锁内完成）"""
+        path = self.cache_dir / self.STATS_FILE_NAME
+        try:
+            with self._stats_lock, os.fdopen(os.open(path, os.O_RDWR | os.O_CREAT, 0o644), "r+") as f:
+                if fcntl is not None:
+                    fcntl.flock(f.fileno(), fcntl.LOCK_EX)
+                stats = self._read_stats(f)
+                stats[name] += 1
+                f.seek(0)
+                f.truncate()
+                json.dump(stats, f)
+        except OSError as e:
+            # 统计失败不影响转换
+            logger.warning(f"更新 PDF 转换缓存统计失败: {str(e)}")
+    
+    def _load_stats(self) -> Dict[str, int]:
+        path = self.cache_dir / self.STATS_FILE_NAME
+        try:
+            with open(path, "r") as f:
+                if fcntl is not None:
+                    fcntl.flock(f.fileno(), fcntl.LOCK_SH)
+                return self._read_stats(f)
+        except FileNotFoundError:
+            return {"hits": 0, "misses": 0}
+    
+    def get(self, key: str) -> Optional[Path]:
+        """
+        查找缓存结果
+        
+        Returns:
+            Path: 命中时返回缓存的 PDF 路径，否则返回 None
+        """
+        path = self.entry_path(key)
+        try:
+            # 刷新 mtime 作为最近使用时间
+            os.utime(path)
+        except FileNotFoundError:
+            self._count("misses")
+            return None
+        
+        self._count("hits")
+        logger.info(f"PDF 转换缓存命中: {path}")
+        return path
+    
+    def new_staging_dir(self) -> Path:
+        """创建一次转换专用的临时输出目录，避免并发转换的输出文件互相覆盖"""
+        path = self.cache_dir / self.STAGING_DIR_NAME / uuid4().hex
+        path.mkdir(parents=True, exist_ok=True)
+        return path
+    
+    def put(self, key: str, pdf_path: Path) -> Path:
+        """
+        将转换结果放入缓存（移动文件），然后按容量淘汰旧文件
+        
+        Returns:
+            Path: 缓存中的 PDF 路径
+        """
+        path = self.entry_path(key)
+        os.replace(pdf_path, path)
+        self.evict(keep={path.name})
+        return path
+    
+    def discard_staging_dir(self, staging_dir: Path) -> None:
+        """删除临时输出目录"""
+        shutil.rmtree(staging_dir, ignore_errors=True)
+    
+    def evict(self, keep: Optional[set] = None) -> int:
+        """
+        按 LRU 淘汰缓存文件，直到总大小不超过 CONVERSION_CACHE_MAX_SIZE
+        
+        Args:
+            keep: 不参与淘汰的文件名（如刚写入的结果）
+        
+        Returns:
+            int: 删除的文件数
+        """
+        return evict_lru(
+            self.cache_dir,
+            settings.CONVERSION_CACHE_MAX_SIZE,
+            pinned=lambda: {
+                Path(p).name for p in DocumentRepository(self.db).get_pdf_save_paths()
+            },
+            keep=keep or (),
+        )
+    
+    def stats(self) -> Dict[str, int]:
+        """缓存统计信息"""
+        entries, size = directory_usage(self.cache_dir)
+        
+        counts = self._load_stats()
+        
+        return {
+            "hits": counts["hits"],
+            "misses": counts["misses"],
+            "entries": entries,
+            "size": size,
+            "max_size": settings.CONVERSION_CACHE_MAX_SIZE,
+        }
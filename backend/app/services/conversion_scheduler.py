@@ -0,0 +1,141 @@
+from sqlalchemy.orm import Session
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, Optional
+import asyncio
+import logging
+import math
+import threading
+
+from app.core.config import settings
+from app.core.exceptions import ServiceBusyError
+from app.repositories.conversion_job_repository import ConversionJobRepository
+
+logger = logging.getLogger(__name__)
+
+# 转换器类型（开销类别）
+CONVERTER_TEXT = "text"
+CONVERTER_IMAGE = "image"
+CONVERTER_OFFICE = "office"
+
+
+@dataclass
+class ConverterClassConfig:
+    """单类转换器的调度配置"""
+    
+    concurrency: int  # 最大并发数
+    max_queue_depth: int  # 排队任务上限
+    time_budget: int  # 单个任务的时间预算（秒）
+
+
+class ConversionScheduler:
+    """
+    PDF 转换调度器
+    
+    按转换器类型（文本类 / 图片 / Office 文档）分别限制并发：每类使用独立的线程池，
+    大量 Office 文档排队时不会占满图片转换的执行槽位。每个任务有时间预算，超时视为失败：
+    预算在执行转换的地方生效（PDF 处理进程中的任务超时后中止或结束工作进程，LibreOffice 超时后结束 soffice 进程），
+    线程池的执行槽位随转换一起释放。
+    
+    排队深度以 conversion_jobs 表为准（多个工作进程共享），超过上限时拒绝新的上传（503 + Retry-After）。
+    任务优先级按估算开销（文件大小 × 格式权重）计算，开销小的任务先处理。
+    """
+    
+    # 各格式相对于同等大小图片的转换开销权重
+    FORMAT_COST_WEIGHTS = {
+        ".doc": 2, ".docx": 2, ".odt": 2, ".rtf": 2,
+        ".xls": 3, ".xlsx": 3, ".ods": 3,
+        ".ppt": 4, ".pptx": 4, ".odp": 4,
+    }
+    
+    def __init__(self):
+        self.classes: Dict[str, ConverterClassConfig] = {
+            CONVERTER_TEXT: ConverterClassConfig(
+                concurrency=settings.CONVERSION_TEXT_CONCURRENCY,
+                max_queue_depth=settings.CONVERSION_TEXT_MAX_QUEUE,
+                time_budget=settings.CONVERSION_TEXT_TIME_BUDGET,
+            ),
+            CONVERTER_IMAGE: ConverterClassConfig(
+                concurrency=settings.CONVERSION_IMAGE_CONCURRENCY,
+                max_queue_depth=settings.CONVERSION_IMAGE_MAX_QUEUE,
+                time_budget=settings.CONVERSION_IMAGE_TIME_BUDGET,
+            ),
+            CONVERTER_OFFICE: ConverterClassConfig(
+                concurrency=settings.CONVERSION_OFFICE_CONCURRENCY,
+                max_queue_depth=settings.CONVERSION_OFFICE_MAX_QUEUE,
+                time_budget=settings.LIBREOFFICE_TIMEOUT,
+            ),
+        }
+        self._executors: Dict[str, ThreadPoolExecutor] = {
+            name: ThreadPoolExecutor(
+                max_workers=config.concurrency,
+                thread_name_prefix=f"convert-{name}",
+            )
+            for name, config in self.classes.items()
+        }
+    
+    @classmethod
+    def estimate_priority(cls, file_ext: str, file_size: int) -> int:
+        """
+        按估算转换开销计算任务优先级（数值越小越先处理）
+        
+        取开销（KB）的对数分级，同一级别内按提交顺序处理，避免开销相近的任务互相饿死。
+        """
+        cost = file_size * cls.FORMAT_COST_WEIGHTS.get(file_ext.lower(), 1)
+        return int(math.log2(max(cost / 1024, 1)))
+    
+    def ensure_capacity(self, db: Session, converter_class: Optional[str]) -> None:
+        """
+        准入控制：某类转换任务排队数达到上限时拒绝新的上传
+        
+        Raises:
+            ServiceBusyError: 队列已满时抛出（503，带 Retry-After）
+        """
+        if converter_class is None:
+            return
+        
+        depth = ConversionJobRepository(db).count_pending(converter_class)
+        if depth >= self.classes[converter_class].max_queue_depth:
+            logger.warning(f"{converter_class} 转换队列已满 (depth={depth})，拒绝上传")
+            raise ServiceBusyError(settings.CONVERSION_BUSY_RETRY_AFTER)
+    
+    def time_budget(self, converter_class: str) -> int:
+        """单个任务的时间预算（秒），由转换函数在执行转换的进程中执行"""
+        return self.classes[converter_class].time_budget
+    
+    async def run(self, converter_class: str, func: Callable[..., Any], *args: Any) -> Any:
+        """
+        在对应类型的线程池中执行转换函数
+        
+        这里不再单独计时：asyncio 超时只能停止等待，无法中止线程中的转换，执行槽位仍被占用。
+        转换函数需要按 time_budget 自行限制执行时间。
+        """
+        loop = asyncio.get_event_loop()
+        return await loop.run_in_executor(self._executors[converter_class], func, *args)
+    
+    def shutdown(self) -> None:
+        """关闭线程池（不等待正在执行的任务）"""
+        for executor in self._executors.values():
+            executor.shutdown(wait=False)
+
+
+_scheduler: Optional[ConversionScheduler] = None
+_scheduler_lock = threading.Lock()
+
+
+def get_conversion_scheduler() -> ConversionScheduler:
+    """获取全局转换调度器（首次调用时创建）"""
+    global _scheduler
+    with _scheduler_lock:
+        if _scheduler is None:
+            _scheduler = ConversionScheduler()
+        return _scheduler
+
+
+def shutdown_conversion_scheduler() -> None:
+    """关闭全局转换调度器"""
+    global _scheduler
+    with _scheduler_lock:
+        if _scheduler is not None:
+            _scheduler.shutdown()
+            _scheduler = None
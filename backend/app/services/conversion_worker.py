@@ -0,0 +1,253 @@
+from sqlalchemy.orm import Session
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Callable, Dict, Optional, Set
+import asyncio
+import logging
+import os
+import socket
+
+from app.core.config import settings
+from app.core.database import SessionLocal
+from app.repositories.compilation_job_repository import CompilationJobRepository
+from app.repositories.conversion_job_repository import ConversionJobRepository
+from app.repositories.document_repository import DocumentRepository
+from app.services.conversion_scheduler import get_conversion_scheduler
+
+logger = logging.getLogger(__name__)
+
+# 汇编任务与转换任务共用工作进程，使用单独的并发上限
+COMPILATION = "compilation"
+
+
+class ConversionWorker:
+    """
+    PDF 转换 / 汇编工作进程
+    
+    从 conversion_jobs 表按转换器类型分别领取任务（各类型有独立的并发上限，
+    优先领取估算开销小的任务）并转换，任务状态持久化在数据库中，
+    进程重启后未完成的任务会被重新领取。可以在 API 进程内运行
+    （CONVERSION_WORKER_EMBEDDED），也可以通过 python -m app.worker 在独立进程
+    或其他节点上运行（需共享数据库和文件存储）。
+    
+    同一工作进程还处理 compilation_jobs 表中的 PDF 汇编任务（并发上限 COMPILATION_WORKER_CONCURRENCY），
+    汇编在独立的线程池中执行，不占用 Web 请求线程。
+    """
+    
+    def __init__(
+        self,
+        concurrency: Optional[Dict[str, int]] = None,
+        worker_id: Optional[str] = None,
+        session_factory: Callable[[], Session] = SessionLocal,
+    ):
+        # 每类转换器的并发上限，默认与调度器线程池大小一致
+        scheduler = get_conversion_scheduler()
+        self.concurrency = {
+            name: config.concurrency for name, config in scheduler.classes.items()
+        }
+        self.concurrency[COMPILATION] = settings.COMPILATION_WORKER_CONCURRENCY
+        self.concurrency.update(concurrency or {})
+        self.worker_id = worker_id or f"{socket.gethostname()}:{os.getpid()}"
+        self.session_factory = session_factory
+        self._running: Dict[str, Set[asyncio.Task]] = {name: set() for name in self.concurrency}
+        self._stopping = asyncio.Event()
+        self._compile_executor: Optional[ThreadPoolExecutor] = None
+    
+    def stop(self) -> None:
+        """请求停止（正在处理的任务会继续完成）"""
+        self._stopping.set()
+    
+    @property
+    def running_tasks(self) -> Set[asyncio.Task]:
+        """正在处理的所有任务"""
+        return set().union(*self._running.values())
+    
+    def _claim(self, lane: str) -> Optional[int]:
+        """领取一个指定类型的任务（转换器类型或汇编），返回任务ID"""
+        db = self.session_factory()
+        try:
+            if lane == COMPILATION:
+                job = CompilationJobRepository(db).claim_next(self.worker_id)
+            else:
+                job = ConversionJobRepository(db).claim_next(self.worker_id, lane)
+            return job.id if job else None
+        finally:
+            db.close()
+    
+    def _requeue_stale(self) -> None:
+        """回收超时任务"""
+        db = self.session_factory()
+        try:
+            count = ConversionJobRepository(db).requeue_stale()
+            if count:
+                logger.warning(f"重新排队 {count} 个超时的转换任务")
+            count = CompilationJobRepository(db).requeue_stale()
+            if count:
+                logger.warning(f"重新排队 {count} 个超时的汇编任务")
+        finally:
+            db.close()
+    
+    def _fill(self) -> int:
+        """按类型领取任务直到各自达到并发上限，返回新启动的任务数"""
+        started = 0
+        for lane, limit in self.concurrency.items():
+            running = self._running[lane]
+            while len(running) < limit:
+                job_id = self._claim(lane)
+                if job_id is None:
+                    break
+                if lane == COMPILATION:
+                    task = asyncio.create_task(self._process_compilation(job_id))
+                else:
+                    task = asyncio.create_task(self._process(job_id))
+                running.add(task)
+                task.add_done_callback(running.discard)
+                started += 1
+        return started
+    
+    async def run(self) -> None:
+        """持续运行，直到调用 stop()"""
+        logger.info(f"PDF 转换工作进程启动: {self.worker_id} (concurrency={self.concurrency})")
+        
+        while not self._stopping.is_set():
+            try:
+                self._requeue_stale()
+                self._fill()
+            except Exception as e:
+                logger.error(f"领取转换任务失败: {str(e)}", exc_info=True)
+            
+            # 有任务完成或到达轮询间隔时继续领取
+            running = self.running_tasks
+            waiters = set(running)
+            waiters.add(asyncio.create_task(self._stopping.wait()))
+            _, pending = await asyncio.wait(
+                waiters,
+                timeout=settings.CONVERSION_WORKER_POLL_INTERVAL,
+                return_when=asyncio.FIRST_COMPLETED,
+            )
+            for waiter in pending - running:
+                waiter.cancel()
+        
+        running = self.running_tasks
+        if running:
+            await asyncio.gather(*running, return_exceptions=True)
+        self._shutdown_compile_executor()
+        logger.info(f"PDF 转换工作进程退出: {self.worker_id}")
+    
+    async def run_once(self) -> None:
+        """处理完当前所有可执行的任务后返回"""
+        self._requeue_stale()
+        while self._fill() or self.running_tasks:
+            await asyncio.wait(self.running_tasks, return_when=asyncio.FIRST_COMPLETED)
+        self._shutdown_compile_executor()
+    
+    async def _process(self, job_id: int) -> None:
+        """
+        处理单个转换任务
+        
+        每个任务使用独立的数据库会话，与请求的生命周期无关。
+        """
+        # 导入 PDFService（避免循环导入）
+        from app.services.pdf_service import PDFService
+        
+        db = self.session_factory()
+        repository = ConversionJobRepository(db)
+        job = repository.get_by_id(job_id)
+        if job is None:
+            # 领取后任务记录已被删除
+            logger.warning(f"转换任务不存在，跳过 (job_id={job_id})")
+            db.close()
+            return
+        
+        heartbeat = asyncio.create_task(
+            self._heartbeat(job_id, ConversionJobRepository, settings.CONVERSION_JOB_HEARTBEAT_INTERVAL)
+        )
+        try:
+            source_path = Path(job.source_path)
+            logger.info(
+                f"开始转换 PDF (job_id={job.id}, document_id={job.document_id}, "
+                f"attempt={job.attempts}, file={source_path})"
+            )
+            
+            pdf_path = await PDFService(db).convert_to_pdf(source_path)
+            
+            if pdf_path and pdf_path.exists():
+                # 引用同一文件的所有文档共享转换结果
+                pdf_file_size = pdf_path.stat().st_size
+                count = DocumentRepository(db).update_pdf_info_by_save_path(
+                    save_path=job.source_path,
+                    pdf_file_size=pdf_file_size,
+                    pdf_save_path=str(pdf_path),
+                    page_count=PDFService.count_pages(pdf_path),
+                )
+                repository.mark_succeeded(job)
+                logger.info(
+                    f"PDF 转换成功 (job_id={job.id}, documents={count}, "
+                    f"pdf_size={pdf_file_size}, pdf_path={pdf_path})"
+                )
+            else:
+                repository.mark_failed(job, "未生成 PDF 文件")
+                logger.warning(f"PDF 转换失败，未生成 PDF 文件 (job_id={job.id})")
+        except Exception as e:
+            logger.error(f"PDF 转换失败 (job_id={job_id}): {str(e)}", exc_info=True)
+            db.rollback()
+            repository.mark_failed(job, str(e))
+        finally:
+            heartbeat.cancel()
+            db.close()
+    
+    async def _heartbeat(self, job_id: int, repository_class: type, interval: int) -> None:
+        """
+        任务处理期间定期刷新心跳，耗时超过锁超时时间（CONVERSION_JOB_LOCK_TIMEOUT / COMPILATION_JOB_LOCK_TIMEOUT）
+        的任务不会被重新排队
+        
+        Args:
+            repository_class: ConversionJobRepository 或 CompilationJobRepository
+        """
+        while True:
+            await asyncio.sleep(interval)
+            db = self.session_factory()
+            try:
+                if not repository_class(db).heartbeat(job_id, self.worker_id):
+                    logger.warning(f"任务已不由本工作进程处理 (job_id={job_id}, {repository_class.__name__})")
+                    return
+            except Exception as e:
+                logger.error(f"刷新任务心跳失败 (job_id={job_id}, {repository_class.__name__}): {str(e)}")
+            finally:
+                db.close()
+    
+    def _shutdown_compile_executor(self) -> None:
+        if self._compile_executor is not None:
+            self._compile_executor.shutdown(wait=True)
+            self._compile_executor = None
+    
+    async def _process_compilation(self, job_id: int) -> None:
+        """处理单个汇编任务（合并是同步的 CPU/IO 密集操作，在汇编线程池中执行）"""
+        if self._compile_executor is None:
+            self._compile_executor = ThreadPoolExecutor(
+                max_workers=self.concurrency[COMPILATION],
+                thread_name_prefix="compile",
+            )
+        
+        heartbeat = asyncio.create_task(
+            self._heartbeat(job_id, CompilationJobRepository, settings.COMPILATION_JOB_HEARTBEAT_INTERVAL)
+        )
+        try:
+            loop = asyncio.get_event_loop()
+            await loop.run_in_executor(self._compile_executor, self._compile_sync, job_id)
+        finally:
+            heartbeat.cancel()
+    
+    def _compile_sync(self, job_id: int) -> None:
+        # 导入 CompilationService（避免循环导入）
+        from app.services.compilation_service import CompilationService
+        
+        # 会话在执行线程中创建和使用
+        db = self.session_factory()
+        try:
+            job = CompilationJobRepository(db).get_by_id(job_id)
+            CompilationService(db).run_job(job)
+        except Exception as e:
+            logger.error(f"PDF 汇编任务异常 (job_id={job_id}): {str(e)}", exc_info=True)
+        finally:
+            db.close()
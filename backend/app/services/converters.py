@@ -0,0 +1,816 @@
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Any, ClassVar, Dict, FrozenSet, Iterable, Iterator, List, Optional, Tuple
+import csv
+import html
+import importlib.util
+import io
+import logging
+import math
+import os
+import shutil
+import struct
+import threading
+
+import fitz  # PyMuPDF
+import PIL
+from PIL import Image, TiffImagePlugin
+
+from app.core.config import settings
+from app.services.conversion_scheduler import CONVERTER_IMAGE, CONVERTER_OFFICE, CONVERTER_TEXT
+from app.services.libreoffice_pool import get_libreoffice_mode, get_libreoffice_pool, get_libreoffice_version
+from app.services.process_pool import in_worker_process
+
+logger = logging.getLogger(__name__)
+
+# fontTools 可用时只嵌入用到的字形（排版中文时 MuPDF 回退到内置的中文字体，完整嵌入约 3.5MB）
+_CAN_SUBSET_FONTS = importlib.util.find_spec("fontTools") is not None
+
+
+class Converter:
+    """
+    PDF 转换器基类
+    
+    每个转换器声明处理的文件格式（扩展名）、开销类别（决定转换任务进入哪个调度队列）和名称，
+    版本由 probe() 在启动时检测一次，与名称一起作为转换结果缓存键的一部分。
+    convert() 在对应开销类别的转换线程池中同步执行；cpu_bound 的转换器再交给 PDF 处理进程池执行，
+    convert() 只接收和返回文件路径。
+    """
+    
+    name: ClassVar[str] = ""
+    converter_class: ClassVar[str] = CONVERTER_TEXT
+    extensions: ClassVar[FrozenSet[str]] = frozenset()
+    cpu_bound: ClassVar[bool] = True  # 是否在 PDF 处理进程池中执行（调用外部进程的转换器为 False）
+    
+    def probe(self) -> Optional[str]:
+        """
+        检测转换器是否可用
+        
+        Returns:
+            Optional[str]: 转换器版本，不可用时返回 None
+        """
+        raise NotImplementedError
+    
+    def convert(self, source_path: Path, staging_dir: Path) -> Optional[Path]:
+        """
+        将文件转换为 PDF，输出到临时目录
+        
+        Returns:
+            Optional[Path]: 生成的 PDF 文件路径，失败返回 None
+        """
+        raise NotImplementedError
+
+
+class _StoryConverter(Converter):
+    """使用 PyMuPDF Story（HTML 排版）在进程内生成 PDF 的轻量转换器"""
+    
+    # 排版规则变化时递增，使旧的转换结果缓存失效
+    layout_version: ClassVar[str] = "1"
+    
+    PAGE_SIZE = "a4"
+    PAGE_MARGIN = 54  # 页边距（pt）
+    BASE_CSS = (
+        "body { font-size: 11pt; line-height: 1.4; } "
+        "pre, code { font-family: monospace; font-size: 9pt; } "
+        "pre { white-space: pre-wrap; } "
+        "table { border-collapse: collapse; } "
+        "th, td { border: 0.5pt solid #888; padding: 2pt 4pt; font-size: 9pt; } "
+        "th { background-color: #eee; }"
+    )
+    
+    def probe(self) -> Optional[str]:
+        return f"{self.layout_version}/pymupdf-{fitz.VersionBind}"
+    
+    def convert(self, source_path: Path, staging_dir: Path) -> Optional[Path]:
+        output_path = staging_dir / f"{source_path.stem}.pdf"
+        self.render_html(self.to_html(source_path), output_path, landscape=self.is_landscape(source_path))
+        logger.info(f"{self.name} 转 PDF 成功: {source_path} -> {output_path}")
+        return output_path
+    
+    def to_html(self, source_path: Path) -> str:
+        """将源文件转换为 HTML"""
+        raise NotImplementedError
+    
+    def is_landscape(self, source_path: Path) -> bool:
+        return False
+    
+    def render_html(self, content: str, output_path: Path, landscape: bool = False) -> None:
+        """排版 HTML 并写入 PDF（自动分页）"""
+        mediabox = fitz.paper_rect(f"{self.PAGE_SIZE}-l" if landscape else self.PAGE_SIZE)
+        where = mediabox + (self.PAGE_MARGIN, self.PAGE_MARGIN, -self.PAGE_MARGIN, -self.PAGE_MARGIN)
+        story = fitz.Story(html=content, user_css=self.BASE_CSS)
+        
+        buffer = io.BytesIO()
+        writer = fitz.DocumentWriter(buffer)
+        more = True
+        while more:
+            device = writer.begin_page(mediabox)
+            more, _ = story.place(where)
+            story.draw(device)
+            writer.end_page()
+        writer.close()
+        
+        with fitz.open("pdf", buffer.getvalue()) as doc:
+            if _CAN_SUBSET_FONTS:
+                doc.subset_fonts()
+            doc.save(str(output_path), garbage=3, deflate=True)
+    
+    @staticmethod
+    def read_text(source_path: Path) -> str:
+        """读取文本文件（依次尝试 UTF-8、GB18030，都失败时按 UTF-8 替换无法解码的字符）"""
+        data = source_path.read_bytes()
+        for encoding in ("utf-8-sig", "gb18030"):
+            try:
+                return data.decode(encoding)
+            except UnicodeDecodeError:
+                continue
+        return data.decode("utf-8", errors="replace")
+
+
+class TextConverter(_StoryConverter):
+    """纯文本转 PDF（保留换行和缩进，长行自动折行）"""
+    
+    name = "pymupdf-text"
+    extensions = frozenset({".txt", ".text", ".log", ".md", ".markdown"})
+    
+    def to_html(self, source_path: Path) -> str:
+        return f"<pre>{html.escape(self.read_text(source_path))}</pre>"
+
+
+class MarkdownConverter(_StoryConverter):
+    """Markdown 转 PDF（需要安装 markdown，未安装时由 TextConverter 按纯文本处理）"""
+    
+    name = "pymupdf-markdown"
+    extensions = frozenset({".md", ".markdown"})
+    
+    def probe(self) -> Optional[str]:
+        if importlib.util.find_spec("markdown") is None:
+            return None
+        import markdown
+        return f"{super().probe()}/markdown-{markdown.__version__}"
+    
+    def to_html(self, source_path: Path) -> str:
+        import markdown
+        return markdown.markdown(self.read_text(source_path), extensions=["tables", "fenced_code"])
+
+
+class HTMLConverter(_StoryConverter):
+    """HTML 转 PDF（不加载外部资源和脚本）"""
+    
+    name = "pymupdf-html"
+    extensions = frozenset({".html", ".htm"})
+    
+    def to_html(self, source_path: Path) -> str:
+        return self.read_text(source_path)
+
+
+class CSVConverter(_StoryConverter):
+    """CSV 转 PDF（首行作为表头；列数较多时使用横向页面）"""
+    
+    name = "pymupdf-csv"
+    extensions = frozenset({".csv", ".tsv"})
+    
+    LANDSCAPE_MIN_COLUMNS = 8
+    
+    def _rows(self, source_path: Path) -> List[List[str]]:
+        text = self.read_text(source_path)
+        if source_path.suffix.lower() == ".tsv":
+            dialect = csv.excel_tab
+        else:
+            try:
+                dialect = csv.Sniffer().sniff(text[:8192], delimiters=",;\t|")
+            except csv.Error:
+                dialect = csv.excel
+        return list(csv.reader(io.StringIO(text), dialect))
+    
+    def is_landscape(self, source_path: Path) -> bool:
+        rows = self._rows(source_path)
+        return max((len(row) for row in rows), default=0) >= self.LANDSCAPE_MIN_COLUMNS
+    
+    def to_html(self, source_path: Path) -> str:
+        rows = self._rows(source_path)
+        if not rows:
+            return "<p></p>"
+        
+        def cells(row: List[str], tag: str) -> str:
+            return "".join(f"<{tag}>{html.escape(value)}</{tag}>" for value in row)
+        
+        body = "".join(f"<tr>{cells(row, 'td')}</tr>" for row in rows[1:])
+        return f"<table><tr>{cells(rows[0], 'th')}</tr>{body}</table>"
+
+
+class ImageConverter(Converter):
+    """
+    图片转 PDF（PyMuPDF + Pillow，每帧一页，页面尺寸等于图片尺寸）
+    
+    - 多页 TIFF、动画 GIF 的每一帧生成一页
+    - JPEG（灰度 / RGB）原样嵌入压缩数据（DCTDecode），不解码也不重新编码
+    - 不透明、非隔行的 PNG 原样嵌入压缩数据（FlateDecode + PNG 预测器），不解码
+    - 其余图片每帧只由 Pillow 解码一次，像素直接交给 PyMuPDF，不再让 PyMuPDF 重新读取文件；
+      recompress_lossless 为真时（IMAGE_PDF_RECOMPRESS_LOSSLESS）重新编码为 PNG 预测器压缩的数据
+      （黑白图按 1 位、调色板图按索引色存储），否则按原始像素嵌入、保存时 Deflate 压缩
+    - 全部不透明的 alpha 通道直接去掉，带透明度的图片保留透明蒙版
+    
+    解码前逐帧检查像素数，超过 IMAGE_PDF_MAX_PIXELS 的图片视为解压炸弹直接拒绝。
+    超过 IMAGE_PDF_LARGE_PIXELS 的大图片（工程图纸、A0 扫描件）限制解码内存，见 _insert_large_frame。
+    """
+    
+    name = "pymupdf"
+    converter_class = CONVERTER_IMAGE
+    extensions = frozenset({'.jpg', '.jpeg', '.png', '.gif', '.bmp', '.tiff', '.tif', '.webp'})
+    
+    # 转换规则变化时递增，使旧的转换结果缓存失效
+    layout_version: ClassVar[str] = "2"
+    
+    # 可以原样嵌入的 PNG 颜色类型：0-灰度，2-RGB，3-调色板
+    PNG_COLOR_CHANNELS = {0: 1, 2: 3, 3: 1}
+    
+    # 可以逐条带解码的 TIFF 压缩方式 -> PDF 过滤器（1-不压缩，4-CCITT G4，5-LZW，8 / 32946-Deflate）
+    TIFF_STRIP_FILTERS = {1: None, 4: "CCITTFaxDecode", 5: "LZWDecode", 8: "FlateDecode", 32946: "FlateDecode"}
+    
+    # 大图片分块转换时每个条带组解码后的最大字节数
+    BAND_BYTES = 16 * 1024 * 1024
+    
+    def __init__(self, recompress_lossless: Optional[bool] = None):
+        if recompress_lossless is None:
+            recompress_lossless = settings.IMAGE_PDF_RECOMPRESS_LOSSLESS
+        self.recompress_lossless = recompress_lossless
+        # 转换在 PDF 处理进程中执行，配置随实例一起传入
+        self.max_pixels = settings.IMAGE_PDF_MAX_PIXELS
+        self.large_pixels = settings.IMAGE_PDF_LARGE_PIXELS
+        self.max_decode_bytes = settings.IMAGE_PDF_MAX_DECODE_BYTES
+        self.max_dpi = settings.IMAGE_PDF_MAX_DPI
+    
+    def probe(self) -> Optional[str]:
+        return f"{self.layout_version}/pymupdf-{fitz.VersionBind}/pillow-{PIL.__version__}"
+    
+    @contextmanager
+    def _pixel_limit(self) -> Iterator[None]:
+        """
+        转换期间 Pillow 的解压炸弹检查（打开图片、GIF 切换帧时检查，超过 2 倍上限抛出异常）使用 IMAGE_PDF_MAX_PIXELS
+        
+        Pillow 的上限是进程级全局变量，只在 PDF 处理工作进程中（同一时间只执行一个任务）临时修改，结束后恢复；
+        在线程中直接执行时不修改，沿用 Pillow 当前的上限，IMAGE_PDF_MAX_PIXELS 由 convert 逐帧检查。
+        Pillow 拒绝的图片统一转换为 ValueError。
+        """
+        try:
+            if not self.max_pixels or not in_worker_process():
+                yield
+                return
+            
+            default_limit = Image.MAX_IMAGE_PIXELS
+            Image.MAX_IMAGE_PIXELS = self.max_pixels
+            try:
+                yield
+            finally:
+                Image.MAX_IMAGE_PIXELS = default_limit
+        except Image.DecompressionBombError as e:
+            raise ValueError(f"{str(e)}，可能是解压炸弹")
+    
+    def convert(self, source_path: Path, staging_dir: Path) -> Optional[Path]:
+        output_path = staging_dir / f"{source_path.stem}.pdf"
+        try:
+            doc = fitz.open()
+            try:
+                with self._pixel_limit(), Image.open(source_path) as image:
+                    frames = getattr(image, "n_frames", 1)
+                    for index in range(frames):
+                        image.seek(index)
+                        pixels = image.width * image.height
+                        if self.max_pixels and pixels > self.max_pixels:
+                            raise ValueError(
+                                f"图片第 {index + 1} 帧像素数 {pixels} 超过上限 {self.max_pixels}，可能是解压炸弹"
+                            )
+                        
+                        page = doc.new_page(width=image.width, height=image.height)
+                        if self.large_pixels and pixels > self.large_pixels:
+                            self._insert_large_frame(doc, page, image, source_path, frames == 1)
+                        else:
+                            self._insert_frame(doc, page, image, source_path if frames == 1 else None)
+                
+                # 只压缩以原始像素嵌入的图片，原样嵌入的压缩数据保持不变
+                doc.save(str(output_path), deflate=True)
+            finally:
+                doc.close()
+            
+            logger.info(f"图片转 PDF 成功: {source_path} -> {output_path} ({frames} 页)")
+            return output_path
+        except Exception as e:
+            logger.error(f"图片转 PDF 失败: {str(e)}", exc_info=True)
+            raise
+    
+    def _insert_frame(
+        self,
+        doc: fitz.Document,
+        page: fitz.Page,
+        image: Image.Image,
+        source_path: Optional[Path],
+    ) -> None:
+        """
+        将当前帧插入页面
+        
+        Args:
+            source_path: 单帧图片的源文件路径（可以原样嵌入压缩数据时使用），多帧图片为 None
+        """
+        if source_path is not None and self._insert_passthrough(doc, page, image, source_path):
+            return
+        self._insert_pixels(doc, page, page.rect, image)
+    
+    def _insert_passthrough(
+        self,
+        doc: fitz.Document,
+        page: fitz.Page,
+        image: Image.Image,
+        source_path: Path,
+    ) -> bool:
+        """原样嵌入 JPEG / PNG 的压缩数据（不解码），不能原样嵌入时返回 False"""
+        if image.format == "JPEG" and image.mode in ("L", "RGB"):
+            page.insert_image(page.rect, stream=source_path.read_bytes())
+            return True
+        
+        if image.format == "PNG":
+            png = self._parse_png(source_path.read_bytes())
+            if png is not None:
+                page.insert_image(page.rect, xref=self._add_png_image(doc, png))
+                return True
+        return False
+    
+    def _insert_pixels(
+        self,
+        doc: fitz.Document,
+        page: fitz.Page,
+        rect: fitz.Rect,
+        image: Image.Image,
+    ) -> None:
+        """将解码后的像素插入页面的指定区域"""
+        frame = self._normalize_mode(image)
+        if self.recompress_lossless and frame.mode in ("1", "L", "P", "RGB"):
+            buffer = io.BytesIO()
+            frame.save(buffer, format="PNG")
+            png = self._parse_png(buffer.getvalue())
+            if png is not None:
+                page.insert_image(rect, xref=self._add_png_image(doc, png))
+                return
+            frame = frame.convert("RGB") if frame.mode == "P" else frame
+        
+        if frame.mode in ("1", "P"):
+            frame = frame.convert("L" if frame.mode == "1" else "RGB")
+        colorspace = {
+            "L": fitz.csGRAY, "LA": fitz.csGRAY, "RGB": fitz.csRGB, "RGBA": fitz.csRGB, "CMYK": fitz.csCMYK,
+        }[frame.mode]
+        alpha = frame.mode in ("LA", "RGBA")
+        if alpha:
+            # PyMuPDF 的像素数据按预乘 alpha 处理
+            frame = frame.convert(frame.mode[:-1] + "a")
+        pixmap = fitz.Pixmap(colorspace, frame.width, frame.height, frame.tobytes(), alpha)
+        page.insert_image(rect, pixmap=pixmap)
+    
+    def _insert_large_frame(
+        self,
+        doc: fitz.Document,
+        page: fitz.Page,
+        image: Image.Image,
+        source_path: Path,
+        single_frame: bool,
+    ) -> None:
+        """
+        插入大图片的当前帧（限制解码内存）
+        
+        - 不需要降采样时，JPEG / PNG 原样嵌入，不解码
+        - 条带存储的 TIFF（不压缩、CCITT G4、LZW、Deflate）逐条带解码，每凑满 BAND_BYTES 作为一个图片嵌入
+          （页面由上到下多个图片拼接），需要降采样时每组解码后立即缩小，解码内存不超过约 2 倍 BAND_BYTES
+        - JPEG 需要降采样时直接按缩小的尺寸解码（DCT 缩放）
+        - 其余情况整帧解码，解码后的大小超过 IMAGE_PDF_MAX_DECODE_BYTES 时拒绝转换
+        
+        图片记录了分辨率且高于 IMAGE_PDF_MAX_DPI 时按整数倍降采样到不超过该分辨率，页面尺寸不变。
+        
+        Raises:
+            ValueError: 无法分块解码且整帧解码超过内存上限时抛出
+        """
+        factor = self._downsample_factor(image)
+        if factor == 1 and single_frame and self._insert_passthrough(doc, page, image, source_path):
+            return
+        
+        strips = self._tiff_strips(image)
+        if strips is not None:
+            self._insert_strips(doc, page, image, source_path, strips, factor)
+            return
+        
+        width, height = image.size
+        target = (math.ceil(width / factor), math.ceil(height / factor))
+        if image.format == "JPEG" and factor > 1:
+            image.draft(image.mode, target)
+        
+        decoded_bytes = image.width * image.height * len(image.getbands())
+        if self.max_decode_bytes and decoded_bytes > self.max_decode_bytes:
+            raise ValueError(
+                f"图片 {width}x{height} 解码需要 {decoded_bytes // 1048576}MB，"
+                f"超过上限 {self.max_decode_bytes // 1048576}MB，且不支持分块解码"
+            )
+        
+        frame = image
+        if frame.size != target:
+            frame = self._normalize_mode(frame)
+            if frame.mode in ("1", "P"):
+                frame = frame.convert("L" if frame.mode == "1" else "RGB")
+            frame = frame.resize(target, Image.BOX)
+        self._insert_pixels(doc, page, page.rect, frame)
+        logger.info(f"大图片整帧解码: {width}x{height} -> {target[0]}x{target[1]}")
+    
+    def _downsample_factor(self, image: Image.Image) -> int:
+        """按图片记录的分辨率计算降采样倍数（不超过 IMAGE_PDF_MAX_DPI），不需要降采样时为 1"""
+        dpi = image.info.get("dpi")
+        if not self.max_dpi or not dpi:
+            return 1
+        return max(math.ceil(float(max(dpi)) / self.max_dpi), 1)
+    
+    def _tiff_strips(self, image: Image.Image) -> Optional[Dict[str, Any]]:
+        """
+        获取可以逐条带解码的 TIFF 帧的条带信息
+        
+        Returns:
+            Optional[Dict]: PDF 过滤器、解码参数、条带偏移 / 字节数和每条带行数，不支持时返回 None
+        """
+        if image.format != "TIFF" or image.mode not in ("1", "L", "RGB"):
+            return None
+        
+        tags = image.tag_v2
+        compression = tags.get(TiffImagePlugin.COMPRESSION, 1)
+        photometric = tags.get(TiffImagePlugin.PHOTOMETRIC_INTERPRETATION)
+        predictor = tags.get(TiffImagePlugin.PREDICTOR, 1)
+        bits = 1 if image.mode == "1" else 8
+        if (
+            compression not in self.TIFF_STRIP_FILTERS
+            or photometric not in (0, 1, 2)
+            or predictor not in (1, 2)
+            or (predictor == 2 and bits != 8)
+            or TiffImagePlugin.STRIPOFFSETS not in tags
+            or TiffImagePlugin.TILEOFFSETS in tags
+            or tags.get(TiffImagePlugin.PLANAR_CONFIGURATION, 1) != 1
+            or tags.get(TiffImagePlugin.FILLORDER, 1) != 1
+            or set(tags.get(TiffImagePlugin.BITSPERSAMPLE, (1,))) != {bits}
+        ):
+            return None
+        
+        channels = len(image.getbands())
+        rows = min(tags.get(TiffImagePlugin.ROWSPERSTRIP, image.height), image.height)
+        if image.width * rows * channels > self.BAND_BYTES:
+            # 单个条带过大（如整帧只有一个条带）
+            return None
+        
+        strip_filter = self.TIFF_STRIP_FILTERS[compression]
+        parameters = ""
+        if compression == 4:
+            # 解码后 0 表示黑色；BlackIsZero 的 TIFF 需要反转
+            parameters = f"<< /K -1 /Columns {image.width} /BlackIs1 {'true' if photometric == 1 else 'false'} >>"
+        elif predictor == 2:
+            parameters = f"<< /Predictor 2 /Colors {channels} /BitsPerComponent 8 /Columns {image.width} >>"
+        
+        return {
+            "filter": strip_filter,
+            "parameters": parameters,
+            # WhiteIsZero 的灰度图反转解码
+            "decode": photometric == 0 and compression != 4,
+            "bits": bits,
+            "offsets": list(tags[TiffImagePlugin.STRIPOFFSETS]),
+            "counts": list(tags[TiffImagePlugin.STRIPBYTECOUNTS]),
+            "rows": rows,
+        }
+    
+    def _insert_strips(
+        self,
+        doc: fitz.Document,
+        page: fitz.Page,
+        image: Image.Image,
+        source_path: Path,
+        strips: Dict[str, Any],
+        factor: int,
+    ) -> None:
+        """逐条带解码 TIFF 帧，按条带组嵌入为多个图片（需要降采样时每组解码后立即缩小）"""
+        width, height = image.size
+        channels = len(image.getbands())
+        # 每组行数为降采样倍数的整数倍，各组缩小后的图片正好拼接
+        band_rows = max(self.BAND_BYTES // (width * channels), strips["rows"])
+        band_rows = max(band_rows // factor * factor, factor)
+        
+        pending: List[Image.Image] = []
+        pending_rows = 0
+        top = 0
+        with open(source_path, "rb") as source:
+            for index, (offset, count) in enumerate(zip(strips["offsets"], strips["counts"])):
+                rows = min(strips["rows"], height - index * strips["rows"])
+                if rows <= 0:
+                    break
+                source.seek(offset)
+                pending.append(self._decode_strip(strips, source.read(count), width, rows, channels))
+                pending_rows += rows
+                
+                last = index == len(strips["offsets"]) - 1 or pending_rows + top >= height
+                if pending_rows >= band_rows or last:
+                    band = Image.new(pending[0].mode, (width, pending_rows))
+                    y = 0
+                    for piece in pending:
+                        band.paste(piece, (0, y))
+                        y += piece.height
+                    
+                    # 不是最后一组时，不足降采样倍数的行留到下一组
+                    emit_rows = pending_rows if last else pending_rows // factor * factor
+                    pending = [band.crop((0, emit_rows, width, pending_rows))] if emit_rows < pending_rows else []
+                    pending_rows -= emit_rows
+                    band = band.crop((0, 0, width, emit_rows))
+                    
+                    if factor > 1:
+                        band = band.reduce(factor)
+                    elif strips["bits"] == 1:
+                        band = band.convert("1", dither=Image.NONE)
+                    self._insert_pixels(doc, page, fitz.Rect(0, top, width, top + emit_rows), band)
+                    top += emit_rows
+                    # MuPDF 会缓存插入时解码的图片（默认最多 256MB），逐组清空，保持内存上限
+                    fitz.TOOLS.store_shrink(100)
+        
+        if top < height:
+            raise ValueError(f"TIFF 条带不完整: 只解码了 {top} / {height} 行")
+        logger.info(f"大图片分块转换: {width}x{height}, 降采样 {factor} 倍")
+    
+    @staticmethod
+    def _decode_strip(
+        strips: Dict[str, Any],
+        data: bytes,
+        width: int,
+        rows: int,
+        channels: int,
+    ) -> Image.Image:
+        """用 PyMuPDF 的 PDF 过滤器解码单个 TIFF 条带（每个条带使用独立的临时文档，解码结果不会被缓存复用）"""
+        colorspace = "/DeviceRGB" if channels == 3 else "/DeviceGray"
+        decode = " /Decode [1 0]" if strips["decode"] else ""
+        with fitz.open() as scratch:
+            xref = scratch.get_new_xref()
+            scratch.update_object(
+                xref,
+                f"<< /Type /XObject /Subtype /Image /Width {width} /Height {rows} "
+                f"/ColorSpace {colorspace} /BitsPerComponent {strips['bits']}{decode} >>",
+            )
+            scratch.update_stream(xref, data, compress=False)
+            if strips["filter"]:
+                scratch.xref_set_key(xref, "Filter", f"/{strips['filter']}")
+            if strips["parameters"]:
+                parameters = strips["parameters"]
+                if strips["filter"] == "CCITTFaxDecode":
+                    parameters = parameters.replace(" >>", f" /Rows {rows} >>")
+                scratch.xref_set_key(xref, "DecodeParms", parameters)
+            
+            pixmap = fitz.Pixmap(scratch, xref)
+            return Image.frombytes("RGB" if pixmap.n == 3 else "L", (pixmap.width, pixmap.height), pixmap.samples)
+    
+    @staticmethod
+    def _normalize_mode(image: Image.Image) -> Image.Image:
+        """将帧转换为可嵌入 PDF 的颜色模式（1 / L / LA / P / RGB / RGBA / CMYK），去掉全部不透明的 alpha 通道"""
+        frame = image
+        if frame.mode in ("I;16", "I;16B", "I;16L", "I"):
+            # 16 位灰度按比例缩放到 8 位（直接 convert 会截断）
+            frame = frame.convert("I").point(lambda value: value * (1 / 256)).convert("L")
+        elif frame.mode == "F":
+            frame = frame.convert("L")
+        elif frame.mode == "P" and "transparency" in frame.info:
+            frame = frame.convert("RGBA")
+        elif frame.mode == "PA":
+            frame = frame.convert("RGBA")
+        elif frame.mode not in ("1", "L", "LA", "P", "RGB", "RGBA", "CMYK"):
+            frame = frame.convert("RGB")
+        
+        if frame.mode in ("LA", "RGBA") and frame.getchannel("A").getextrema() == (255, 255):
+            frame = frame.convert(frame.mode[:-1])
+        return frame
+    
+    @classmethod
+    def _parse_png(cls, data: bytes) -> Optional[Dict[str, Any]]:
+        """
+        解析可以原样嵌入 PDF 的 PNG（不透明、非隔行、单帧）
+        
+        Returns:
+            Optional[Dict]: 宽、高、位深、颜色类型、调色板和压缩数据（各 IDAT 块拼接），不能原样嵌入时返回 None
+        """
+        if not data.startswith(b"\x89PNG\r\n\x1a\n"):
+            return None
+        
+        png: Dict[str, Any] = {"palette": b"", "idat": []}
+        position = 8
+        while position + 8 <= len(data):
+            length, chunk_type = struct.unpack(">I4s", data[position:position + 8])
+            chunk = data[position + 8:position + 8 + length]
+            position += length + 12
+            if chunk_type == b"IHDR":
+                width, height, bit_depth, color_type, _, _, interlace = struct.unpack(">IIBBBBB", chunk)
+                if color_type not in cls.PNG_COLOR_CHANNELS or interlace:
+                    return None
+                png.update(width=width, height=height, bit_depth=bit_depth, color_type=color_type)
+            elif chunk_type == b"PLTE":
+                png["palette"] = chunk
+            elif chunk_type in (b"tRNS", b"acTL"):
+                # 带透明色或动画的 PNG 需要解码
+                return None
+            elif chunk_type == b"IDAT":
+                png["idat"].append(chunk)
+            elif chunk_type == b"IEND":
+                break
+        
+        if "width" not in png or not png["idat"] or (png["color_type"] == 3 and not png["palette"]):
+            return None
+        png["idat"] = b"".join(png["idat"])
+        return png
+    
+    @classmethod
+    def _add_png_image(cls, doc: fitz.Document, png: Dict[str, Any]) -> int:
+        """将 PNG 压缩数据作为图片对象写入文档（PNG 的 IDAT 即带 PNG 预测器的 FlateDecode 数据）"""
+        if png["color_type"] == 3:
+            palette = png["palette"]
+            colorspace = f"[/Indexed /DeviceRGB {len(palette) // 3 - 1} <{palette.hex()}>]"
+        else:
+            colorspace = "/DeviceGray" if png["color_type"] == 0 else "/DeviceRGB"
+        
+        xref = doc.get_new_xref()
+        doc.update_object(
+            xref,
+            f"<< /Type /XObject /Subtype /Image /Width {png['width']} /Height {png['height']} "
+            f"/ColorSpace {colorspace} /BitsPerComponent {png['bit_depth']} >>",
+        )
+        doc.update_stream(xref, png["idat"], compress=False)
+        # update_stream 会重置压缩参数，写入数据后再设置
+        doc.xref_set_key(xref, "Filter", "/FlateDecode")
+        doc.xref_set_key(
+            xref,
+            "DecodeParms",
+            f"<< /Predictor 15 /Colors {cls.PNG_COLOR_CHANNELS[png['color_type']]} "
+            f"/BitsPerComponent {png['bit_depth']} /Columns {png['width']} >>",
+        )
+        return xref
+
+
+class LibreOfficeConverter(Converter):
+    """
+    Office 文档转 PDF（常驻 LibreOffice 进程池）
+    
+    也作为文本、HTML、CSV 的后备转换器：进程内转换器不可用或转换失败时使用。
+    """
+    
+    name = "libreoffice"
+    converter_class = CONVERTER_OFFICE
+    cpu_bound = False
+    extensions = frozenset({
+        '.doc', '.docx', '.xls', '.xlsx', '.ppt', '.pptx', '.odt', '.ods', '.odp', '.rtf',
+        '.txt', '.html', '.htm', '.csv',
+    })
+    
+    def __init__(self):
+        self.soffice_path: Optional[str] = None
+    
+    def probe(self) -> Optional[str]:
+        self.soffice_path = self._find_libreoffice_path()
+        if not self.soffice_path:
+            return None
+        # 没有可用的 UNO 连接方式时不降级为一次性进程（除非配置允许），转换器不可用
+        if get_libreoffice_mode(self.soffice_path) is None:
+            return None
+        return get_libreoffice_version(self.soffice_path)
+    
+    def convert(self, source_path: Path, staging_dir: Path) -> Optional[Path]:
+        if not self.soffice_path:
+            logger.error("LibreOffice 未找到，无法转换 Office 文档")
+            return None
+        
+        pool = get_libreoffice_pool(self.soffice_path)
+        return pool.convert(source_path, staging_dir)
+    
+    @staticmethod
+    def _find_libreoffice_path() -> Optional[str]:
+        """
+        查找 LibreOffice 可执行文件路径
+        
+        Returns:
+            str: LibreOffice 可执行文件路径，如果未找到返回 None
+        """
+        # 如果配置中指定了路径，使用配置的路径
+        if settings.LIBREOFFICE_PATH:
+            path = Path(settings.LIBREOFFICE_PATH)
+            if path.exists():
+                logger.info(f"使用配置的 LibreOffice 路径: {path}")
+                return str(path)
+            else:
+                logger.warning(f"配置的 LibreOffice 路径不存在: {settings.LIBREOFFICE_PATH}")
+        
+        # 尝试在 PATH 中查找
+        libreoffice_cmd = shutil.which('libreoffice')
+        if libreoffice_cmd:
+            logger.info(f"在 PATH 中找到 LibreOffice: {libreoffice_cmd}")
+            return libreoffice_cmd
+        
+        # Windows 上尝试常见安装路径
+        if os.name == 'nt':  # Windows
+            common_paths = [
+                r"C:\Program Files\LibreOffice\program\soffice.exe",
+                r"C:\Program Files (x86)\LibreOffice\program\soffice.exe",
+                r"C:\Program Files\LibreOffice 7\program\soffice.exe",
+                r"C:\Program Files (x86)\LibreOffice 7\program\soffice.exe",
+            ]
+        # Linux/macOS 上尝试其他可能的位置
+        else:
+            common_paths = [
+                "/usr/bin/libreoffice",
+                "/usr/local/bin/libreoffice",
+                "/Applications/LibreOffice.app/Contents/MacOS/soffice",  # macOS
+            ]
+        
+        for path_str in common_paths:
+            if Path(path_str).exists():
+                logger.info(f"在常见路径找到 LibreOffice: {path_str}")
+                return path_str
+        
+        logger.error("未找到 LibreOffice，请安装 LibreOffice 或在配置中指定路径")
+        return None
+
+
+class ConverterRegistry:
+    """
+    PDF 转换器注册表
+    
+    转换器按优先级排列，同一格式由第一个可用的转换器处理，转换失败时依次使用后面的转换器
+    （LibreOffice 排在最后，作为通用后备）。各转换器是否可用及其版本只探测一次。
+    """
+    
+    def __init__(self, converters: Iterable[Converter]):
+        self.converters = list(converters)
+        self._versions: Optional[Dict[str, Optional[str]]] = None
+        self._lock = threading.Lock()
+    
+    def probe(self) -> Dict[str, Optional[str]]:
+        """
+        探测所有转换器（只执行一次，之后直接返回结果）
+        
+        Returns:
+            Dict[str, Optional[str]]: 转换器名称 -> 版本（不可用为 None）
+        """
+        with self._lock:
+            if self._versions is None:
+                versions = {}
+                for converter in self.converters:
+                    try:
+                        versions[converter.name] = converter.probe()
+                    except Exception as e:
+                        logger.warning(f"转换器 {converter.name} 探测失败: {str(e)}")
+                        versions[converter.name] = None
+                    status = versions[converter.name] or "不可用"
+                    logger.info(f"PDF 转换器 {converter.name} ({converter.converter_class}): {status}")
+                self._versions = versions
+            return self._versions
+    
+    def candidates(self, file_ext: str) -> List[Tuple[Converter, str]]:
+        """
+        获取处理该格式的可用转换器（按优先级排列）
+        
+        Returns:
+            List[Tuple[Converter, str]]: (转换器, 版本) 列表，没有可用的转换器时为空
+        """
+        versions = self.probe()
+        file_ext = file_ext.lower()
+        return [
+            (converter, versions[converter.name])
+            for converter in self.converters
+            if file_ext in converter.extensions and versions[converter.name]
+        ]
+    
+    def converter_class(self, file_ext: str) -> Optional[str]:
+        """
+        获取格式对应的开销类别（转换任务进入的调度队列）
+        
+        优先使用本机可用的转换器；都不可用时（如本机未安装 LibreOffice）仍按声明的转换器归类，
+        任务可以由其他节点上的工作进程处理。不支持的格式返回 None。
+        """
+        candidates = self.candidates(file_ext)
+        if candidates:
+            return candidates[0][0].converter_class
+        
+        file_ext = file_ext.lower()
+        for converter in self.converters:
+            if file_ext in converter.extensions:
+                return converter.converter_class
+        return None
+
+
+_registry: Optional[ConverterRegistry] = None
+_registry_lock = threading.Lock()
+
+
+def get_converter_registry() -> ConverterRegistry:
+    """获取全局转换器注册表（首次调用时创建）"""
+    global _registry
+    with _registry_lock:
+        if _registry is None:
+            _registry = ConverterRegistry([
+                MarkdownConverter(),
+                TextConverter(),
+                HTMLConverter(),
+                CSVConverter(),
+                ImageConverter(),
+                LibreOfficeConverter(),
+            ])
+        return _registry
@@ -1,15 +1,30 @@
 from sqlalchemy.orm import Session
 from fastapi import UploadFile
 from pathlib import Path
-from datetime import datetime
 from typing import List, Optional
 import asyncio
 import logging
 
 from app.core.config import settings
-from app.core.exceptions import DocumentNotFoundError, FileNotFoundError
+from app.core.exceptions import (
+    BaseAPIException,
+    DocumentNotFoundError,
+    FileNotFoundError,
+    UnsupportedFileTypeError,
+)
+from app.repositories.conversion_job_repository import ConversionJobRepository
 from app.repositories.document_repository import DocumentRepository
-from app.schemas.document import DocumentCreate, DocumentUpdate, DocumentResponse
+from app.services.conversion_scheduler import ConversionScheduler, get_conversion_scheduler
+from app.services.pdf_service import PDFService
+from app.services.storage_service import StorageService, StoredFile
+from app.schemas.document import (
+    BatchUploadResponse,
+    BatchUploadResult,
+    ConversionStatusResponse,
+    DocumentCreate,
+    DocumentResponse,
+    DocumentUpdate,
+)
 from app.models.document_model import Document
 
 logger = logging.getLogger(__name__)
@@ -37,6 +52,7 @@ class DocumentService:
             file_size=document.file_size,
             file_type=document.file_type,
             pdf_file_size=document.pdf_file_size,
+            page_count=document.page_count,
             introduction=document.introduction,
             write_time=document.write_time,
             status=document.status,
@@ -65,103 +81,301 @@ class DocumentService:
             file: 上传的文件
             description: 文档描述
             category_id: 分类ID
-            
+        
         Returns:
             DocumentResponse: 文档响应对象
+        
+        Raises:
+            FileTooLargeError: 文件超过 MAX_UPLOAD_SIZE 时抛出
+            UnsupportedFileTypeError: 开启 UPLOAD_REJECT_UNCONVERTIBLE 且文件内容无法转换时抛出
+            ServiceBusyError: 对应类型的转换队列已满时抛出
         """
-        # 生成唯一文件名
-        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-        filename = f"{timestamp}_{file.filename}"
-        file_path = settings.upload_dir_path / filename
-        
-        # 保存文件
-        with open(file_path, "wb") as buffer:
-            content = await file.read()
-            buffer.write(content)
-        
-        # 获取文件大小
-        file_size = file_path.stat().st_size
-        
-        # 查询分类名称（如果提供了分类ID）
-        category_name = None
-        if category_id:
-            from app.models.category_model import Category
-            category = self.db.query(Category).filter(
-                Category.id == category_id,
-                Category.delete_flag == 0
-            ).first()
-            if category:
-                category_name = category.name
-        
-        # 创建文档记录
-        document = self.repository.create(
+        # 转换队列已满时在接收文件之前拒绝上传（此时只能按文件名判断类型）
+        get_conversion_scheduler().ensure_capacity(
+            self.db, PDFService.get_converter_class(Path(file.filename or ""))
+        )
+        
+        # 流式保存文件到内容寻址存储（相同内容只保存一份），按文件头识别的类型决定扩展名和转换器
+        stored = await StorageService().save_upload(file, validate=self.check_file_type)
+        
+        return await self.create_document_from_blob(
+            stored=stored,
             title=file.filename,  # 使用原始文件名作为标题
-            save_path=str(file_path),
-            file_size=file_size,
-            file_type=file.content_type or "application/octet-stream",
-            introduction=description,
+            file_type=stored.file_type.mime_type,
+            description=description,
             category_id=category_id,
-            category_name=category_name,
         )
-
-        # 启动后台任务：异步转换 PDF
-        # 如果文件已经是 PDF，跳过转换
-        if file_path.suffix.lower() != '.pdf':
-            asyncio.create_task(
-                self._convert_and_update_pdf(document.id, file_path)
-            )
-
-        return self._document_to_response(document, tags=[])
     
-    async def _convert_and_update_pdf(
+    async def upload_documents(
         self,
-        document_id: int,
-        file_path: Path,
-    ):
+        files: List[UploadFile],
+        description: Optional[str] = None,
+        category_id: Optional[int] = None,
+    ) -> BatchUploadResponse:
         """
-        异步转换 PDF 并更新数据库
+        批量上传文档
+        
+        文件并发流式保存（并发数由 BATCH_UPLOAD_CONCURRENCY 控制），
+        所有文档记录和 PDF 转换任务在同一个事务中创建，不会出现没有转换任务的文档。
+        单个文件失败不影响其他文件，结果按上传顺序逐个返回。
         
         Args:
-            document_id: 文档ID
-            file_path: 源文件路径
+            files: 上传的文件列表
+            description: 文档描述（应用到所有文件）
+            category_id: 分类ID（应用到所有文件）
+        
+        Returns:
+            BatchUploadResponse: 批量上传结果
+        
+        Raises:
+            ServiceBusyError: 本批次涉及的转换队列已满时抛出
         """
-        try:
-            logger.info(f"开始转换 PDF (document_id={document_id}, file={file_path})")
-            
-            # 导入 PDFService（避免循环导入）
-            from app.services.pdf_service import PDFService
-            pdf_service = PDFService(self.db)
-            
-            # 转换 PDF
-            pdf_path = await pdf_service.convert_to_pdf(file_path)
-            
-            if pdf_path and pdf_path.exists():
-                # 获取 PDF 文件大小
-                pdf_file_size = pdf_path.stat().st_size
-                
-                # 更新数据库
-                updated_document = self.repository.update_pdf_info(
-                    document_id=document_id,
-                    pdf_file_size=pdf_file_size,
-                    pdf_save_path=str(pdf_path),
+        # 本批次涉及的任一类转换队列已满时整批拒绝
+        scheduler = get_conversion_scheduler()
+        for converter_class in {PDFService.get_converter_class(Path(file.filename or "")) for file in files}:
+            scheduler.ensure_capacity(self.db, converter_class)
+        
+        storage = StorageService()
+        semaphore = asyncio.Semaphore(settings.BATCH_UPLOAD_CONCURRENCY)
+        
+        async def save(file: UploadFile) -> StoredFile:
+            async with semaphore:
+                return await storage.save_upload(file, validate=self.check_file_type)
+        
+        outcomes = await asyncio.gather(
+            *(save(file) for file in files),
+            return_exceptions=True,
+        )
+        
+        # 相同内容已转换过 PDF 时直接复用转换结果（一次查询）
+        saved = [stored for stored in outcomes if isinstance(stored, StoredFile)]
+        converted = self.repository.get_converted_by_save_paths(
+            [str(stored.path) for stored in saved if stored.deduplicated]
+        )
+        
+        category_name = self._get_category_name(category_id)
+        page_counts = iter(await asyncio.gather(*(self._count_pages(stored.path) for stored in saved)))
+        items = []
+        for file, stored in zip(files, outcomes):
+            if not isinstance(stored, StoredFile):
+                continue
+            item = dict(
+                title=file.filename,
+                save_path=str(stored.path),
+                file_size=stored.size,
+                file_type=stored.file_type.mime_type,
+                introduction=description,
+                category_id=category_id,
+                category_name=category_name,
+                page_count=next(page_counts),
+            )
+            reused = converted.get(str(stored.path))
+            if reused and Path(reused.pdf_save_path).exists():
+                item.update(
+                    pdf_file_size=reused.pdf_file_size,
+                    pdf_save_path=reused.pdf_save_path,
+                    page_count=reused.page_count,
                 )
-                
-                if updated_document:
-                    logger.info(
-                        f"PDF 转换成功 (document_id={document_id}, "
-                        f"pdf_size={pdf_file_size}, pdf_path={pdf_path})"
-                    )
+            items.append(item)
+        
+        # 文档记录先 flush 获取ID，与本批次的转换任务在同一个事务中提交（相同内容的文件只转换一次）
+        documents = self.repository.create_many(items, commit=False)
+        conversions = []
+        for document in documents:
+            file_path = Path(document.save_path)
+            converter_class = PDFService.get_converter_class(file_path)
+            if document.pdf_save_path is None and converter_class:
+                conversions.append((
+                    document.id,
+                    document.save_path,
+                    converter_class,
+                    ConversionScheduler.estimate_priority(file_path.suffix, document.file_size),
+                ))
+        ConversionJobRepository(self.db).enqueue_many(conversions, commit=False)
+        self.db.commit()
+        for stored in saved:
+            await storage.release(stored)
+        
+        # 一次查询刷新所有文档（代替逐个 refresh）
+        documents = iter(self.repository.get_by_ids([document.id for document in documents])[0])
+        
+        results = []
+        for file, stored in zip(files, outcomes):
+            if not isinstance(stored, StoredFile):
+                if isinstance(stored, BaseAPIException):
+                    error = str(stored.detail)
                 else:
-                    logger.warning(f"PDF 转换成功但更新数据库失败 (document_id={document_id})")
-            else:
-                logger.warning(f"PDF 转换失败，未生成 PDF 文件 (document_id={document_id})")
-                
-        except Exception as e:
-            # 记录错误日志，但不影响主流程
-            logger.error(
-                f"PDF 转换失败 (document_id={document_id}): {str(e)}",
-                exc_info=True
+                    logger.error(f"文件保存失败 ({file.filename}): {stored}", exc_info=stored)
+                    error = str(stored)
+                results.append(BatchUploadResult(filename=file.filename, success=False, error=error))
+                continue
+            
+            results.append(BatchUploadResult(
+                filename=file.filename,
+                success=True,
+                document=self._document_to_response(next(documents), tags=[]),
+            ))
+        
+        succeeded = sum(1 for result in results if result.success)
+        return BatchUploadResponse(
+            total=len(results),
+            succeeded=succeeded,
+            failed=len(results) - succeeded,
+            results=results,
+        )
+    
+    @staticmethod
+    def check_file_type(stored: StoredFile) -> None:
+        """
+        开启 UPLOAD_REJECT_UNCONVERTIBLE 时拒绝按文件头识别为无法转换的文件（在提交到存储之前调用）
+        
+        Raises:
+            UnsupportedFileTypeError: 文件内容既不是 PDF 也没有对应的转换器时抛出
+        """
+        file_type = stored.file_type
+        if not settings.UPLOAD_REJECT_UNCONVERTIBLE or not file_type.sniffed:
+            return
+        if not PDFService.is_supported_suffix(file_type.suffix):
+            raise UnsupportedFileTypeError(file_type.mime_type)
+    
+    @staticmethod
+    async def _count_pages(file_path: Path) -> Optional[int]:
+        """上传的文件本身是 PDF 时记录页数（其他格式在转换完成时记录），解析 PDF 在线程池中执行，不阻塞事件循环"""
+        if file_path.suffix.lower() != '.pdf':
+            return None
+        loop = asyncio.get_event_loop()
+        return await loop.run_in_executor(None, PDFService.count_pages, file_path)
+    
+    def _get_category_name(self, category_id: Optional[int]) -> Optional[str]:
+        """查询分类名称（如果提供了分类ID）"""
+        if not category_id:
+            return None
+        
+        from app.models.category_model import Category
+        category = self.db.query(Category).filter(
+            Category.id == category_id,
+            Category.delete_flag == 0
+        ).first()
+        return category.name if category else None
+    
+    async def create_document_from_blob(
+        self,
+        stored: StoredFile,
+        title: str,
+        file_type: str,
+        description: Optional[str] = None,
+        category_id: Optional[int] = None,
+    ) -> DocumentResponse:
+        """
+        为已保存的文件创建文档记录并启动 PDF 转换
+        
+        单次上传和断点续传上传共用此流程。文档记录和转换任务在同一个事务中提交。
+        
+        Args:
+            stored: 已保存到内容寻址存储的文件
+            title: 文件标题
+            file_type: 文件类型
+            description: 文档描述
+            category_id: 分类ID
+        
+        Returns:
+            DocumentResponse: 文档响应对象
+        """
+        file_path = stored.path
+        
+        # 创建文档记录（先 flush 获取ID，与转换任务一起提交）
+        document = self.repository.create(
+            title=title,
+            save_path=str(file_path),
+            file_size=stored.size,
+            file_type=file_type,
+            introduction=description,
+            category_id=category_id,
+            category_name=self._get_category_name(category_id),
+            page_count=await self._count_pages(file_path),
+            commit=False,
+        )
+        
+        # 相同内容已转换过 PDF 时直接复用转换结果
+        converted = None
+        if stored.deduplicated:
+            converted = self.repository.get_converted_by_save_path(str(file_path))
+        if converted and Path(converted.pdf_save_path).exists():
+            document.pdf_file_size = converted.pdf_file_size
+            document.pdf_save_path = converted.pdf_save_path
+            document.page_count = converted.page_count
+        else:
+            # 创建持久化转换任务，由转换工作进程异步处理（估算开销小的任务优先）
+            # 如果文件已经是 PDF 或格式不支持，跳过转换
+            converter_class = PDFService.get_converter_class(file_path)
+            if converter_class:
+                ConversionJobRepository(self.db).enqueue(
+                    document.id,
+                    str(file_path),
+                    converter_class,
+                    ConversionScheduler.estimate_priority(file_path.suffix, stored.size),
+                    commit=False,
+                )
+        
+        self.db.commit()
+        # 文档记录已提交，释放 blob 副本（期间 blob 被删除时恢复）
+        await StorageService().release(stored)
+        self.db.refresh(document)
+        return self._document_to_response(document, tags=[])
+    
+    def get_conversion_status(self, document_id: int) -> ConversionStatusResponse:
+        """获取文档的 PDF 转换状态"""
+        document = self.repository.get_by_id(document_id)
+        if not document:
+            raise DocumentNotFoundError(document_id)
+        
+        response = ConversionStatusResponse(
+            document_id=document.id,
+            status="succeeded",
+            pdf_file_size=document.pdf_file_size,
+        )
+        if document.pdf_save_path:
+            return response
+        
+        file_path = Path(document.save_path)
+        if not PDFService.needs_conversion(file_path):
+            response.status = "not_required" if file_path.suffix.lower() == '.pdf' else "unsupported"
+            return response
+        
+        job = ConversionJobRepository(self.db).get_latest_by_source_path(document.save_path)
+        if not job:
+            response.status = "not_queued"
+            return response
+        
+        response.status = ConversionStatusResponse.JOB_STATUS_NAMES[job.status]
+        response.attempts = job.attempts
+        response.max_attempts = job.max_attempts
+        response.last_error = job.last_error
+        response.next_run_time = job.next_run_time
+        response.update_time = job.update_time
+        return response
+    
+    def request_conversion(self, document_id: int) -> ConversionStatusResponse:
+        """
+        重新提交文档的 PDF 转换任务
+        
+        用于转换最终失败或历史上未创建转换任务的文档；已有未完成任务时不重复提交。
+        """
+        document = self.repository.get_by_id(document_id)
+        if not document:
+            raise DocumentNotFoundError(document_id)
+        
+        file_path = Path(document.save_path)
+        converter_class = PDFService.get_converter_class(file_path)
+        if not document.pdf_save_path and converter_class:
+            ConversionJobRepository(self.db).enqueue(
+                document.id,
+                document.save_path,
+                converter_class,
+                ConversionScheduler.estimate_priority(file_path.suffix, document.file_size),
             )
+        
+        return self.get_conversion_status(document_id)
     
     def get_document(self, document_id: int) -> DocumentResponse:
         """获取文档"""
@@ -209,7 +423,13 @@ class DocumentService:
         if not document:
             raise DocumentNotFoundError(document_id)
         
+        save_path = document.save_path
         self.repository.delete(document)
+        
+        # 最后一个引用被删除时删除文件
+        StorageService().delete_blob_if_unreferenced(
+            Path(save_path), lambda: self.repository.count_by_save_path(save_path)
+        )
     
     def get_file_path(self, document_id: int) -> Path:
         """获取文档文件路径"""
@@ -0,0 +1,107 @@
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Callable, Dict, Iterable, List, Optional, Set, Tuple
+import logging
+import os
+
+logger = logging.getLogger(__name__)
+
+
+def directory_usage(directory: Path, pattern: str = "*.pdf") -> Tuple[int, int]:
+    """
+    统计目录中匹配文件的数量和总大小
+    
+    Returns:
+        Tuple[int, int]: (文件数, 总大小)
+    """
+    entries = 0
+    size = 0
+    for path in directory.glob(pattern):
+        try:
+            size += path.stat().st_size
+        except FileNotFoundError:
+            continue
+        entries += 1
+    return entries, size
+
+
+def evict_lru(
+    directory: Path,
+    max_size: int,
+    pinned: Optional[Callable[[], Set[str]]] = None,
+    keep: Iterable[str] = (),
+    pattern: str = "*.pdf",
+    group: Optional[Callable[[str], str]] = None,
+) -> int:
+    """
+    按最近使用时间（文件 mtime，命中缓存时刷新）淘汰文件，直到目录总大小不超过 max_size
+    
+    Args:
+        directory: 缓存目录
+        max_size: 容量上限（字节），0 表示不限制
+        pinned: 返回不可淘汰文件名集合的函数，只在需要淘汰时调用（可能需要查询数据库）
+        keep: 不参与淘汰的文件名或分组名（如刚写入的结果）
+        pattern: 参与统计和淘汰的文件匹配模式
+        group: 文件名 -> 分组名，同一分组的文件一起淘汰（按组内最近的使用时间），
+            组内任一文件不可淘汰时整组保留
+    
+    Returns:
+        int: 删除的文件数
+    """
+    if max_size <= 0:
+        return 0
+    
+    # 分组名 -> [最近使用时间, 总大小, 文件列表]
+    groups: Dict[str, list] = {}
+    total_size = 0
+    for path in directory.glob(pattern):
+        try:
+            stat = path.stat()
+        except FileNotFoundError:
+            continue
+        entry = groups.setdefault(group(path.name) if group else path.name, [0.0, 0, []])
+        entry[0] = max(entry[0], stat.st_mtime)
+        entry[1] += stat.st_size
+        entry[2].append(path)
+        total_size += stat.st_size
+    
+    if total_size <= max_size:
+        return 0
+    
+    protected = set(keep)
+    if pinned:
+        protected.update(pinned())
+    
+    removed = 0
+    for name, (_, size, paths) in sorted(groups.items(), key=lambda item: item[1][0]):
+        if total_size <= max_size:
+            break
+        if name in protected or any(path.name in protected for path in paths):
+            continue
+        for path in paths:
+            try:
+                path.unlink()
+            except FileNotFoundError:
+                pass
+            removed += 1
+        total_size -= size
+    
+    if removed:
+        logger.info(f"缓存目录 {directory} 淘汰 {removed} 个文件，当前大小 {total_size} 字节")
+    return removed
+
+
+def existing_paths(paths: Iterable[str], max_workers: int = 16) -> Set[str]:
+    """
+    批量检查文件是否存在（去重后并发 stat，网络文件系统上可重叠多个请求的延迟）
+    
+    Returns:
+        Set[str]: 存在的文件路径
+    """
+    unique_paths: List[str] = list(dict.fromkeys(path for path in paths if path))
+    if len(unique_paths) <= 1:
+        return {path for path in unique_paths if os.path.isfile(path)}
+    
+    with ThreadPoolExecutor(max_workers=min(max_workers, len(unique_paths))) as executor:
+        flags = executor.map(os.path.isfile, unique_paths)
+        return {path for path, exists in zip(unique_paths, flags) if exists}
@@ -0,0 +1,199 @@
+from pathlib import Path
+from typing import Dict, FrozenSet, List, Optional, Tuple
+import logging
+import mimetypes
+import re
+
+logger = logging.getLogger(__name__)
+
+
+class DetectedFileType:
+    """按文件内容识别的文件类型"""
+    
+    def __init__(self, suffix: str, mime_type: str, sniffed: bool = False):
+        self.suffix = suffix  # 保存和转换使用的扩展名（小写）
+        self.mime_type = mime_type  # 记录到 Document.file_type 的类型
+        self.sniffed = sniffed  # 是否按文件头识别（否则沿用上传文件名的扩展名）
+
+
+class FileTypeDetector:
+    """
+    按文件头（魔数）识别上传文件的实际类型
+    
+    上传文件的扩展名和 Content-Type 都由客户端提供，可能与内容不符（如内容是 HTML 的 .doc、
+    内容是 JPEG 的 .pdf），按扩展名转换时这类文件会交给 LibreOffice，超时后才失败。
+    识别出的扩展名用作 blob 的扩展名，转换器按识别出的格式选择：
+    
+    - 有文件头的格式（PDF、图片、OLE2 / ZIP 容器的 Office 文档、RTF）按内容识别，
+      与扩展名不符时改用识别出的扩展名；OLE2 容器只有扩展名是 Office 文档时才按 Office 文档转换
+    - 压缩包、可执行文件、音视频等识别为对应扩展名，没有转换器，不会创建转换任务
+    - 纯文本格式（TXT、Markdown、CSV、HTML）没有文件头，沿用上传文件名的扩展名；
+      扩展名是有文件头的格式而内容不符时，按 HTML、纯文本或未知二进制（.bin）处理
+    """
+    
+    # 识别使用的文件头字节数
+    SNIFF_BYTES = 8192
+    
+    # (偏移, 文件头, 扩展名)，按顺序匹配
+    SIGNATURES: List[Tuple[int, bytes, str]] = [
+        (0, b"%PDF-", ".pdf"),
+        (0, b"\x89PNG\r\n\x1a\n", ".png"),
+        (0, b"\xff\xd8\xff", ".jpg"),
+        (0, b"GIF87a", ".gif"),
+        (0, b"GIF89a", ".gif"),
+        (0, b"II*\x00", ".tiff"),
+        (0, b"MM\x00*", ".tiff"),
+        (0, b"{\\rtf", ".rtf"),
+        (0, b"\xd0\xcf\x11\xe0\xa1\xb1\x1a\xe1", ".ole"),  # OLE2 复合文档（doc / xls / ppt，也用于 msg / vsd / pub 等）
+        (0, b"PK\x03\x04", ".zip"),  # ZIP 容器（docx / xlsx / pptx / odt 等）
+        (0, b"\x1f\x8b\x08", ".gz"),
+        (0, b"7z\xbc\xaf\x27\x1c", ".7z"),
+        (0, b"Rar!\x1a\x07", ".rar"),
+        (0, b"\x7fELF", ".elf"),
+        (0, b"ID3", ".mp3"),
+        (0, b"OggS", ".ogg"),
+        (0, b"fLaC", ".flac"),
+        (0, b"\x1a\x45\xdf\xa3", ".mkv"),
+        (4, b"ftyp", ".mp4"),
+    ]
+    
+    # 同一格式的其他扩展名：上传文件名使用其中之一时保留原扩展名
+    ALIASES: Dict[str, FrozenSet[str]] = {
+        ".jpg": frozenset({".jpg", ".jpeg", ".jpe", ".jfif"}),
+        ".tiff": frozenset({".tiff", ".tif"}),
+        ".ole": frozenset({".doc", ".dot", ".xls", ".xlt", ".ppt", ".pps", ".pot"}),
+        ".zip": frozenset({
+            ".docx", ".docm", ".dotx", ".xlsx", ".xlsm", ".xltx", ".pptx", ".pptm", ".ppsx",
+            ".odt", ".ods", ".odp", ".odg", ".zip",
+        }),
+        ".mp4": frozenset({".mp4", ".m4a", ".m4v", ".mov", ".3gp", ".heic", ".avif"}),
+        ".mkv": frozenset({".mkv", ".webm"}),
+    }
+    
+    # ZIP 容器中的特征条目 -> Office 文档扩展名（扩展名不是 ZIP 容器格式时识别具体格式）
+    ZIP_MARKERS: List[Tuple[bytes, str]] = [
+        (b"application/vnd.oasis.opendocument.text", ".odt"),
+        (b"application/vnd.oasis.opendocument.spreadsheet", ".ods"),
+        (b"application/vnd.oasis.opendocument.presentation", ".odp"),
+        (b"word/", ".docx"),
+        (b"xl/", ".xlsx"),
+        (b"ppt/", ".pptx"),
+    ]
+    
+    # 扩展名是 OOXML 格式而内容是 OLE2 容器时（误标扩展名的旧版 Office 文档）按 .doc 交给 LibreOffice，
+    # LibreOffice 按内容识别 Word / Excel / PowerPoint
+    OLE2_OFFICE_SUFFIXES: FrozenSet[str] = frozenset({".docx", ".docm", ".xlsx", ".xlsm", ".pptx", ".pptm"})
+    
+    # 文本文件中可能出现的字节（控制字符只允许空白、退格、响铃和 ESC，0x80 以上按 UTF-8 / GB18030 等编码的文本处理）
+    TEXT_BYTES = bytes({7, 8, 9, 10, 11, 12, 13, 27} | set(range(0x20, 0x100)) - {0x7f})
+    
+    MIME_TYPES: Dict[str, str] = {
+        ".pdf": "application/pdf",
+        ".docx": "application/vnd.openxmlformats-officedocument.wordprocessingml.document",
+        ".xlsx": "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
+        ".pptx": "application/vnd.openxmlformats-officedocument.presentationml.presentation",
+        ".odt": "application/vnd.oasis.opendocument.text",
+        ".ods": "application/vnd.oasis.opendocument.spreadsheet",
+        ".odp": "application/vnd.oasis.opendocument.presentation",
+        ".rtf": "application/rtf",
+        ".webp": "image/webp",
+        ".gz": "application/gzip",
+        ".7z": "application/x-7z-compressed",
+        ".rar": "application/vnd.rar",
+        ".elf": "application/x-executable",
+        ".exe": "application/vnd.microsoft.portable-executable",
+        ".flac": "audio/flac",
+        ".mkv": "video/x-matroska",
+        ".ole": "application/x-ole-storage",
+        ".bin": "application/octet-stream",
+    }
+    
+    # 扩展名是有文件头的格式而内容是文本时，按 HTML 开头标签区分 HTML 和纯文本
+    HTML_PATTERN = re.compile(
+        rb"^\s*(<!--.*?-->\s*)*<(!doctype\s+html|html|head|body)[\s>]",
+        re.IGNORECASE | re.DOTALL,
+    )
+    
+    @classmethod
+    def _signature_suffixes(cls) -> FrozenSet[str]:
+        """有文件头的格式的扩展名（内容不符时不沿用）"""
+        suffixes = {suffix for _, _, suffix in cls.SIGNATURES} | {".pdf", ".bmp", ".webp", ".exe"}
+        for aliases in cls.ALIASES.values():
+            suffixes |= aliases
+        return frozenset(suffixes)
+    
+    @classmethod
+    def _is_text(cls, data: bytes) -> bool:
+        """判断数据是否是文本（不含文本中不会出现的控制字符）"""
+        return not data.translate(None, cls.TEXT_BYTES)
+    
+    @classmethod
+    def _match_signature(cls, head: bytes) -> Optional[str]:
+        """按文件头识别扩展名，没有匹配的文件头时返回 None"""
+        for offset, signature, suffix in cls.SIGNATURES:
+            if head[offset:offset + len(signature)] == signature:
+                return suffix
+        if head[:4] == b"RIFF" and head[8:12] == b"WEBP":
+            return ".webp"
+        # BMP、PE 的文件头只有两个字节，再校验头部字段
+        if head[:2] == b"BM" and int.from_bytes(head[14:18], "little") in (12, 40, 52, 56, 64, 108, 124):
+            return ".bmp"
+        if head[:2] == b"MZ" and b"\x00" in head[2:64]:
+            return ".exe"
+        # PDF 规范允许文件头之前有少量其他数据（如二进制的封装头），
+        # 之前是文本时是提到 %PDF- 的文本文件（如 Markdown 笔记），不按 PDF 处理
+        offset = head.find(b"%PDF-", 0, 1024)
+        if offset > 0 and not cls._is_text(head[:offset]):
+            return ".pdf"
+        return None
+    
+    @classmethod
+    def detect(
+        cls,
+        head: bytes,
+        filename: Optional[str] = None,
+        content_type: Optional[str] = None,
+    ) -> DetectedFileType:
+        """
+        识别文件类型
+        
+        Args:
+            head: 文件开头的字节（最多 SNIFF_BYTES）
+            filename: 上传的文件名
+            content_type: 客户端声明的 Content-Type（沿用文件名扩展名时记录）
+        
+        Returns:
+            DetectedFileType: 识别出的扩展名和类型
+        """
+        declared = Path(filename or "").suffix.lower()
+        detected = cls._match_signature(head)
+        
+        if detected is None:
+            if not head or declared not in cls._signature_suffixes():
+                # 纯文本格式、空文件及其他无法识别的格式沿用文件名扩展名
+                return DetectedFileType(
+                    declared,
+                    content_type or mimetypes.guess_type(f"file{declared}")[0] or "application/octet-stream",
+                )
+            if b"\x00" in head:
+                detected = ".bin"
+            elif cls.HTML_PATTERN.match(head.lstrip(b"\xef\xbb\xbf")):
+                detected = ".html"
+            else:
+                detected = ".txt"
+        elif declared in cls.ALIASES.get(detected, ()):
+            detected = declared
+        elif detected == ".ole":
+            # 扩展名不是 Office 文档的 OLE2 容器（Outlook 邮件、Visio、Publisher 等）无法转换
+            detected = ".doc" if declared in cls.OLE2_OFFICE_SUFFIXES else ".ole"
+        elif detected == ".zip":
+            detected = next((suffix for marker, suffix in cls.ZIP_MARKERS if marker in head), ".zip")
+        
+        if detected != declared:
+            logger.info(f"文件内容与扩展名不符: {filename} 识别为 {detected}")
+        mime_type = (
+            cls.MIME_TYPES.get(detected)
+            or mimetypes.guess_type(f"file{detected}")[0]
+            or "application/octet-stream"
+        )
+        return DetectedFileType(detected, mime_type, sniffed=True)
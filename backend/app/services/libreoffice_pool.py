@@ -0,0 +1,443 @@
+from functools import lru_cache
+from pathlib import Path
+from typing import List, Optional
+import logging
+import os
+import queue
+import shutil
+import subprocess
+import threading
+import time
+
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+# UNO 是 LibreOffice 自带的 Python 绑定，通常只有系统 Python 或 LibreOffice 自带的 Python 可以导入（如 python3-uno 包）。
+# 当前 Python 可以导入时在进程内连接常驻进程；否则由能导入 uno 的 Python 运行 UNO 客户端脚本连接常驻进程。
+try:
+    import uno  # noqa: F401
+    UNO_AVAILABLE = True
+except ImportError:
+    UNO_AVAILABLE = False
+
+from app.services import libreoffice_uno_client
+
+MODE_UNO = "uno"  # 常驻进程，当前进程内 UNO 连接
+MODE_CLIENT = "client"  # 常驻进程，子进程 UNO 客户端
+MODE_ONESHOT = "oneshot"  # 每个任务启动一次性 soffice 进程（需配置 LIBREOFFICE_ONESHOT_FALLBACK）
+
+UNO_CLIENT_SCRIPT = Path(libreoffice_uno_client.__file__).resolve()
+UNO_CLIENT_CONNECT_TIMEOUT = 10  # 转换时 UNO 客户端连接常驻进程的超时时间（秒）
+
+
+class _OfficeWorker:
+    """
+    单个 LibreOffice 工作进程
+    
+    每个工作进程使用独立的 -env:UserInstallation 用户配置目录，互不抢占配置锁。
+    """
+    
+    def __init__(
+        self,
+        index: int,
+        soffice_path: str,
+        profile_root: Path,
+        mode: str,
+        uno_python: Optional[str] = None,
+    ):
+        self.index = index
+        self.soffice_path = soffice_path
+        self.mode = mode
+        self.uno_python = uno_python
+        self.profile_dir = profile_root / f"{os.getpid()}_{index}"
+        self.pipe_name = f"documents_collecting_{os.getpid()}_{index}"
+        self.process: Optional[subprocess.Popen] = None
+        self.desktop = None
+        self.jobs = 0
+    
+    @property
+    def profile_url(self) -> str:
+        return self.profile_dir.resolve().as_uri()
+    
+    def is_alive(self) -> bool:
+        """健康检查：进程仍在运行"""
+        return self.process is not None and self.process.poll() is None
+    
+    def start(self) -> None:
+        """启动常驻 LibreOffice 进程并确认 UNO 管道可以连接"""
+        self.profile_dir.mkdir(parents=True, exist_ok=True)
+        self.jobs = 0
+        if self.mode == MODE_ONESHOT:
+            return
+        
+        self.process = subprocess.Popen(
+            [
+                self.soffice_path,
+                f"-env:UserInstallation={self.profile_url}",
+                "--headless",
+                "--invisible",
+                "--nologo",
+                "--nodefault",
+                "--norestore",
+                "--nolockcheck",
+                f"--accept=pipe,name={self.pipe_name};urp;StarOffice.ComponentContext",
+            ],
+            stdout=subprocess.DEVNULL,
+            stderr=subprocess.DEVNULL,
+        )
+        
+        if self.mode == MODE_UNO:
+            try:
+                self.desktop = libreoffice_uno_client.connect(
+                    self.pipe_name, settings.LIBREOFFICE_START_TIMEOUT, self.is_alive
+                )
+            except ConnectionError:
+                self.stop()
+                raise RuntimeError(f"LibreOffice 工作进程 {self.index} 启动失败")
+        else:
+            self._wait_for_pipe()
+        logger.info(f"LibreOffice 工作进程 {self.index} 已启动 (pid={self.process.pid})")
+    
+    def _wait_for_pipe(self) -> None:
+        """通过 UNO 客户端确认管道可以连接（进程启动期间重试）"""
+        deadline = time.monotonic() + settings.LIBREOFFICE_START_TIMEOUT
+        while True:
+            try:
+                result = subprocess.run(
+                    [str(self.uno_python), str(UNO_CLIENT_SCRIPT), "--pipe", self.pipe_name,
+                     "--connect-timeout", "1", "--ping"],
+                    capture_output=True,
+                    text=True,
+                    timeout=settings.LIBREOFFICE_START_TIMEOUT,
+                )
+                if result.returncode == libreoffice_uno_client.EXIT_OK:
+                    return
+            except subprocess.TimeoutExpired:
+                pass
+            if not self.is_alive() or time.monotonic() > deadline:
+                self.stop()
+                raise RuntimeError(f"LibreOffice 工作进程 {self.index} 启动失败")
+            time.sleep(0.2)
+    
+    def stop(self) -> None:
+        """停止工作进程"""
+        self.desktop = None
+        if self.process is not None:
+            if self.process.poll() is None:
+                self.process.terminate()
+                try:
+                    self.process.wait(timeout=10)
+                except subprocess.TimeoutExpired:
+                    self.process.kill()
+                    self.process.wait()
+            self.process = None
+    
+    def ensure_ready(self) -> None:
+        """确保工作进程可用：崩溃或处理任务数达到上限时回收重启"""
+        if self.mode == MODE_ONESHOT:
+            if not self.profile_dir.exists():
+                self.start()
+            return
+        
+        if self.is_alive() and self.jobs < settings.LIBREOFFICE_MAX_JOBS_PER_WORKER:
+            return
+        
+        if self.process is not None:
+            logger.info(f"回收 LibreOffice 工作进程 {self.index} (已处理 {self.jobs} 个任务)")
+        self.stop()
+        self.start()
+    
+    def convert(self, file_path: Path, output_dir: Path, timeout: int) -> Optional[Path]:
+        """
+        转换单个文档
+        
+        Returns:
+            Path: 生成的 PDF 文件路径，失败返回 None
+        """
+        self.jobs += 1
+        if self.mode == MODE_UNO:
+            return self._convert_via_uno(file_path, output_dir, timeout)
+        if self.mode == MODE_CLIENT:
+            return self._convert_via_client(file_path, output_dir, timeout)
+        return self._convert_via_cli(file_path, output_dir, timeout)
+    
+    def _convert_via_uno(self, file_path: Path, output_dir: Path, timeout: int) -> Optional[Path]:
+        """通过 UNO 管道在常驻进程中转换（当前进程内连接）"""
+        pdf_path = output_dir / f"{file_path.stem}.pdf"
+        temp_path = output_dir / f".{file_path.stem}.{self.index}.pdf.part"
+        
+        # 超时由看门狗终止进程，阻塞中的 UNO 调用随之抛出异常
+        timed_out = threading.Event()
+        
+        def kill():
+            timed_out.set()
+            self.stop()
+        
+        watchdog = threading.Timer(timeout, kill)
+        watchdog.start()
+        try:
+            libreoffice_uno_client.export_pdf(
+                self.desktop, str(file_path.resolve()), str(temp_path.resolve())
+            )
+            os.replace(temp_path, pdf_path)
+            logger.info(f"Office 文档转 PDF 成功: {file_path} -> {pdf_path} (worker={self.index})")
+            return pdf_path
+        except libreoffice_uno_client.DocumentLoadError:
+            logger.error(f"LibreOffice 无法打开文档: {file_path}")
+            return None
+        except Exception as e:
+            if timed_out.is_set():
+                logger.error(f"LibreOffice 转换超时: {file_path}")
+            else:
+                logger.error(f"LibreOffice 转换失败 (worker={self.index}): {str(e)}")
+                # 连接异常时进程状态不可信，下次使用前重启
+                self.stop()
+            return None
+        finally:
+            watchdog.cancel()
+            if temp_path.exists():
+                temp_path.unlink()
+    
+    def _convert_via_client(self, file_path: Path, output_dir: Path, timeout: int) -> Optional[Path]:
+        """通过 UNO 客户端子进程在常驻进程中转换"""
+        pdf_path = output_dir / f"{file_path.stem}.pdf"
+        temp_path = output_dir / f".{file_path.stem}.{self.index}.pdf.part"
+        try:
+            try:
+                result = subprocess.run(
+                    [
+                        str(self.uno_python), str(UNO_CLIENT_SCRIPT),
+                        "--pipe", self.pipe_name,
+                        "--connect-timeout", str(UNO_CLIENT_CONNECT_TIMEOUT),
+                        str(file_path.resolve()), str(temp_path.resolve()),
+                    ],
+                    capture_output=True,
+                    text=True,
+                    timeout=timeout,
+                )
+            except subprocess.TimeoutExpired:
+                # 常驻进程可能卡在该文档上，结束后下次使用前重启
+                logger.error(f"LibreOffice 转换超时: {file_path}")
+                self.stop()
+                return None
+            
+            if result.returncode == libreoffice_uno_client.EXIT_LOAD_FAILED:
+                logger.error(f"LibreOffice 无法打开文档: {file_path}")
+                return None
+            if result.returncode != libreoffice_uno_client.EXIT_OK:
+                logger.error(f"LibreOffice 转换失败 (worker={self.index}): {result.stderr.strip()}")
+                # 连接异常时进程状态不可信，下次使用前重启
+                self.stop()
+                return None
+            
+            os.replace(temp_path, pdf_path)
+            logger.info(f"Office 文档转 PDF 成功: {file_path} -> {pdf_path} (worker={self.index})")
+            return pdf_path
+        finally:
+            if temp_path.exists():
+                temp_path.unlink()
+    
+    def _convert_via_cli(self, file_path: Path, output_dir: Path, timeout: int) -> Optional[Path]:
+        """启动一次性 soffice 进程转换（使用本工作进程的独立用户配置目录）"""
+        try:
+            result = subprocess.run(
+                [
+                    self.soffice_path,
+                    f"-env:UserInstallation={self.profile_url}",
+                    '--headless',
+                    '--convert-to', 'pdf',
+                    '--outdir', str(output_dir),
+                    str(file_path)
+                ],
+                capture_output=True,
+                text=True,
+                timeout=timeout,
+            )
+        except subprocess.TimeoutExpired:
+            logger.error(f"LibreOffice 转换超时: {file_path}")
+            return None
+        
+        if result.returncode != 0:
+            logger.error(f"LibreOffice 转换失败: {result.stderr}")
+            if result.stdout:
+                logger.debug(f"LibreOffice 输出: {result.stdout}")
+            return None
+        
+        # LibreOffice 生成的 PDF 文件名
+        pdf_path = output_dir / f"{file_path.stem}.pdf"
+        if not pdf_path.exists():
+            logger.error(f"PDF 文件未生成: {pdf_path}")
+            return None
+        
+        logger.info(f"Office 文档转 PDF 成功: {file_path} -> {pdf_path} (worker={self.index})")
+        return pdf_path
+
+
+class LibreOfficePool:
+    """
+    LibreOffice 转换工作进程池
+    
+    池中每个工作进程同一时间只处理一个任务，并发转换数等于池大小（LIBREOFFICE_POOL_SIZE）。
+    工作进程按需启动，崩溃后或处理 LIBREOFFICE_MAX_JOBS_PER_WORKER 个任务后自动重启。
+    """
+    
+    def __init__(self, soffice_path: str, size: int):
+        self.soffice_path = soffice_path
+        self.size = size
+        self.mode = get_libreoffice_mode(soffice_path)
+        if self.mode is None:
+            raise RuntimeError("LibreOffice 不可用：未找到可以导入 uno 的 Python")
+        uno_python = find_uno_python(soffice_path) if self.mode == MODE_CLIENT else None
+        self._workers: List[_OfficeWorker] = [
+            _OfficeWorker(index, soffice_path, settings.libreoffice_profile_dir_path, self.mode, uno_python)
+            for index in range(size)
+        ]
+        self._idle: "queue.Queue[_OfficeWorker]" = queue.Queue()
+        for worker in self._workers:
+            self._idle.put(worker)
+        
+        mode = {
+            MODE_UNO: "常驻进程（进程内 UNO 连接）",
+            MODE_CLIENT: f"常驻进程（UNO 客户端: {uno_python}）",
+            MODE_ONESHOT: "一次性进程（LIBREOFFICE_ONESHOT_FALLBACK）",
+        }[self.mode]
+        logger.info(f"LibreOffice 进程池已创建: size={size}, 模式={mode}")
+    
+    def convert(
+        self,
+        file_path: Path,
+        output_dir: Path,
+        timeout: Optional[int] = None,
+    ) -> Optional[Path]:
+        """
+        转换 Office 文档为 PDF（阻塞直到有空闲工作进程）
+        
+        Args:
+            file_path: Office 文档路径
+            output_dir: 输出目录
+            timeout: 超时时间（秒，默认 LIBREOFFICE_TIMEOUT）
+        
+        Returns:
+            Path: 生成的 PDF 文件路径，失败返回 None
+        """
+        if timeout is None:
+            timeout = settings.LIBREOFFICE_TIMEOUT
+        
+        worker = self._idle.get()
+        try:
+            worker.ensure_ready()
+            return worker.convert(file_path, output_dir, timeout)
+        except Exception as e:
+            logger.error(f"Office 文档转 PDF 失败: {str(e)}", exc_info=True)
+            worker.stop()
+            return None
+        finally:
+            self._idle.put(worker)
+    
+    def shutdown(self) -> None:
+        """停止所有工作进程并删除用户配置目录"""
+        for worker in self._workers:
+            worker.stop()
+            shutil.rmtree(worker.profile_dir, ignore_errors=True)
+
+
+_pool: Optional[LibreOfficePool] = None
+_pool_lock = threading.Lock()
+
+
+@lru_cache(maxsize=None)
+def get_libreoffice_version(soffice_path: str) -> str:
+    """获取 LibreOffice 版本号（用于转换结果缓存键），获取失败返回 unknown"""
+    try:
+        result = subprocess.run(
+            [soffice_path, "--version"],
+            capture_output=True,
+            text=True,
+            timeout=settings.LIBREOFFICE_START_TIMEOUT,
+        )
+        version = result.stdout.strip()
+        if result.returncode == 0 and version:
+            return version
+    except (OSError, subprocess.TimeoutExpired) as e:
+        logger.warning(f"获取 LibreOffice 版本失败: {str(e)}")
+    return "unknown"
+
+
+@lru_cache(maxsize=None)
+def find_uno_python(soffice_path: str) -> Optional[str]:
+    """
+    查找可以导入 uno 的 Python 解释器（在子进程中运行 UNO 客户端）
+    
+    依次尝试 LIBREOFFICE_UNO_PYTHON、LibreOffice 自带的 Python（soffice 所在目录）和 PATH 中的 python3。
+    
+    Returns:
+        str: 解释器路径，都不可用返回 None
+    """
+    program_dir = Path(soffice_path).resolve().parent
+    candidates = [
+        settings.LIBREOFFICE_UNO_PYTHON,
+        str(program_dir / "python.exe"),  # Windows
+        str(program_dir / "python"),  # Linux 官方安装包
+        str(program_dir.parent / "Resources" / "python"),  # macOS
+        shutil.which("python3"),
+    ]
+    for candidate in candidates:
+        if not candidate or not Path(candidate).exists():
+            continue
+        try:
+            result = subprocess.run(
+                [candidate, "-c", "import uno"],
+                capture_output=True,
+                timeout=settings.LIBREOFFICE_START_TIMEOUT,
+            )
+        except (OSError, subprocess.TimeoutExpired):
+            continue
+        if result.returncode == 0:
+            logger.info(f"使用 {candidate} 运行 LibreOffice UNO 客户端")
+            return candidate
+    
+    if settings.LIBREOFFICE_UNO_PYTHON:
+        logger.warning(f"配置的 LIBREOFFICE_UNO_PYTHON 无法导入 uno: {settings.LIBREOFFICE_UNO_PYTHON}")
+    return None
+
+
+@lru_cache(maxsize=None)
+def get_libreoffice_mode(soffice_path: str) -> Optional[str]:
+    """
+    确定 LibreOffice 工作进程的运行方式
+    
+    Returns:
+        str: MODE_UNO / MODE_CLIENT / MODE_ONESHOT，没有可用方式时返回 None（Office 文档转换不可用）
+    """
+    if UNO_AVAILABLE:
+        return MODE_UNO
+    if find_uno_python(soffice_path):
+        return MODE_CLIENT
+    if settings.LIBREOFFICE_ONESHOT_FALLBACK:
+        logger.warning("未找到可以导入 uno 的 Python，按 LIBREOFFICE_ONESHOT_FALLBACK 配置每个任务启动一次性 soffice 进程")
+        return MODE_ONESHOT
+    logger.error(
+        "未找到可以导入 uno 的 Python，Office 文档转换不可用："
+        "请安装 LibreOffice 的 Python 绑定（如 python3-uno）或配置 LIBREOFFICE_UNO_PYTHON；"
+        "确需每个任务启动一次性 soffice 进程时设置 LIBREOFFICE_ONESHOT_FALLBACK=true"
+    )
+    return None
+
+
+def get_libreoffice_pool(soffice_path: str) -> LibreOfficePool:
+    """获取全局 LibreOffice 进程池（首次调用时创建）"""
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = LibreOfficePool(soffice_path, settings.LIBREOFFICE_POOL_SIZE)
+        return _pool
+
+
+def shutdown_libreoffice_pool() -> None:
+    """关闭全局 LibreOffice 进程池"""
+    global _pool
+    with _pool_lock:
+        if _pool is not None:
+            _pool.shutdown()
+            _pool = None
@@ -0,0 +1,139 @@
+"""
+LibreOffice UNO 客户端
+
+连接常驻 LibreOffice 进程的 UNO 管道并把文档导出为 PDF。
+既被 libreoffice_pool 在进程内调用（当前 Python 可以导入 uno 时），
+也作为独立脚本由能导入 uno 的 Python（LibreOffice 自带的 Python 或安装了 python3-uno 的系统 Python）执行，
+因此只依赖标准库和 uno，不导入 app 包。
+
+脚本用法:
+    python libreoffice_uno_client.py --pipe <管道名> [--connect-timeout <秒>] [--ping] [<源文件> <输出文件>]
+
+退出码: 0 成功；2 文档无法打开；3 无法连接工作进程；1 其他错误（工作进程状态不可信）
+"""
+import argparse
+import sys
+import time
+
+EXIT_OK = 0
+EXIT_ERROR = 1
+EXIT_LOAD_FAILED = 2
+EXIT_CONNECT_FAILED = 3
+
+# 按文档类型选择 PDF 导出过滤器
+PDF_EXPORT_FILTERS = [
+    ("com.sun.star.text.GenericTextDocument", "writer_pdf_Export"),
+    ("com.sun.star.sheet.SpreadsheetDocument", "calc_pdf_Export"),
+    ("com.sun.star.presentation.PresentationDocument", "impress_pdf_Export"),
+    ("com.sun.star.drawing.DrawingDocument", "draw_pdf_Export"),
+]
+
+
+class DocumentLoadError(Exception):
+    """LibreOffice 无法打开文档"""
+
+
+def _property(name: str, value):
+    from com.sun.star.beans import PropertyValue
+    
+    prop = PropertyValue()
+    prop.Name = name
+    prop.Value = value
+    return prop
+
+
+def connect(pipe_name: str, timeout: float, is_alive=None):
+    """
+    连接工作进程的 UNO 管道（进程启动期间重试），返回 Desktop 对象
+    
+    Args:
+        pipe_name: 管道名
+        timeout: 连接超时时间（秒）
+        is_alive: 可选的进程存活检查，进程退出后立即放弃
+    
+    Raises:
+        ConnectionError: 超时或进程已退出
+    """
+    import uno
+    
+    local_context = uno.getComponentContext()
+    resolver = local_context.ServiceManager.createInstanceWithContext(
+        "com.sun.star.bridge.UnoUrlResolver", local_context
+    )
+    deadline = time.monotonic() + timeout
+    while True:
+        try:
+            context = resolver.resolve(f"uno:pipe,name={pipe_name};urp;StarOffice.ComponentContext")
+            break
+        except Exception:
+            if (is_alive is not None and not is_alive()) or time.monotonic() > deadline:
+                raise ConnectionError(f"无法连接 LibreOffice 管道: {pipe_name}")
+            time.sleep(0.2)
+    
+    return context.ServiceManager.createInstanceWithContext("com.sun.star.frame.Desktop", context)
+
+
+def export_pdf(desktop, source_path: str, target_path: str) -> None:
+    """
+    打开文档并导出为 PDF（路径为绝对路径）
+    
+    Raises:
+        DocumentLoadError: 文档无法打开
+    """
+    import uno
+    
+    document = desktop.loadComponentFromURL(
+        uno.systemPathToFileUrl(source_path),
+        "_blank",
+        0,
+        (_property("Hidden", True), _property("ReadOnly", True)),
+    )
+    if document is None:
+        raise DocumentLoadError(source_path)
+    
+    try:
+        export_filter = "writer_pdf_Export"
+        for service, filter_name in PDF_EXPORT_FILTERS:
+            if document.supportsService(service):
+                export_filter = filter_name
+                break
+        document.storeToURL(
+            uno.systemPathToFileUrl(target_path),
+            (_property("FilterName", export_filter),),
+        )
+    finally:
+        document.close(True)
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="通过常驻 LibreOffice 进程把文档导出为 PDF")
+    parser.add_argument("--pipe", required=True)
+    parser.add_argument("--connect-timeout", type=float, default=10)
+    parser.add_argument("--ping", action="store_true", help="只检查能否连接")
+    parser.add_argument("source", nargs="?")
+    parser.add_argument("target", nargs="?")
+    args = parser.parse_args(argv)
+    
+    try:
+        desktop = connect(args.pipe, args.connect_timeout)
+    except ConnectionError as e:
+        print(str(e), file=sys.stderr)
+        return EXIT_CONNECT_FAILED
+    if args.ping:
+        return EXIT_OK
+    if not args.source or not args.target:
+        parser.error("缺少源文件或输出文件")
+    
+    try:
+        export_pdf(desktop, args.source, args.target)
+    except DocumentLoadError:
+        print(f"LibreOffice 无法打开文档: {args.source}", file=sys.stderr)
+        return EXIT_LOAD_FAILED
+    except Exception as e:
+        print(f"{type(e).__name__}: {e}", file=sys.stderr)
+        return EXIT_ERROR
+    return EXIT_OK
+
+
+if __name__ == "__main__":
+    sys.exit(main())
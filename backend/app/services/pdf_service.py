@@ -1,97 +1,156 @@
 from sqlalchemy.orm import Session
+from dataclasses import dataclass
 from pathlib import Path
-from datetime import datetime
-from typing import List, Optional, Dict
-import subprocess
+from typing import Any, Callable, List, Optional, Dict, Set, Tuple
 import logging
 import asyncio
+import io
+import math
 import os
 import shutil
 
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+
 import fitz  # PyMuPDF
 from PIL import Image
 
 from app.core.config import settings
-from app.core.exceptions import PDFGenerationError, DocumentNotFoundError
+from app.core.exceptions import (
+    BaseAPIException,
+    CompilationTooLargeError,
+    DocumentsNotFoundError,
+    EmptyDocumentSelectionError,
+    InvalidPageRangeError,
+    PDFGenerationError,
+)
 from app.repositories.document_repository import DocumentRepository
+from app.schemas.pdf import CompilationEstimate, DocumentSelector
+from app.services.compilation_cache import CompilationCache
+from app.services.conversion_cache import ConversionCache
+from app.services.conversion_scheduler import CONVERTER_IMAGE, get_conversion_scheduler
+from app.services.converters import Converter, get_converter_registry
+from app.services.file_lru import existing_paths
+from app.services.pdf_stamper import PDFStamper
+from app.services.process_pool import run_cpu_bound
 
 logger = logging.getLogger(__name__)
 
 
+@dataclass(frozen=True)
+class OutputProfile:
+    """汇编结果的输出配置"""
+    
+    garbage: int  # 垃圾回收级别：3-清理并合并重复对象，4-同时合并内容相同的流（字体、图标等共享资源）
+    deflate: bool = True  # 压缩未压缩的流
+    deflate_images: bool = False  # 压缩未压缩的图片流
+    deflate_fonts: bool = False  # 压缩未压缩的字体流
+    max_image_dpi: Optional[int] = None  # 图片降采样的目标分辨率，None 表示保留原图
+    jpeg_quality: int = 85  # 降采样后图片的 JPEG 质量
+    
+    @property
+    def save_options(self) -> Dict[str, Any]:
+        """fitz.Document.save 参数"""
+        return {
+            "garbage": self.garbage,
+            "deflate": self.deflate,
+            "deflate_images": self.deflate_images,
+            "deflate_fonts": self.deflate_fonts,
+        }
+
+
+# 汇编输出配置：archive-存档（无损），screen-屏幕阅读，email-邮件发送（体积最小）
+OUTPUT_PROFILES: Dict[str, OutputProfile] = {
+    "archive": OutputProfile(garbage=3),
+    "screen": OutputProfile(
+        garbage=4, deflate_images=True, deflate_fonts=True, max_image_dpi=150, jpeg_quality=75
+    ),
+    "email": OutputProfile(
+        garbage=4, deflate_images=True, deflate_fonts=True, max_image_dpi=96, jpeg_quality=60
+    ),
+}
+DEFAULT_OUTPUT_PROFILE = "archive"
+
+# ioctl FICLONE（linux/fs.h）：在 btrfs、XFS 等文件系统上创建写时复制副本
+_FICLONE = 0x40049409
+
+
+def _clone_file(source: Path, target: Path) -> None:
+    """
+    复制文件，优先不复制数据
+    
+    依次尝试：写时复制克隆（reflink，只复制元数据）、copy_file_range（内核内复制，
+    部分文件系统和 NFS 上由服务端完成），最后退回普通复制。
+    """
+    with open(source, "rb") as src, open(target, "wb") as dst:
+        if fcntl is not None:
+            try:
+                fcntl.ioctl(dst.fileno(), _FICLONE, src.fileno())
+                return
+            except OSError:
+                pass
+        
+        if hasattr(os, "copy_file_range"):
+            try:
+                remaining = os.fstat(src.fileno()).st_size
+                while remaining > 0:
+                    copied = os.copy_file_range(src.fileno(), dst.fileno(), remaining)
+                    if copied == 0:
+                        break
+                    remaining -= copied
+                if remaining == 0:
+                    return
+            except OSError:
+                pass
+            os.lseek(src.fileno(), 0, os.SEEK_SET)
+            os.lseek(dst.fileno(), 0, os.SEEK_SET)
+            os.ftruncate(dst.fileno(), 0)
+        
+        shutil.copyfileobj(src, dst)
+
+
 class PDFService:
     """PDF 服务类"""
     
-    # 支持的图片格式
-    SUPPORTED_IMAGE_FORMATS = {'.jpg', '.jpeg', '.png', '.gif', '.bmp', '.tiff', '.tif', '.webp'}
-    # 支持的 Office 文档格式（需要 LibreOffice）
-    SUPPORTED_OFFICE_FORMATS = {'.doc', '.docx', '.xls', '.xlsx', '.ppt', '.pptx', '.odt', '.ods', '.odp', '.rtf'}
+    @classmethod
+    def get_converter_class(cls, file_path: Path) -> Optional[str]:
+        """获取文件对应的转换器类型（text / image / office），无需或无法转换时返回 None"""
+        if file_path.suffix.lower() == '.pdf':
+            return None
+        return get_converter_registry().converter_class(file_path.suffix)
     
-    def __init__(self, db: Session):
-        self.repository = DocumentRepository(db)
-        self.db = db
-        self._libreoffice_path = None  # 缓存 LibreOffice 路径
+    @classmethod
+    def is_supported_suffix(cls, suffix: str) -> bool:
+        """判断该扩展名的文件能否用于汇编（本身是 PDF 或有对应的转换器）"""
+        return suffix.lower() == '.pdf' or get_converter_registry().converter_class(suffix) is not None
+    
+    @classmethod
+    def needs_conversion(cls, file_path: Path) -> bool:
+        """判断文件是否需要（且能够）转换为 PDF"""
+        return cls.get_converter_class(file_path) is not None
     
-    def _find_libreoffice_path(self) -> Optional[str]:
+    @staticmethod
+    def count_pages(pdf_path: Path) -> Optional[int]:
         """
-        查找 LibreOffice 可执行文件路径
+        读取 PDF 页数（只解析交叉引用表和页面树，不渲染页面）
+        
+        入库和转换完成时记录到文档中，汇编预估直接使用，不必再打开 PDF。
         
         Returns:
-            str: LibreOffice 可执行文件路径，如果未找到返回 None
-        """
-        # 如果已缓存，直接返回
-        if self._libreoffice_path:
-            return self._libreoffice_path
-        
-        # 如果配置中指定了路径，使用配置的路径
-        if settings.LIBREOFFICE_PATH:
-            path = Path(settings.LIBREOFFICE_PATH)
-            if path.exists():
-                self._libreoffice_path = str(path)
-                logger.info(f"使用配置的 LibreOffice 路径: {self._libreoffice_path}")
-                return self._libreoffice_path
-            else:
-                logger.warning(f"配置的 LibreOffice 路径不存在: {settings.LIBREOFFICE_PATH}")
-        
-        # 尝试在 PATH 中查找
-        libreoffice_cmd = shutil.which('libreoffice')
-        if libreoffice_cmd:
-            self._libreoffice_path = libreoffice_cmd
-            logger.info(f"在 PATH 中找到 LibreOffice: {self._libreoffice_path}")
-            return self._libreoffice_path
-        
-        # Windows 上尝试常见安装路径
-        if os.name == 'nt':  # Windows
-            common_paths = [
-                r"C:\Program Files\LibreOffice\program\soffice.exe",
-                r"C:\Program Files (x86)\LibreOffice\program\soffice.exe",
-                r"C:\Program Files\LibreOffice 7\program\soffice.exe",
-                r"C:\Program Files (x86)\LibreOffice 7\program\soffice.exe",
-            ]
-            
-            for path_str in common_paths:
-                path = Path(path_str)
-                if path.exists():
-                    self._libreoffice_path = str(path)
-                    logger.info(f"在常见路径找到 LibreOffice: {self._libreoffice_path}")
-                    return self._libreoffice_path
-        
-        # Linux/macOS 上尝试其他可能的位置
-        else:
-            common_paths = [
-                "/usr/bin/libreoffice",
-                "/usr/local/bin/libreoffice",
-                "/Applications/LibreOffice.app/Contents/MacOS/soffice",  # macOS
-            ]
-            
-            for path_str in common_paths:
-                path = Path(path_str)
-                if path.exists():
-                    self._libreoffice_path = str(path)
-                    logger.info(f"在常见路径找到 LibreOffice: {self._libreoffice_path}")
-                    return self._libreoffice_path
-        
-        logger.error("未找到 LibreOffice，请安装 LibreOffice 或在配置中指定路径")
-        return None
+            Optional[int]: 页数，文件无法解析时返回 None
+        """
+        try:
+            with fitz.open(str(pdf_path)) as doc:
+                return doc.page_count
+        except Exception as e:
+            logger.warning(f"读取 PDF 页数失败 ({pdf_path}): {e}")
+            return None
+    
+    def __init__(self, db: Session):
+        self.repository = DocumentRepository(db)
+        self.db = db
     
     async def convert_to_pdf(
         self,
@@ -101,10 +160,14 @@ class PDFService:
         """
         将文件转换为 PDF
         
+        按转换器注册表的优先级依次尝试可用的转换器（进程内转换器优先，LibreOffice 作为后备），
+        转换在转换器开销类别对应的线程池中执行，PyMuPDF / Pillow 转换器再交给 PDF 处理进程池。
+        转换结果按源文件内容和转换器版本缓存，相同内容再次转换时直接返回已有结果。
+        
         Args:
             file_path: 源文件路径
-            output_dir: PDF 输出目录（默认使用配置的 PDF 输出目录）
-            
+            output_dir: PDF 输出目录，即转换结果缓存目录（默认使用配置的 PDF 输出目录）
+        
         Returns:
             Path: 生成的 PDF 文件路径，转换失败返回 None
         """
@@ -117,223 +180,467 @@ class PDFService:
             if file_path.suffix.lower() == '.pdf':
                 return file_path
             
-            # 确定输出目录
-            if output_dir is None:
-                output_dir = settings.pdf_output_dir_path
-            output_dir.mkdir(parents=True, exist_ok=True)
+            loop = asyncio.get_event_loop()
             
-            # 生成输出文件名
-            pdf_filename = f"{file_path.stem}.pdf"
-            output_path = output_dir / pdf_filename
+            # 根据文件类型选择转换器（首次调用时探测转换器，可能需要启动 LibreOffice）
+            candidates = await loop.run_in_executor(
+                None, get_converter_registry().candidates, file_path.suffix
+            )
+            if not candidates:
+                logger.warning(f"不支持的文件格式或转换器不可用: {file_path.suffix.lower()}")
+                return None
             
-            # 根据文件类型选择转换方法
-            file_ext = file_path.suffix.lower()
+            cache = ConversionCache(self.db, output_dir)
+            source_hash = await loop.run_in_executor(None, cache.source_hash, file_path)
             
-            if file_ext in self.SUPPORTED_IMAGE_FORMATS:
-                # 图片转 PDF
-                return await self._convert_image_to_pdf(file_path, output_path)
-            elif file_ext in self.SUPPORTED_OFFICE_FORMATS:
-                # Office 文档转 PDF（使用 LibreOffice）
-                return await self._convert_office_to_pdf(file_path, output_dir)
-            else:
-                logger.warning(f"不支持的文件格式: {file_ext}")
-                return None
+            for converter, converter_version in candidates:
+                # 查找转换结果缓存（输出目录即缓存目录）
+                cache_key = cache.make_key(source_hash, "pdf", converter.name, converter_version)
+                cached_path = cache.get(cache_key)
+                if cached_path:
+                    return cached_path
                 
+                # 在独立的临时目录中转换，完成后移入缓存
+                staging_dir = cache.new_staging_dir()
+                try:
+                    scheduler = get_conversion_scheduler()
+                    pdf_path = await scheduler.run(
+                        converter.converter_class,
+                        self._run_converter,
+                        converter,
+                        file_path,
+                        staging_dir,
+                        scheduler.time_budget(converter.converter_class),
+                    )
+                    if pdf_path is not None:
+                        return cache.put(cache_key, pdf_path)
+                except Exception as e:
+                    logger.warning(f"转换器 {converter.name} 转换失败，尝试下一个转换器 ({file_path}): {str(e)}")
+                finally:
+                    cache.discard_staging_dir(staging_dir)
+            
+            logger.error(f"所有转换器均转换失败: {file_path}")
+            return None
+        
         except Exception as e:
             logger.error(f"PDF 转换失败 ({file_path}): {str(e)}", exc_info=True)
             return None
     
-    async def _convert_image_to_pdf(
+    @staticmethod
+    def _run_converter(
+        converter: Converter,
+        source_path: Path,
+        staging_dir: Path,
+        time_budget: int,
+    ) -> Optional[Path]:
+        """
+        执行转换器：CPU 密集的转换器在 PDF 处理进程中执行（超过时间预算时在工作进程中中止），
+        LibreOffice 等外部进程直接在调度线程中调用（由 LIBREOFFICE_TIMEOUT 结束超时的 soffice 进程）
+        """
+        if converter.cpu_bound:
+            return run_cpu_bound(converter.convert, source_path, staging_dir, timeout=time_budget)
+        return converter.convert(source_path, staging_dir)
+    
+    def add_header_to_pdf(
         self,
-        image_path: Path,
-        output_path: Path,
+        pdf_path: Path,
+        header_text: str,
+        output_path: Optional[Path] = None,
+        font_size: int = 10,
+        header_height: float = 50.0,
     ) -> Path:
         """
-        将图片转换为 PDF
+        给 PDF 添加页眉
         
         Args:
-            image_path: 图片文件路径
-            output_path: 输出 PDF 路径
-            
+            pdf_path: PDF 文件路径
+            header_text: 页眉文本
+            output_path: 输出路径（默认覆盖原文件）
+            font_size: 字体大小
+            header_height: 页眉高度
+        
         Returns:
-            Path: 生成的 PDF 文件路径
-        """
-        # 在线程池中执行，避免阻塞
-        loop = asyncio.get_event_loop()
-        return await loop.run_in_executor(
-            None,
-            self._convert_image_to_pdf_sync,
-            image_path,
-            output_path
+            Path: 输出 PDF 文件路径
+        """
+        return run_cpu_bound(
+            PDFService._add_header_sync, pdf_path, header_text, output_path, font_size, header_height
         )
     
-    def _convert_image_to_pdf_sync(
-        self,
-        image_path: Path,
-        output_path: Path,
+    @staticmethod
+    def _add_header_sync(
+        pdf_path: Path,
+        header_text: str,
+        output_path: Optional[Path],
+        font_size: int,
+        header_height: float,
     ) -> Path:
-        """同步版本的图片转 PDF"""
-        try:
-            # 使用 PyMuPDF 创建 PDF
-            doc = fitz.open()
-            
-            # 打开图片
-            img = Image.open(image_path)
-            
-            # 创建页面（使用图片尺寸）
-            page = doc.new_page(width=img.width, height=img.height)
-            
-            # 插入图片
-            rect = page.rect
-            page.insert_image(rect, filename=str(image_path))
-            
-            # 保存 PDF
+        """给 PDF 添加页眉（同步版本，在 PDF 处理进程中执行）"""
+        doc = fitz.open(str(pdf_path))
+        
+        with PDFStamper(doc, font_size=font_size, header_height=header_height) as stamper:
+            for page in doc:
+                stamper.stamp(page, header_text=header_text)
+        
+        if output_path is None or Path(output_path) == Path(pdf_path):
+            # 覆盖原文件只能增量保存
+            output_path = pdf_path
+            doc.saveIncr()
+        else:
             doc.save(str(output_path))
-            doc.close()
-            
-            logger.info(f"图片转 PDF 成功: {image_path} -> {output_path}")
-            return output_path
-        except Exception as e:
-            logger.error(f"图片转 PDF 失败: {str(e)}", exc_info=True)
-            raise
+        doc.close()
+        
+        return output_path
     
-    async def _convert_office_to_pdf(
-        self,
-        file_path: Path,
-        output_dir: Path,
-    ) -> Optional[Path]:
+    @staticmethod
+    def _downsample_images(
+        doc: fitz.Document,
+        max_dpi: int,
+        jpeg_quality: int,
+        start_page: int = 0,
+    ) -> int:
         """
-        使用 LibreOffice 将 Office 文档转换为 PDF
+        将显示分辨率高于 max_dpi 的图片降采样为 JPEG（同一图片对象只处理一次，所有引用页面同时生效）
+        
+        分辨率按图片在首次出现的页面上的显示尺寸计算。带透明蒙版的图片保持不变，
+        重新编码后没有变小的图片也保持不变。
         
         Args:
-            file_path: Office 文档路径
-            output_dir: 输出目录
-            
+            start_page: 只处理从该页（从0开始）开始的页面
+        
         Returns:
-            Path: 生成的 PDF 文件路径
-        """
-        # 在线程池中执行
-        loop = asyncio.get_event_loop()
-        return await loop.run_in_executor(
-            None,
-            self._convert_office_to_pdf_sync,
-            file_path,
-            output_dir
-        )
+            int: 替换的图片数
+        """
+        seen: Set[int] = set()
+        replaced = 0
+        for page in doc.pages(start_page):
+            for xref, smask, width, height, *_ in page.get_images(full=True):
+                if xref in seen:
+                    continue
+                seen.add(xref)
+                if smask:
+                    continue
+                
+                rects = page.get_image_rects(xref)
+                if not rects:
+                    continue
+                display_width = max(rect.width for rect in rects) / 72
+                display_height = max(rect.height for rect in rects) / 72
+                if display_width <= 0 or display_height <= 0:
+                    continue
+                
+                dpi = min(width / display_width, height / display_height)
+                if dpi <= max_dpi:
+                    continue
+                
+                scale = max_dpi / dpi
+                size = (max(int(width * scale), 1), max(int(height * scale), 1))
+                
+                pixmap = fitz.Pixmap(doc, xref)
+                if pixmap.colorspace is None or pixmap.colorspace.n not in (1, 3):
+                    pixmap = fitz.Pixmap(fitz.csRGB, pixmap)
+                if pixmap.alpha:
+                    pixmap = fitz.Pixmap(pixmap, 0)
+                
+                mode = "L" if pixmap.n == 1 else "RGB"
+                image = Image.frombytes(mode, (pixmap.width, pixmap.height), pixmap.samples)
+                image = image.resize(size, Image.LANCZOS)
+                buffer = io.BytesIO()
+                image.save(buffer, format="JPEG", quality=jpeg_quality, optimize=True)
+                
+                if buffer.tell() >= len(doc.xref_stream_raw(xref)):
+                    continue
+                page.replace_image(xref, stream=buffer.getvalue())
+                replaced += 1
+        
+        return replaced
     
-    def _convert_office_to_pdf_sync(
-        self,
-        file_path: Path,
-        output_dir: Path,
-    ) -> Optional[Path]:
-        """同步版本的 Office 文档转 PDF"""
-        try:
-            # 查找 LibreOffice 路径
-            libreoffice_path = self._find_libreoffice_path()
-            if not libreoffice_path:
-                logger.error("LibreOffice 未找到，无法转换 Office 文档")
-                return None
-            
-            # 调用 LibreOffice 命令行转换
-            result = subprocess.run(
-                [
-                    libreoffice_path,
-                    '--headless',
-                    '--convert-to', 'pdf',
-                    '--outdir', str(output_dir),
-                    str(file_path)
-                ],
-                capture_output=True,
-                text=True,
-                timeout=300  # 5分钟超时
+    @staticmethod
+    def _save_with_profile(doc: fitz.Document, output_path: Path, profile: str) -> None:
+        """按输出配置保存汇编结果（降采样图片，清理和合并重复对象，压缩流）"""
+        output_profile = OUTPUT_PROFILES[profile]
+        if output_profile.max_image_dpi:
+            replaced = PDFService._downsample_images(
+                doc, output_profile.max_image_dpi, output_profile.jpeg_quality
             )
-            
-            if result.returncode != 0:
-                logger.error(f"LibreOffice 转换失败: {result.stderr}")
-                if result.stdout:
-                    logger.debug(f"LibreOffice 输出: {result.stdout}")
-                return None
-            
-            # LibreOffice 生成的 PDF 文件名
-            pdf_path = output_dir / f"{file_path.stem}.pdf"
-            
-            if pdf_path.exists():
-                logger.info(f"Office 文档转 PDF 成功: {file_path} -> {pdf_path}")
-                return pdf_path
-            else:
-                logger.error(f"PDF 文件未生成: {pdf_path}")
-                return None
-                
-        except subprocess.TimeoutExpired:
-            logger.error(f"LibreOffice 转换超时: {file_path}")
-            return None
-        except FileNotFoundError:
-            logger.error("LibreOffice 可执行文件未找到")
-            return None
-        except Exception as e:
-            logger.error(f"Office 文档转 PDF 失败: {str(e)}", exc_info=True)
-            return None
+            if replaced:
+                logger.info(f"降采样 {replaced} 张图片至 {output_profile.max_image_dpi} DPI")
+        doc.save(str(output_path), **output_profile.save_options)
     
-    def add_header_to_pdf(
+    @staticmethod
+    def _page_span(
+        doc: fitz.Document,
+        title: str,
+        page_range: Optional[Tuple[int, Optional[int]]],
+    ) -> Tuple[int, int]:
+        """
+        将页码范围转换为 insert_pdf 使用的 (from_page, to_page)（从0开始，包含首尾页）
+        
+        Raises:
+            InvalidPageRangeError: 起始页超出文档页数时抛出
+        """
+        if page_range is None:
+            return 0, doc.page_count - 1
+        
+        first, last = page_range
+        if first > doc.page_count:
+            raise InvalidPageRangeError(title, first, last, doc.page_count)
+        return first - 1, min(last or doc.page_count, doc.page_count) - 1
+    
+    def compose_pdf(
         self,
-        pdf_path: Path,
-        header_text: str,
-        output_path: Optional[Path] = None,
-        font_size: int = 10,
-        header_height: float = 50.0,
+        sections: List[Tuple[Path, str, Optional[Tuple[int, Optional[int]]]]],
+        output_path: Path,
+        header_text: Optional[str] = None,
+        add_header: bool = False,
+        progress: Optional[Callable[[int, int], None]] = None,
+        profile: str = DEFAULT_OUTPUT_PROFILE,
+        watermark_text: Optional[str] = None,
     ) -> Path:
         """
-        给 PDF 添加页眉
+        单次处理完成汇编：合并、逐节添加页眉、生成书签，最后只保存一次
+        
+        所有操作都在内存中的同一个文档上完成，不会先写出合并结果再重新打开添加页眉。
+        指定页码范围的节只复制范围内的页面，书签指向该节实际插入的第一页。
         
         Args:
-            pdf_path: PDF 文件路径
-            header_text: 页眉文本
-            output_path: 输出路径（默认覆盖原文件）
-            font_size: 字体大小
-            header_height: 页眉高度
-            
+            sections: (PDF 文件路径, 书签标题, 页码范围) 列表，按汇编顺序排列；
+                页码范围为 (起始页, 结束页)，从1开始、包含首尾页，结束页为空表示到最后一页，
+                整个范围为 None 表示全部页面
+            output_path: 输出 PDF 路径
+            header_text: 页眉文本（为空时使用各节的书签标题）
+            add_header: 是否添加页眉
+            progress: 进度回调，每合并一节调用一次，参数为 (已合并节数, 已合并页数)
+            profile: 输出配置名称（OUTPUT_PROFILES）
+            watermark_text: 水印文本（为空时不加水印）
+        
         Returns:
             Path: 输出 PDF 文件路径
         """
-        doc = fitz.open(str(pdf_path))
+        return run_cpu_bound(
+            PDFService._compose_pdf_sync,
+            sections,
+            output_path,
+            header_text,
+            add_header,
+            profile,
+            watermark_text,
+            callbacks={"progress": progress},
+        )
+    
+    @staticmethod
+    def _compose_pdf_sync(
+        sections: List[Tuple[Path, str, Optional[Tuple[int, Optional[int]]]]],
+        output_path: Path,
+        header_text: Optional[str],
+        add_header: bool,
+        profile: str,
+        watermark_text: Optional[str],
+        progress: Optional[Callable[[int, int], None]] = None,
+    ) -> Path:
+        """单次处理完成汇编（同步版本，在 PDF 处理进程中执行）"""
+        composed = fitz.open()
+        # 页眉和水印只嵌入一次，各页面引用同一个叠加层
+        stamper = PDFStamper(composed)
+        toc = []
         
-        for page_num in range(len(doc)):
-            page = doc[page_num]
-            rect = page.rect
-            
-            # 创建页眉区域
-            header_rect = fitz.Rect(0, 0, rect.width, header_height)
+        try:
+            for index, (pdf_path, bookmark_title, page_range) in enumerate(sections, start=1):
+                if not pdf_path.exists():
+                    raise PDFGenerationError(f"文件不存在: {pdf_path}")
+                
+                start_page = composed.page_count
+                with fitz.open(str(pdf_path)) as doc:
+                    from_page, to_page = PDFService._page_span(doc, bookmark_title, page_range)
+                    composed.insert_pdf(doc, from_page=from_page, to_page=to_page)
+                
+                # 每节一个一级书签，指向该节第一页（页码从1开始）
+                toc.append([1, bookmark_title, start_page + 1])
+                
+                # 只给本节新插入的页面添加页眉和水印
+                if add_header or watermark_text:
+                    section_header = (header_text or bookmark_title) if add_header else None
+                    for page_number in range(start_page, composed.page_count):
+                        stamper.stamp(composed[page_number], section_header, watermark_text)
+                
+                if progress:
+                    progress(index, composed.page_count)
             
-            # 插入页眉文本（居中）
-            page.insert_text(
-                (rect.width / 2, header_height / 2),
-                header_text,
-                fontsize=font_size,
-                align=1,  # 1=居中
-                color=(0, 0, 0),  # 黑色
-            )
+            stamper.flush()
+            if toc:
+                composed.set_toc(toc)
             
-            # 可选：添加页眉分隔线
-            page.draw_line(
-                fitz.Point(0, header_height),
-                fitz.Point(rect.width, header_height),
-                color=(0.5, 0.5, 0.5),  # 灰色
-                width=0.5
-            )
+            PDFService._save_with_profile(composed, output_path, profile)
+        finally:
+            stamper.close()
+            composed.close()
         
-        if output_path is None:
-            output_path = pdf_path
+        return output_path
+    
+    def compose_volumes(
+        self,
+        sections: List[Tuple[Path, str, Optional[Tuple[int, Optional[int]]]]],
+        temp_path: Callable[[int], Path],
+        commit_volume: Callable[[int, Path], Path],
+        max_pages: Optional[int] = None,
+        max_bytes: Optional[int] = None,
+        header_text: Optional[str] = None,
+        add_header: bool = False,
+        progress: Optional[Callable[[int, int], None]] = None,
+        on_volume: Optional[Callable[[Dict[str, Any]], None]] = None,
+        profile: str = DEFAULT_OUTPUT_PROFILE,
+        watermark_text: Optional[str] = None,
+    ) -> List[Dict[str, Any]]:
+        """
+        分卷汇编：按每卷最大页数 / 字节数拆分为多个 PDF，每卷有自己的书签
         
-        doc.save(str(output_path))
-        doc.close()
+        同一时间只在内存中保留当前分卷，每卷写完后立即保存、释放并交给 commit_volume，
+        客户端可以在后续分卷生成期间下载已完成的分卷。超出剩余容量的文档从中间拆开，
+        下一卷中该文档的书签标注“（续）”。字节数按源 PDF 的平均每页大小估算，
+        实际分卷大小可能略有偏差。单页超出容量时该页单独成卷。
         
-        return output_path
+        Args:
+            sections: (PDF 文件路径, 书签标题, 页码范围) 列表，同 compose_pdf
+            temp_path: 卷号 -> 分卷临时文件路径
+            commit_volume: (卷号, 临时文件路径) -> 分卷最终路径
+            max_pages: 每卷最大页数
+            max_bytes: 每卷最大字节数
+            header_text: 页眉文本（为空时使用各节的书签标题）
+            add_header: 是否添加页眉
+            progress: 进度回调，每合并一节调用一次，参数为 (已合并节数, 已合并总页数)
+            on_volume: 每完成一卷调用一次，参数为分卷信息
+            profile: 输出配置名称（OUTPUT_PROFILES）
+            watermark_text: 水印文本（为空时不加水印）
+        
+        Returns:
+            List[Dict]: 分卷信息列表（卷号、文件名、页数、大小、书签）
+        """
+        return run_cpu_bound(
+            PDFService._compose_volumes_sync,
+            sections,
+            max_pages,
+            max_bytes,
+            header_text,
+            add_header,
+            profile,
+            watermark_text,
+            callbacks={
+                "temp_path": temp_path,
+                "commit_volume": commit_volume,
+                "progress": progress,
+                "on_volume": on_volume,
+            },
+        )
+    
+    @staticmethod
+    def _compose_volumes_sync(
+        sections: List[Tuple[Path, str, Optional[Tuple[int, Optional[int]]]]],
+        max_pages: Optional[int],
+        max_bytes: Optional[int],
+        header_text: Optional[str],
+        add_header: bool,
+        profile: str,
+        watermark_text: Optional[str],
+        temp_path: Callable[[int], Path],
+        commit_volume: Callable[[int, Path], Path],
+        progress: Optional[Callable[[int, int], None]] = None,
+        on_volume: Optional[Callable[[Dict[str, Any]], None]] = None,
+    ) -> List[Dict[str, Any]]:
+        """分卷汇编（同步版本，在 PDF 处理进程中执行）"""
+        volumes: List[Dict[str, Any]] = []
+        state: Dict[str, Any] = {"doc": None, "stamper": None, "toc": [], "bytes": 0.0}
+        total_pages = 0
+        
+        def close_volume() -> None:
+            # 先从 state 中取走当前分卷，之后由本函数负责关闭；外层 finally 只关闭 state 中仍在写入的分卷
+            volume_doc, stamper, toc = state["doc"], state["stamper"], state["toc"]
+            state.update(doc=None, stamper=None, toc=[], bytes=0.0)
+            index = len(volumes) + 1
+            path = temp_path(index)
+            try:
+                stamper.flush()
+                volume_doc.set_toc(toc)
+                PDFService._save_with_profile(volume_doc, path, profile)
+                pages = volume_doc.page_count
+            finally:
+                stamper.close()
+                volume_doc.close()
+            
+            final_path = commit_volume(index, path)
+            volume = {
+                "index": index,
+                "file": final_path.name,
+                "pages": pages,
+                "size": final_path.stat().st_size,
+                "bookmarks": toc,
+            }
+            volumes.append(volume)
+            logger.info(f"分卷 {index} 完成: {pages} 页, {volume['size']} 字节")
+            if on_volume:
+                on_volume(volume)
+        
+        try:
+            for index, (pdf_path, bookmark_title, page_range) in enumerate(sections, start=1):
+                if not pdf_path.exists():
+                    raise PDFGenerationError(f"文件不存在: {pdf_path}")
+                
+                with fitz.open(str(pdf_path)) as doc:
+                    page, to_page = PDFService._page_span(doc, bookmark_title, page_range)
+                    bytes_per_page = pdf_path.stat().st_size / max(doc.page_count, 1)
+                    continued = False
+                    
+                    while page <= to_page:
+                        if state["doc"] is None:
+                            state["doc"] = fitz.open()
+                            state["stamper"] = PDFStamper(state["doc"])
+                        volume_doc = state["doc"]
+                        
+                        # 当前分卷剩余可放入的页数
+                        room = to_page - page + 1
+                        if max_pages:
+                            room = min(room, max_pages - volume_doc.page_count)
+                        if max_bytes:
+                            room = min(room, int((max_bytes - state["bytes"]) // max(bytes_per_page, 1)))
+                        if room < 1:
+                            if volume_doc.page_count > 0:
+                                close_volume()
+                                continue
+                            room = 1
+                        
+                        last_page = page + room - 1
+                        start_page = volume_doc.page_count
+                        volume_doc.insert_pdf(doc, from_page=page, to_page=last_page)
+                        title = f"{bookmark_title}（续）" if continued else bookmark_title
+                        state["toc"].append([1, title, start_page + 1])
+                        state["bytes"] += room * bytes_per_page
+                        
+                        if add_header or watermark_text:
+                            section_header = (header_text or bookmark_title) if add_header else None
+                            for page_number in range(start_page, volume_doc.page_count):
+                                state["stamper"].stamp(volume_doc[page_number], section_header, watermark_text)
+                        
+                        total_pages += room
+                        page = last_page + 1
+                        continued = True
+                
+                if progress:
+                    progress(index, total_pages)
+            
+            if state["doc"] is not None and state["doc"].page_count > 0:
+                close_volume()
+        finally:
+            if state["doc"] is not None:
+                state["stamper"].close()
+                state["doc"].close()
+        
+        return volumes
     
     def merge_pdfs(
         self,
         pdf_paths: List[Path],
         output_path: Path,
         add_bookmarks: bool = True,
+        progress: Optional[Callable[[int, int], None]] = None,
+        profile: str = DEFAULT_OUTPUT_PROFILE,
     ) -> Path:
         """
         合并多个 PDF 文件
@@ -342,15 +649,35 @@ class PDFService:
             pdf_paths: PDF 文件路径列表
             output_path: 输出 PDF 路径
             add_bookmarks: 是否添加书签（每个 PDF 作为一个书签）
-            
+            progress: 进度回调，每合并一个文件调用一次，参数为 (已合并文件数, 已合并页数)
+            profile: 输出配置名称（OUTPUT_PROFILES）
+        
         Returns:
             Path: 输出 PDF 文件路径
         """
+        return run_cpu_bound(
+            PDFService._merge_pdfs_sync,
+            pdf_paths,
+            output_path,
+            add_bookmarks,
+            profile,
+            callbacks={"progress": progress},
+        )
+    
+    @staticmethod
+    def _merge_pdfs_sync(
+        pdf_paths: List[Path],
+        output_path: Path,
+        add_bookmarks: bool,
+        profile: str,
+        progress: Optional[Callable[[int, int], None]] = None,
+    ) -> Path:
+        """合并多个 PDF 文件（同步版本，在 PDF 处理进程中执行）"""
         merged_doc = fitz.open()
         bookmarks = []
         page_offset = 0
         
-        for pdf_path in pdf_paths:
+        for index, pdf_path in enumerate(pdf_paths, start=1):
             if not pdf_path.exists():
                 raise PDFGenerationError(f"文件不存在: {pdf_path}")
             
@@ -369,12 +696,15 @@ class PDFService:
             merged_doc.insert_pdf(doc)
             page_offset += len(doc)
             doc.close()
+            
+            if progress:
+                progress(index, page_offset)
         
         # 设置书签
         if add_bookmarks and bookmarks:
             merged_doc.set_toc(bookmarks)
         
-        merged_doc.save(str(output_path))
+        PDFService._save_with_profile(merged_doc, output_path, profile)
         merged_doc.close()
         
         return output_path
@@ -392,7 +722,7 @@ class PDFService:
             pdf_path: PDF 文件路径
             bookmarks: 书签列表，格式: [{"title": "第一章", "page": 0, "level": 1}, ...]
             output_path: 输出路径（默认覆盖原文件）
-            
+        
         Returns:
             Path: 输出 PDF 文件路径
         """
@@ -417,80 +747,575 @@ class PDFService:
         
         return output_path
     
+    def _convert_missing_pdfs(self, documents: List[Any], existing: Set[str]) -> Dict[str, Path]:
+        """
+        并发转换尚未生成 PDF 的文档（同步方法，在调用线程中运行事件循环）
+        
+        同一源文件只转换一次；并发数由 COMPILATION_CONVERT_CONCURRENCY 限制，
+        各类转换器的并发和时间预算仍由转换调度器控制，已有的转换结果直接从缓存返回。
+        转换结果会写回所有引用该文件的文档，后续汇编和转换任务直接复用。
+        
+        Args:
+            documents: 汇编的文档列表
+            existing: 已存在的文件路径（批量检查结果）
+        
+        Returns:
+            Dict[str, Path]: 源文件路径 -> PDF 路径
+        
+        Raises:
+            PDFGenerationError: 转换失败时抛出（避免生成缺少文档的汇编）
+        """
+        source_paths = []
+        for doc in documents:
+            if doc.pdf_save_path in existing:
+                continue
+            if self.needs_conversion(Path(doc.save_path)) and doc.save_path not in source_paths:
+                source_paths.append(doc.save_path)
+        
+        if not source_paths:
+            return {}
+        
+        logger.info(f"汇编前转换 {len(source_paths)} 个文件为 PDF")
+        
+        async def convert_all() -> List[Optional[Path]]:
+            semaphore = asyncio.Semaphore(settings.COMPILATION_CONVERT_CONCURRENCY)
+            
+            async def convert(source_path: str) -> Optional[Path]:
+                async with semaphore:
+                    return await self.convert_to_pdf(Path(source_path))
+            
+            return await asyncio.gather(*(convert(source_path) for source_path in source_paths))
+        
+        results = asyncio.run(convert_all())
+        
+        converted = {}
+        for source_path, pdf_path in zip(source_paths, results):
+            if pdf_path is None or not pdf_path.exists():
+                raise PDFGenerationError(f"文件转换 PDF 失败: {source_path}")
+            self.repository.update_pdf_info_by_save_path(
+                save_path=source_path,
+                pdf_file_size=pdf_path.stat().st_size,
+                pdf_save_path=str(pdf_path),
+                page_count=self.count_pages(pdf_path),
+            )
+            converted[source_path] = pdf_path
+        return converted
+    
+    def resolve_document_ids(
+        self,
+        document_ids: Optional[List[int]] = None,
+        selector: Optional[DocumentSelector] = None,
+    ) -> List[int]:
+        """
+        获取汇编的文档ID列表：直接指定的ID列表，或按筛选条件在服务端查询
+        
+        筛选条件与搜索接口使用相同的查询逻辑，只读取ID列，不构造文档响应对象。
+        
+        Raises:
+            EmptyDocumentSelectionError: 筛选条件没有匹配任何文档时抛出
+        """
+        if selector is None:
+            return list(document_ids or [])
+        
+        resolved = list(self.repository.iter_search_ids(
+            keyword=selector.keyword,
+            tag_ids=selector.tag_ids,
+            file_type=selector.file_type,
+            category_id=selector.category_id,
+            order_by=selector.order_by,
+            descending=selector.descending,
+        ))
+        if not resolved:
+            raise EmptyDocumentSelectionError()
+        
+        logger.info(f"筛选条件匹配 {len(resolved)} 个文档")
+        return resolved
+    
+    def estimate_compilation(
+        self,
+        document_ids: List[int],
+        page_ranges: Optional[Dict[int, Tuple[int, Optional[int]]]] = None,
+        max_pages_per_volume: Optional[int] = None,
+        max_bytes_per_volume: Optional[int] = None,
+    ) -> CompilationEstimate:
+        """
+        预估汇编规模（只查询数据库中的文档元数据，不打开 PDF 文件，也不检查文件是否存在）
+        
+        页数和大小来自入库 / 转换完成时记录的页数和 PDF 大小；尚未转换的文档页数未知，
+        大小按原始文件大小估算。指定页码范围时大小按页数比例折算。
+        页数未知的文档按本次汇编中已知页数文档的平均每页大小（没有时使用 COMPILATION_ESTIMATE_PAGE_BYTES）
+        估算页数并计入总页数（图片按一页计），页数上限对未转换的文档同样生效。
+        页眉、水印和输出配置对大小的影响不计入。
+        
+        Raises:
+            DocumentsNotFoundError: 文档不存在时抛出
+            InvalidPageRangeError: 起始页超出已知页数时抛出
+        """
+        documents, missing = self.repository.get_by_ids(document_ids)
+        if missing:
+            raise DocumentsNotFoundError(missing)
+        
+        page_ranges = page_ranges or {}
+        total_pages = 0
+        estimated_size = 0
+        converted = pending = skipped = 0
+        known_pages = known_size = 0
+        # 页数未知的文档: (文件大小, 是否图片, 页码范围)
+        unknown: List[Tuple[int, bool, Optional[Tuple[int, Optional[int]]]]] = []
+        pending_paths: Set[str] = set()
+        for doc in documents:
+            file_path = Path(doc.save_path)
+            if doc.pdf_save_path:
+                converted += 1
+                size = doc.pdf_file_size
+            elif file_path.suffix.lower() == '.pdf':
+                converted += 1
+                size = doc.file_size
+            elif self.needs_conversion(file_path):
+                # 同一源文件只转换一次
+                if doc.save_path not in pending_paths:
+                    pending_paths.add(doc.save_path)
+                    pending += 1
+                size = doc.file_size
+            else:
+                skipped += 1
+                continue
+            
+            page_count = doc.page_count
+            page_range = page_ranges.get(doc.id)
+            if page_count is None:
+                is_image = self.get_converter_class(file_path) == CONVERTER_IMAGE
+                unknown.append((size, is_image, page_range))
+                estimated_size += size
+                continue
+            
+            known_pages += page_count
+            known_size += size
+            pages = page_count
+            if page_range is not None:
+                first, last = page_range
+                if first > page_count:
+                    raise InvalidPageRangeError(doc.title, first, last, page_count)
+                pages = min(last or page_count, page_count) - first + 1
+            total_pages += pages
+            estimated_size += size * pages // page_count if page_count else 0
+        
+        # 页数未知的文档按平均每页大小估算页数
+        page_bytes = known_size // known_pages if known_pages else 0
+        page_bytes = max(page_bytes or settings.COMPILATION_ESTIMATE_PAGE_BYTES, 1)
+        estimated_pages = 0
+        for size, is_image, page_range in unknown:
+            pages = 1 if is_image else max(math.ceil(size / page_bytes), 1)
+            if page_range is not None:
+                first, last = page_range
+                pages = last - first + 1 if last else max(pages - first + 1, 1)
+            estimated_pages += pages
+        total_pages += estimated_pages
+        
+        estimated_volumes = None
+        if max_pages_per_volume or max_bytes_per_volume:
+            estimated_volumes = max(
+                math.ceil(total_pages / max_pages_per_volume) if max_pages_per_volume else 1,
+                math.ceil(estimated_size / max_bytes_per_volume) if max_bytes_per_volume else 1,
+                1,
+            )
+        
+        max_pages = settings.COMPILATION_MAX_PAGES
+        max_bytes = settings.COMPILATION_MAX_BYTES
+        return CompilationEstimate(
+            total_documents=len(documents),
+            total_pages=total_pages,
+            estimated_size=estimated_size,
+            converted_documents=converted,
+            pending_conversions=pending,
+            unknown_page_documents=len(unknown),
+            estimated_pages=estimated_pages,
+            skipped_documents=skipped,
+            estimated_volumes=estimated_volumes,
+            max_pages=max_pages,
+            max_bytes=max_bytes,
+            exceeds_limits=bool(
+                (max_pages and total_pages > max_pages) or (max_bytes and estimated_size > max_bytes)
+            ),
+        )
+    
+    def check_compilation_size(
+        self,
+        document_ids: List[int],
+        page_ranges: Optional[Dict[int, Tuple[int, Optional[int]]]] = None,
+    ) -> CompilationEstimate:
+        """
+        在开始转换和合并之前按预估规模拒绝超出上限的汇编
+        
+        Raises:
+            DocumentsNotFoundError: 文档不存在时抛出
+            InvalidPageRangeError: 起始页超出已知页数时抛出
+            CompilationTooLargeError: 预估页数或大小超出上限时抛出
+        """
+        estimate = self.estimate_compilation(document_ids, page_ranges)
+        if estimate.max_pages and estimate.total_pages > estimate.max_pages:
+            raise CompilationTooLargeError(f"预计 {estimate.total_pages} 页，上限 {estimate.max_pages} 页")
+        if estimate.max_bytes and estimate.estimated_size > estimate.max_bytes:
+            raise CompilationTooLargeError(
+                f"预计 {estimate.estimated_size // 1048576}MB，上限 {estimate.max_bytes // 1048576}MB"
+            )
+        return estimate
+    
+    def _generate_volumes(
+        self,
+        cache: CompilationCache,
+        cache_key: str,
+        title: str,
+        sections: List[Tuple[Path, str, Optional[Tuple[int, Optional[int]]]]],
+        max_pages: Optional[int],
+        max_bytes: Optional[int],
+        header_text: Optional[str],
+        add_header: bool,
+        progress: Optional[Callable[[int, int], None]],
+        on_volume: Optional[Callable[[Dict[str, Any]], None]],
+        profile: str,
+        watermark_text: Optional[str],
+    ) -> Path:
+        """分卷汇编并写入分卷清单，返回清单路径"""
+        with cache.single_flight(cache_key):
+            manifest = cache.get_manifest(cache_key)
+            if manifest:
+                for volume in manifest["volumes"]:
+                    if on_volume:
+                        on_volume(volume)
+                if progress:
+                    progress(len(sections), manifest["total_pages"])
+                return cache.manifest_path(cache_key)
+            
+            temp_paths: List[Path] = []
+            
+            def temp_path(index: int) -> Path:
+                temp_paths.append(cache.temp_path(cache_key))
+                return temp_paths[-1]
+            
+            try:
+                volumes = self.compose_volumes(
+                    sections=sections,
+                    temp_path=temp_path,
+                    commit_volume=lambda index, path: cache.put_volume(cache_key, index, path),
+                    max_pages=max_pages,
+                    max_bytes=max_bytes,
+                    header_text=header_text,
+                    add_header=add_header,
+                    progress=progress,
+                    on_volume=on_volume,
+                    profile=profile,
+                    watermark_text=watermark_text,
+                )
+            finally:
+                for path in temp_paths:
+                    if path.exists():
+                        path.unlink()
+            
+            return cache.put_manifest(cache_key, {
+                "title": title,
+                "total_pages": sum(volume["pages"] for volume in volumes),
+                "total_size": sum(volume["size"] for volume in volumes),
+                "volumes": volumes,
+            })
+    
+    def _plan_sections(
+        self,
+        document_ids: List[int],
+        page_ranges: Optional[Dict[int, Tuple[int, Optional[int]]]] = None,
+    ) -> Tuple[List[Tuple[Path, str, Optional[Tuple[int, Optional[int]]]]], List[Dict[str, Any]]]:
+        """
+        确定参与汇编的 PDF 文件（尚未转换的文档先并发转换）
+        
+        Returns:
+            Tuple: (合并用的 (PDF 路径, 书签标题, 页码范围) 列表, 计算缓存键用的文档信息列表)
+        
+        Raises:
+            DocumentsNotFoundError: 文档不存在时抛出
+            PDFGenerationError: 文件不存在或没有可用的 PDF 文件时抛出
+        """
+        # 一次查询获取所有文档，一次报告所有不存在的ID
+        documents, missing = self.repository.get_by_ids(document_ids)
+        if missing:
+            raise DocumentsNotFoundError(missing)
+        
+        # 批量检查原始文件和 PDF 文件是否存在
+        existing = existing_paths(
+            [doc.save_path for doc in documents] + [doc.pdf_save_path for doc in documents]
+        )
+        
+        # 尚未转换 PDF 的文档先并发转换
+        converted = self._convert_missing_pdfs(documents, existing)
+        
+        page_ranges = page_ranges or {}
+        
+        # 优先使用 PDF 文件，如果没有则使用原始文件
+        pdf_sections = []
+        sections = []
+        for doc in documents:
+            file_path = Path(doc.save_path)
+            if doc.save_path not in existing:
+                raise PDFGenerationError(f"文件不存在: {doc.save_path}")
+            
+            # 如果文档有 PDF 版本，优先使用
+            pdf_path = None
+            if doc.pdf_save_path in existing:
+                pdf_path = Path(doc.pdf_save_path)
+            elif file_path.suffix.lower() == '.pdf':
+                pdf_path = file_path
+            elif doc.save_path in converted:
+                pdf_path = converted[doc.save_path]
+            else:
+                # 格式不支持转换
+                logger.warning(f"文档 {doc.id} 不是 PDF 且不支持转换，跳过合并: {file_path}")
+            
+            page_range = page_ranges.get(doc.id)
+            if pdf_path:
+                pdf_sections.append((pdf_path, doc.title, page_range))
+            # PDF 文件按内容命名，路径即可标识内容
+            sections.append({
+                "id": doc.id,
+                "update_time": doc.update_time,
+                "pdf": str(pdf_path) if pdf_path else None,
+                "pages": page_range,
+            })
+        
+        if not pdf_sections:
+            raise PDFGenerationError("所选文档中没有可用的 PDF 文件")
+        
+        return pdf_sections, sections
+    
+    def append_pdf(
+        self,
+        base_path: Path,
+        document_ids: List[int],
+        add_header: bool = False,
+        header_text: Optional[str] = None,
+        progress: Optional[Callable[[int, int], None]] = None,
+        page_ranges: Optional[Dict[int, Tuple[int, Optional[int]]]] = None,
+        profile: str = DEFAULT_OUTPUT_PROFILE,
+        watermark_text: Optional[str] = None,
+    ) -> Path:
+        """
+        在已生成的汇编末尾追加文档（增量保存）
+        
+        复制原汇编文件（原文件可能被其他任务引用，不能直接修改），插入新文档的页面，
+        在原书签后追加新文档的书签，然后增量保存：只在文件末尾写入新增和修改的对象，
+        不重新处理原有页面。增量保存不做垃圾回收和重复对象合并，输出配置中只有图片降采样作用于新增页面。
+        
+        复制原文件时优先使用写时复制克隆（btrfs、XFS 等），此时耗时只与追加的页数有关；
+        文件系统不支持克隆时仍需整体复制原文件，这部分耗时与原汇编大小成正比（但不解析 PDF）。
+        
+        Args:
+            base_path: 原汇编文件路径
+            document_ids: 追加的文档ID列表
+            其余参数同 generate_pdf（页眉、水印、输出配置应与原汇编一致）
+        
+        Returns:
+            Path: 追加后的汇编文件路径
+        
+        Raises:
+            PDFGenerationError: 追加失败时抛出
+        """
+        try:
+            pdf_sections, sections = self._plan_sections(document_ids, page_ranges)
+            
+            cache = CompilationCache(self.db)
+            cache_key = cache.make_key(
+                sections,
+                {
+                    "base": base_path.name,
+                    "add_header": add_header,
+                    "header_text": header_text,
+                    "profile": profile,
+                    "watermark_text": watermark_text,
+                },
+            )
+            with cache.single_flight(cache_key):
+                cached_path = cache.get(cache_key)
+                if cached_path:
+                    if progress:
+                        with fitz.open(str(cached_path)) as cached_doc:
+                            progress(len(pdf_sections), cached_doc.page_count)
+                    return cached_path
+                
+                output_path = cache.temp_path(cache_key)
+                try:
+                    _clone_file(base_path, output_path)
+                    run_cpu_bound(
+                        PDFService._append_sections,
+                        output_path,
+                        pdf_sections,
+                        header_text=header_text,
+                        add_header=add_header,
+                        profile=profile,
+                        watermark_text=watermark_text,
+                        callbacks={"progress": progress},
+                    )
+                    return cache.put(cache_key, output_path)
+                finally:
+                    if output_path.exists():
+                        output_path.unlink()
+        
+        except Exception as e:
+            if isinstance(e, BaseAPIException):
+                raise
+            raise PDFGenerationError(str(e))
+    
+    @staticmethod
+    def _append_sections(
+        pdf_path: Path,
+        sections: List[Tuple[Path, str, Optional[Tuple[int, Optional[int]]]]],
+        header_text: Optional[str] = None,
+        add_header: bool = False,
+        progress: Optional[Callable[[int, int], None]] = None,
+        profile: str = DEFAULT_OUTPUT_PROFILE,
+        watermark_text: Optional[str] = None,
+    ) -> None:
+        """在 PDF 文件末尾插入各节页面并追加书签，增量保存（在 PDF 处理进程中执行）"""
+        doc = fitz.open(str(pdf_path))
+        stamper = PDFStamper(doc)
+        try:
+            base_page_count = doc.page_count
+            toc = doc.get_toc(simple=False)
+            
+            for index, (section_path, bookmark_title, page_range) in enumerate(sections, start=1):
+                if not section_path.exists():
+                    raise PDFGenerationError(f"文件不存在: {section_path}")
+                
+                start_page = doc.page_count
+                with fitz.open(str(section_path)) as section:
+                    from_page, to_page = PDFService._page_span(section, bookmark_title, page_range)
+                    doc.insert_pdf(section, from_page=from_page, to_page=to_page)
+                
+                toc.append([1, bookmark_title, start_page + 1])
+                
+                if add_header or watermark_text:
+                    section_header = (header_text or bookmark_title) if add_header else None
+                    for page_number in range(start_page, doc.page_count):
+                        stamper.stamp(doc[page_number], section_header, watermark_text)
+                
+                if progress:
+                    progress(index, doc.page_count - base_page_count)
+            
+            stamper.flush()
+            output_profile = OUTPUT_PROFILES[profile]
+            if output_profile.max_image_dpi:
+                PDFService._downsample_images(
+                    doc, output_profile.max_image_dpi, output_profile.jpeg_quality, start_page=base_page_count
+                )
+            
+            doc.set_toc(toc)
+            doc.save(
+                str(pdf_path),
+                incremental=True,
+                encryption=fitz.PDF_ENCRYPT_KEEP,
+                deflate=output_profile.deflate,
+            )
+        finally:
+            stamper.close()
+            doc.close()
+    
     def generate_pdf(
         self,
         document_ids: List[int],
         title: str = "文档汇编",
         add_header: bool = False,
         header_text: Optional[str] = None,
+        progress: Optional[Callable[[int, int], None]] = None,
+        page_ranges: Optional[Dict[int, Tuple[int, Optional[int]]]] = None,
+        max_pages_per_volume: Optional[int] = None,
+        max_bytes_per_volume: Optional[int] = None,
+        on_volume: Optional[Callable[[Dict[str, Any]], None]] = None,
+        profile: str = DEFAULT_OUTPUT_PROFILE,
+        watermark_text: Optional[str] = None,
     ) -> Path:
         """
         生成 PDF 汇编（保留原有接口，使用 PyMuPDF 重构）
         
+        指定每卷最大页数或字节数时分卷汇编，返回分卷清单（JSON）路径，
+        清单中的分卷文件与清单位于同一目录。
+        
         Args:
             document_ids: 文档ID列表
             title: PDF 标题
             add_header: 是否添加页眉
-            header_text: 页眉文本（如果 add_header=True）
-            
+            header_text: 页眉文本（如果 add_header=True，为空时每节使用文档标题）
+            page_ranges: 各文档的页码范围，文档ID -> (起始页, 结束页)，未指定的文档包含全部页面
+            max_pages_per_volume: 每卷最大页数（分卷汇编）
+            max_bytes_per_volume: 每卷最大字节数（分卷汇编）
+            on_volume: 分卷完成回调，参数为分卷信息（缓存命中时对每个分卷调用一次）
+            profile: 输出配置名称：archive-存档（无损），screen-屏幕阅读（150 DPI），email-邮件（96 DPI）
+            watermark_text: 水印文本（为空时不加水印）
+            progress: 合并进度回调，参数为 (已合并文件数, 已合并页数)
+        
         Returns:
-            Path: 生成的 PDF 文件路径
-            
+            Path: 生成的 PDF 文件路径（分卷汇编时为分卷清单路径）
+        
         Raises:
             PDFGenerationError: PDF 生成失败时抛出
         """
         try:
-            # 获取所有文档
-            documents = []
-            for doc_id in document_ids:
-                document = self.repository.get_by_id(doc_id)
-                if not document:
-                    raise DocumentNotFoundError(doc_id)
-                documents.append(document)
-            
-            # 优先使用 PDF 文件，如果没有则使用原始文件
-            pdf_paths = []
-            for doc in documents:
-                file_path = Path(doc.save_path)
-                if not file_path.exists():
-                    raise PDFGenerationError(f"文件不存在: {doc.save_path}")
-                
-                # 如果文档有 PDF 版本，优先使用
-                if doc.pdf_save_path and Path(doc.pdf_save_path).exists():
-                    pdf_paths.append(Path(doc.pdf_save_path))
-                elif file_path.suffix.lower() == '.pdf':
-                    pdf_paths.append(file_path)
-                else:
-                    # 如果不是 PDF，尝试转换（同步转换，因为这是同步方法）
-                    logger.warning(f"文档 {doc.id} 不是 PDF，跳过合并: {file_path}")
-            
-            if not pdf_paths:
-                raise PDFGenerationError("所选文档中没有可用的 PDF 文件")
+            pdf_sections, sections = self._plan_sections(document_ids, page_ranges)
             
-            # 生成输出文件名
-            timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-            output_filename = f"{title}_{timestamp}.pdf"
-            # 使用汇编目录存储汇编PDF（不保存到数据库，仅生成文件）
-            output_path = settings.pdf_compilation_dir_path / output_filename
-            
-            # 合并 PDF
-            self.merge_pdfs(
-                pdf_paths=pdf_paths,
-                output_path=output_path,
-                add_bookmarks=True,
+            # 相同文档和选项的汇编复用已有文件，并发的相同请求只合并一次
+            cache = CompilationCache(self.db)
+            cache_key = cache.make_key(
+                sections,
+                {
+                    "title": title,
+                    "add_header": add_header,
+                    "header_text": header_text,
+                    "max_pages_per_volume": max_pages_per_volume,
+                    "max_bytes_per_volume": max_bytes_per_volume,
+                    "profile": profile,
+                    "watermark_text": watermark_text,
+                },
             )
-            
-            # 如果需要，添加页眉
-            if add_header and header_text:
-                self.add_header_to_pdf(
-                    pdf_path=output_path,
-                    header_text=header_text or title,
-                    output_path=output_path,
+            if max_pages_per_volume or max_bytes_per_volume:
+                return self._generate_volumes(
+                    cache=cache,
+                    cache_key=cache_key,
+                    title=title,
+                    sections=pdf_sections,
+                    max_pages=max_pages_per_volume,
+                    max_bytes=max_bytes_per_volume,
+                    header_text=header_text,
+                    add_header=add_header,
+                    progress=progress,
+                    on_volume=on_volume,
+                    profile=profile,
+                    watermark_text=watermark_text,
                 )
             
-            return output_path
-            
+            with cache.single_flight(cache_key):
+                cached_path = cache.get(cache_key)
+                if cached_path:
+                    if progress:
+                        with fitz.open(str(cached_path)) as cached_doc:
+                            progress(len(pdf_sections), cached_doc.page_count)
+                    return cached_path
+                
+                # 先写入临时文件，完成后再放入汇编目录
+                output_path = cache.temp_path(cache_key)
+                try:
+                    # 合并、页眉、书签一次完成，只保存一次
+                    self.compose_pdf(
+                        sections=pdf_sections,
+                        output_path=output_path,
+                        header_text=header_text,
+                        add_header=add_header,
+                        progress=progress,
+                        profile=profile,
+                        watermark_text=watermark_text,
+                    )
+                    
+                    return cache.put(cache_key, output_path)
+                finally:
+                    if output_path.exists():
+                        output_path.unlink()
+        
         except Exception as e:
-            if isinstance(e, (PDFGenerationError, DocumentNotFoundError)):
+            if isinstance(e, BaseAPIException):
                 raise
             raise PDFGenerationError(str(e))
@@ -0,0 +1,278 @@
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+import importlib.util
+import io
+
+import fitz  # PyMuPDF
+
+# fontTools 可用时可以嵌入字体子集
+_CAN_SUBSET_FONTS = importlib.util.find_spec("fontTools") is not None
+
+
+def _subset_cjk_font(text: str) -> bytes:
+    """生成只包含 text 中字符的中文字体（Droid Sans Fallback）子集"""
+    from fontTools import subset
+    from fontTools.ttLib import TTFont
+    
+    # 按需加载字体表，只解析用到的字形
+    font = TTFont(io.BytesIO(fitz.Font("cjk").buffer), lazy=True)
+    options = subset.Options()
+    options.name_IDs = ["*"]
+    options.notdef_outline = True
+    options.hinting = False
+    subsetter = subset.Subsetter(options)
+    subsetter.populate(text=text)
+    subsetter.subset(font)
+    
+    buffer = io.BytesIO()
+    font.save(buffer)
+    return buffer.getvalue()
+
+
+class PDFStamper:
+    """
+    页眉 / 水印叠加层
+    
+    每种文本和页面尺寸的叠加层只绘制一次，作为表单 XObject 嵌入目标文档一次，
+    其余页面只在资源字典中引用同一个 XObject，并共享同一组内容流（"q" / "Q q /Stamp Do Q"），
+    每页只增加一个数组和一个名称引用，不会为每页生成新的内容流和字体引用。
+    
+    新出现的叠加层先记录下来，在 flush 时（保存目标文档之前）统一绘制：所有叠加层是同一个叠加层文档的各页，
+    共用一个字体对象。安装 fontTools 时按全部文本只生成一次中文字体（Droid Sans Fallback）子集，
+    汇编每节使用不同页眉时目标文档中也只有一份字体；否则使用不嵌入的 china-s 字体（由 PDF 阅读器提供中文字体）。
+    已嵌入的叠加层在之后的页面上直接引用，不等待 flush。
+    
+    未绘制的叠加层达到 MAX_PENDING_OVERLAYS 种时自动 flush（之后的新文本再嵌入一份字体子集）。
+    
+    一个实例只用于一个目标文档。
+    """
+    
+    HEADER_LINE_COLOR = (0.5, 0.5, 0.5)  # 灰色
+    WATERMARK_COLOR = (0.6, 0.6, 0.6)
+    WATERMARK_ANGLE = 45
+    MAX_PENDING_OVERLAYS = 1000
+    
+    def __init__(
+        self,
+        doc: fitz.Document,
+        font_size: int = 10,
+        header_height: float = 50.0,
+        watermark_font_size: int = 48,
+        watermark_opacity: float = 0.15,
+    ):
+        self.doc = doc
+        self.font_size = font_size
+        self.header_height = header_height
+        self.watermark_font_size = watermark_font_size
+        self.watermark_opacity = watermark_opacity
+        # (类型, 文本, 页面框, 裁剪框, 旋转角度, 叠加区域) -> 目标文档中的表单 XObject xref
+        self._forms: Dict[Tuple, int] = {}
+        # 共享内容流 -> xref
+        self._streams: Dict[bytes, int] = {}
+        # 等待 flush 的页面: (页码, [(表单键, 类型, 文本, 叠加区域)])
+        self._pending: List[Tuple[int, List[Tuple[Tuple, str, str, fitz.Rect]]]] = []
+        # 等待绘制的叠加层: (类型, 文本, 宽, 高)
+        self._pending_overlays: Set[Tuple[str, str, float, float]] = set()
+    
+    def __enter__(self) -> "PDFStamper":
+        return self
+    
+    def __exit__(self, exc_type, *exc_info) -> None:
+        if exc_type is None:
+            self.flush()
+        self.close()
+    
+    def stamp(
+        self,
+        page: fitz.Page,
+        header_text: Optional[str] = None,
+        watermark_text: Optional[str] = None,
+    ) -> None:
+        """给页面添加页眉和 / 或水印（新的叠加层在 flush 时写入）"""
+        width = page.rect.width
+        # 叠加层比页眉高 1pt，保证分隔线不被裁剪
+        header_rect = fitz.Rect(0, 0, width, self.header_height + 1)
+        
+        stamps = []
+        if watermark_text:
+            stamps.append(("watermark", watermark_text, page.rect))
+        if header_text:
+            stamps.append(("header", header_text, header_rect))
+        if not stamps:
+            return
+        
+        # 表单 XObject 的放置矩阵由页面框、裁剪框（含原点）和旋转角度决定
+        frame = (tuple(page.mediabox), tuple(page.cropbox), page.rotation)
+        stamps = [((kind, text, *frame, tuple(rect)), kind, text, rect) for kind, text, rect in stamps]
+        form_xrefs = [self._forms.get(key) for key, *_ in stamps]
+        if None not in form_xrefs and self._reference_forms(page, form_xrefs):
+            return
+        
+        self._pending.append((page.number, stamps))
+        self._pending_overlays.update(self._overlay_key(kind, text, rect) for _, kind, text, rect in stamps)
+        if len(self._pending_overlays) >= self.MAX_PENDING_OVERLAYS:
+            self.flush()
+    
+    def flush(self) -> None:
+        """绘制记录的叠加层并写入对应页面（保存目标文档之前调用）"""
+        if not self._pending:
+            return
+        
+        overlay, overlay_pages = self._build_overlays(sorted(self._pending_overlays))
+        try:
+            for page_number, stamps in self._pending:
+                page = self.doc[page_number]
+                shared = []
+                for key, kind, text, rect in stamps:
+                    if key in self._forms:
+                        shared.append((key, kind, text, rect))
+                        continue
+                    # 首次出现：通过 show_pdf_page 嵌入叠加层，记录生成的表单 XObject 供其他页面复用
+                    existing = {xref for xref, *_ in self.doc.get_page_xobjects(page_number)}
+                    page.show_pdf_page(rect, overlay, overlay_pages[self._overlay_key(kind, text, rect)], overlay=True)
+                    self._forms[key] = next(
+                        xref for xref, *_ in self.doc.get_page_xobjects(page_number) if xref not in existing
+                    )
+                
+                if shared and not self._reference_forms(page, [self._forms[key] for key, *_ in shared]):
+                    # 资源继承自页面树等少见结构，逐个使用 show_pdf_page
+                    for _, kind, text, rect in shared:
+                        page.show_pdf_page(rect, overlay, overlay_pages[self._overlay_key(kind, text, rect)], overlay=True)
+        finally:
+            overlay.close()
+            self._pending.clear()
+            self._pending_overlays.clear()
+    
+    def close(self) -> None:
+        """丢弃尚未 flush 的记录"""
+        self._pending.clear()
+        self._pending_overlays.clear()
+    
+    @staticmethod
+    def _overlay_key(kind: str, text: str, rect: fitz.Rect) -> Tuple[str, str, float, float]:
+        return (kind, text, round(rect.width, 2), round(rect.height, 2))
+    
+    def _reference_forms(self, page: fitz.Page, form_xrefs: List[int]) -> bool:
+        """在页面资源中引用已嵌入的表单 XObject，并追加共享的绘制内容流；页面资源结构不支持时返回 False"""
+        names = [f"fzStamp{xref}" for xref in form_xrefs]
+        if not self._add_xobjects(page, names, form_xrefs):
+            return False
+        
+        head = self._shared_stream(b"q\n")
+        tail = self._shared_stream(b"Q\n" + b"".join(f"q /{name} Do Q\n".encode() for name in names))
+        contents = [head, *page.get_contents(), tail]
+        self.doc.xref_set_key(page.xref, "Contents", "[" + " ".join(f"{xref} 0 R" for xref in contents) + "]")
+        return True
+    
+    def _add_xobjects(self, page: fitz.Page, names: List[str], form_xrefs: List[int]) -> bool:
+        """将表单 XObject 加入页面资源字典（资源字典可能是间接对象，被多个页面共享）"""
+        kind, value = self.doc.xref_get_key(page.xref, "Resources")
+        if kind == "xref":
+            target, prefix = int(value.split()[0]), ""
+        elif kind == "dict":
+            target, prefix = page.xref, "Resources/"
+        else:
+            return False
+        
+        kind, value = self.doc.xref_get_key(target, f"{prefix}XObject")
+        for name, xref in zip(names, form_xrefs):
+            if kind == "xref":
+                self.doc.xref_set_key(int(value.split()[0]), name, f"{xref} 0 R")
+            else:
+                self.doc.xref_set_key(target, f"{prefix}XObject/{name}", f"{xref} 0 R")
+        return True
+    
+    def _shared_stream(self, content: bytes) -> int:
+        xref = self._streams.get(content)
+        if xref is None:
+            xref = self.doc.get_new_xref()
+            self.doc.update_object(xref, "<<>>")
+            self.doc.update_stream(xref, content)
+            self._streams[content] = xref
+        return xref
+    
+    def _build_overlays(
+        self,
+        keys: Iterable[Tuple[str, str, float, float]],
+    ) -> Tuple[fitz.Document, Dict[Tuple[str, str, float, float], int]]:
+        """
+        绘制叠加层文档（每个叠加层一页，各页共用同一个字体对象）
+        
+        Returns:
+            Tuple: (叠加层文档, 叠加层 -> 页码)
+        """
+        keys = list(keys)
+        doc = fitz.open()
+        try:
+            if _CAN_SUBSET_FONTS:
+                fontname = "cjk"
+                buffer = _subset_cjk_font("".join({char for _, text, _, _ in keys for char in text}))
+                font = fitz.Font(fontbuffer=buffer)
+            else:
+                fontname = "china-s"
+                buffer = None
+                font = fitz.Font("china-s")
+            
+            font_xref = 0
+            pages = {}
+            for key in keys:
+                kind, text, width, height = key
+                page = doc.new_page(width=width, height=height)
+                if buffer is not None:
+                    if not font_xref:
+                        font_xref = page.insert_font(fontname=fontname, fontbuffer=buffer)
+                    else:
+                        self._share_font(doc, page, fontname, font_xref)
+                
+                if kind == "header":
+                    self._draw_header(page, text, fontname)
+                else:
+                    self._draw_watermark(page, text, fontname, font)
+                pages[key] = page.number
+            
+            # 重新打开，叠加层以紧凑的独立文档形式被引用
+            return fitz.open("pdf", doc.tobytes(garbage=3, deflate=True)), pages
+        finally:
+            doc.close()
+    
+    @staticmethod
+    def _share_font(doc: fitz.Document, page: fitz.Page, fontname: str, font_xref: int) -> None:
+        """在页面资源中引用已嵌入的字体对象（不重复嵌入）"""
+        kind, value = doc.xref_get_key(page.xref, "Resources")
+        if kind == "xref":
+            doc.xref_set_key(int(value.split()[0]), f"Font/{fontname}", f"{font_xref} 0 R")
+        else:
+            doc.xref_set_key(page.xref, f"Resources/Font/{fontname}", f"{font_xref} 0 R")
+    
+    def _draw_header(self, page: fitz.Page, text: str, fontname: str) -> None:
+        """页眉文本（在页眉高度内垂直居中）和分隔线"""
+        width = page.rect.width
+        text_top = max((self.header_height - self.font_size * 1.5) / 2, 0)
+        page.insert_textbox(
+            fitz.Rect(0, text_top, width, self.header_height),
+            text,
+            fontsize=self.font_size,
+            fontname=fontname,
+            align=fitz.TEXT_ALIGN_CENTER,
+            color=(0, 0, 0),
+        )
+        page.draw_line(
+            fitz.Point(0, self.header_height),
+            fitz.Point(width, self.header_height),
+            color=self.HEADER_LINE_COLOR,
+            width=0.5,
+        )
+    
+    def _draw_watermark(self, page: fitz.Page, text: str, fontname: str, font: fitz.Font) -> None:
+        """页面中心的倾斜半透明水印"""
+        center = fitz.Point(page.rect.width / 2, page.rect.height / 2)
+        text_width = font.text_length(text, fontsize=self.watermark_font_size)
+        origin = fitz.Point(center.x - text_width / 2, center.y + self.watermark_font_size / 3)
+        page.insert_text(
+            origin,
+            text,
+            fontsize=self.watermark_font_size,
+            fontname=fontname,
+            color=self.WATERMARK_COLOR,
+            fill_opacity=self.watermark_opacity,
+            morph=(center, fitz.Matrix(-self.WATERMARK_ANGLE)),
+        )
@@ -0,0 +1,443 @@
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Any, Callable, Dict, List, Optional, Set
+import importlib
+import logging
+import multiprocessing
+import queue
+import sys
+import threading
+import time
+
+from app.core.config import settings
+
+try:
+    import resource
+except ImportError:  # Windows 不支持按进程限制内存
+    resource = None
+
+logger = logging.getLogger(__name__)
+
+# 回调请求的轮询间隔（秒）
+_CALLBACK_POLL_INTERVAL = 0.05
+
+# 独立工作进程启动（导入 PyMuPDF / Pillow）的超时时间（秒）
+_ISOLATED_START_TIMEOUT = 60
+
+# 当前进程是否为 PDF 处理工作进程（由 _init_worker 设置）
+_in_worker_process = False
+
+
+def in_worker_process() -> bool:
+    """
+    当前是否在 PDF 处理工作进程中执行
+    
+    工作进程同一时间只执行一个任务，任务可以临时修改进程级的全局状态（如 Pillow 的像素上限）；
+    在线程中直接执行（PDF_PROCESS_POOL_SIZE 为 0 或进程池不可用）时不能修改。
+    """
+    return _in_worker_process
+
+
+def _init_worker(memory_limit: int) -> None:
+    """工作进程初始化：限制内存并预先导入 PyMuPDF / Pillow，之后的任务不再重复导入"""
+    global _in_worker_process
+    _in_worker_process = True
+    logging.basicConfig(
+        level=logging.INFO,
+        format="%(asctime)s %(levelname)s %(name)s: %(message)s",
+    )
+    if memory_limit and resource is not None:
+        # 每个工作进程同一时间只执行一个任务，进程的内存上限即单个任务的内存上限
+        resource.setrlimit(resource.RLIMIT_AS, (memory_limit, memory_limit))
+    importlib.import_module("fitz")
+    importlib.import_module("PIL.Image")
+    importlib.import_module("app.services.pdf_service")
+
+
+class _CallbackProxy:
+    """工作进程中的回调代理：把调用转发给提交任务的线程执行，并等待返回值"""
+    
+    def __init__(self, name: str, requests: Any, responses: Any):
+        self.name = name
+        self.requests = requests
+        self.responses = responses
+    
+    def __call__(self, *args: Any) -> Any:
+        self.requests.put((self.name, args))
+        ok, value = self.responses.get()
+        if not ok:
+            raise RuntimeError(f"回调 {self.name} 执行失败: {value}")
+        return value
+
+
+def _run_task(
+    func: Callable[..., Any],
+    args: tuple,
+    kwargs: Dict[str, Any],
+    callback_names: list,
+    requests: Any,
+    responses: Any,
+) -> Any:
+    for name in callback_names:
+        kwargs[name] = _CallbackProxy(name, requests, responses)
+    return func(*args, **kwargs)
+
+
+class _PipeCallbackProxy:
+    """独立工作进程中的回调代理：通过任务管道把调用转发给提交任务的线程执行"""
+    
+    def __init__(self, name: str, conn: Any):
+        self.name = name
+        self.conn = conn
+    
+    def __call__(self, *args: Any) -> Any:
+        self.conn.send(("callback", self.name, args))
+        ok, value = self.conn.recv()
+        if not ok:
+            raise RuntimeError(f"回调 {self.name} 执行失败: {value}")
+        return value
+
+
+def _isolated_worker_main(conn: Any, memory_limit: int) -> None:
+    """独立工作进程：逐个执行父进程通过管道发来的任务，收到 None 时退出"""
+    _init_worker(memory_limit)
+    while True:
+        task = conn.recv()
+        if task is None:
+            return
+        
+        func, args, kwargs, callback_names = task
+        for name in callback_names:
+            kwargs[name] = _PipeCallbackProxy(name, conn)
+        conn.send(("started",))
+        try:
+            reply = ("result", True, func(*args, **kwargs))
+        except Exception as e:
+            reply = ("result", False, e)
+        try:
+            conn.send(reply)
+        except Exception:
+            # 返回值或异常无法序列化
+            conn.send(("result", False, RuntimeError(repr(reply[2]))))
+
+
+class _IsolatedWorker:
+    """
+    单独持有的工作进程（执行有时间预算的任务）
+    
+    超时的任务可能停留在 C 扩展中无法在进程内中止，此时只结束这一个进程，
+    不影响其他工作进程上正在执行的任务。
+    """
+    
+    def __init__(self, context: Any, memory_limit: int):
+        self.conn, child_conn = context.Pipe()
+        self.process = context.Process(
+            target=_isolated_worker_main,
+            args=(child_conn, memory_limit),
+            daemon=True,
+        )
+        self.process.start()
+        child_conn.close()
+        self.tasks = 0
+    
+    def run(
+        self,
+        func: Callable[..., Any],
+        args: tuple,
+        kwargs: Dict[str, Any],
+        callbacks: Dict[str, Callable[..., Any]],
+        timeout: float,
+    ) -> Any:
+        """
+        执行任务并等待结果
+        
+        Raises:
+            TimeoutError: 超过时间预算（从工作进程开始执行时计算），调用方需结束该进程
+            EOFError: 工作进程异常退出
+        """
+        self.tasks += 1
+        self.conn.send((func, args, kwargs, list(callbacks)))
+        deadline = time.monotonic() + _ISOLATED_START_TIMEOUT
+        started = False
+        callback_error: Optional[BaseException] = None
+        while True:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0 or not self.conn.poll(remaining):
+                if not started:
+                    raise EOFError("PDF 处理进程启动超时")
+                raise TimeoutError("PDF 处理任务超过时间预算")
+            
+            message = self.conn.recv()
+            if message[0] == "started":
+                started = True
+                deadline = time.monotonic() + timeout
+            elif message[0] == "callback":
+                _, name, callback_args = message
+                try:
+                    self.conn.send((True, callbacks[name](*callback_args)))
+                except Exception as e:
+                    callback_error = callback_error or e
+                    self.conn.send((False, str(e)))
+            else:
+                _, ok, value = message
+                if ok:
+                    return value
+                # 回调失败导致任务失败时抛出回调的原始异常
+                raise callback_error or value
+    
+    def close(self) -> None:
+        """通知工作进程退出，未及时退出时结束"""
+        try:
+            self.conn.send(None)
+        except OSError:
+            pass
+        self.process.join(timeout=5)
+        self.kill()
+    
+    def kill(self) -> None:
+        """结束工作进程"""
+        if self.process.is_alive():
+            self.process.kill()
+        self.process.join()
+        self.conn.close()
+
+
+class PDFProcessPool:
+    """
+    PDF 处理进程池
+    
+    PyMuPDF 和 Pillow 的 CPU 密集操作（图片转换、文本排版、合并、添加页眉）在线程中执行时
+    受 GIL 和 PyMuPDF 全局锁限制，多个请求实际上串行执行；放到独立进程中才能利用多核。
+    
+    - 任务参数只传文件路径和选项，不在进程间传递 PDF 内容
+    - 工作进程使用 spawn 方式启动（不继承 API 进程的线程、数据库连接），
+      启动时导入一次 PyMuPDF / Pillow，处理 PDF_PROCESS_MAX_TASKS_PER_CHILD 个任务后重启（Python 3.11+）
+    - 每个工作进程的地址空间限制为 PDF_PROCESS_MEMORY_LIMIT，超出时任务以 MemoryError 失败，
+      不会拖垮 API 进程或转换工作进程
+    - 回调（进度、分卷提交等）在提交任务的线程中执行：工作进程通过队列发送调用请求并等待返回值，
+      回调的语义和在线程中直接执行时一致
+    - 有时间预算的任务在单独持有的工作进程中执行（最多 size 个，空闲时复用），
+      超时后只结束执行该任务的进程并抛出 TimeoutError，共享进程池中的其他任务不受影响
+    """
+    
+    def __init__(self, size: int, memory_limit: int = 0, max_tasks_per_child: int = 0):
+        context = multiprocessing.get_context("spawn")
+        self._context = context
+        options = {}
+        if max_tasks_per_child:
+            # max_tasks_per_child 需要 Python 3.11+，更早的版本工作进程不重启
+            if sys.version_info >= (3, 11):
+                options["max_tasks_per_child"] = max_tasks_per_child
+            else:
+                logger.warning("PDF_PROCESS_MAX_TASKS_PER_CHILD 需要 Python 3.11+，当前版本不生效")
+        self._size = size
+        self._memory_limit = memory_limit
+        self._max_tasks_per_child = max_tasks_per_child
+        self._executor = ProcessPoolExecutor(
+            max_workers=size,
+            mp_context=context,
+            initializer=_init_worker,
+            initargs=(memory_limit,),
+            **options,
+        )
+        self._manager = None
+        self._manager_lock = threading.Lock()
+        # 有时间预算的任务使用的独立工作进程
+        self._isolated_slots = threading.BoundedSemaphore(size)
+        self._isolated_lock = threading.Lock()
+        self._isolated_idle: List[_IsolatedWorker] = []
+        self._isolated_busy: Set[_IsolatedWorker] = set()
+        self._closed = False
+        if memory_limit and resource is None:
+            logger.warning("当前平台不支持限制工作进程内存，PDF_PROCESS_MEMORY_LIMIT 不生效")
+        logger.info(f"PDF 处理进程池已创建: size={size}, memory_limit={memory_limit}")
+    
+    def _get_manager(self):
+        """回调队列的管理进程（首次使用回调时启动）"""
+        with self._manager_lock:
+            if self._manager is None:
+                self._manager = self._context.Manager()
+            return self._manager
+    
+    def run(
+        self,
+        func: Callable[..., Any],
+        *args: Any,
+        callbacks: Optional[Dict[str, Callable[..., Any]]] = None,
+        timeout: float = 0,
+        **kwargs: Any,
+    ) -> Any:
+        """
+        在工作进程中执行函数并等待结果（阻塞调用线程）
+        
+        Args:
+            func: 模块级函数或类的静态方法（按名称传给工作进程）
+            callbacks: 关键字参数名 -> 回调，回调在调用线程中执行
+            timeout: 时间预算（秒，从工作进程开始执行时计算），0 表示不限制；
+                有时间预算的任务在独立工作进程中执行，超时时结束该进程
+        
+        Raises:
+            TimeoutError: 超过时间预算时抛出
+            RuntimeError: 执行有时间预算任务的独立工作进程异常退出时抛出
+            BrokenProcessPool: 共享进程池的工作进程异常退出（崩溃、被系统终止）时抛出
+        """
+        callbacks = {name: callback for name, callback in (callbacks or {}).items() if callback}
+        if timeout:
+            return self._run_isolated(func, args, kwargs, callbacks, timeout)
+        if not callbacks:
+            return self._executor.submit(_run_task, func, args, kwargs, [], None, None).result()
+        
+        manager = self._get_manager()
+        requests, responses = manager.Queue(), manager.Queue()
+        future = self._executor.submit(
+            _run_task, func, args, kwargs, list(callbacks), requests, responses
+        )
+        
+        callback_error: Optional[BaseException] = None
+        while True:
+            try:
+                name, callback_args = requests.get(timeout=_CALLBACK_POLL_INTERVAL)
+            except queue.Empty:
+                if future.done():
+                    break
+                continue
+            try:
+                responses.put((True, callbacks[name](*callback_args)))
+            except Exception as e:
+                callback_error = callback_error or e
+                responses.put((False, str(e)))
+        
+        try:
+            return future.result()
+        except Exception:
+            # 回调失败导致任务失败时抛出回调的原始异常
+            if callback_error is not None:
+                raise callback_error
+            raise
+    
+    def _run_isolated(
+        self,
+        func: Callable[..., Any],
+        args: tuple,
+        kwargs: Dict[str, Any],
+        callbacks: Dict[str, Callable[..., Any]],
+        timeout: float,
+    ) -> Any:
+        """在独立工作进程中执行有时间预算的任务"""
+        with self._isolated_slots:
+            with self._isolated_lock:
+                if self._closed:
+                    raise RuntimeError("PDF 处理进程池已关闭")
+                worker = self._isolated_idle.pop() if self._isolated_idle else None
+                if worker is None:
+                    worker = _IsolatedWorker(self._context, self._memory_limit)
+                self._isolated_busy.add(worker)
+            
+            reusable = False
+            try:
+                result = worker.run(func, args, kwargs, callbacks, timeout)
+                reusable = True
+                return result
+            except TimeoutError:
+                logger.warning(f"PDF 处理任务超过时间预算 {timeout} 秒，结束工作进程 (pid={worker.process.pid})")
+                raise
+            except (EOFError, OSError):
+                logger.error(f"PDF 处理进程异常退出 (pid={worker.process.pid})")
+                raise RuntimeError("PDF 处理进程异常退出（可能超出内存限制）")
+            except Exception:
+                # 任务本身抛出的异常，工作进程可以继续使用
+                reusable = True
+                raise
+            finally:
+                with self._isolated_lock:
+                    self._isolated_busy.discard(worker)
+                    recycle = (
+                        not reusable
+                        or self._closed
+                        or (self._max_tasks_per_child and worker.tasks >= self._max_tasks_per_child)
+                    )
+                    if not recycle:
+                        self._isolated_idle.append(worker)
+                if recycle:
+                    if reusable:
+                        worker.close()
+                    else:
+                        worker.kill()
+    
+    def shutdown(self) -> None:
+        """关闭进程池（取消排队的任务（Python 3.9+），不等待正在执行的任务）"""
+        with self._isolated_lock:
+            self._closed = True
+            idle, self._isolated_idle = self._isolated_idle, []
+            busy = list(self._isolated_busy)
+        for worker in idle:
+            worker.close()
+        for worker in busy:
+            if worker.process.is_alive():
+                worker.process.kill()
+        if sys.version_info >= (3, 9):
+            self._executor.shutdown(wait=False, cancel_futures=True)
+        else:
+            self._executor.shutdown(wait=False)
+        if self._manager is not None:
+            self._manager.shutdown()
+            self._manager = None
+
+
+_pool: Optional[PDFProcessPool] = None
+_pool_lock = threading.Lock()
+
+
+def get_pdf_process_pool() -> Optional[PDFProcessPool]:
+    """获取全局 PDF 处理进程池（首次调用时创建），PDF_PROCESS_POOL_SIZE 为 0 时返回 None"""
+    global _pool
+    with _pool_lock:
+        if _pool is None and settings.PDF_PROCESS_POOL_SIZE > 0:
+            _pool = PDFProcessPool(
+                settings.PDF_PROCESS_POOL_SIZE,
+                memory_limit=settings.PDF_PROCESS_MEMORY_LIMIT,
+                max_tasks_per_child=settings.PDF_PROCESS_MAX_TASKS_PER_CHILD,
+            )
+        return _pool
+
+
+def run_cpu_bound(
+    func: Callable[..., Any],
+    *args: Any,
+    callbacks: Optional[Dict[str, Callable[..., Any]]] = None,
+    timeout: float = 0,
+    **kwargs: Any,
+) -> Any:
+    """
+    执行 CPU 密集的 PDF 操作：启用进程池时在工作进程中执行，否则直接在当前线程中执行
+    
+    Args:
+        timeout: 时间预算（秒），0 表示不限制；只在进程池中执行时生效（线程无法被中止）
+    
+    Raises:
+        TimeoutError: 超过时间预算时抛出（只结束执行该任务的独立工作进程）
+        RuntimeError: 工作进程异常退出时抛出（共享进程池的工作进程退出时进程池随后重建）
+    """
+    global _pool
+    pool = get_pdf_process_pool()
+    if pool is None:
+        return func(*args, **{name: callback for name, callback in (callbacks or {}).items()}, **kwargs)
+    
+    try:
+        return pool.run(func, *args, callbacks=callbacks, timeout=timeout, **kwargs)
+    except BrokenProcessPool:
+        with _pool_lock:
+            if _pool is pool:
+                _pool = None
+        pool.shutdown()
+        logger.error("PDF 处理进程异常退出，进程池将重建")
+        raise RuntimeError("PDF 处理进程异常退出（可能超出内存限制或时间预算）")
+
+
+def shutdown_pdf_process_pool() -> None:
+    """关闭全局 PDF 处理进程池"""
+    global _pool
+    with _pool_lock:
+        if _pool is not None:
+            _pool.shutdown()
+            _pool = None
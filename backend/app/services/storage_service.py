@@ -0,0 +1,338 @@
+from contextlib import contextmanager
+from fastapi import UploadFile
+from pathlib import Path
+from typing import Callable, Iterator, Optional
+from uuid import uuid4
+import asyncio
+import hashlib
+import logging
+import os
+import threading
+
+import aiofiles
+import aiofiles.os
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+
+from app.core.config import settings
+from app.core.exceptions import FileTooLargeError
+from app.services.file_type import DetectedFileType, FileTypeDetector
+
+logger = logging.getLogger(__name__)
+
+# 不支持 flock 时 blob 锁只在进程内互斥
+_blob_thread_lock = threading.Lock()
+
+
+class StoredFile:
+    """已落盘的上传文件信息"""
+    
+    def __init__(
+        self,
+        path: Path,
+        size: int,
+        sha256: str,
+        deduplicated: bool = False,
+        file_type: Optional[DetectedFileType] = None,
+        pending: Optional[Path] = None,
+    ):
+        self.path = path
+        self.size = size
+        self.sha256 = sha256
+        self.deduplicated = deduplicated  # 是否命中已有的相同内容文件
+        self.file_type = file_type  # 按文件头识别的文件类型
+        self.pending = pending  # 文档记录创建前保留的内容副本（硬链接），见 StorageService.release
+
+
+class StorageService:
+    """
+    文件存储服务类
+    
+    上传的原始文件以内容寻址方式保存在 upload_dir_path/blobs 下：
+    blobs/<sha256 前两位>/<sha256><扩展名>。相同内容只保存一份，
+    由 Document.save_path 引用计数，最后一个引用删除时才删除文件。
+    
+    提交 blob 到创建文档记录之间，同一内容的最后一个文档可能被删除（引用数为 0，blob 随之删除）。
+    因此提交时保留一份内容副本（临时文件的硬链接，不额外占用磁盘），文档记录提交后调用 release：
+    blob 已被删除时用副本恢复，否则删除副本。提交、release 和删除无引用 blob 在 blob 分片目录的
+    .lock 上加 flock 互斥（不支持 flock 的系统上只在进程内互斥）。
+    """
+    
+    BLOB_DIR_NAME = "blobs"
+    
+    def __init__(self, base_dir: Optional[Path] = None):
+        self.base_dir = base_dir or settings.upload_dir_path
+    
+    @property
+    def blob_dir(self) -> Path:
+        """内容寻址存储根目录"""
+        path = self.base_dir / self.BLOB_DIR_NAME
+        path.mkdir(parents=True, exist_ok=True)
+        return path
+    
+    def _temp_path(self) -> Path:
+        """生成临时文件路径（与 blob 在同一文件系统，保证 rename 为原子操作）"""
+        return self.base_dir / f".{uuid4().hex}.part"
+    
+    def blob_path(self, sha256: str, suffix: str = "") -> Path:
+        """
+        获取内容哈希对应的 blob 路径
+        
+        保留小写扩展名，转换服务依赖扩展名判断文件格式。
+        """
+        return self.blob_dir / sha256[:2] / f"{sha256}{suffix.lower()}"
+    
+    async def stream_to_temp(
+        self,
+        file: UploadFile,
+        max_size: Optional[int] = None,
+    ) -> StoredFile:
+        """
+        流式写入临时文件
+        
+        按 UPLOAD_CHUNK_SIZE 分块读取并异步写入临时文件，边写边计算大小和 SHA-256，
+        超过大小限制立即中止，内存占用与文件大小无关。写入时保留文件开头的字节，按文件头识别实际类型。
+        
+        Args:
+            file: 上传的文件
+            max_size: 最大文件大小（默认使用 MAX_UPLOAD_SIZE）
+        
+        Returns:
+            StoredFile: 临时文件的路径、大小、哈希和识别出的文件类型
+        
+        Raises:
+            FileTooLargeError: 文件超过大小限制时抛出
+        """
+        if max_size is None:
+            max_size = settings.MAX_UPLOAD_SIZE
+        
+        # 客户端声明了大小时提前拒绝，避免无谓的读写
+        if file.size is not None and file.size > max_size:
+            raise FileTooLargeError(max_size)
+        
+        temp_path = self._temp_path()
+        hasher = hashlib.sha256()
+        size = 0
+        head = b""
+        
+        try:
+            async with aiofiles.open(temp_path, "wb") as buffer:
+                while True:
+                    chunk = await file.read(settings.UPLOAD_CHUNK_SIZE)
+                    if not chunk:
+                        break
+                    size += len(chunk)
+                    if size > max_size:
+                        raise FileTooLargeError(max_size)
+                    if len(head) < FileTypeDetector.SNIFF_BYTES:
+                        head += chunk[:FileTypeDetector.SNIFF_BYTES - len(head)]
+                    hasher.update(chunk)
+                    await buffer.write(chunk)
+        except BaseException:
+            # 任何异常（包括客户端断开）都清理临时文件
+            if temp_path.exists():
+                temp_path.unlink()
+            raise
+        
+        return StoredFile(
+            path=temp_path,
+            size=size,
+            sha256=hasher.hexdigest(),
+            file_type=FileTypeDetector.detect(head, file.filename, file.content_type),
+        )
+    
+    async def hash_file(
+        self,
+        path: Path,
+        filename: Optional[str] = None,
+        content_type: Optional[str] = None,
+    ) -> StoredFile:
+        """
+        分块计算已有文件的大小和 SHA-256，并按文件头识别实际类型
+        
+        Args:
+            path: 文件路径
+            filename: 原始文件名（默认使用 path 的文件名）
+            content_type: 客户端声明的文件类型
+        
+        Returns:
+            StoredFile: 文件的路径、大小、哈希和识别出的文件类型
+        """
+        hasher = hashlib.sha256()
+        size = 0
+        head = b""
+        
+        async with aiofiles.open(path, "rb") as buffer:
+            while True:
+                chunk = await buffer.read(settings.UPLOAD_CHUNK_SIZE)
+                if not chunk:
+                    break
+                if not size:
+                    head = chunk[:FileTypeDetector.SNIFF_BYTES]
+                size += len(chunk)
+                hasher.update(chunk)
+        
+        return StoredFile(
+            path=path,
+            size=size,
+            sha256=hasher.hexdigest(),
+            file_type=FileTypeDetector.detect(head, filename or path.name, content_type),
+        )
+    
+    async def commit_blob(self, temp: StoredFile, suffix: str = "") -> StoredFile:
+        """
+        将临时文件提交到内容寻址存储
+        
+        如果相同内容的 blob 已存在，直接复用；否则把临时文件硬链接为 blob 文件（原子操作）。
+        临时文件作为副本保留在 StoredFile.pending 中，文档记录提交后必须调用 release。
+        
+        Args:
+            temp: stream_to_temp 或 hash_file 返回的临时文件
+            suffix: 文件扩展名
+        
+        Returns:
+            StoredFile: blob 文件信息
+        """
+        blob_path = self.blob_path(temp.sha256, suffix)
+        loop = asyncio.get_running_loop()
+        deduplicated, pending = await loop.run_in_executor(None, self._commit_sync, temp.path, blob_path)
+        if deduplicated:
+            logger.info(f"命中已有文件，跳过保存: {blob_path}")
+        else:
+            logger.info(f"文件保存成功: {blob_path} (size={temp.size})")
+        
+        return StoredFile(
+            path=blob_path,
+            size=temp.size,
+            sha256=temp.sha256,
+            deduplicated=deduplicated,
+            file_type=temp.file_type,
+            pending=pending,
+        )
+    
+    def _commit_sync(self, temp_path: Path, blob_path: Path):
+        """
+        提交临时文件（持有 blob 锁）
+        
+        Returns:
+            Tuple[bool, Optional[Path]]: (是否命中已有 blob, 保留的内容副本)
+        """
+        with self.blob_lock(blob_path):
+            if blob_path.exists():
+                return True, temp_path
+            try:
+                # 临时文件保留为副本，与 blob 共享数据
+                os.link(temp_path, blob_path)
+                return False, temp_path
+            except OSError:
+                # 文件系统不支持硬链接时直接重命名，不保留副本
+                os.replace(temp_path, blob_path)
+                return False, None
+    
+    @contextmanager
+    def blob_lock(self, blob_path: Path) -> Iterator[None]:
+        """blob 所在分片目录的锁（提交、release 和删除无引用 blob 互斥）"""
+        blob_path.parent.mkdir(parents=True, exist_ok=True)
+        if fcntl is None:
+            with _blob_thread_lock:
+                yield
+            return
+        
+        fd = os.open(blob_path.parent / ".lock", os.O_RDWR | os.O_CREAT, 0o644)
+        try:
+            fcntl.flock(fd, fcntl.LOCK_EX)
+            yield
+        finally:
+            os.close(fd)
+    
+    async def release(self, stored: StoredFile) -> None:
+        """
+        文档记录提交后调用：blob 在此期间被删除（最后一个引用被删除）时用保留的副本恢复，否则删除副本
+        """
+        if stored.pending is None:
+            return
+        loop = asyncio.get_running_loop()
+        await loop.run_in_executor(None, self._release_sync, stored.path, stored.pending)
+        stored.pending = None
+    
+    def _release_sync(self, blob_path: Path, pending: Path) -> None:
+        with self.blob_lock(blob_path):
+            if blob_path.exists():
+                pending.unlink(missing_ok=True)
+            else:
+                os.replace(pending, blob_path)
+                logger.warning(f"文件在创建文档记录前被删除，已恢复: {blob_path}")
+    
+    def discard(self, stored: StoredFile, references: Callable[[], int]) -> bool:
+        """
+        文档记录创建失败时调用（代替 release）：删除保留的副本，blob 没有文档引用时一并删除
+        
+        Args:
+            stored: commit_blob 返回的文件
+            references: 返回引用该 blob 的文档数
+        
+        Returns:
+            bool: 是否删除了 blob
+        """
+        with self.blob_lock(stored.path):
+            if stored.pending is not None:
+                stored.pending.unlink(missing_ok=True)
+                stored.pending = None
+            if references() > 0 or not stored.path.exists():
+                return False
+            stored.path.unlink()
+            return True
+    
+    def delete_blob_if_unreferenced(self, blob_path: Path, references: Callable[[], int]) -> bool:
+        """
+        删除无引用的 blob（持有 blob 锁时统计引用数，与 release 互斥）
+        
+        Args:
+            blob_path: blob 路径
+            references: 返回引用该 blob 的文档数
+        
+        Returns:
+            bool: 是否删除了文件
+        """
+        with self.blob_lock(blob_path):
+            if references() > 0 or not blob_path.exists():
+                return False
+            blob_path.unlink()
+            return True
+    
+    async def save_upload(
+        self,
+        file: UploadFile,
+        suffix: Optional[str] = None,
+        max_size: Optional[int] = None,
+        validate: Optional[Callable[[StoredFile], None]] = None,
+    ) -> StoredFile:
+        """
+        流式保存上传文件到内容寻址存储
+        
+        Args:
+            file: 上传的文件
+            suffix: 文件扩展名（默认使用按文件头识别出的扩展名，无法识别时取上传文件名的扩展名）
+            max_size: 最大文件大小（默认使用 MAX_UPLOAD_SIZE）
+            validate: 提交前对临时文件的校验（如按识别出的类型拒绝），抛出异常时丢弃临时文件
+        
+        Returns:
+            StoredFile: blob 文件信息
+        
+        Raises:
+            FileTooLargeError: 文件超过大小限制时抛出
+        """
+        temp = await self.stream_to_temp(file, max_size=max_size)
+        if validate is not None:
+            try:
+                validate(temp)
+            except BaseException:
+                await aiofiles.os.remove(temp.path)
+                raise
+        
+        if suffix is None:
+            suffix = temp.file_type.suffix
+        return await self.commit_blob(temp, suffix)
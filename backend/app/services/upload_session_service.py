@@ -0,0 +1,336 @@
+from contextlib import asynccontextmanager
+from sqlalchemy.orm import Session
+from pathlib import Path
+from typing import AsyncIterator, Dict, Optional
+from uuid import uuid4
+import asyncio
+import json
+import logging
+import os
+import re
+import shutil
+import time
+
+import aiofiles
+import aiofiles.os
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+
+from app.core.config import settings
+from app.core.exceptions import (
+    FileTooLargeError,
+    UnsupportedFileTypeError,
+    UploadIncompleteError,
+    UploadOffsetMismatchError,
+    UploadSessionNotFoundError,
+)
+from app.schemas.document import DocumentResponse, UploadSessionCreate, UploadSessionResponse
+from app.services.conversion_scheduler import get_conversion_scheduler
+from app.services.document_service import DocumentService
+from app.services.pdf_service import PDFService
+from app.services.storage_service import StorageService
+
+logger = logging.getLogger(__name__)
+
+_UPLOAD_ID_PATTERN = re.compile(r"[0-9a-f]{32}")
+
+
+class UploadSessionService:
+    """
+    断点续传上传服务类
+    
+    每个上传会话在 upload_dir_path/.staging 下对应两个文件：
+    <upload_id>.json 保存会话信息，<upload_id>.part 保存已接收的数据。
+    分块直接追加到 .part 文件，已接收字节数即 .part 文件大小，服务重启后仍可续传。
+    
+    同一会话的分块写入、完成和取消串行执行：进程内按会话排队，多个 API 工作进程之间对 .json 文件加 flock
+    （不支持 flock 的系统上只在进程内互斥，需要单进程部署）。
+    """
+    
+    STAGING_DIR_NAME = ".staging"
+    LOCK_POLL_INTERVAL = 0.05  # 会话被其他进程锁定时的重试间隔（秒）
+    
+    # 进程内同一会话的请求排队，避免轮询 flock
+    _locks: Dict[str, asyncio.Lock] = {}
+    
+    def __init__(self, db: Session):
+        self.db = db
+        self.storage = StorageService()
+    
+    @property
+    def staging_dir(self) -> Path:
+        """上传暂存目录"""
+        path = self.storage.base_dir / self.STAGING_DIR_NAME
+        path.mkdir(parents=True, exist_ok=True)
+        return path
+    
+    def _part_path(self, upload_id: str) -> Path:
+        return self.staging_dir / f"{upload_id}.part"
+    
+    def _meta_path(self, upload_id: str) -> Path:
+        return self.staging_dir / f"{upload_id}.json"
+    
+    def _commit_path(self, upload_id: str) -> Path:
+        return self.staging_dir / f"{upload_id}.commit"
+    
+    @staticmethod
+    def _check_id(upload_id: str) -> None:
+        # upload_id 由服务端生成（uuid4().hex），格式不符时视为不存在，防止路径穿越
+        if not _UPLOAD_ID_PATTERN.fullmatch(upload_id):
+            raise UploadSessionNotFoundError(upload_id)
+    
+    def _try_flock(self, upload_id: str) -> Optional[int]:
+        """
+        尝试对会话信息文件加排他锁（不等待）
+        
+        Returns:
+            int: 持有锁的文件描述符（关闭即释放），系统不支持 flock 时返回 None
+        
+        Raises:
+            BlockingIOError: 会话被其他进程锁定
+            UploadSessionNotFoundError: 会话不存在（或等待期间已被删除）
+        """
+        if fcntl is None:
+            return None
+        
+        try:
+            fd = os.open(self._meta_path(upload_id), os.O_RDONLY)
+        except FileNotFoundError:
+            raise UploadSessionNotFoundError(upload_id)
+        try:
+            fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            # 会话在加锁前被其他进程删除
+            if os.fstat(fd).st_nlink == 0:
+                raise UploadSessionNotFoundError(upload_id)
+        except BaseException:
+            os.close(fd)
+            raise
+        return fd
+    
+    @asynccontextmanager
+    async def _session_lock(self, upload_id: str) -> AsyncIterator[None]:
+        """持有会话锁（进程内 asyncio.Lock + 进程间 flock）"""
+        self._check_id(upload_id)
+        async with self._locks.setdefault(upload_id, asyncio.Lock()):
+            while True:
+                try:
+                    fd = self._try_flock(upload_id)
+                    break
+                except BlockingIOError:
+                    await asyncio.sleep(self.LOCK_POLL_INTERVAL)
+            try:
+                yield
+            finally:
+                if fd is not None:
+                    os.close(fd)
+    
+    async def _load(self, upload_id: str) -> dict:
+        """读取会话信息"""
+        self._check_id(upload_id)
+        try:
+            async with aiofiles.open(self._meta_path(upload_id), "r", encoding="utf-8") as buffer:
+                meta = json.loads(await buffer.read())
+        except FileNotFoundError:
+            raise UploadSessionNotFoundError(upload_id)
+        
+        if not await aiofiles.os.path.exists(self._part_path(upload_id)):
+            raise UploadSessionNotFoundError(upload_id)
+        return meta
+    
+    async def _received(self, upload_id: str) -> int:
+        """已接收的字节数"""
+        return (await aiofiles.os.stat(self._part_path(upload_id))).st_size
+    
+    async def _to_response(self, meta: dict) -> UploadSessionResponse:
+        return UploadSessionResponse(
+            upload_id=meta["upload_id"],
+            filename=meta["filename"],
+            total_size=meta["total_size"],
+            offset=await self._received(meta["upload_id"]),
+        )
+    
+    def _remove(self, upload_id: str) -> None:
+        """删除会话文件（持有会话锁时调用，会话信息文件最后删除）"""
+        for path in (self._part_path(upload_id), self._commit_path(upload_id), self._meta_path(upload_id)):
+            if path.exists():
+                path.unlink()
+        self._locks.pop(upload_id, None)
+    
+    def _purge_expired(self) -> None:
+        """清理超过 UPLOAD_SESSION_TTL 未活动的会话（跳过正在处理的会话）"""
+        deadline = time.time() - settings.UPLOAD_SESSION_TTL
+        for meta_path in self.staging_dir.glob("*.json"):
+            upload_id = meta_path.stem
+            lock = self._locks.get(upload_id)
+            if lock is not None and lock.locked():
+                continue
+            try:
+                fd = self._try_flock(upload_id)
+            except (BlockingIOError, UploadSessionNotFoundError):
+                continue
+            try:
+                part_path = self._part_path(upload_id)
+                last_active = (part_path if part_path.exists() else meta_path).stat().st_mtime
+                if last_active < deadline:
+                    logger.info(f"清理过期上传会话: {upload_id}")
+                    self._remove(upload_id)
+            finally:
+                if fd is not None:
+                    os.close(fd)
+    
+    async def create_session(self, data: UploadSessionCreate) -> UploadSessionResponse:
+        """
+        创建上传会话
+        
+        Args:
+            data: 会话信息
+        
+        Returns:
+            UploadSessionResponse: 上传会话
+        
+        Raises:
+            FileTooLargeError: 文件超过 MAX_RESUMABLE_UPLOAD_SIZE 时抛出
+            ServiceBusyError: 对应类型的转换队列已满时抛出
+        """
+        if data.total_size > settings.MAX_RESUMABLE_UPLOAD_SIZE:
+            raise FileTooLargeError(settings.MAX_RESUMABLE_UPLOAD_SIZE)
+        
+        # 转换队列已满时在传输数据之前拒绝
+        get_conversion_scheduler().ensure_capacity(
+            self.db, PDFService.get_converter_class(Path(data.filename))
+        )
+        
+        await asyncio.get_running_loop().run_in_executor(None, self._purge_expired)
+        
+        upload_id = uuid4().hex
+        meta = {
+            "upload_id": upload_id,
+            "filename": Path(data.filename).name,
+            "total_size": data.total_size,
+            "content_type": data.content_type,
+            "description": data.description,
+            "category_id": data.category_id,
+        }
+        async with aiofiles.open(self._part_path(upload_id), "wb"):
+            pass
+        async with aiofiles.open(self._meta_path(upload_id), "w", encoding="utf-8") as buffer:
+            await buffer.write(json.dumps(meta, ensure_ascii=False))
+        
+        logger.info(f"创建上传会话: {upload_id} ({meta['filename']}, {data.total_size} 字节)")
+        return await self._to_response(meta)
+    
+    async def get_session(self, upload_id: str) -> UploadSessionResponse:
+        """获取上传会话（含已接收的偏移量）"""
+        return await self._to_response(await self._load(upload_id))
+    
+    async def append_chunk(
+        self,
+        upload_id: str,
+        offset: int,
+        stream: AsyncIterator[bytes],
+    ) -> UploadSessionResponse:
+        """
+        追加上传分块
+        
+        请求体以流的方式直接追加到暂存文件，不在内存中缓存整个分块。
+        传输中断时已写入的字节保留，客户端查询偏移量后从断点继续。
+        
+        Args:
+            upload_id: 上传会话ID
+            offset: 分块在文件中的起始偏移量，必须等于已接收字节数
+            stream: 分块数据流
+        
+        Returns:
+            UploadSessionResponse: 更新后的上传会话
+        
+        Raises:
+            UploadOffsetMismatchError: 偏移量与已接收字节数不一致时抛出
+            FileTooLargeError: 数据超过声明的文件大小时抛出
+        """
+        async with self._session_lock(upload_id):
+            meta = await self._load(upload_id)
+            part_path = self._part_path(upload_id)
+            received = await self._received(upload_id)
+            
+            if offset != received:
+                raise UploadOffsetMismatchError(received)
+            
+            async with aiofiles.open(part_path, "ab") as buffer:
+                async for chunk in stream:
+                    if received + len(chunk) > meta["total_size"]:
+                        raise FileTooLargeError(meta["total_size"])
+                    await buffer.write(chunk)
+                    received += len(chunk)
+            
+            return await self._to_response(meta)
+    
+    async def complete(self, upload_id: str) -> DocumentResponse:
+        """
+        完成上传
+        
+        将暂存文件提交到内容寻址存储，然后走与单次上传相同的建档和 PDF 转换流程。
+        
+        Args:
+            upload_id: 上传会话ID
+        
+        Returns:
+            DocumentResponse: 文档响应对象
+        
+        Raises:
+            UploadIncompleteError: 数据未全部接收时抛出
+            UnsupportedFileTypeError: 开启 UPLOAD_REJECT_UNCONVERTIBLE 且文件内容无法转换时抛出（会话随之删除）
+        """
+        async with self._session_lock(upload_id):
+            meta = await self._load(upload_id)
+            part_path = self._part_path(upload_id)
+            received = await self._received(upload_id)
+            
+            if received != meta["total_size"]:
+                raise UploadIncompleteError(received, meta["total_size"])
+            
+            # 提交暂存文件的硬链接，暂存文件保留到建档成功后再删除，建档失败时可以重新完成
+            commit_path = self._commit_path(upload_id)
+            if await aiofiles.os.path.exists(commit_path):
+                await aiofiles.os.remove(commit_path)
+            try:
+                await aiofiles.os.link(part_path, commit_path)
+            except OSError:
+                await asyncio.get_running_loop().run_in_executor(None, shutil.copyfile, part_path, commit_path)
+            
+            staged = await self.storage.hash_file(commit_path, meta["filename"], meta["content_type"])
+            try:
+                DocumentService.check_file_type(staged)
+            except UnsupportedFileTypeError:
+                self._remove(upload_id)
+                raise
+            stored = await self.storage.commit_blob(staged, staged.file_type.suffix)
+            
+            document_service = DocumentService(self.db)
+            try:
+                document = await document_service.create_document_from_blob(
+                    stored=stored,
+                    title=meta["filename"],
+                    file_type=stored.file_type.mime_type,
+                    description=meta["description"],
+                    category_id=meta["category_id"],
+                )
+            except Exception:
+                # 建档失败：删除刚提交且没有文档引用的 blob，不留下无引用的文件（暂存文件保留，可以重新完成）
+                self.db.rollback()
+                self.storage.discard(
+                    stored, lambda: document_service.repository.count_by_save_path(str(stored.path))
+                )
+                raise
+            self._remove(upload_id)
+        
+        logger.info(f"上传会话完成: {upload_id} -> {stored.path}")
+        return document
+    
+    async def abort(self, upload_id: str) -> None:
+        """取消上传会话并删除已接收的数据"""
+        async with self._session_lock(upload_id):
+            await self._load(upload_id)
+            self._remove(upload_id)
@@ -0,0 +1,76 @@
+"""
+PDF 转换工作进程入口
+
+使用方法（从 backend 目录运行）:
+    python -m app.worker                  # 持续运行
+    python -m app.worker --office-concurrency 4  # 指定 Office 文档转换并发数
+    python -m app.worker --once           # 处理完当前任务后退出
+
+API 进程默认也会运行一个内置工作进程（CONVERSION_WORKER_EMBEDDED），
+设置 CONVERSION_WORKER_EMBEDDED=false 后转换只由独立工作进程处理。
+"""
+import argparse
+import asyncio
+import logging
+import signal
+
+from app.services.conversion_scheduler import (
+    CONVERTER_IMAGE,
+    CONVERTER_OFFICE,
+    CONVERTER_TEXT,
+    shutdown_conversion_scheduler,
+)
+from app.services.conversion_worker import ConversionWorker
+from app.services.converters import get_converter_registry
+from app.services.libreoffice_pool import shutdown_libreoffice_pool
+from app.services.process_pool import shutdown_pdf_process_pool
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="PDF 转换工作进程")
+    parser.add_argument("--text-concurrency", type=int, default=None, help="同时处理的文本类（纯文本、Markdown、HTML、CSV）转换任务数")
+    parser.add_argument("--image-concurrency", type=int, default=None, help="同时处理的图片转换任务数")
+    parser.add_argument("--office-concurrency", type=int, default=None, help="同时处理的 Office 文档转换任务数")
+    parser.add_argument("--worker-id", default=None, help="工作进程标识（默认 主机名:进程号）")
+    parser.add_argument("--once", action="store_true", help="处理完当前所有任务后退出")
+    args = parser.parse_args()
+    
+    logging.basicConfig(
+        level=logging.INFO,
+        format="%(asctime)s %(levelname)s %(name)s: %(message)s",
+    )
+    
+    async def run() -> None:
+        concurrency = {}
+        if args.text_concurrency:
+            concurrency[CONVERTER_TEXT] = args.text_concurrency
+        if args.image_concurrency:
+            concurrency[CONVERTER_IMAGE] = args.image_concurrency
+        if args.office_concurrency:
+            concurrency[CONVERTER_OFFICE] = args.office_concurrency
+        # 启动时探测一次各转换器是否可用
+        get_converter_registry().probe()
+        worker = ConversionWorker(concurrency=concurrency, worker_id=args.worker_id)
+        if args.once:
+            await worker.run_once()
+            return
+        
+        loop = asyncio.get_running_loop()
+        for sig in (signal.SIGINT, signal.SIGTERM):
+            try:
+                loop.add_signal_handler(sig, worker.stop)
+            except NotImplementedError:
+                # Windows 不支持 add_signal_handler，Ctrl+C 直接中断
+                pass
+        await worker.run()
+    
+    try:
+        asyncio.run(run())
+    finally:
+        shutdown_conversion_scheduler()
+        shutdown_pdf_process_pool()
+        shutdown_libreoffice_pool()
+
+
+if __name__ == "__main__":
+    main()
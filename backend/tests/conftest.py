@@ -1,13 +1,16 @@
 """
 测试配置和共享 fixtures
 """
+import io
 import pytest
 import tempfile
 import shutil
 from pathlib import Path
 from sqlalchemy import create_engine
 from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import StaticPool
 from fastapi.testclient import TestClient
+from PIL import Image
 
 from app.core.database import Base, get_db
 from app.core.dependencies import get_database
@@ -20,7 +23,12 @@ from app.main import app
 def test_db():
     """创建测试数据库"""
     # 使用内存数据库进行测试
-    engine = create_engine("sqlite:///:memory:", connect_args={"check_same_thread": False})
+    # 使用 StaticPool 让所有会话共享同一个内存数据库连接
+    engine = create_engine(
+        "sqlite:///:memory:",
+        connect_args={"check_same_thread": False},
+        poolclass=StaticPool,
+    )
     TestingSessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
     
     # 创建所有表
@@ -46,8 +54,11 @@ def db_session(test_db):
 
 
 @pytest.fixture
-def client(db_session):
+def client(db_session, monkeypatch):
     """创建测试客户端"""
+    # 测试中不启动内置转换工作进程，由用例显式执行转换任务
+    monkeypatch.setattr(settings, "CONVERSION_WORKER_EMBEDDED", False)
+    
     def override_get_database():
         try:
             yield db_session
@@ -84,6 +95,23 @@ def temp_upload_dir(monkeypatch):
     monkeypatch.setattr(settings, "UPLOAD_DIR", original_upload_dir)
 
 
+@pytest.fixture
+def temp_pdf_output_dir(monkeypatch):
+    """创建临时 PDF 输出目录"""
+    temp_dir = tempfile.mkdtemp()
+    monkeypatch.setattr(settings, "PDF_OUTPUT_DIR", temp_dir)
+    yield Path(temp_dir)
+    shutil.rmtree(temp_dir, ignore_errors=True)
+
+
+@pytest.fixture
+def sample_png_file():
+    """创建示例 PNG 图片内容"""
+    buffer = io.BytesIO()
+    Image.new("RGB", (64, 32), "white").save(buffer, format="PNG")
+    return buffer.getvalue()
+
+
 @pytest.fixture
 def sample_pdf_file():
     """创建示例PDF文件内容"""
@@ -0,0 +1,93 @@
+"""
+测试 PDF 转换结果缓存
+"""
+import asyncio
+import multiprocessing
+import os
+from pathlib import Path
+
+from app.core.config import settings
+from app.repositories.document_repository import DocumentRepository
+from app.services.conversion_cache import ConversionCache
+from app.services.pdf_service import PDFService
+
+
+def _lookup_in_worker(cache_dir: str, keys) -> None:
+    """在独立进程中查找缓存（模拟 python -m app.worker）"""
+    cache = ConversionCache(None, Path(cache_dir))
+    for key in keys:
+        cache.get(key)
+
+
+class TestConversionCache:
+    """PDF 转换结果缓存测试类"""
+    
+    def test_reconvert_same_content_hits_cache(
+        self, client, db_session, temp_upload_dir, temp_pdf_output_dir, sample_png_file
+    ):
+        """测试1: 相同内容再次转换直接返回缓存结果"""
+        first = temp_upload_dir / "first.png"
+        second = temp_upload_dir / "second.png"
+        first.write_bytes(sample_png_file)
+        second.write_bytes(sample_png_file)
+        
+        before = ConversionCache(db_session).stats()
+        service = PDFService(db_session)
+        first_pdf = asyncio.run(service.convert_to_pdf(first))
+        second_pdf = asyncio.run(service.convert_to_pdf(second))
+        
+        assert first_pdf == second_pdf
+        assert first_pdf.parent == temp_pdf_output_dir
+        
+        response = client.get("/api/v1/pdf/conversion-cache")
+        assert response.status_code == 200
+        stats = response.json()
+        assert stats["hits"] == before["hits"] + 1
+        assert stats["misses"] == before["misses"] + 1
+        assert stats["entries"] == 1
+        
+        # 临时转换目录已清理
+        assert list((temp_pdf_output_dir / ConversionCache.STAGING_DIR_NAME).iterdir()) == []
+    
+    def test_evict_least_recently_used(self, db_session, temp_pdf_output_dir, monkeypatch):
+        """测试2: 超过容量时淘汰最久未使用的文件，保留被文档引用的文件"""
+        cache = ConversionCache(db_session)
+        paths = []
+        for index in range(4):
+            path = cache.entry_path(f"{index:064x}")
+            path.write_bytes(b"x" * 100)
+            os.utime(path, (1000 + index, 1000 + index))
+            paths.append(path)
+        
+        # 最旧的文件仍被文档引用
+        repository = DocumentRepository(db_session)
+        document = repository.create(
+            title="pinned", save_path="/tmp/pinned.png", file_size=1, file_type="image/png",
+        )
+        repository.update_pdf_info(document.id, pdf_file_size=100, pdf_save_path=str(paths[0]))
+        
+        monkeypatch.setattr(settings, "CONVERSION_CACHE_MAX_SIZE", 250)
+        assert cache.evict() == 2
+        assert [path.exists() for path in paths] == [True, False, False, True]
+        
+        repository.delete(document)
+    
+    def test_stats_shared_across_processes(self, client, temp_pdf_output_dir):
+        """测试3: 独立转换工作进程中的命中/未命中次数可以从 API 读到"""
+        cache = ConversionCache(None)
+        hit_key = f"{1:064x}"
+        cache.entry_path(hit_key).write_bytes(b"%PDF-1.4")
+        before = cache.stats()
+        
+        context = multiprocessing.get_context("spawn")
+        process = context.Process(
+            target=_lookup_in_worker,
+            args=(str(temp_pdf_output_dir), [hit_key, f"{2:064x}", f"{3:064x}"]),
+        )
+        process.start()
+        process.join(30)
+        assert process.exitcode == 0
+        
+        stats = client.get("/api/v1/pdf/conversion-cache").json()
+        assert stats["hits"] == before["hits"] + 1
+        assert stats["misses"] == before["misses"] + 2
@@ -0,0 +1,167 @@
+"""
+测试持久化 PDF 转换任务队列
+"""
+from datetime import datetime, timedelta
+import asyncio
+import io
+
+from sqlalchemy.orm import sessionmaker
+
+from app.core.config import settings
+from app.models.conversion_job_model import ConversionJob
+from app.repositories.conversion_job_repository import ConversionJobRepository
+from app.services.conversion_scheduler import (
+    CONVERTER_IMAGE,
+    CONVERTER_OFFICE,
+    CONVERTER_TEXT,
+    ConversionScheduler,
+    get_conversion_scheduler,
+)
+from app.services.conversion_worker import ConversionWorker
+
+
+class TestConversionJobs:
+    """PDF 转换任务测试类"""
+    
+    def _upload_png(self, client, content: bytes) -> dict:
+        files = {"file": ("scan.png", io.BytesIO(content), "image/png")}
+        response = client.post("/api/v1/documents/upload", files=files)
+        assert response.status_code == 201
+        return response.json()
+    
+    def test_upload_enqueues_and_worker_converts(
+        self, client, db_session, test_db, temp_upload_dir, temp_pdf_output_dir, sample_png_file
+    ):
+        """测试1: 上传后创建转换任务，工作进程处理后文档关联 PDF"""
+        document = self._upload_png(client, sample_png_file)
+        
+        response = client.get(f"/api/v1/documents/{document['id']}/conversion")
+        assert response.status_code == 200
+        assert response.json()["status"] == "pending"
+        
+        worker = ConversionWorker(
+            worker_id="test",
+            session_factory=sessionmaker(autocommit=False, autoflush=False, bind=test_db),
+        )
+        asyncio.run(worker.run_once())
+        
+        db_session.expire_all()
+        response = client.get(f"/api/v1/documents/{document['id']}/conversion")
+        data = response.json()
+        assert data["status"] == "succeeded"
+        assert data["pdf_file_size"] > 0
+    
+    def test_failed_job_is_retried_then_marked_failed(self, db_session, monkeypatch):
+        """测试2: 失败任务按退避重新排队，用完重试次数后标记为失败"""
+        monkeypatch.setattr(settings, "CONVERSION_MAX_ATTEMPTS", 2)
+        repository = ConversionJobRepository(db_session)
+        job = repository.enqueue(1, "/nonexistent/retry.docx", CONVERTER_OFFICE)
+        
+        # 同一源文件不重复创建任务
+        assert repository.enqueue(2, "/nonexistent/retry.docx", CONVERTER_OFFICE).id == job.id
+        
+        # 只领取指定类型的任务
+        assert repository.claim_next("test", CONVERTER_IMAGE) is None
+        claimed = repository.claim_next("test", CONVERTER_OFFICE)
+        assert claimed.id == job.id
+        assert claimed.status == ConversionJob.STATUS_RUNNING
+        repository.mark_failed(claimed, "boom")
+        assert claimed.status == ConversionJob.STATUS_PENDING
+        
+        # 退避期间不会被领取
+        assert repository.claim_next("test", CONVERTER_OFFICE) is None
+        
+        claimed.next_run_time = claimed.create_time
+        db_session.commit()
+        claimed = repository.claim_next("test", CONVERTER_OFFICE)
+        assert claimed.attempts == 2
+        repository.mark_failed(claimed, "boom")
+        assert claimed.status == ConversionJob.STATUS_FAILED
+        assert claimed.last_error == "boom"
+    
+    def test_smaller_jobs_claimed_first(self, db_session):
+        """测试3: 估算开销小的任务优先领取"""
+        repository = ConversionJobRepository(db_session)
+        large = repository.enqueue(
+            1, "/nonexistent/large.pptx", CONVERTER_OFFICE,
+            ConversionScheduler.estimate_priority(".pptx", 50 * 1024 * 1024),
+        )
+        small = repository.enqueue(
+            2, "/nonexistent/small.docx", CONVERTER_OFFICE,
+            ConversionScheduler.estimate_priority(".docx", 20 * 1024),
+        )
+        
+        assert repository.claim_next("test", CONVERTER_OFFICE).id == small.id
+        assert repository.claim_next("test", CONVERTER_OFFICE).id == large.id
+    
+    def test_upload_rejected_when_queue_full(
+        self, client, db_session, temp_upload_dir, sample_png_file, monkeypatch
+    ):
+        """测试4: 转换队列已满时拒绝上传，返回 503 和 Retry-After"""
+        monkeypatch.setattr(
+            get_conversion_scheduler().classes[CONVERTER_IMAGE], "max_queue_depth", 0
+        )
+        
+        files = {"file": ("scan.png", io.BytesIO(sample_png_file), "image/png")}
+        response = client.post("/api/v1/documents/upload", files=files)
+        assert response.status_code == 503
+        assert response.headers["Retry-After"] == str(settings.CONVERSION_BUSY_RETRY_AFTER)
+        
+        # 不需要转换的文件不受影响
+        files = {"file": ("doc.pdf", io.BytesIO(b"%PDF-1.4 test"), "application/pdf")}
+        response = client.post("/api/v1/documents/upload", files=files)
+        assert response.status_code == 201
+    
+    def test_conversion_routed_by_detected_type(
+        self, client, db_session, temp_upload_dir, sample_png_file, monkeypatch
+    ):
+        """测试5: 按文件头识别的类型选择转换器，无法转换的内容不创建任务或直接拒绝"""
+        uploads = [
+            ("mislabeled.doc", b"<html><body>report</body></html>", "text/html", CONVERTER_TEXT),
+            ("mislabeled.pdf", sample_png_file, "image/png", CONVERTER_IMAGE),
+            ("mislabeled.docx", b"\x1f\x8b\x08\x00" + b"\x00" * 16, "application/gzip", None),
+        ]
+        for filename, content, file_type, converter_class in uploads:
+            files = {"file": (filename, io.BytesIO(content), "application/octet-stream")}
+            response = client.post("/api/v1/documents/upload", files=files)
+            assert response.status_code == 201
+            assert response.json()["file_type"] == file_type
+            
+            job = db_session.query(ConversionJob).filter(
+                ConversionJob.document_id == response.json()["id"]
+            ).first()
+            assert (job and job.converter_class) == converter_class
+        
+        monkeypatch.setattr(settings, "UPLOAD_REJECT_UNCONVERTIBLE", True)
+        files = {"file": ("archive.docx", io.BytesIO(b"7z\xbc\xaf\x27\x1c rejected"), "application/msword")}
+        response = client.post("/api/v1/documents/upload", files=files)
+        assert response.status_code == 415
+        assert list((temp_upload_dir / "blobs").rglob("*.7z")) == []
+        assert list(temp_upload_dir.glob("*.part")) == []
+    
+    def test_heartbeat_keeps_running_job(self, db_session, test_db):
+        """测试6: 有心跳的长耗时任务不会被重新排队，任务记录不存在时工作进程直接跳过"""
+        repository = ConversionJobRepository(db_session)
+        alive = repository.enqueue(1, "/nonexistent/alive.docx", CONVERTER_OFFICE)
+        dead = repository.enqueue(2, "/nonexistent/dead.docx", CONVERTER_OFFICE)
+        repository.claim_next("alive", CONVERTER_OFFICE)
+        repository.claim_next("dead", CONVERTER_OFFICE)
+        
+        expired = datetime.utcnow() - timedelta(seconds=settings.CONVERSION_JOB_LOCK_TIMEOUT + 60)
+        for job in (alive, dead):
+            job.locked_time = expired
+        db_session.commit()
+        
+        assert repository.heartbeat(alive.id, "alive")
+        assert not repository.heartbeat(alive.id, "other")
+        assert repository.requeue_stale() == 1
+        
+        db_session.expire_all()
+        assert repository.get_by_id(alive.id).status == ConversionJob.STATUS_RUNNING
+        assert repository.get_by_id(dead.id).status == ConversionJob.STATUS_PENDING
+        
+        worker = ConversionWorker(
+            worker_id="test",
+            session_factory=sessionmaker(autocommit=False, autoflush=False, bind=test_db),
+        )
+        asyncio.run(worker._process(999999))
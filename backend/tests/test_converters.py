@@ -0,0 +1,246 @@
+"""
+测试 PDF 转换器注册表和进程内转换器
+"""
+import asyncio
+import io
+from pathlib import Path
+
+import fitz
+import pytest
+from PIL import Image
+from sqlalchemy.orm import sessionmaker
+
+from app.core.config import settings
+from app.services import converters, libreoffice_pool, pdf_service
+from app.services.conversion_scheduler import CONVERTER_OFFICE, CONVERTER_TEXT
+from app.services.conversion_worker import ConversionWorker
+from app.services.converters import (
+    Converter,
+    ConverterRegistry,
+    CSVConverter,
+    HTMLConverter,
+    ImageConverter,
+    LibreOfficeConverter,
+    TextConverter,
+    get_converter_registry,
+)
+from app.services.pdf_service import PDFService
+
+
+class _FailingConverter(Converter):
+    name = "failing"
+    extensions = frozenset({".txt"})
+    
+    def probe(self):
+        return "1"
+    
+    def convert(self, source_path, staging_dir):
+        raise RuntimeError("转换失败")
+
+
+class _UnavailableConverter(Converter):
+    name = "unavailable"
+    converter_class = CONVERTER_OFFICE
+    extensions = frozenset({".txt", ".docx"})
+    
+    def probe(self):
+        return None
+
+
+class TestConverters:
+    """PDF 转换器测试类"""
+    
+    def test_native_converters(self, tmp_path):
+        """测试1: 纯文本、HTML、CSV 在进程内排版为 PDF"""
+        text = tmp_path / "notes.txt"
+        text.write_bytes("第一行\n    缩进的第二行\n".encode("gb18030"))
+        page = tmp_path / "page.html"
+        page.write_text("<h1>标题</h1><p>正文<script>ignored()</script></p>", encoding="utf-8")
+        table = tmp_path / "table.csv"
+        table.write_text("名称;数量\n甲;1\n乙;2\n", encoding="utf-8")
+        wide = tmp_path / "wide.csv"
+        wide.write_text(",".join(f"c{index}" for index in range(10)) + "\n", encoding="utf-8")
+        
+        for converter, source, expected in (
+            (TextConverter(), text, ["第一行", "    缩进的第二行"]),
+            (HTMLConverter(), page, ["标题", "正文"]),
+            (CSVConverter(), table, ["名称", "数量", "甲", "2"]),
+        ):
+            pdf_path = converter.convert(source, tmp_path)
+            with fitz.open(str(pdf_path)) as doc:
+                content = doc[0].get_text()
+                assert doc[0].rect.width < doc[0].rect.height
+            for value in expected:
+                assert value in content
+        
+        with fitz.open(str(CSVConverter().convert(wide, tmp_path))) as doc:
+            assert doc[0].rect.width > doc[0].rect.height
+    
+    def test_registry_resolution(self):
+        """测试2: 同一格式使用第一个可用的转换器，都不可用时仍按声明的转换器归类"""
+        registry = ConverterRegistry([_UnavailableConverter(), TextConverter()])
+        assert registry.probe() == {"unavailable": None, "pymupdf-text": TextConverter().probe()}
+        assert [converter.name for converter, _ in registry.candidates(".TXT")] == ["pymupdf-text"]
+        assert registry.converter_class(".txt") == CONVERTER_TEXT
+        assert registry.converter_class(".docx") == CONVERTER_OFFICE
+        assert registry.converter_class(".xyz") is None
+        
+        # 未安装 markdown 时 Markdown 文件按纯文本处理
+        candidates = [converter.name for converter, _ in get_converter_registry().candidates(".md")]
+        assert candidates[-1] == "pymupdf-text"
+        assert PDFService.get_converter_class(Path("notes.md")) == CONVERTER_TEXT
+    
+    def test_fallback_to_next_converter(
+        self, db_session, temp_upload_dir, temp_pdf_output_dir, monkeypatch
+    ):
+        """测试3: 转换器失败时使用下一个可用的转换器"""
+        registry = ConverterRegistry([_FailingConverter(), TextConverter()])
+        monkeypatch.setattr(pdf_service, "get_converter_registry", lambda: registry)
+        
+        source = temp_upload_dir / "fallback.txt"
+        source.write_text("fallback content", encoding="utf-8")
+        pdf_path = asyncio.run(PDFService(db_session).convert_to_pdf(source))
+        
+        assert pdf_path.parent == temp_pdf_output_dir
+        with fitz.open(str(pdf_path)) as doc:
+            assert "fallback content" in doc[0].get_text()
+    
+    def test_text_upload_converted_in_text_lane(
+        self, client, db_session, test_db, temp_upload_dir, temp_pdf_output_dir
+    ):
+        """测试4: 文本文件上传后进入文本类队列，由工作进程在进程内转换"""
+        files = {"file": ("readme.txt", io.BytesIO("转换器测试".encode("utf-8")), "text/plain")}
+        document = client.post("/api/v1/documents/upload", files=files).json()
+        assert client.get(f"/api/v1/documents/{document['id']}/conversion").json()["status"] == "pending"
+        
+        worker = ConversionWorker(
+            worker_id="test",
+            session_factory=sessionmaker(autocommit=False, autoflush=False, bind=test_db),
+        )
+        asyncio.run(worker.run_once())
+        
+        db_session.expire_all()
+        data = client.get(f"/api/v1/documents/{document['id']}/conversion").json()
+        assert data["status"] == "succeeded"
+        assert client.get(f"/api/v1/documents/{document['id']}").json()["page_count"] == 1
+    
+    def test_image_frames_and_passthrough(self, tmp_path):
+        """测试5: 多页 TIFF 每帧一页，JPEG / PNG 原样嵌入，无损图片重新压缩后像素不变"""
+        gradient = Image.radial_gradient("L").resize((400, 300))
+        color = Image.merge("RGB", (gradient, gradient.transpose(Image.FLIP_LEFT_RIGHT), gradient))
+        
+        tiff = tmp_path / "scan.tiff"
+        frames = [gradient.convert("1"), color, gradient.resize((300, 400))]
+        frames[0].save(tiff, save_all=True, append_images=frames[1:])
+        with fitz.open(str(ImageConverter().convert(tiff, tmp_path))) as doc:
+            assert [(page.rect.width, page.rect.height) for page in doc] == [(400, 300), (400, 300), (300, 400)]
+            for page, frame in zip(doc, frames):
+                pixmap = page.get_pixmap(colorspace=fitz.csRGB)
+                assert pixmap.samples == frame.convert("RGB").tobytes()
+        
+        jpeg = tmp_path / "photo.jpg"
+        color.save(jpeg, quality=80)
+        png = tmp_path / "chart.png"
+        color.save(png)
+        for source, image_filter in ((jpeg, "DCTDecode"), (png, "FlateDecode")):
+            with fitz.open(str(ImageConverter().convert(source, tmp_path))) as doc:
+                xref = doc[0].get_images(full=True)[0][0]
+                assert doc.xref_get_key(xref, "Filter") == ("name", f"/{image_filter}")
+                if source == jpeg:
+                    assert doc.xref_stream_raw(xref) == jpeg.read_bytes()
+        
+        bmp = tmp_path / "bitmap.bmp"
+        color.save(bmp)
+        sizes = {}
+        for recompress in (True, False):
+            staging_dir = tmp_path / str(recompress)
+            staging_dir.mkdir()
+            pdf_path = ImageConverter(recompress_lossless=recompress).convert(bmp, staging_dir)
+            with fitz.open(str(pdf_path)) as doc:
+                assert doc[0].get_pixmap().samples == color.tobytes()
+            sizes[recompress] = pdf_path.stat().st_size
+        assert sizes[True] < sizes[False] < bmp.stat().st_size
+    
+    def test_large_image_bounded_memory(self, tmp_path, monkeypatch):
+        """测试6: 大图片按条带分块解码、按 DPI 降采样，解压炸弹和超出解码内存的图片被拒绝"""
+        monkeypatch.setattr(settings, "IMAGE_PDF_LARGE_PIXELS", 1000)
+        monkeypatch.setattr(ImageConverter, "BAND_BYTES", 100000)
+        gradient = Image.radial_gradient("L").resize((1000, 700))
+        color = Image.merge("RGB", (gradient, gradient.transpose(Image.FLIP_TOP_BOTTOM), gradient))
+        
+        for name, frame, options in (
+            ("lzw.tiff", color, {"compression": "tiff_lzw", "strip_size": 8000}),
+            ("deflate.tiff", gradient, {"compression": "tiff_deflate", "strip_size": 8000}),
+            ("fax.tiff", gradient.convert("1"), {"compression": "group4", "strip_size": 8000, "tiffinfo": {262: 0}}),
+        ):
+            source = tmp_path / name
+            frame.save(source, **options)
+            with fitz.open(str(ImageConverter().convert(source, tmp_path))) as doc:
+                # 按条带组嵌入为多个图片，拼接后与原图一致
+                assert len(doc[0].get_images()) > 1
+                assert doc[0].get_pixmap(colorspace=fitz.csRGB).samples == frame.convert("RGB").tobytes()
+        
+        monkeypatch.setattr(settings, "IMAGE_PDF_MAX_DPI", 150)
+        scan = tmp_path / "scan.tiff"
+        color.save(scan, compression="tiff_lzw", strip_size=8000, dpi=(600, 600))
+        photo = tmp_path / "photo.jpg"
+        color.save(photo, dpi=(600, 600))
+        for source in (scan, photo):
+            with fitz.open(str(ImageConverter().convert(source, tmp_path))) as doc:
+                assert doc[0].rect == fitz.Rect(0, 0, 1000, 700)
+                assert {width for _, _, width, *_ in doc[0].get_images(full=True)} == {250}
+        
+        monkeypatch.setattr(settings, "IMAGE_PDF_MAX_DECODE_BYTES", 1000)
+        transparent = tmp_path / "transparent.png"
+        color.convert("RGBA").save(transparent)
+        with pytest.raises(ValueError, match="解码需要"):
+            ImageConverter().convert(transparent, tmp_path)
+        
+        default_limit = Image.MAX_IMAGE_PIXELS
+        monkeypatch.setattr(settings, "IMAGE_PDF_MAX_PIXELS", 100000)
+        with pytest.raises(ValueError, match="解压炸弹"):
+            ImageConverter().convert(scan, tmp_path)
+        # 在线程中转换时不修改进程内 Pillow 的全局上限
+        assert Image.MAX_IMAGE_PIXELS == default_limit
+    
+    def test_pillow_limit_only_in_worker_process(self, tmp_path, monkeypatch):
+        """测试7: 只在 PDF 处理工作进程中用 IMAGE_PDF_MAX_PIXELS 替换 Pillow 的全局上限，转换后恢复"""
+        image_path = tmp_path / "scan.png"
+        Image.new("L", (100, 100), 255).save(image_path)
+        monkeypatch.setattr(settings, "IMAGE_PDF_MAX_PIXELS", 100000)
+        # Pillow 的上限低于 IMAGE_PDF_MAX_PIXELS
+        monkeypatch.setattr(Image, "MAX_IMAGE_PIXELS", 1000)
+        
+        # 线程中执行：沿用 Pillow 的上限
+        with pytest.raises(ValueError, match="解压炸弹"):
+            ImageConverter().convert(image_path, tmp_path)
+        assert Image.MAX_IMAGE_PIXELS == 1000
+        
+        # 工作进程中执行：转换期间使用 IMAGE_PDF_MAX_PIXELS
+        monkeypatch.setattr(converters, "in_worker_process", lambda: True)
+        output = ImageConverter().convert(image_path, tmp_path)
+        with fitz.open(str(output)) as doc:
+            assert doc.page_count == 1
+        assert Image.MAX_IMAGE_PIXELS == 1000
+    
+    def test_libreoffice_requires_uno(self, tmp_path, monkeypatch):
+        """测试8: 没有可以导入 uno 的 Python 时 LibreOffice 转换器不可用，不静默降级为一次性进程"""
+        soffice = tmp_path / "soffice"
+        soffice.write_text("#!/bin/sh\necho LibreOffice 7.6\n")
+        soffice.chmod(0o755)
+        monkeypatch.setattr(settings, "LIBREOFFICE_PATH", str(soffice))
+        monkeypatch.setattr(libreoffice_pool, "UNO_AVAILABLE", False)
+        
+        def probe(uno_python, oneshot_fallback):
+            monkeypatch.setattr(libreoffice_pool, "find_uno_python", lambda path: uno_python)
+            monkeypatch.setattr(settings, "LIBREOFFICE_ONESHOT_FALLBACK", oneshot_fallback)
+            libreoffice_pool.get_libreoffice_mode.cache_clear()
+            return LibreOfficeConverter().probe(), libreoffice_pool.get_libreoffice_mode(str(soffice))
+        
+        try:
+            assert probe(None, False) == (None, None)
+            assert probe(None, True) == ("LibreOffice 7.6", libreoffice_pool.MODE_ONESHOT)
+            assert probe("/usr/bin/python3", False) == ("LibreOffice 7.6", libreoffice_pool.MODE_CLIENT)
+        finally:
+            libreoffice_pool.get_libreoffice_mode.cache_clear()
+            libreoffice_pool.get_libreoffice_version.cache_clear()
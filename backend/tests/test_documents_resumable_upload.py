@@ -0,0 +1,123 @@
+"""
+测试 /api/v1/documents/uploads 断点续传接口
+"""
+import hashlib
+from pathlib import Path
+
+import pytest
+
+from app.services.document_service import DocumentService
+from app.services.storage_service import StorageService
+
+
+class TestResumableUpload:
+    """断点续传上传接口测试类"""
+    
+    def _create_session(self, client, content: bytes, filename: str = "large.pdf"):
+        response = client.post(
+            "/api/v1/documents/uploads",
+            json={"filename": filename, "total_size": len(content), "description": "续传"},
+        )
+        assert response.status_code == 201
+        return response.json()
+    
+    def test_upload_in_chunks_and_complete(self, client, temp_upload_dir, sample_pdf_file):
+        """测试1: 分块上传后完成，创建文档"""
+        session = self._create_session(client, sample_pdf_file)
+        upload_id = session["upload_id"]
+        assert session["offset"] == 0
+        
+        half = len(sample_pdf_file) // 2
+        response = client.put(
+            f"/api/v1/documents/uploads/{upload_id}",
+            params={"offset": 0},
+            content=sample_pdf_file[:half],
+        )
+        assert response.status_code == 200
+        assert response.json()["offset"] == half
+        
+        # 查询断点
+        response = client.get(f"/api/v1/documents/uploads/{upload_id}")
+        assert response.json()["offset"] == half
+        
+        response = client.put(
+            f"/api/v1/documents/uploads/{upload_id}",
+            params={"offset": half},
+            content=sample_pdf_file[half:],
+        )
+        assert response.json()["offset"] == len(sample_pdf_file)
+        
+        response = client.post(f"/api/v1/documents/uploads/{upload_id}/complete")
+        assert response.status_code == 201
+        document = response.json()
+        assert document["title"] == "large.pdf"
+        assert document["file_size"] == len(sample_pdf_file)
+        assert document["description"] == "续传"
+        
+        # 会话已清理
+        response = client.get(f"/api/v1/documents/uploads/{upload_id}")
+        assert response.status_code == 404
+    
+    def test_offset_mismatch(self, client, temp_upload_dir, sample_pdf_file):
+        """测试2: 偏移量不一致返回 409 和服务端偏移量"""
+        upload_id = self._create_session(client, sample_pdf_file)["upload_id"]
+        
+        response = client.put(
+            f"/api/v1/documents/uploads/{upload_id}",
+            params={"offset": 10},
+            content=sample_pdf_file,
+        )
+        assert response.status_code == 409
+        assert response.headers["Upload-Offset"] == "0"
+    
+    def test_complete_incomplete_upload(self, client, temp_upload_dir, sample_pdf_file):
+        """测试3: 数据未全部接收时不能完成"""
+        upload_id = self._create_session(client, sample_pdf_file)["upload_id"]
+        client.put(
+            f"/api/v1/documents/uploads/{upload_id}",
+            params={"offset": 0},
+            content=sample_pdf_file[:10],
+        )
+        
+        response = client.post(f"/api/v1/documents/uploads/{upload_id}/complete")
+        assert response.status_code == 409
+        
+        response = client.delete(f"/api/v1/documents/uploads/{upload_id}")
+        assert response.status_code == 204
+        assert list(Path(temp_upload_dir, ".staging").iterdir()) == []
+    
+    def test_complete_retry_after_failure(self, client, temp_upload_dir, sample_pdf_file, monkeypatch):
+        """测试4: 建档失败时会话保留且不留下无引用的 blob，重新完成即可创建文档"""
+        # 内容唯一，blob 不被其他用例的文档引用
+        content = sample_pdf_file + b"\n% retry after failure\n"
+        blob_path = StorageService().blob_path(hashlib.sha256(content).hexdigest(), ".pdf")
+        upload_id = self._create_session(client, content)["upload_id"]
+        client.put(
+            f"/api/v1/documents/uploads/{upload_id}",
+            params={"offset": 0},
+            content=content,
+        )
+        
+        async def fail(*args, **kwargs):
+            raise RuntimeError("数据库不可用")
+        
+        with monkeypatch.context() as patch:
+            patch.setattr(DocumentService, "create_document_from_blob", fail)
+            with pytest.raises(RuntimeError):
+                client.post(f"/api/v1/documents/uploads/{upload_id}/complete")
+        assert not blob_path.exists()
+        
+        response = client.get(f"/api/v1/documents/uploads/{upload_id}")
+        assert response.json()["offset"] == len(content)
+        
+        response = client.post(f"/api/v1/documents/uploads/{upload_id}/complete")
+        assert response.status_code == 201
+        assert response.json()["file_size"] == len(content)
+        assert blob_path.exists()
+        assert list(Path(temp_upload_dir, ".staging").iterdir()) == []
+    
+    def test_invalid_upload_id(self, client, temp_upload_dir):
+        """测试5: 不是服务端生成格式的上传会话ID视为不存在"""
+        for upload_id in ("A" * 32, "a" * 31, "abc", "0" * 31 + "g"):
+            response = client.get(f"/api/v1/documents/uploads/{upload_id}")
+            assert response.status_code == 404
@@ -279,3 +279,37 @@ class TestDocumentUpload:
             datetime.strptime(timestamp_str, "%Y%m%d_%H%M%S")
         except ValueError:
             pytest.fail(f"文件名时间戳格式不正确: {timestamp_str}")
+
+
+class TestBatchUpload:
+    """批量上传接口测试类"""
+    
+    def test_batch_upload(self, client, temp_upload_dir, sample_pdf_file, monkeypatch):
+        """测试1: 批量上传，逐个返回结果，超限文件单独失败"""
+        from app.core.config import settings
+        
+        monkeypatch.setattr(settings, "MAX_UPLOAD_SIZE", len(sample_pdf_file))
+        files = [
+            ("files", ("a.pdf", BytesIO(sample_pdf_file), "application/pdf")),
+            ("files", ("b.pdf", BytesIO(sample_pdf_file), "application/pdf")),
+            ("files", ("big.pdf", BytesIO(sample_pdf_file + b"x"), "application/pdf")),
+        ]
+        
+        response = client.post(
+            "/api/v1/documents/upload/batch",
+            files=files,
+            data={"description": "批量"},
+        )
+        
+        assert response.status_code == 201
+        result = response.json()
+        assert result["total"] == 3
+        assert result["succeeded"] == 2
+        assert result["failed"] == 1
+        assert [item["filename"] for item in result["results"]] == ["a.pdf", "b.pdf", "big.pdf"]
+        assert result["results"][0]["document"]["description"] == "批量"
+        assert result["results"][2]["success"] is False
+        assert result["results"][2]["error"]
+        
+        # 相同内容只保存一份
+        assert len(list((temp_upload_dir / "blobs").rglob("*.pdf"))) == 1
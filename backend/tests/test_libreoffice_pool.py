@@ -0,0 +1,166 @@
+"""
+测试 LibreOffice 工作进程池（使用模拟的 soffice 和 UNO 客户端，不需要安装 LibreOffice）
+"""
+import os
+import signal
+import sys
+import time
+
+import pytest
+
+from app.core.config import settings
+from app.services import libreoffice_pool
+from app.services.libreoffice_pool import LibreOfficePool
+
+pytestmark = pytest.mark.skipif(os.name == "nt", reason="模拟的 soffice 依赖可执行脚本")
+
+# 模拟常驻 soffice：把进程号写入 <FAKE_OFFICE_DIR>/<管道名>.pid，然后一直运行直到被结束
+FAKE_SOFFICE = """
+import os
+import sys
+import time
+
+pipe = next(arg.split("name=")[1].split(";")[0] for arg in sys.argv if arg.startswith("--accept="))
+with open(os.path.join(os.environ["FAKE_OFFICE_DIR"], pipe + ".pid"), "w") as f:
+    f.write(str(os.getpid()))
+while True:
+    time.sleep(1)
+"""
+
+# 模拟 UNO 客户端：管道对应的 soffice 在运行时视为连接成功，按源文件内容模拟转换结果，
+# 成功时输出文件内容为处理该任务的 soffice 进程号
+FAKE_UNO_CLIENT = """
+import argparse
+import os
+import sys
+import time
+
+parser = argparse.ArgumentParser()
+parser.add_argument("--pipe", required=True)
+parser.add_argument("--connect-timeout", type=float, default=10)
+parser.add_argument("--ping", action="store_true")
+parser.add_argument("source", nargs="?")
+parser.add_argument("target", nargs="?")
+args = parser.parse_args()
+
+try:
+    with open(os.path.join(os.environ["FAKE_OFFICE_DIR"], args.pipe + ".pid")) as f:
+        pid = int(f.read())
+    os.kill(pid, 0)
+except (OSError, ValueError):
+    sys.exit(3)
+if args.ping:
+    sys.exit(0)
+
+with open(args.source) as f:
+    behavior = f.read().strip()
+if behavior == "hang":
+    time.sleep(60)
+if behavior == "crash":
+    sys.exit(1)
+if behavior == "unreadable":
+    sys.exit(2)
+with open(args.target, "w") as f:
+    f.write(str(pid))
+"""
+
+
+def _is_running(pid: int) -> bool:
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    return True
+
+
+class TestLibreOfficePool:
+    """LibreOffice 工作进程池测试类"""
+    
+    @pytest.fixture
+    def office(self, tmp_path, monkeypatch):
+        """模拟 MODE_CLIENT 运行方式，返回 (进程池, 生成源文件的函数, 输出目录)"""
+        state_dir = tmp_path / "state"
+        output_dir = tmp_path / "output"
+        state_dir.mkdir()
+        output_dir.mkdir()
+        
+        soffice = tmp_path / "soffice"
+        soffice.write_text(f"#!{sys.executable}\n{FAKE_SOFFICE}")
+        soffice.chmod(0o755)
+        client = tmp_path / "uno_client.py"
+        client.write_text(FAKE_UNO_CLIENT)
+        
+        monkeypatch.setenv("FAKE_OFFICE_DIR", str(state_dir))
+        monkeypatch.setattr(settings, "LIBREOFFICE_PROFILE_DIR", str(tmp_path / "profiles"))
+        monkeypatch.setattr(settings, "LIBREOFFICE_START_TIMEOUT", 10)
+        monkeypatch.setattr(libreoffice_pool, "get_libreoffice_mode", lambda path: libreoffice_pool.MODE_CLIENT)
+        monkeypatch.setattr(libreoffice_pool, "find_uno_python", lambda path: sys.executable)
+        monkeypatch.setattr(libreoffice_pool, "UNO_CLIENT_SCRIPT", client)
+        
+        counter = iter(range(1000))
+        
+        def document(behavior: str = "ok"):
+            path = tmp_path / f"doc{next(counter)}.docx"
+            path.write_text(behavior)
+            return path
+        
+        pool = LibreOfficePool(str(soffice), 1)
+        try:
+            yield pool, document, output_dir
+        finally:
+            pool.shutdown()
+    
+    @staticmethod
+    def _served_by(pdf_path) -> int:
+        """处理该任务的 soffice 进程号"""
+        assert pdf_path is not None
+        return int(pdf_path.read_text())
+    
+    def test_recycle_after_max_jobs(self, office, monkeypatch):
+        """测试1: 工作进程处理 LIBREOFFICE_MAX_JOBS_PER_WORKER 个任务后重启"""
+        pool, document, output_dir = office
+        monkeypatch.setattr(settings, "LIBREOFFICE_MAX_JOBS_PER_WORKER", 2)
+        
+        pids = [self._served_by(pool.convert(document(), output_dir)) for _ in range(5)]
+        
+        assert pids[0] == pids[1]
+        assert pids[2] == pids[3]
+        assert pids[1] != pids[2] != pids[4]
+        # 回收的进程已结束
+        assert not _is_running(pids[0])
+        assert not _is_running(pids[2])
+    
+    def test_restart_after_crash(self, office):
+        """测试2: 转换出错或 soffice 崩溃后，下次使用前重启工作进程；文档无法打开时不重启"""
+        pool, document, output_dir = office
+        first = self._served_by(pool.convert(document(), output_dir))
+        
+        # UNO 连接异常：进程状态不可信，立即结束
+        assert pool.convert(document("crash"), output_dir) is None
+        assert not _is_running(first)
+        second = self._served_by(pool.convert(document(), output_dir))
+        assert second != first
+        
+        # 文档本身无法打开：工作进程继续使用
+        assert pool.convert(document("unreadable"), output_dir) is None
+        assert self._served_by(pool.convert(document(), output_dir)) == second
+        
+        # soffice 进程意外退出
+        os.kill(second, signal.SIGKILL)
+        third = self._served_by(pool.convert(document(), output_dir))
+        assert third != second
+    
+    def test_client_timeout_kills_worker(self, office):
+        """测试3: UNO 客户端子进程超时时结束客户端和常驻进程，下次使用前重启"""
+        pool, document, output_dir = office
+        first = self._served_by(pool.convert(document(), output_dir))
+        
+        started = time.monotonic()
+        assert pool.convert(document("hang"), output_dir, timeout=1) is None
+        assert time.monotonic() - started < 15
+        assert not _is_running(first)
+        # 没有残留的临时输出文件
+        assert not any(path.name.endswith(".part") for path in output_dir.iterdir())
+        
+        second = self._served_by(pool.convert(document(), output_dir))
+        assert second != first
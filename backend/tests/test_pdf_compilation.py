@@ -0,0 +1,780 @@
+"""
+测试 /api/v1/pdf/compilations 异步汇编接口
+"""
+import asyncio
+import io
+import json
+import multiprocessing
+import os
+import shutil
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+from pathlib import Path
+
+import fitz
+import pytest
+from PIL import Image
+from sqlalchemy.orm import sessionmaker
+
+from app.core.config import settings
+from app.models.compilation_job_model import CompilationJob
+from app.repositories.compilation_job_repository import CompilationJobRepository
+from app.schemas.pdf import PDFGenerateRequest
+from app.services import compilation_cache
+from app.services.compilation_cache import CompilationCache
+from app.services.conversion_worker import ConversionWorker
+from app.services.pdf_service import PDFService
+
+
+@pytest.fixture
+def temp_compilation_dir(monkeypatch):
+    """创建临时汇编目录"""
+    temp_dir = tempfile.mkdtemp()
+    monkeypatch.setattr(settings, "PDF_COMPILATION_DIR", temp_dir)
+    yield temp_dir
+    shutil.rmtree(temp_dir, ignore_errors=True)
+
+
+def _hold_single_flight(cache_dir: str, key: str, holding, release) -> None:
+    """在另一个进程中持有缓存键的 single-flight 锁，直到 release 被设置"""
+    with CompilationCache(cache_dir=Path(cache_dir)).single_flight(key):
+        holding.set()
+        release.wait(30)
+
+
+def make_pdf(text: str, pages: int = 1) -> bytes:
+    """生成指定页数的 PDF 内容"""
+    doc = fitz.open()
+    for index in range(pages):
+        doc.new_page().insert_text((72, 72), f"{text} {index + 1}")
+    content = doc.tobytes()
+    doc.close()
+    return content
+
+
+class TestPDFCompilation:
+    """异步汇编接口测试类"""
+    
+    def _upload(self, client, filename: str, content: bytes) -> int:
+        files = {"file": (filename, io.BytesIO(content), "application/pdf")}
+        response = client.post("/api/v1/documents/upload", files=files)
+        assert response.status_code == 201
+        return response.json()["id"]
+    
+    def _run_worker(self, test_db):
+        worker = ConversionWorker(
+            worker_id="test",
+            session_factory=sessionmaker(autocommit=False, autoflush=False, bind=test_db),
+        )
+        asyncio.run(worker.run_once())
+    
+    def test_submit_poll_and_download(
+        self, client, db_session, test_db, temp_upload_dir, temp_compilation_dir
+    ):
+        """测试1: 提交后立即返回任务，工作进程完成后可下载"""
+        first = self._upload(client, "a.pdf", make_pdf("first", pages=2))
+        second = self._upload(client, "b.pdf", make_pdf("second", pages=3))
+        
+        response = client.post(
+            "/api/v1/pdf/compilations",
+            json={"document_ids": [first, second], "title": "汇编"},
+        )
+        assert response.status_code == 202
+        job = response.json()
+        assert job["status"] == "pending"
+        assert job["total_documents"] == 2
+        assert job["download_url"] is None
+        
+        # 未完成时不能下载
+        response = client.get(f"/api/v1/pdf/compilations/{job['job_id']}/download")
+        assert response.status_code == 409
+        
+        self._run_worker(test_db)
+        
+        db_session.expire_all()
+        response = client.get(f"/api/v1/pdf/compilations/{job['job_id']}")
+        data = response.json()
+        assert data["status"] == "succeeded"
+        assert data["processed_documents"] == 2
+        assert data["processed_pages"] == 5
+        
+        response = client.get(data["download_url"])
+        assert response.status_code == 200
+        assert response.headers["content-type"] == "application/pdf"
+        with fitz.open(stream=response.content, filetype="pdf") as merged:
+            assert merged.page_count == 5
+    
+    def test_submit_with_missing_document(self, client, temp_upload_dir):
+        """测试2: 提交时校验文档是否存在"""
+        response = client.post("/api/v1/pdf/compilations", json={"document_ids": [999999]})
+        assert response.status_code == 404
+        
+        response = client.get("/api/v1/pdf/compilations/999999")
+        assert response.status_code == 404
+    
+    def test_identical_requests_reuse_output(
+        self, client, db_session, temp_upload_dir, temp_compilation_dir
+    ):
+        """测试3: 相同文档和标题的汇编复用已有文件，并发请求只合并一次"""
+        first = self._upload(client, "a.pdf", make_pdf("first"))
+        second = self._upload(client, "b.pdf", make_pdf("second"))
+        
+        service = PDFService(db_session)
+        merges = []
+        original_merge = service.compose_pdf
+        
+        def counting_merge(*args, **kwargs):
+            merges.append(1)
+            return original_merge(*args, **kwargs)
+        
+        service.compose_pdf = counting_merge
+        
+        with ThreadPoolExecutor(max_workers=4) as executor:
+            paths = list(executor.map(
+                lambda _: service.generate_pdf(document_ids=[first, second], title="汇编"),
+                range(4),
+            ))
+        
+        assert len(set(paths)) == 1
+        assert len(merges) == 1
+        
+        # 顺序或标题不同则重新生成
+        other = service.generate_pdf(document_ids=[second, first], title="汇编")
+        assert other != paths[0]
+        assert len(merges) == 2
+    
+    def test_compilation_dir_size_budget(
+        self, client, db_session, temp_upload_dir, temp_compilation_dir, monkeypatch
+    ):
+        """测试4: 汇编目录超过容量上限时淘汰最久未使用的结果"""
+        document_id = self._upload(client, "a.pdf", make_pdf("first"))
+        service = PDFService(db_session)
+        
+        oldest = service.generate_pdf(document_ids=[document_id], title="one")
+        os.utime(oldest, (1000, 1000))
+        monkeypatch.setattr(settings, "COMPILATION_CACHE_MAX_SIZE", oldest.stat().st_size + 1)
+        newest = service.generate_pdf(document_ids=[document_id], title="two")
+        
+        assert not oldest.exists()
+        assert newest.exists()
+    
+    def test_compose_with_headers_and_bookmarks(
+        self, client, db_session, temp_upload_dir, temp_compilation_dir
+    ):
+        """测试5: 单次汇编完成合并、逐节页眉和书签"""
+        first = self._upload(client, "第一章.pdf", make_pdf("first", pages=2))
+        second = self._upload(client, "第二章.pdf", make_pdf("second", pages=1))
+        
+        output_path = PDFService(db_session).generate_pdf(
+            document_ids=[first, second],
+            title="汇编",
+            add_header=True,
+        )
+        
+        with fitz.open(str(output_path)) as merged:
+            assert merged.page_count == 3
+            assert merged.get_toc() == [[1, "第一章.pdf", 1], [1, "第二章.pdf", 3]]
+            assert "第一章" in merged[1].get_text()
+            assert "第二章" in merged[2].get_text()
+    
+    def test_generate_converts_missing_pdfs_concurrently(
+        self, client, db_session, temp_upload_dir, temp_pdf_output_dir, temp_compilation_dir
+    ):
+        """测试6: 尚未转换的文档在汇编前并发转换，结果写回文档"""
+        images = []
+        for color in ("red", "green", "blue"):
+            buffer = io.BytesIO()
+            Image.new("RGB", (64, 32), color).save(buffer, format="PNG")
+            files = {"file": (f"{color}.png", io.BytesIO(buffer.getvalue()), "image/png")}
+            response = client.post("/api/v1/documents/upload", files=files)
+            assert response.status_code == 201
+            images.append(response.json()["id"])
+        document_id = self._upload(client, "a.pdf", make_pdf("first", pages=2))
+        
+        service = PDFService(db_session)
+        in_flight = []
+        peak = []
+        original_convert = service.convert_to_pdf
+        
+        async def tracking_convert(*args, **kwargs):
+            in_flight.append(1)
+            peak.append(len(in_flight))
+            await asyncio.sleep(0.05)
+            try:
+                return await original_convert(*args, **kwargs)
+            finally:
+                in_flight.pop()
+        
+        service.convert_to_pdf = tracking_convert
+        output_path = service.generate_pdf(document_ids=images + [document_id], title="汇编")
+        
+        assert max(peak) == 3
+        with fitz.open(str(output_path)) as merged:
+            assert merged.page_count == 5
+        
+        db_session.expire_all()
+        for image_id in images:
+            document = service.repository.get_by_id(image_id)
+            assert document.pdf_save_path
+            assert os.path.exists(document.pdf_save_path)
+    
+    def test_get_by_ids_preserves_order_and_reports_missing(
+        self, client, db_session, temp_upload_dir, temp_compilation_dir
+    ):
+        """测试7: 批量获取文档保持请求顺序，一次报告所有不存在的ID"""
+        first = self._upload(client, "a.pdf", make_pdf("first"))
+        second = self._upload(client, "b.pdf", make_pdf("second"))
+        
+        repository = PDFService(db_session).repository
+        documents, missing = repository.get_by_ids([second, 999998, first, second, 999999])
+        assert [document.id for document in documents] == [second, first, second]
+        assert missing == [999998, 999999]
+        
+        response = client.post(
+            "/api/v1/pdf/compilations",
+            json={"document_ids": [first, 999998, 999999]},
+        )
+        assert response.status_code == 404
+        assert "999998" in response.json()["detail"]
+        assert "999999" in response.json()["detail"]
+    
+    def test_generate_with_selector(
+        self, client, db_session, temp_upload_dir, temp_compilation_dir
+    ):
+        """测试8: 按筛选条件在服务端选择文档并排序"""
+        from app.models.document_model import Document, document_tags
+        from app.models.tag_model import Tag
+        
+        tag = Tag(name="汇编筛选", color="#00FF00")
+        db_session.add(tag)
+        db_session.commit()
+        
+        first = self._upload(client, "a.pdf", make_pdf("first"))
+        second = self._upload(client, "b.pdf", make_pdf("second", pages=2))
+        other = self._upload(client, "c.pdf", make_pdf("other", pages=4))
+        
+        db_session.query(Document).filter(Document.id.in_([first, second])).update(
+            {Document.category_id: 7}, synchronize_session=False
+        )
+        db_session.execute(document_tags.insert(), [
+            {"document_id": doc_id, "tag_id": tag.id} for doc_id in (first, second, other)
+        ])
+        db_session.commit()
+        
+        selector = {"tag_ids": [tag.id], "category_id": 7, "order_by": "title", "descending": True}
+        assert PDFService(db_session).resolve_document_ids(
+            selector=PDFGenerateRequest(selector=selector).selector
+        ) == [second, first]
+        
+        response = client.post("/api/v1/pdf/generate", json={"selector": selector, "title": "筛选"})
+        assert response.status_code == 200
+        with fitz.open(stream=response.content, filetype="pdf") as merged:
+            assert merged.page_count == 3
+            assert [entry[1] for entry in merged.get_toc()] == ["b.pdf", "a.pdf"]
+        
+        # 没有匹配的文档
+        response = client.post("/api/v1/pdf/generate", json={"selector": {"category_id": 999}})
+        assert response.status_code == 400
+        
+        # document_ids 与 selector 必须二选一
+        response = client.post("/api/v1/pdf/generate", json={"title": "空"})
+        assert response.status_code == 422
+        response = client.post(
+            "/api/v1/pdf/generate",
+            json={"document_ids": [first], "selector": selector},
+        )
+        assert response.status_code == 422
+    
+    def test_generate_with_page_ranges(
+        self, client, db_session, test_db, temp_upload_dir, temp_compilation_dir
+    ):
+        """测试9: 按页码范围只复制选定页面，书签指向实际插入的页"""
+        report = self._upload(client, "report.pdf", make_pdf("report", pages=5))
+        summary = self._upload(client, "summary.pdf", make_pdf("summary", pages=2))
+        
+        response = client.post(
+            "/api/v1/pdf/generate",
+            json={
+                "document_ids": [report, summary],
+                "page_ranges": {str(report): {"start": 2, "end": 3}, str(summary): {"start": 2}},
+            },
+        )
+        assert response.status_code == 200
+        with fitz.open(stream=response.content, filetype="pdf") as merged:
+            assert merged.page_count == 3
+            assert "report 2" in merged[0].get_text()
+            assert "report 3" in merged[1].get_text()
+            assert "summary 2" in merged[2].get_text()
+            assert merged.get_toc() == [[1, "report.pdf", 1], [1, "summary.pdf", 3]]
+        
+        # 异步任务同样保留页码范围
+        response = client.post(
+            "/api/v1/pdf/compilations",
+            json={"document_ids": [report], "page_ranges": {str(report): {"start": 5}}},
+        )
+        job_id = response.json()["job_id"]
+        self._run_worker(test_db)
+        response = client.get(f"/api/v1/pdf/compilations/{job_id}/download")
+        with fitz.open(stream=response.content, filetype="pdf") as merged:
+            assert merged.page_count == 1
+        
+        # 起始页超出文档页数
+        response = client.post(
+            "/api/v1/pdf/generate",
+            json={"document_ids": [summary], "page_ranges": {str(summary): {"start": 3}}},
+        )
+        assert response.status_code == 400
+        
+        # 结束页小于起始页、文档不在列表中
+        for page_ranges in ({str(report): {"start": 3, "end": 2}}, {"999999": {"start": 1}}):
+            response = client.post(
+                "/api/v1/pdf/generate",
+                json={"document_ids": [report], "page_ranges": page_ranges},
+            )
+            assert response.status_code == 422
+    
+    def test_split_into_volumes(
+        self, client, db_session, test_db, temp_upload_dir, temp_compilation_dir
+    ):
+        """测试10: 按每卷最大页数分卷，每卷完成即可下载，并生成分卷清单"""
+        first = self._upload(client, "a.pdf", make_pdf("first", pages=2))
+        second = self._upload(client, "b.pdf", make_pdf("second", pages=5))
+        
+        # 每卷完成时文件已放入汇编目录
+        completed = []
+        
+        def on_volume(volume):
+            assert (settings.pdf_compilation_dir_path / volume["file"]).exists()
+            completed.append(volume["index"])
+        
+        manifest_path = PDFService(db_session).generate_pdf(
+            document_ids=[first, second],
+            title="分卷",
+            max_pages_per_volume=3,
+            on_volume=on_volume,
+        )
+        assert completed == [1, 2, 3]
+        
+        response = client.post(
+            "/api/v1/pdf/compilations",
+            json={"document_ids": [first, second], "title": "分卷", "max_pages_per_volume": 3},
+        )
+        job_id = response.json()["job_id"]
+        self._run_worker(test_db)
+        
+        db_session.expire_all()
+        job = client.get(f"/api/v1/pdf/compilations/{job_id}").json()
+        assert job["status"] == "succeeded"
+        assert [volume["pages"] for volume in job["volumes"]] == [3, 3, 1]
+        
+        tocs = []
+        for volume in job["volumes"]:
+            response = client.get(volume["download_url"])
+            assert response.status_code == 200
+            with fitz.open(stream=response.content, filetype="pdf") as volume_doc:
+                assert volume_doc.page_count == volume["pages"]
+                tocs.append(volume_doc.get_toc())
+        assert tocs == [
+            [[1, "a.pdf", 1], [1, "b.pdf", 3]],
+            [[1, "b.pdf（续）", 1]],
+            [[1, "b.pdf（续）", 1]],
+        ]
+        
+        response = client.get(f"/api/v1/pdf/compilations/{job_id}/download")
+        assert response.headers["content-type"].startswith("application/json")
+        manifest = response.json()
+        assert manifest["total_pages"] == 7
+        assert [volume["file"] for volume in manifest["volumes"]] == [
+            volume["file"] for volume in json.loads(manifest_path.read_text(encoding="utf-8"))["volumes"]
+        ]
+        
+        response = client.get(f"/api/v1/pdf/compilations/{job_id}/volumes/4")
+        assert response.status_code == 404
+        
+        # 同步接口不支持分卷
+        response = client.post(
+            "/api/v1/pdf/generate",
+            json={"document_ids": [first], "max_pages_per_volume": 1},
+        )
+        assert response.status_code == 400
+    
+    def test_output_profiles_downsample_images(
+        self, client, db_session, temp_upload_dir, temp_compilation_dir
+    ):
+        """测试11: screen / email 输出配置将高分辨率扫描图片降采样，archive 保留原图"""
+        buffer = io.BytesIO()
+        Image.effect_noise((1200, 1200), 64).convert("RGB").save(buffer, format="PNG")
+        scan = fitz.open()
+        # 2 英寸见方显示 1200 像素，约 600 DPI
+        scan.new_page().insert_image(fitz.Rect(72, 72, 216, 216), stream=buffer.getvalue())
+        document_id = self._upload(client, "scan.pdf", scan.tobytes())
+        scan.close()
+        
+        service = PDFService(db_session)
+        sizes = {}
+        widths = {}
+        for profile in ("archive", "screen", "email"):
+            output_path = service.generate_pdf(document_ids=[document_id], title="扫描", profile=profile)
+            sizes[profile] = output_path.stat().st_size
+            with fitz.open(str(output_path)) as compiled:
+                widths[profile] = compiled[0].get_images(full=True)[0][2]
+        
+        assert widths == {"archive": 1200, "screen": 300, "email": 192}
+        assert sizes["email"] < sizes["screen"] < sizes["archive"] / 3
+    
+    def test_header_and_watermark_share_one_overlay(
+        self, client, db_session, temp_upload_dir, temp_compilation_dir
+    ):
+        """测试12: 页眉和水印只嵌入一次，每页只增加很小的引用"""
+        document_id = self._upload(client, "长报告.pdf", make_pdf("report", pages=300))
+        service = PDFService(db_session)
+        
+        plain = service.generate_pdf(document_ids=[document_id], title="无页眉")
+        stamped = service.generate_pdf(
+            document_ids=[document_id],
+            title="有页眉",
+            add_header=True,
+            header_text="内部资料",
+            watermark_text="机密",
+        )
+        
+        assert (stamped.stat().st_size - plain.stat().st_size) / 300 < 100
+        with fitz.open(str(stamped)) as compiled:
+            for page_number in (0, 150, 299):
+                text = compiled[page_number].get_text()
+                assert "内部资料" in text
+                assert "机密" in text
+                assert f"report {page_number + 1}" in text
+    
+    def test_append_to_compilation(
+        self, client, db_session, test_db, temp_upload_dir, temp_compilation_dir
+    ):
+        """测试13: 在已完成的汇编末尾增量追加文档，原汇编保持不变"""
+        first = self._upload(client, "a.pdf", make_pdf("first", pages=2))
+        second = self._upload(client, "b.pdf", make_pdf("second", pages=4))
+        
+        response = client.post(
+            "/api/v1/pdf/compilations",
+            json={"document_ids": [first], "title": "追加", "add_header": True},
+        )
+        base_id = response.json()["job_id"]
+        
+        # 未完成的汇编不能追加
+        response = client.post(f"/api/v1/pdf/compilations/{base_id}/append", json={"document_ids": [second]})
+        assert response.status_code == 409
+        
+        self._run_worker(test_db)
+        db_session.expire_all()
+        base_content = client.get(f"/api/v1/pdf/compilations/{base_id}/download").content
+        
+        response = client.post(
+            f"/api/v1/pdf/compilations/{base_id}/append",
+            json={"document_ids": [second], "page_ranges": {str(second): {"start": 2, "end": 3}}},
+        )
+        assert response.status_code == 202
+        job = response.json()
+        assert job["title"] == "追加"
+        assert job["total_documents"] == 2
+        
+        self._run_worker(test_db)
+        db_session.expire_all()
+        data = client.get(f"/api/v1/pdf/compilations/{job['job_id']}").json()
+        assert data["status"] == "succeeded"
+        assert data["processed_documents"] == 2
+        assert data["processed_pages"] == 4
+        
+        content = client.get(data["download_url"]).content
+        # 增量保存：原文件内容保持在新文件开头
+        assert content.startswith(base_content)
+        with fitz.open(stream=content, filetype="pdf") as merged:
+            assert merged.page_count == 4
+            assert merged.get_toc() == [[1, "a.pdf", 1], [1, "b.pdf", 3]]
+            assert "second 2" in merged[2].get_text()
+            assert "second 3" in merged[3].get_text()
+            # 追加的页面沿用原汇编的页眉设置
+            assert "b.pdf" in merged[3].get_text().replace(" ", "")
+        
+        # 原汇编不变
+        response = client.get(f"/api/v1/pdf/compilations/{base_id}/download")
+        assert response.content == base_content
+        
+        # 原汇编中已有的文档只能按相同的页码范围追加
+        response = client.post(
+            f"/api/v1/pdf/compilations/{base_id}/append",
+            json={"document_ids": [first], "page_ranges": {str(first): {"start": 1, "end": 1}}},
+        )
+        assert response.status_code == 400
+        response = client.post(f"/api/v1/pdf/compilations/{base_id}/append", json={"document_ids": [first]})
+        assert response.status_code == 202
+        self._run_worker(test_db)
+        
+        response = client.post(f"/api/v1/pdf/compilations/{base_id}/append", json={"document_ids": [999999]})
+        assert response.status_code == 404
+    
+    def test_estimate_from_document_metadata(
+        self, client, db_session, temp_upload_dir, temp_compilation_dir, monkeypatch
+    ):
+        """测试14: 按入库时记录的元数据预估汇编规模，超出上限时拒绝提交"""
+        first = self._upload(client, "a.pdf", make_pdf("estimate first", pages=2))
+        second = self._upload(client, "b.pdf", make_pdf("estimate second", pages=5))
+        assert client.get(f"/api/v1/documents/{second}").json()["page_count"] == 5
+        
+        image = io.BytesIO()
+        Image.new("RGB", (40, 40), "white").save(image, format="PNG")
+        files = {"file": ("c.png", io.BytesIO(image.getvalue()), "image/png")}
+        pending = client.post("/api/v1/documents/upload", files=files).json()["id"]
+        
+        # 预估不打开任何 PDF
+        def fail_open(*args, **kwargs):
+            raise AssertionError("预估时不应打开 PDF")
+        
+        request = {
+            "document_ids": [first, second, pending],
+            "page_ranges": {str(second): {"start": 2, "end": 3}},
+            "max_pages_per_volume": 2,
+        }
+        with monkeypatch.context() as patch:
+            patch.setattr(fitz, "open", fail_open)
+            response = client.post("/api/v1/pdf/estimate", json=request)
+        assert response.status_code == 200
+        estimate = response.json()
+        assert estimate["total_documents"] == 3
+        # 待转换的图片按一页估算
+        assert estimate["total_pages"] == 5
+        assert estimate["converted_documents"] == 2
+        assert estimate["pending_conversions"] == 1
+        assert estimate["unknown_page_documents"] == 1
+        assert estimate["estimated_pages"] == 1
+        assert estimate["skipped_documents"] == 0
+        assert estimate["estimated_volumes"] == 3
+        assert estimate["exceeds_limits"] is False
+        
+        response = client.post(
+            "/api/v1/pdf/estimate",
+            json={"document_ids": [first], "page_ranges": {str(first): {"start": 3}}},
+        )
+        assert response.status_code == 400
+        
+        monkeypatch.setattr(settings, "COMPILATION_MAX_PAGES", 3)
+        response = client.post("/api/v1/pdf/estimate", json={"document_ids": [first, second]})
+        assert response.json()["exceeds_limits"] is True
+        
+        for path in ("/api/v1/pdf/compilations", "/api/v1/pdf/generate"):
+            response = client.post(path, json={"document_ids": [first, second]})
+            assert response.status_code == 413
+        
+        # 页数未知的文档按平均每页大小估算，不会按 0 页放行
+        monkeypatch.setattr(settings, "COMPILATION_ESTIMATE_PAGE_BYTES", 1000)
+        files = {"file": ("large.txt", io.BytesIO(b"line\n" * 2000), "text/plain")}
+        text = client.post("/api/v1/documents/upload", files=files).json()["id"]
+        estimate = client.post("/api/v1/pdf/estimate", json={"document_ids": [text]}).json()
+        assert estimate["estimated_pages"] == 10
+        assert estimate["exceeds_limits"] is True
+    
+    def test_section_headers_share_one_font(self, tmp_path):
+        """测试15: 每节使用不同页眉时所有叠加层共用一个字体，不同裁剪框的页面不共用表单"""
+        sections = []
+        for index in range(30):
+            path = tmp_path / f"section{index}.pdf"
+            path.write_bytes(make_pdf(f"section {index}", pages=2))
+            sections.append((path, f"第{index + 1}章 文档标题", None))
+        cropped = tmp_path / "cropped.pdf"
+        with fitz.open() as doc:
+            for offset in (0, 100):
+                page = doc.new_page()
+                page.set_cropbox(fitz.Rect(offset, offset, offset + 400, offset + 600))
+                page.insert_text((offset + 72, offset + 72), f"cropped {offset}")
+            doc.save(str(cropped))
+        sections.append((cropped, "裁剪页面", None))
+        
+        output_path = PDFService(None).compose_pdf(sections, tmp_path / "composed.pdf", add_header=True)
+        
+        with fitz.open(str(output_path)) as compiled:
+            stamp_fonts = {
+                xref
+                for page in compiled
+                for xref, _, _, basefont, *_ in page.get_fonts(full=True)
+                if "Helvetica" not in basefont
+            }
+            assert len(stamp_fonts) == 1
+            assert "第30章 文档标题" in compiled[59].get_text()
+            for page_number in (60, 61):
+                page = compiled[page_number]
+                assert "裁剪页面" in page.get_textbox(fitz.Rect(0, 0, page.rect.width, 50))
+    
+    def test_cache_evicts_volumes_with_manifest(self, tmp_path, monkeypatch):
+        """测试16: 分卷和清单一起淘汰，正在生成的汇编已完成的分卷不被淘汰"""
+        cache = CompilationCache(cache_dir=tmp_path)
+        old_key, new_key = "a" * 64, "b" * 64
+        
+        def put_volume(key: str, index: int) -> Path:
+            temp_path = cache.temp_path(key)
+            temp_path.write_bytes(b"x" * 1000)
+            return cache.put_volume(key, index, temp_path)
+        
+        monkeypatch.setattr(settings, "COMPILATION_CACHE_MAX_SIZE", 0)
+        old_volumes = [put_volume(old_key, index) for index in (1, 2)]
+        old_manifest = cache.put_manifest(old_key, {"volumes": [{"file": path.name} for path in old_volumes]})
+        for path in (*old_volumes, old_manifest):
+            os.utime(path, (1000, 1000))
+        
+        monkeypatch.setattr(settings, "COMPILATION_CACHE_MAX_SIZE", 2500)
+        with cache.single_flight(new_key):
+            new_volumes = [put_volume(new_key, index) for index in (1, 2, 3)]
+        
+        assert all(path.exists() for path in new_volumes)
+        assert not any(path.exists() for path in (*old_volumes, old_manifest))
+        assert cache.get_manifest(old_key) is None
+    
+    def test_stale_job_fails_after_max_attempts(self, db_session, monkeypatch):
+        """测试17: 超时的汇编任务重新排队，达到最大尝试次数后标记为失败"""
+        monkeypatch.setattr(settings, "COMPILATION_MAX_ATTEMPTS", 2)
+        repository = CompilationJobRepository(db_session)
+        job = repository.create("stale", [1])
+        expired = datetime.utcnow() - timedelta(seconds=settings.COMPILATION_JOB_LOCK_TIMEOUT + 60)
+        
+        for attempt in (1, 2):
+            claimed = repository.claim_next("test")
+            assert claimed.id == job.id
+            assert claimed.attempts == attempt
+            claimed.locked_time = expired
+            db_session.commit()
+            assert repository.requeue_stale() == (1 if attempt == 1 else 0)
+        
+        db_session.expire_all()
+        job = repository.get_by_id(job.id)
+        assert job.status == CompilationJob.STATUS_FAILED
+        assert job.last_error == "工作进程超时未完成"
+        assert repository.claim_next("test") is None
+    
+    def test_job_outputs_pinned(self, db_session, temp_compilation_dir, monkeypatch):
+        """测试18: 汇编任务引用的结果不被缓存淘汰"""
+        repository = CompilationJobRepository(db_session)
+        cache = CompilationCache(db_session)
+        
+        def put(key: str) -> Path:
+            temp_path = cache.temp_path(key)
+            temp_path.write_bytes(b"x" * 1000)
+            path = cache.put(key, temp_path)
+            os.utime(path, (1000, 1000))
+            return path
+        
+        monkeypatch.setattr(settings, "COMPILATION_CACHE_MAX_SIZE", 0)
+        referenced, unreferenced = put("a" * 64), put("b" * 64)
+        job = repository.create("pinned", [1])
+        assert repository.claim_next("worker-1").id == job.id
+        repository.mark_succeeded(job, "worker-1", str(referenced), 1000)
+        
+        monkeypatch.setattr(settings, "COMPILATION_CACHE_MAX_SIZE", 1500)
+        latest = put("c" * 64)
+        assert referenced.exists() and latest.exists()
+        assert not unreferenced.exists()
+    
+    
+    def test_job_ownership_checked(self, db_session):
+        """测试19: 心跳、进度和结果只在任务仍由本工作进程处理时更新，重新排队后原工作进程不能完成任务"""
+        repository = CompilationJobRepository(db_session)
+        job = repository.create("owned", [1])
+        assert repository.claim_next("worker-1").id == job.id
+        assert repository.heartbeat(job.id, "worker-1")
+        assert not repository.heartbeat(job.id, "worker-2")
+        assert repository.update_progress(job, "worker-1", 1, 10)
+        
+        # 心跳中断超过锁超时时间，任务被重新排队并由其他工作进程领取
+        job.locked_time = datetime.utcnow() - timedelta(seconds=settings.COMPILATION_JOB_LOCK_TIMEOUT + 60)
+        db_session.commit()
+        assert repository.requeue_stale() == 1
+        assert repository.claim_next("worker-2").id == job.id
+        
+        assert not repository.heartbeat(job.id, "worker-1")
+        assert not repository.update_progress(job, "worker-1", 1, 10)
+        assert not repository.add_volume(job, "worker-1", {"file": "x.pdf"})
+        assert not repository.mark_succeeded(job, "worker-1", "x.pdf", 1)
+        assert not repository.mark_failed(job, "worker-1", "失败")
+        
+        db_session.expire_all()
+        job = repository.get_by_id(job.id)
+        assert job.status == CompilationJob.STATUS_RUNNING
+        assert job.locked_by == "worker-2"
+        assert repository.mark_succeeded(job, "worker-2", "x.pdf", 1)
+    
+    @pytest.mark.skipif(compilation_cache.fcntl is None, reason="当前平台不支持 flock")
+    def test_single_flight_across_processes(self, tmp_path, monkeypatch):
+        """测试20: 其他进程正在生成的缓存键不被淘汰，相同键的请求等待其他进程生成完成"""
+        cache = CompilationCache(cache_dir=tmp_path)
+        key, other_key = "a" * 64, "b" * 64
+        monkeypatch.setattr(settings, "COMPILATION_CACHE_MAX_SIZE", 0)
+        for name in (key, other_key):
+            temp_path = cache.temp_path(name)
+            temp_path.write_bytes(b"x" * 1000)
+            os.utime(cache.put(name, temp_path), (1000, 1000))
+        
+        context = multiprocessing.get_context("spawn")
+        holding, release = context.Event(), context.Event()
+        process = context.Process(target=_hold_single_flight, args=(str(tmp_path), key, holding, release))
+        process.start()
+        try:
+            assert holding.wait(30)
+            
+            monkeypatch.setattr(settings, "COMPILATION_CACHE_MAX_SIZE", 1500)
+            temp_path = cache.temp_path("c" * 64)
+            temp_path.write_bytes(b"x" * 1000)
+            cache.put("c" * 64, temp_path)
+            assert cache.entry_path(key).exists()
+            assert not cache.entry_path(other_key).exists()
+            
+            threading.Timer(0.5, release.set).start()
+            started = time.monotonic()
+            with cache.single_flight(key):
+                assert time.monotonic() - started >= 0.4
+        finally:
+            release.set()
+            process.join(30)
+    
+    def test_volume_failure_closes_documents_once(self, tmp_path, monkeypatch):
+        """测试21: 保存或提交某一卷失败时抛出原始错误，分卷文档不被重复关闭"""
+        source = tmp_path / "source.pdf"
+        source.write_bytes(make_pdf("volume", pages=3))
+        committed = []
+        
+        def commit_volume(index: int, path: Path) -> Path:
+            if index == 2:
+                raise OSError("磁盘已满")
+            committed.append(index)
+            return path
+        
+        def compose():
+            return PDFService._compose_volumes_sync(
+                [(source, "source.pdf", None)],
+                max_pages=1,
+                max_bytes=None,
+                header_text=None,
+                add_header=True,
+                profile="archive",
+                watermark_text=None,
+                temp_path=lambda index: tmp_path / f"volume-{index}.pdf",
+                commit_volume=commit_volume,
+            )
+        
+        with pytest.raises(OSError, match="磁盘已满"):
+            compose()
+        assert committed == [1]
+        
+        # 保存第二卷时失败
+        save_with_profile = PDFService._save_with_profile
+        saved = []
+        
+        def fail_second_save(doc, path, profile):
+            if saved:
+                raise RuntimeError("保存失败")
+            saved.append(path)
+            save_with_profile(doc, path, profile)
+        
+        monkeypatch.setattr(PDFService, "_save_with_profile", staticmethod(fail_second_save))
+        committed.clear()
+        with pytest.raises(RuntimeError, match="保存失败"):
+            compose()
+        assert committed == [1]
@@ -0,0 +1,144 @@
+"""
+测试 PDF 处理进程池
+"""
+from concurrent.futures import ThreadPoolExecutor
+import os
+import time
+
+import fitz
+import pytest
+
+from app.core.config import settings
+from app.services import process_pool
+from app.services.pdf_service import PDFService
+from app.services.process_pool import PDFProcessPool, run_cpu_bound
+
+
+def _process_id() -> int:
+    return os.getpid()
+
+
+def _report(count: int, report=None) -> list:
+    return [report(index) for index in range(count)]
+
+
+def _allocate(size: int) -> int:
+    return len(bytearray(size))
+
+
+def _crash() -> None:
+    os._exit(1)
+
+
+def _spin(seconds: float) -> int:
+    deadline = time.monotonic() + seconds
+    while time.monotonic() < deadline:
+        pass
+    return os.getpid()
+
+
+@pytest.fixture
+def single_process_pool(monkeypatch):
+    """使用只有一个工作进程的全局进程池，用例结束后关闭"""
+    process_pool.shutdown_pdf_process_pool()
+    monkeypatch.setattr(settings, "PDF_PROCESS_POOL_SIZE", 1)
+    yield
+    process_pool.shutdown_pdf_process_pool()
+
+
+class TestProcessPool:
+    """PDF 处理进程池测试类"""
+    
+    def test_compose_in_worker_process(self, tmp_path, single_process_pool):
+        """测试1: 汇编在工作进程中执行，进度回调在调用线程中执行"""
+        sources = []
+        for index in range(3):
+            path = tmp_path / f"source{index}.pdf"
+            with fitz.open() as doc:
+                doc.new_page().insert_text((72, 72), f"section {index}")
+                doc.save(str(path))
+            sources.append((path, f"第{index + 1}节", None))
+        
+        calls = []
+        output_path = PDFService(None).compose_pdf(
+            sources,
+            tmp_path / "composed.pdf",
+            add_header=True,
+            progress=lambda merged, pages: calls.append((merged, pages, os.getpid())),
+        )
+        
+        assert run_cpu_bound(_process_id) != os.getpid()
+        assert calls == [(1, 1, os.getpid()), (2, 2, os.getpid()), (3, 3, os.getpid())]
+        with fitz.open(str(output_path)) as doc:
+            assert [title for _, title, _ in doc.get_toc()] == ["第1节", "第2节", "第3节"]
+    
+    def test_callback_error_propagates(self, single_process_pool):
+        """测试2: 回调抛出的异常原样传回调用方"""
+        def report(index):
+            if index == 1:
+                raise ValueError("回调失败")
+            return index
+        
+        assert run_cpu_bound(_report, 3, callbacks={"report": lambda index: index * 2}) == [0, 2, 4]
+        with pytest.raises(ValueError, match="回调失败"):
+            run_cpu_bound(_report, 3, callbacks={"report": report})
+    
+    @pytest.mark.skipif(process_pool.resource is None, reason="当前平台不支持限制进程内存")
+    def test_memory_limit(self):
+        """测试3: 超出内存上限的任务失败，工作进程继续处理后续任务"""
+        pool = PDFProcessPool(1, memory_limit=1024 * 1024 * 1024)
+        try:
+            with pytest.raises(MemoryError):
+                pool.run(_allocate, 2 * 1024 * 1024 * 1024)
+            assert pool.run(_allocate, 1024) == 1024
+        finally:
+            pool.shutdown()
+    
+    def test_crashed_worker_rebuilds_pool(self, single_process_pool):
+        """测试4: 工作进程异常退出时任务失败，进程池重建后可继续使用"""
+        with pytest.raises(RuntimeError, match="PDF 处理进程异常退出"):
+            run_cpu_bound(_crash)
+        assert run_cpu_bound(_allocate, 16) == 16
+    
+    def test_inline_when_disabled(self, monkeypatch):
+        """测试5: 进程数为 0 时在当前线程中执行"""
+        process_pool.shutdown_pdf_process_pool()
+        monkeypatch.setattr(settings, "PDF_PROCESS_POOL_SIZE", 0)
+        assert run_cpu_bound(_process_id) == os.getpid()
+        assert run_cpu_bound(_report, 2, callbacks={"report": str}) == ["0", "1"]
+    
+    def test_time_budget_enforced_in_worker(self, single_process_pool):
+        """测试6: 超过时间预算的任务被中止（结束执行该任务的进程），之后的任务正常执行"""
+        worker_pid = run_cpu_bound(_spin, 0, timeout=30)
+        assert worker_pid != os.getpid()
+        assert run_cpu_bound(_spin, 0, timeout=30) == worker_pid
+        
+        started = time.monotonic()
+        with pytest.raises(TimeoutError):
+            run_cpu_bound(_spin, 30, timeout=0.5)
+        assert time.monotonic() - started < 10
+        
+        assert run_cpu_bound(_spin, 0, timeout=30) not in (worker_pid, os.getpid())
+        assert run_cpu_bound(_report, 2, callbacks={"report": str}, timeout=30) == ["0", "1"]
+    
+    def test_timeout_does_not_affect_other_tasks(self):
+        """测试7: 任务超时只结束执行它的进程，同时执行的其他任务（有无时间预算）正常完成"""
+        pool = PDFProcessPool(2)
+        try:
+            # 预热，排除进程启动时间
+            pool.run(_spin, 0)
+            pool.run(_spin, 0, timeout=30)
+            
+            with ThreadPoolExecutor(max_workers=3) as executor:
+                stuck = executor.submit(pool.run, _spin, 30, timeout=0.5)
+                budgeted = executor.submit(pool.run, _spin, 2, timeout=30)
+                shared = executor.submit(pool.run, _spin, 2)
+                
+                with pytest.raises(TimeoutError):
+                    stuck.result(timeout=20)
+                assert budgeted.result(timeout=20) != os.getpid()
+                assert shared.result(timeout=20) != os.getpid()
+            
+            assert pool.run(_allocate, 16) == 16
+        finally:
+            pool.shutdown()
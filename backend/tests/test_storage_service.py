@@ -0,0 +1,139 @@
+"""
+测试 StorageService 文件存储
+"""
+import asyncio
+import hashlib
+import pytest
+from io import BytesIO
+
+from fastapi import UploadFile
+
+from app.core.config import settings
+from app.core.exceptions import FileTooLargeError
+from app.services.document_service import DocumentService
+from app.services.file_type import FileTypeDetector
+from app.services.storage_service import StorageService
+
+
+def _upload(content: bytes, filename: str = "test.bin", content_type: str = None) -> UploadFile:
+    headers = {"content-type": content_type} if content_type else None
+    return UploadFile(file=BytesIO(content), filename=filename, headers=headers)
+
+
+class TestStreamingUpload:
+    """流式上传测试类"""
+    
+    def test_save_upload_in_chunks(self, temp_upload_dir, monkeypatch):
+        """测试1: 分块写入，大小和哈希边写边计算"""
+        monkeypatch.setattr(settings, "UPLOAD_CHUNK_SIZE", 7)
+        content = b"0123456789" * 10
+        
+        stored = asyncio.run(StorageService().save_upload(_upload(content, "a.BIN")))
+        
+        sha256 = hashlib.sha256(content).hexdigest()
+        assert stored.path == temp_upload_dir / "blobs" / sha256[:2] / f"{sha256}.bin"
+        assert stored.path.read_bytes() == content
+        assert stored.size == len(content)
+        assert stored.sha256 == sha256
+        assert stored.deduplicated is False
+    
+    def test_save_upload_too_large(self, temp_upload_dir, monkeypatch):
+        """测试2: 超过大小限制时中止并清理临时文件"""
+        monkeypatch.setattr(settings, "UPLOAD_CHUNK_SIZE", 4)
+        
+        with pytest.raises(FileTooLargeError):
+            asyncio.run(
+                StorageService().save_upload(_upload(b"x" * 32), max_size=16)
+            )
+        
+        assert list(temp_upload_dir.glob("*.part")) == []
+
+
+class TestContentAddressedStorage:
+    """内容寻址存储测试类"""
+    
+    def test_duplicate_upload_stored_once(self, temp_upload_dir):
+        """测试1: 相同内容只保存一份"""
+        service = StorageService()
+        
+        first = asyncio.run(service.save_upload(_upload(b"same", "a.txt")))
+        second = asyncio.run(service.save_upload(_upload(b"same", "b.txt")))
+        for stored in (first, second):
+            asyncio.run(service.release(stored))
+        
+        assert first.path == second.path
+        assert second.deduplicated is True
+        assert len(list((temp_upload_dir / "blobs").rglob("*.txt"))) == 1
+        assert list(temp_upload_dir.glob("*.part")) == []
+    
+    def test_delete_keeps_blob_until_last_reference(self, db_session, temp_upload_dir):
+        """测试2: 最后一个引用删除时才删除文件"""
+        stored = asyncio.run(StorageService().save_upload(_upload(b"shared", "a.txt")))
+        service = DocumentService(db_session)
+        documents = [
+            asyncio.run(service.create_document_from_blob(stored, title, "text/plain"))
+            for title in ("a.txt", "b.txt")
+        ]
+        
+        service.delete_document(documents[0].id)
+        assert stored.path.exists()
+        
+        service.delete_document(documents[1].id)
+        assert not stored.path.exists()
+    
+    def test_delete_during_duplicate_upload(self, db_session, temp_upload_dir):
+        """测试3: 命中已有文件后、文档记录创建前最后一个引用被删除，文件在创建文档记录后恢复"""
+        service = DocumentService(db_session)
+        first = asyncio.run(StorageService().save_upload(_upload(b"shared", "a.txt")))
+        document = asyncio.run(service.create_document_from_blob(first, "a.txt", "text/plain"))
+        
+        second = asyncio.run(StorageService().save_upload(_upload(b"shared", "b.txt")))
+        assert second.deduplicated is True
+        service.delete_document(document.id)
+        assert not second.path.exists()
+        
+        asyncio.run(service.create_document_from_blob(second, "b.txt", "text/plain"))
+        assert second.path.read_bytes() == b"shared"
+        assert list(temp_upload_dir.glob("*.part")) == []
+
+
+class TestFileTypeDetection:
+    """按文件头识别文件类型测试类"""
+    
+    def test_detect_by_signature(self):
+        """测试1: 有文件头的格式按内容识别，纯文本格式沿用扩展名"""
+        cases = [
+            (b"\xff\xd8\xff\xe0\x00\x10JFIF", "photo.jpeg", ".jpeg"),
+            (b"\xff\xd8\xff\xe0\x00\x10JFIF", "scan.pdf", ".jpg"),
+            (b"<!DOCTYPE html><html><body>report</body></html>", "report.doc", ".html"),
+            (b"plain text", "notes.docx", ".txt"),
+            (b"\x00\x01\x02\x03", "broken.xlsx", ".bin"),
+            (b"\x1f\x8b\x08\x00", "archive.docx", ".gz"),
+            (b"PK\x03\x04" + b"\x00" * 26 + b"word/document.xml", "contract.bin", ".docx"),
+            (b"\xd0\xcf\x11\xe0\xa1\xb1\x1a\xe1", "budget.xls", ".xls"),
+            (b"\xd0\xcf\x11\xe0\xa1\xb1\x1a\xe1", "legacy.docx", ".doc"),
+            (b"\xd0\xcf\x11\xe0\xa1\xb1\x1a\xe1", "mail.msg", ".ole"),
+            (b"\xd0\xcf\x11\xe0\xa1\xb1\x1a\xe1", "drawing.vsd", ".ole"),
+            (b"\x00\x05\x16\x07garbage\n%PDF-1.7", "paper.PDF", ".pdf"),
+            (b"See the %PDF-1.7 header", "notes.md", ".md"),
+            (b"text mentioning\n%PDF-1.4", "readme.pdf", ".txt"),
+            ("# <html> 标题".encode(), "readme.md", ".md"),
+            (b"", "empty.pdf", ".pdf"),
+        ]
+        for head, filename, suffix in cases:
+            assert FileTypeDetector.detect(head, filename).suffix == suffix, filename
+        
+        # 沿用扩展名时记录客户端声明的类型，按内容识别时记录识别出的类型
+        assert FileTypeDetector.detect(b"a,b", "data.csv", "text/csv").mime_type == "text/csv"
+        assert FileTypeDetector.detect(b"%PDF-1.4", "x.pdf", "text/plain").mime_type == "application/pdf"
+    
+    def test_save_upload_uses_detected_suffix(self, temp_upload_dir, monkeypatch):
+        """测试2: 流式保存时识别文件头（跨多个分块），blob 使用识别出的扩展名"""
+        monkeypatch.setattr(settings, "UPLOAD_CHUNK_SIZE", 3)
+        content = b"\x89PNG\r\n\x1a\n" + b"\x00" * 32
+        
+        stored = asyncio.run(StorageService().save_upload(_upload(content, "scan.pdf", "application/pdf")))
+        
+        assert stored.path.suffix == ".png"
+        assert stored.file_type.mime_type == "image/png"
+        assert stored.path.read_bytes() == content
@@ -14,6 +14,7 @@ CREATE TABLE documents (
     file_type VARCHAR(100) NOT NULL,  -- 文件类型
     pdf_file_size INTEGER NOT NULL,  -- PDF文件大小
     pdf_save_path VARCHAR(500) DEFAULT NULL,  -- PDF文件保存路径
+    page_count INTEGER DEFAULT NULL,  -- PDF页数（原始 PDF 或转换结果的页数，为空表示未知）
     introduction TEXT,  -- 文章简介
     write_time TEXT DEFAULT NULL,  -- 写作时间（SQLite 使用 TEXT 存储日期时间）
     create_time TEXT NOT NULL DEFAULT CURRENT_TIMESTAMP,  -- 创建时间
@@ -75,6 +76,45 @@ CREATE TABLE document_tags (
     FOREIGN KEY (tag_id) REFERENCES tags(id) ON DELETE CASCADE
 );
 
+-- PDF 转换任务表（持久化任务队列，由转换工作进程消费）
+CREATE TABLE conversion_jobs (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,  -- 任务ID，主键
+    document_id INTEGER NOT NULL,  -- 发起转换的文档ID
+    source_path VARCHAR(500) NOT NULL,  -- 源文件路径（同一文件的多个文档共享转换结果）
+    converter_class VARCHAR(20) NOT NULL,  -- 转换器类型：text-文本类，image-图片，office-Office 文档
+    status INTEGER NOT NULL DEFAULT 0,  -- 状态：0-待处理，1-处理中，2-成功，3-失败
+    priority INTEGER NOT NULL DEFAULT 0,  -- 优先级：数值越小越先处理（按估算转换开销）
+    attempts INTEGER NOT NULL DEFAULT 0,  -- 已尝试次数
+    max_attempts INTEGER NOT NULL DEFAULT 3,  -- 最大尝试次数
+    next_run_time TEXT NOT NULL,  -- 下次可执行时间（重试退避）
+    locked_by VARCHAR(100) DEFAULT NULL,  -- 正在处理的工作进程标识
+    locked_time TEXT DEFAULT NULL,  -- 开始处理时间
+    last_error TEXT,  -- 最近一次失败原因
+    create_time TEXT NOT NULL DEFAULT CURRENT_TIMESTAMP,  -- 创建时间
+    update_time TEXT NOT NULL DEFAULT CURRENT_TIMESTAMP  -- 更新时间（通过触发器自动更新）
+);
+
+-- PDF 汇编任务表
+CREATE TABLE compilation_jobs (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,  -- 任务ID，主键
+    title VARCHAR(255) NOT NULL,  -- 汇编标题
+    document_ids TEXT NOT NULL,  -- 文档ID列表（JSON，按汇编顺序）
+    options TEXT,  -- 汇编选项（JSON）
+    status INTEGER NOT NULL DEFAULT 0,  -- 状态：0-待处理，1-处理中，2-成功，3-失败
+    total_documents INTEGER NOT NULL DEFAULT 0,  -- 文档总数
+    processed_documents INTEGER NOT NULL DEFAULT 0,  -- 已处理文档数
+    processed_pages INTEGER NOT NULL DEFAULT 0,  -- 已处理页数
+    output_path VARCHAR(500) DEFAULT NULL,  -- 汇编结果文件路径
+    output_size INTEGER NOT NULL DEFAULT 0,  -- 汇编结果文件大小
+    volumes TEXT,  -- 已完成的分卷列表（JSON，分卷汇编时逐卷追加）
+    attempts INTEGER NOT NULL DEFAULT 0,  -- 已尝试次数（每次领取加一）
+    locked_by VARCHAR(100) DEFAULT NULL,  -- 正在处理的工作进程标识
+    locked_time TEXT DEFAULT NULL,  -- 开始处理时间
+    last_error TEXT,  -- 失败原因
+    create_time TEXT NOT NULL DEFAULT CURRENT_TIMESTAMP,  -- 创建时间
+    update_time TEXT NOT NULL DEFAULT CURRENT_TIMESTAMP  -- 更新时间（通过触发器自动更新）
+);
+
 -- ==================== 索引 ====================
 
 -- 文章表索引
@@ -83,6 +123,7 @@ CREATE INDEX idx_documents_category_id ON documents(category_id);
 CREATE INDEX idx_documents_delete_flag ON documents(delete_flag);
 CREATE INDEX idx_documents_create_time ON documents(create_time);
 CREATE INDEX idx_documents_update_time ON documents(update_time);
+CREATE INDEX idx_documents_save_path ON documents(save_path);  -- 原始文件按内容去重存储，删除时按路径统计引用数
 
 -- 用户表索引
 CREATE UNIQUE INDEX uk_users_phone ON users(phone) WHERE phone IS NOT NULL;  -- 手机号唯一索引（忽略 NULL）
@@ -108,6 +149,15 @@ CREATE INDEX idx_tags_update_time ON tags(update_time);
 CREATE INDEX idx_document_tags_document_id ON document_tags(document_id);
 CREATE INDEX idx_document_tags_tag_id ON document_tags(tag_id);
 
+-- 转换任务表索引
+CREATE INDEX idx_conversion_jobs_status_next_run_time ON conversion_jobs(status, next_run_time);
+CREATE INDEX idx_conversion_jobs_converter_class_status ON conversion_jobs(converter_class, status);  -- 按转换器类型领取任务、统计队列深度
+CREATE INDEX idx_conversion_jobs_source_path ON conversion_jobs(source_path);
+CREATE INDEX idx_conversion_jobs_document_id ON conversion_jobs(document_id);
+
+-- PDF 汇编任务表索引
+CREATE INDEX idx_compilation_jobs_status ON compilation_jobs(status);
+
 -- ==================== 触发器：自动更新 update_time ====================
 
 -- 文件表更新触发器
@@ -144,4 +194,22 @@ FOR EACH ROW
 WHEN NEW.update_time = OLD.update_time
 BEGIN
     UPDATE tags SET update_time = CURRENT_TIMESTAMP WHERE id = NEW.id;
-END;
\ No newline at end of file
+END;
+
+-- 转换任务表更新触发器
+CREATE TRIGGER update_conversion_jobs_timestamp 
+AFTER UPDATE ON conversion_jobs
+FOR EACH ROW
+WHEN NEW.update_time = OLD.update_time
+BEGIN
+    UPDATE conversion_jobs SET update_time = CURRENT_TIMESTAMP WHERE id = NEW.id;
+END;
+
+-- PDF 汇编任务表更新触发器
+CREATE TRIGGER update_compilation_jobs_timestamp 
+AFTER UPDATE ON compilation_jobs
+FOR EACH ROW
+WHEN NEW.update_time = OLD.update_time
+BEGIN
+    UPDATE compilation_jobs SET update_time = CURRENT_TIMESTAMP WHERE id = NEW.id;
+END;
@@ -0,0 +1,9 @@
+-- SQLite 数据库升级脚本（已有数据库按 creatSql.sql 旧版本创建时执行，只执行一次）
+-- 使用方式：sqlite3 documents_collecting.db < upgradeSql.sql
+-- 新增的 conversion_jobs、compilation_jobs 表在服务启动时自动创建，不需要手动执行
+
+-- 文件表：PDF 页数（汇编预估使用，为空表示未知；已有文档在下次转换或重新上传时记录）
+ALTER TABLE documents ADD COLUMN page_count INTEGER DEFAULT NULL;  -- PDF页数（原始 PDF 或转换结果的页数，为空表示未知）
+
+-- 文件表索引：原始文件按内容去重存储，删除时按路径统计引用数
+CREATE INDEX IF NOT EXISTS idx_documents_save_path ON documents(save_path);